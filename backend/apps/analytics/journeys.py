@@ -0,0 +1,285 @@
+"""
+Customer journey aggregation.
+
+Journey summaries, per-user journeys and cohort funnels are each answered
+by one grouped query using conditional aggregates (``Count(..., filter=Q())``)
+instead of a query per step type. ``rebuild_rollup`` precomputes the same
+figures per signup cohort day into CustomerJourneyRollup, which the
+summary and funnel can read instead of scanning the steps table.
+"""
+from collections import Counter, OrderedDict
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Func, IntegerField, Min, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Trunc, TruncDate
+
+from apps.booking.models import Appointment, Payment
+from apps.core.dates import date_range_q
+from apps.core.models import User
+
+from .models import CustomerJourneyStep, CustomerJourneyRollup
+
+CUSTOMER_ROLES = ['customer', 'visitor']
+FUNNEL_STEPS = ['signup', 'first_booking', 'first_appointment', 'repeat_booking']
+STEP_TYPES = [step_type for step_type, _ in CustomerJourneyStep.STEP_TYPES]
+BUCKETS = ['day', 'week', 'month']
+TOP_SOURCES = 5
+
+
+def _percentage(part, whole):
+    return (part / whole) * 100 if whole else 0
+
+
+def _cohort_filter(prefix, start_date=None, end_date=None):
+    """Filter customers by signup day, with inclusive dates as a half-open range."""
+    return Q(**{f'{prefix}role__in': CUSTOMER_ROLES}) & date_range_q(
+        f'{prefix}date_joined', start_date, end_date
+    )
+
+
+def _count_by_type(step_types, prefix=''):
+    return {
+        step_type: Count('id', filter=Q(**{f'{prefix}step_type': step_type}))
+        for step_type in step_types
+    }
+
+
+def _summary(total_customers, progression, sources):
+    top_sources = [
+        {'source': source, 'count': count}
+        for source, count in sorted(sources.items(), key=lambda item: (-item[1], str(item[0])))
+    ][:TOP_SOURCES]
+    return {
+        'total_customers': total_customers,
+        'journey_progression': {
+            'signups': progression['signup'],
+            'first_bookings': progression['first_booking'],
+            'first_appointments': progression['first_appointment'],
+            'repeat_bookings': progression['repeat_booking'],
+        },
+        'conversion_rates': {
+            'signup_to_booking': _percentage(progression['first_booking'], progression['signup']),
+            'booking_to_appointment': _percentage(
+                progression['first_appointment'], progression['first_booking']
+            ),
+        },
+        'top_sources': top_sources,
+    }
+
+
+def journey_summary(start_date=None, end_date=None):
+    """Step counts, conversion rates and top sources for a signup cohort range."""
+    customers = User.objects.filter(_cohort_filter('', start_date, end_date))
+    total_customers = customers.order_by().annotate(
+        count=Func(F('id'), function='COUNT')
+    ).values('count')
+
+    # One row per source; the customer total rides along as a scalar subquery
+    rows = CustomerJourneyStep.objects.filter(
+        _cohort_filter('user__', start_date, end_date)
+    ).annotate(
+        total_customers=Coalesce(Subquery(total_customers), Value(0), output_field=IntegerField())
+    ).order_by().values('source', 'total_customers').annotate(
+        count=Count('id'), **_count_by_type(FUNNEL_STEPS)
+    )
+
+    progression = Counter()
+    sources = Counter()
+    total = None
+    for row in rows:
+        total = row['total_customers']
+        sources[row['source']] += row['count']
+        for step_type in FUNNEL_STEPS:
+            progression[step_type] += row[step_type]
+
+    if total is None:
+        # No steps at all in the range
+        total = customers.count()
+    return _summary(total, progression, sources)
+
+
+def user_journey(user):
+    """
+    Journey analytics for one customer.
+
+    ``user`` must come from ``journey_user_queryset`` so that its appointment
+    and payment totals are already loaded.
+    """
+    step_types = ['website_visit', 'signup', 'first_booking', 'first_appointment']
+    rows = CustomerJourneyStep.objects.filter(user=user).order_by().values('source').annotate(
+        count=Count('id'),
+        **{f'{step_type}_at': Min('timestamp', filter=Q(step_type=step_type)) for step_type in step_types},
+        **_count_by_type(STEP_TYPES),
+    )
+
+    firsts = dict.fromkeys(step_types)
+    totals = Counter()
+    sources = {}
+    for row in rows:
+        if row['source']:
+            sources[row['source']] = row['count']
+        for step_type in STEP_TYPES:
+            totals[step_type] += row[step_type]
+        for step_type in step_types:
+            reached = row[f'{step_type}_at']
+            if reached and (firsts[step_type] is None or reached < firsts[step_type]):
+                firsts[step_type] = reached
+
+    days_signup_to_booking = None
+    days_booking_to_appointment = None
+    if firsts['signup'] and firsts['first_booking']:
+        days_signup_to_booking = (firsts['first_booking'] - firsts['signup']).days
+    if firsts['first_booking'] and firsts['first_appointment']:
+        days_booking_to_appointment = (firsts['first_appointment'] - firsts['first_booking']).days
+
+    return {
+        'user_id': user.id,
+        'user_email': user.email,
+        'first_visit_date': firsts['website_visit'],
+        'signup_date': firsts['signup'],
+        'first_booking_date': firsts['first_booking'],
+        'first_appointment_date': firsts['first_appointment'],
+        'days_signup_to_booking': days_signup_to_booking,
+        'days_booking_to_appointment': days_booking_to_appointment,
+        'total_bookings': totals['first_booking'] + totals['repeat_booking'],
+        # Subtract 1 to avoid double-counting the first appointment
+        'total_appointments': totals['first_appointment'] + user.attended_appointments - 1,
+        'total_feedback': totals['feedback_submission'],
+        'total_referrals': totals['referral'],
+        'total_cancellations': totals['cancellation'],
+        'lifetime_value': user.lifetime_value,
+        'sources': sources,
+    }
+
+
+def journey_user_queryset():
+    """Users annotated with the appointment and payment totals user_journey needs."""
+    attended = Appointment.objects.filter(
+        customer=OuterRef('pk'), status__in=['completed', 'confirmed']
+    ).order_by().values('customer').annotate(total=Count('id')).values('total')
+    paid = Payment.objects.filter(
+        appointment__customer=OuterRef('pk'), status='completed'
+    ).order_by().values('appointment__customer').annotate(total=Sum('total_amount')).values('total')
+    return User.objects.annotate(
+        attended_appointments=Coalesce(Subquery(attended), Value(0)),
+        lifetime_value=Coalesce(
+            Subquery(paid), Value(0), output_field=DecimalField(max_digits=12, decimal_places=2)
+        ),
+    )
+
+
+def funnel(bucket='week', start_date=None, end_date=None, steps=FUNNEL_STEPS):
+    """
+    Distinct customers reaching each step, per signup cohort bucket.
+
+    Returns one entry per cohort with its size, the users reaching each step
+    and the conversion from the previous step.
+    """
+    rows = User.objects.filter(_cohort_filter('', start_date, end_date)).annotate(
+        cohort=Trunc(TruncDate('date_joined'), bucket)
+    ).order_by().values('cohort').annotate(
+        customers=Count('id', distinct=True),
+        **{
+            step_type: Count('id', distinct=True, filter=Q(journey_steps__step_type=step_type))
+            for step_type in steps
+        },
+    ).order_by('cohort')
+    return [_funnel_row(row, steps) for row in rows]
+
+
+def _funnel_row(row, steps):
+    reached = OrderedDict()
+    previous = row['customers']
+    for step_type in steps:
+        reached[step_type] = {
+            'users': row[step_type],
+            'conversion': _percentage(row[step_type], previous),
+        }
+        previous = row[step_type]
+    return {'cohort': row['cohort'], 'customers': row['customers'], 'steps': reached}
+
+
+@transaction.atomic
+def rebuild_rollup(start_date=None, end_date=None):
+    """
+    Recompute CustomerJourneyRollup rows for signup days in a range.
+
+    Returns the number of rows written.
+    """
+    cohort = TruncDate('date_joined')
+    step_cohort = TruncDate('user__date_joined')
+    cohorts = User.objects.filter(_cohort_filter('', start_date, end_date)).annotate(
+        day=cohort
+    ).order_by().values('day').annotate(users=Count('id'))
+    steps = CustomerJourneyStep.objects.filter(
+        _cohort_filter('user__', start_date, end_date)
+    ).annotate(day=step_cohort)
+    step_totals = steps.order_by().values('day', 'step_type').annotate(
+        steps=Count('id'), users=Count('user', distinct=True)
+    )
+    source_totals = steps.exclude(source__isnull=True).order_by().values(
+        'day', 'step_type', 'source'
+    ).annotate(steps=Count('id'))
+
+    rows = {}
+    for row in cohorts:
+        rows[(row['day'], CustomerJourneyRollup.COHORT)] = CustomerJourneyRollup(
+            cohort_date=row['day'], step_type=CustomerJourneyRollup.COHORT, user_count=row['users']
+        )
+    for row in step_totals:
+        rows[(row['day'], row['step_type'])] = CustomerJourneyRollup(
+            cohort_date=row['day'], step_type=row['step_type'],
+            step_count=row['steps'], user_count=row['users'], sources={}
+        )
+    for row in source_totals:
+        rows[(row['day'], row['step_type'])].sources[row['source']] = row['steps']
+
+    stale = CustomerJourneyRollup.objects.all()
+    if start_date:
+        stale = stale.filter(cohort_date__gte=start_date)
+    if end_date:
+        stale = stale.filter(cohort_date__lte=end_date)
+    stale.delete()
+    CustomerJourneyRollup.objects.bulk_create(rows.values())
+    return len(rows)
+
+
+def _rollup_rows(start_date=None, end_date=None):
+    rows = CustomerJourneyRollup.objects.all()
+    if start_date:
+        rows = rows.filter(cohort_date__gte=start_date)
+    if end_date:
+        rows = rows.filter(cohort_date__lte=end_date)
+    return rows
+
+
+def rollup_summary(start_date=None, end_date=None):
+    """journey_summary computed from the rollup table."""
+    progression = Counter()
+    sources = Counter()
+    total_customers = 0
+    for row in _rollup_rows(start_date, end_date).values('step_type', 'step_count', 'user_count', 'sources'):
+        if row['step_type'] == CustomerJourneyRollup.COHORT:
+            total_customers += row['user_count']
+            continue
+        progression[row['step_type']] += row['step_count']
+        sources.update(row['sources'])
+        # Steps without a source are grouped under None, like the live query
+        untracked = row['step_count'] - sum(row['sources'].values())
+        if untracked:
+            sources[None] += untracked
+    return _summary(total_customers, progression, sources)
+
+
+def rollup_funnel(bucket='week', start_date=None, end_date=None, steps=FUNNEL_STEPS):
+    """funnel computed from the rollup table in one grouped query."""
+    rows = _rollup_rows(start_date, end_date).annotate(
+        cohort=Trunc('cohort_date', bucket)
+    ).order_by().values('cohort').annotate(
+        customers=Coalesce(Sum('user_count', filter=Q(step_type=CustomerJourneyRollup.COHORT)), 0),
+        **{
+            step_type: Coalesce(Sum('user_count', filter=Q(step_type=step_type)), 0)
+            for step_type in steps
+        },
+    ).order_by('cohort')
+    return [_funnel_row(row, steps) for row in rows]
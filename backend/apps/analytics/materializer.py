@@ -0,0 +1,208 @@
+"""
+Materialization of ServiceAnalytics rows.
+
+Every ServiceAnalytics row is one (service, month) cell. Cells are computed
+by a single grouped query over appointments, whatever the number of cells:
+revenue, feedback and first visits are correlated subqueries per appointment,
+so joining payments or feedback never inflates the appointment counts.
+
+``backfill`` computes every cell in a date range at once. Change events on
+appointments, payments and feedback only mark the affected cells dirty, and
+the dirty cells are recomputed together when the transaction commits.
+"""
+from datetime import date, datetime, time
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import (
+    Count, DateField, DecimalField, F, IntegerField, OuterRef, Q, Subquery, Sum, Value
+)
+from django.db.models.functions import Coalesce, TruncMonth
+from django.utils import timezone
+
+from apps.booking.models import Appointment, Payment
+from apps.clinic.models import Service
+from apps.core.deferred import defer_until_commit
+from apps.engagement.models import FeedbackResponse
+
+from .models import ServiceAnalytics
+
+METRIC_FIELDS = [
+    'appointment_count', 'revenue', 'customer_count', 'new_customer_count',
+    'average_rating', 'cancellation_rate', 'no_show_rate',
+]
+
+
+def month_start(value):
+    """First day of the month containing a date or an aware datetime."""
+    if isinstance(value, datetime):
+        value = timezone.localtime(value).date()
+    return value.replace(day=1)
+
+
+def next_month(month):
+    if month.month == 12:
+        return date(month.year + 1, 1, 1)
+    return date(month.year, month.month + 1, 1)
+
+
+def month_bounds(month):
+    """Aware datetimes bounding a month, usable as a half-open range."""
+    tz = timezone.get_current_timezone()
+    return (
+        timezone.make_aware(datetime.combine(month, time.min), tz),
+        timezone.make_aware(datetime.combine(next_month(month), time.min), tz),
+    )
+
+
+def _percentage(part, whole):
+    if not whole:
+        return Decimal('0')
+    return (Decimal(part) * 100 / whole).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def compute_cells(appointment_filter=Q()):
+    """
+    Compute metrics for every (service, month) cell of the matching appointments.
+
+    Returns a dict mapping (service_id, month) to ServiceAnalytics field values.
+    """
+    appointment_type = ContentType.objects.get_for_model(Appointment)
+    payments = Payment.objects.filter(appointment=OuterRef('pk')).order_by().values('appointment')
+    feedback = FeedbackResponse.objects.filter(
+        content_type=appointment_type, object_id=OuterRef('pk'), satisfaction_score__isnull=False
+    ).order_by().values('object_id')
+    first_visit = Appointment.objects.filter(
+        customer=OuterRef('customer')
+    ).order_by('start_time').values('start_time')[:1]
+
+    rows = Appointment.objects.filter(appointment_filter).annotate(
+        month=TruncMonth('start_time', output_field=DateField()),
+        paid=Coalesce(
+            Subquery(payments.annotate(total=Sum('total_amount')).values('total')),
+            Value(Decimal('0')), output_field=DecimalField(max_digits=12, decimal_places=2)
+        ),
+        appointment_score=Coalesce(
+            Subquery(feedback.annotate(total=Sum('satisfaction_score')).values('total')),
+            Value(0), output_field=IntegerField()
+        ),
+        appointment_responses=Coalesce(
+            Subquery(feedback.annotate(total=Count('id')).values('total')),
+            Value(0), output_field=IntegerField()
+        ),
+        first_visit=Subquery(first_visit),
+    ).order_by().values('service_id', 'month').annotate(
+        appointment_count=Count('id'),
+        customer_count=Count('customer', distinct=True),
+        new_customer_count=Count('customer', distinct=True, filter=Q(start_time=F('first_visit'))),
+        cancelled=Count('id', filter=Q(status='cancelled')),
+        no_shows=Count('id', filter=Q(status='no_show')),
+        revenue=Sum('paid'),
+        score_total=Sum('appointment_score'),
+        score_count=Sum('appointment_responses'),
+    )
+
+    cells = {}
+    for row in rows:
+        count = row['appointment_count']
+        average_rating = None
+        if row['score_count']:
+            average_rating = (Decimal(row['score_total']) / row['score_count']).quantize(
+                Decimal('0.01'), rounding=ROUND_HALF_UP
+            )
+        cells[(row['service_id'], row['month'])] = {
+            'appointment_count': count,
+            'revenue': row['revenue'] or Decimal('0'),
+            'customer_count': row['customer_count'],
+            'new_customer_count': row['new_customer_count'],
+            'average_rating': average_rating,
+            'cancellation_rate': _percentage(row['cancelled'], count),
+            'no_show_rate': _percentage(row['no_shows'], count),
+        }
+    return cells
+
+
+def _save_cells(cells):
+    """Upsert computed cells in one statement."""
+    rows = [
+        ServiceAnalytics(service_id=service_id, time_period=month, **values)
+        for (service_id, month), values in cells.items()
+    ]
+    ServiceAnalytics.objects.bulk_create(
+        rows, update_conflicts=True,
+        unique_fields=['service', 'time_period'], update_fields=METRIC_FIELDS,
+    )
+    return len(rows)
+
+
+def backfill(start_month=None, end_month=None):
+    """
+    Materialize every service and month between two months (inclusive).
+
+    Without bounds, all appointment history is processed. Returns the number
+    of rows written.
+    """
+    appointment_filter = Q()
+    if start_month:
+        appointment_filter &= Q(start_time__gte=month_bounds(month_start(start_month))[0])
+    if end_month:
+        appointment_filter &= Q(start_time__lt=month_bounds(month_start(end_month))[1])
+    return _save_cells(compute_cells(appointment_filter))
+
+
+def refresh_cells(cells):
+    """
+    Recompute the given (service_id, month) cells.
+
+    Cells without appointments are written with zero metrics so that stale
+    figures never survive the last appointment being moved away.
+    """
+    cells = {(service_id, month_start(month)) for service_id, month in cells}
+    if not cells:
+        return 0
+
+    appointment_filter = Q()
+    for service_id, month in cells:
+        start, end = month_bounds(month)
+        appointment_filter |= Q(service_id=service_id, start_time__gte=start, start_time__lt=end)
+
+    computed = compute_cells(appointment_filter)
+    # A service may have been deleted, or its creation rolled back, since its
+    # cells were marked dirty
+    services = set(Service.objects.filter(
+        id__in={service_id for service_id, _ in cells}
+    ).values_list('id', flat=True))
+    for cell in cells:
+        if cell[0] not in services:
+            continue
+        computed.setdefault(cell, {
+            'appointment_count': 0,
+            'revenue': Decimal('0'),
+            'customer_count': 0,
+            'new_customer_count': 0,
+            'average_rating': None,
+            'cancellation_rate': Decimal('0'),
+            'no_show_rate': Decimal('0'),
+        })
+    return _save_cells(computed)
+
+
+def _flush(dirty):
+    cells = {(service_id, month) for service_id, month, _ in dirty}
+    customers = {customer_id for _, _, customer_id in dirty if customer_id is not None}
+
+    # A customer's first visit decides which cell counts them as new, so the
+    # cells of their two earliest appointments may have changed as well
+    for customer_id in customers:
+        earliest = Appointment.objects.filter(customer_id=customer_id).order_by(
+            'start_time'
+        ).values_list('service_id', 'start_time')[:2]
+        cells.update(earliest)
+    refresh_cells(cells)
+
+
+def mark_dirty(service_id, start_time, customer_id=None):
+    """Schedule a cell for recomputation once the current transaction commits."""
+    defer_until_commit(
+        'analytics.cells', [(service_id, month_start(start_time), customer_id)], _flush
+    )
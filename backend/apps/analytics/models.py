@@ -106,6 +106,13 @@ class AnalyticsReport(models.Model):
         ('custom', 'Custom Report'),
     ]
     
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    
     name = models.CharField(_('name'), max_length=255)
     report_type = models.CharField(_('report type'), max_length=50, choices=REPORT_TYPES)
     start_date = models.DateField(_('start date'))
@@ -115,6 +122,11 @@ class AnalyticsReport(models.Model):
     parameters = models.JSONField(_('parameters'), blank=True, null=True)
     report_data = models.JSONField(_('report data'), blank=True, null=True)
     file = models.FileField(_('file'), upload_to='analytics_reports/', blank=True, null=True)
+    status = models.CharField(_('status'), max_length=20, choices=STATUS_CHOICES, default='pending')
+    task_id = models.CharField(_('task ID'), max_length=255, blank=True, null=True)
+    sections_total = models.PositiveSmallIntegerField(_('sections total'), default=0)
+    sections_done = models.PositiveSmallIntegerField(_('sections done'), default=0)
+    error = models.TextField(_('error'), blank=True, null=True)
     is_scheduled = models.BooleanField(_('is scheduled'), default=False)
     schedule_frequency = models.CharField(_('schedule frequency'), max_length=20, 
                                         choices=PerformanceMetric.FREQUENCY_CHOICES,
@@ -134,6 +146,15 @@ class AnalyticsReport(models.Model):
         
     def __str__(self):
         return f"{self.name} - {self.get_report_type_display()} ({self.start_date} to {self.end_date})"
+    
+    @property
+    def progress(self):
+        """Percentage of report sections computed so far."""
+        if self.status == 'completed':
+            return 100
+        if not self.sections_total:
+            return 0
+        return int(self.sections_done * 100 / self.sections_total)
 
 
 class ServiceAnalytics(models.Model):
@@ -189,6 +210,38 @@ class CustomerJourneyStep(models.Model):
         verbose_name = _('customer journey step')
         verbose_name_plural = _('customer journey steps')
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['user', 'step_type', 'timestamp']),
+        ]
+        
+    def __str__(self):
+        return f"{self.user.email} - {self.get_step_type_display()} - {self.timestamp}"
+
+
+class CustomerJourneyRollup(models.Model):
+    """
+    Precomputed journey counts per signup cohort day and step type.
+
+    Each customer belongs to exactly one cohort day, so user counts can be
+    summed across days into weekly or monthly cohorts. Rows with the
+    ``cohort`` step type hold the number of customers who joined that day.
+    """
+    
+    COHORT = 'cohort'
+    
+    cohort_date = models.DateField(_('cohort date'))
+    step_type = models.CharField(_('step type'), max_length=30)
+    step_count = models.IntegerField(_('step count'), default=0)
+    user_count = models.IntegerField(_('user count'), default=0)
+    sources = models.JSONField(_('sources'), default=dict, blank=True,
+                             help_text=_('Step count per marketing source'))
+    updated_at = models.DateTimeField(_('updated at'), auto_now=True)
+    
+    class Meta:
+        verbose_name = _('customer journey rollup')
+        verbose_name_plural = _('customer journey rollups')
+        ordering = ['cohort_date', 'step_type']
+        unique_together = ('cohort_date', 'step_type')
         
     def __str__(self):
-        return f"{self.user.email} - {self.get_step_type_display()} - {self.timestamp}"
\ No newline at end of file
+        return f"{self.cohort_date} - {self.step_type} - {self.user_count} users"
@@ -0,0 +1,62 @@
+"""
+Report sections for AnalyticsReport, computed by apps.core.reports.
+
+Each section receives the report and returns JSON-compatible data stored
+under the section's name in ``report_data``.
+"""
+from django.db.models import Count
+from django.db.models.functions import TruncDay, TruncWeek, TruncMonth
+
+from apps.booking.models import Appointment
+from apps.core.dates import date_range_q
+from apps.core.models import User
+
+
+def _report_customers(report):
+    """Customers who joined within the report's dates, as a half-open range."""
+    users = User.objects.filter(
+        date_range_q('date_joined', report.start_date, report.end_date),
+        role__in=['visitor', 'customer']
+    )
+    if report.branch_id:
+        # Filter by appointments at this branch
+        users = users.filter(
+            id__in=Appointment.objects.filter(branch_id=report.branch_id).values('customer_id')
+        )
+    return users
+
+
+def new_customers(report):
+    """New customers over time, grouped by day, week or month depending on the range."""
+    date_diff = (report.end_date - report.start_date).days
+    if date_diff <= 30:
+        trunc, date_format = TruncDay, '%Y-%m-%d'
+    elif date_diff <= 90:
+        trunc, date_format = TruncWeek, '%Y-%m-%d'
+    else:
+        trunc, date_format = TruncMonth, '%Y-%m'
+
+    users_by_date = _report_customers(report).annotate(
+        date=trunc('date_joined')
+    ).values('date').annotate(count=Count('id')).order_by('date')
+    return [
+        {'date': item['date'].strftime(date_format), 'count': item['count']}
+        for item in users_by_date
+    ]
+
+
+def total_customers(report):
+    return _report_customers(report).count()
+
+
+def customer_roles(report):
+    return list(_report_customers(report).values('role').annotate(count=Count('id')).order_by('role'))
+
+
+SECTIONS = {
+    'customer_trends': {
+        'new_customers': new_customers,
+        'total_customers': total_customers,
+        'customer_roles': customer_roles,
+    },
+}
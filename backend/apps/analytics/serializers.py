@@ -68,12 +68,14 @@ class AnalyticsReportSerializer(serializers.ModelSerializer):
     
     branch_detail = BranchSerializer(source='branch', read_only=True)
     generated_by_detail = UserSerializer(source='generated_by', read_only=True)
+    progress = serializers.IntegerField(read_only=True)
     
     class Meta:
         model = AnalyticsReport
         fields = '__all__'
         read_only_fields = ('created_at', 'updated_at', 'file', 'report_data', 
-                           'last_run', 'next_run')
+                           'last_run', 'next_run', 'status', 'task_id', 'sections_total',
+                           'sections_done', 'error')
 
 
 class ServiceAnalyticsSerializer(serializers.ModelSerializer):
@@ -0,0 +1,54 @@
+from django.contrib.contenttypes.models import ContentType
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from apps.booking.models import Appointment, Payment
+from apps.booking.signals import appointments_bulk_changed
+from apps.engagement.models import FeedbackResponse
+
+from .materializer import mark_dirty
+
+
+def mark_appointment_dirty(appointment_id):
+    cell = Appointment.objects.filter(pk=appointment_id).values_list(
+        'service_id', 'start_time'
+    ).first()
+    if cell:
+        mark_dirty(*cell)
+
+
+@receiver(post_save, sender=Appointment)
+def appointment_moved(sender, instance, raw=False, **kwargs):
+    """
+    Recompute the cell an appointment leaves when its service or month
+    changes, from the state booking's pre_save receiver fetched.
+    """
+    previous = getattr(instance, '_previous', None)
+    if not raw and previous and (previous['service_id'], previous['start_time']) != (
+            instance.service_id, instance.start_time):
+        mark_dirty(previous['service_id'], previous['start_time'], previous['customer_id'])
+
+
+@receiver([post_save, post_delete], sender=Appointment)
+def appointment_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        mark_dirty(instance.service_id, instance.start_time, instance.customer_id)
+
+
+@receiver(appointments_bulk_changed)
+def appointments_bulk_changed_handler(sender, appointments, **kwargs):
+    for service_id, start_time, customer_id in appointments:
+        mark_dirty(service_id, start_time, customer_id)
+
+
+@receiver([post_save, post_delete], sender=Payment)
+def payment_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        mark_appointment_dirty(instance.appointment_id)
+
+
+@receiver([post_save, post_delete], sender=FeedbackResponse)
+def feedback_changed(sender, instance, raw=False, **kwargs):
+    appointment_type = ContentType.objects.get_for_model(Appointment)
+    if not raw and instance.content_type_id == appointment_type.id and instance.object_id:
+        mark_appointment_dirty(instance.object_id)
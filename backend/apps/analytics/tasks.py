@@ -0,0 +1,74 @@
+import calendar
+from datetime import date, timedelta
+
+from celery import shared_task
+from django.db import transaction
+from django.utils import timezone
+
+from apps.analytics import materializer
+from apps.analytics.models import AnalyticsReport
+from apps.core.reports import submit_report
+
+FREQUENCY_MONTHS = {
+    'monthly': 1,
+    'quarterly': 3,
+    'yearly': 12,
+}
+FREQUENCY_DAYS = {
+    'daily': 1,
+    'weekly': 7,
+}
+
+
+def advance(moment, frequency):
+    """Step a datetime forward by one schedule period."""
+    if frequency in FREQUENCY_DAYS:
+        return moment + timedelta(days=FREQUENCY_DAYS[frequency])
+    months = moment.month - 1 + FREQUENCY_MONTHS[frequency]
+    year, month = moment.year + months // 12, months % 12 + 1
+    day = min(moment.day, calendar.monthrange(year, month)[1])
+    return moment.replace(year=year, month=month, day=day)
+
+
+def next_run_after(report, now):
+    """The first scheduled run of a report strictly after ``now``."""
+    next_run = report.next_run or now
+    while next_run <= now:
+        next_run = advance(next_run, report.schedule_frequency)
+    return next_run
+
+
+@shared_task
+def run_scheduled_reports():
+    """
+    Regenerate scheduled analytics reports that are due.
+
+    Each run keeps the report's window length and moves it to end yesterday.
+    Due rows are locked with SKIP LOCKED so concurrent beats never submit a
+    report twice.
+    """
+    now = timezone.now()
+    yesterday = timezone.localdate(now) - timedelta(days=1)
+    with transaction.atomic():
+        due = list(AnalyticsReport.objects.select_for_update(skip_locked=True).filter(
+            is_scheduled=True,
+            schedule_frequency__isnull=False,
+            next_run__lte=now
+        ))
+        for report in due:
+            length = report.end_date - report.start_date
+            report.end_date = yesterday
+            report.start_date = yesterday - length
+            report.next_run = next_run_after(report, now)
+            report.save(update_fields=['start_date', 'end_date', 'next_run', 'updated_at'])
+            submit_report(report)
+    return len(due)
+
+
+@shared_task
+def backfill_service_analytics(start_month=None, end_month=None):
+    """Materialize service analytics between two months given as ISO dates."""
+    return materializer.backfill(
+        date.fromisoformat(start_month) if start_month else None,
+        date.fromisoformat(end_month) if end_month else None,
+    )
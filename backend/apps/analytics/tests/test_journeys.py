@@ -0,0 +1,116 @@
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.test import TestCase
+
+from apps.analytics import journeys
+from apps.analytics.models import CustomerJourneyStep, CustomerJourneyRollup
+from apps.booking.models import Appointment, Payment
+from apps.clinic.models import Branch, Service, TherapistProfile
+from apps.core.models import User
+
+
+def on(day, hour=10):
+    return datetime(2030, 1, day, hour, tzinfo=dt_timezone.utc)
+
+
+class CustomerJourneyTests(TestCase):
+    """Test single-query journey summaries, funnels and the cohort rollup."""
+
+    def setUp(self):
+        # Two weekly cohorts: three customers join in the first week, one in the second
+        self.customers = []
+        for index, day in enumerate([7, 8, 9, 15]):
+            user = User.objects.create_user(email=f"customer{index}@example.com", role="customer")
+            User.objects.filter(pk=user.pk).update(date_joined=on(day))
+            self.customers.append(user)
+        first, second, third, fourth = self.customers
+
+        self.step(first, 'signup', on(7), 'google')
+        self.step(first, 'first_booking', on(8), 'google')
+        self.step(first, 'first_appointment', on(12))
+        self.step(first, 'repeat_booking', on(20), 'email')
+        self.step(second, 'signup', on(8), 'google')
+        self.step(second, 'first_booking', on(10), 'instagram')
+        self.step(third, 'signup', on(9), 'instagram')
+        self.step(fourth, 'signup', on(15), 'google')
+        self.step(fourth, 'first_booking', on(16), 'google')
+
+    def step(self, user, step_type, timestamp, source=None):
+        return CustomerJourneyStep.objects.create(
+            user=user, step_type=step_type, timestamp=timestamp, source=source
+        )
+
+    def test_summary_is_one_query(self):
+        with self.assertNumQueries(1):
+            summary = journeys.journey_summary()
+        self.assertEqual(summary['total_customers'], 4)
+        self.assertEqual(summary['journey_progression'], {
+            'signups': 4, 'first_bookings': 3, 'first_appointments': 1, 'repeat_bookings': 1,
+        })
+        self.assertEqual(summary['conversion_rates']['signup_to_booking'], 75)
+        self.assertEqual(summary['top_sources'][0], {'source': 'google', 'count': 5})
+
+    def test_summary_filters_cohort_dates(self):
+        summary = journeys.journey_summary(date(2030, 1, 8), date(2030, 1, 9))
+        self.assertEqual(summary['total_customers'], 2)
+        self.assertEqual(summary['journey_progression']['signups'], 2)
+
+    def test_summary_without_steps(self):
+        CustomerJourneyStep.objects.all().delete()
+        self.assertEqual(journeys.journey_summary()['total_customers'], 4)
+
+    def test_user_journey(self):
+        first = self.customers[0]
+        branch = Branch.objects.create(
+            name="Main Branch", address="123 Main St", city="Pune", state="MH",
+            country="India", postal_code="411001", phone="555-123-4567"
+        )
+        service = Service.objects.create(
+            name="Massage", description="Massage", duration=60, price=100, category="massage"
+        )
+        therapist = TherapistProfile.objects.create(
+            user=User.objects.create_user(email="therapist@example.com", role="therapist")
+        )
+        for day in [12, 20]:
+            appointment = Appointment.objects.create(
+                customer=first, therapist_profile=therapist, service=service, branch=branch,
+                start_time=on(day), end_time=on(day) + timedelta(hours=1), status='completed'
+            )
+            Payment.objects.create(
+                appointment=appointment, amount=100, total_amount=118,
+                status='completed', payment_method='card'
+            )
+
+        with self.assertNumQueries(2):
+            user = journeys.journey_user_queryset().get(pk=first.pk)
+            journey = journeys.user_journey(user)
+        self.assertEqual(journey['signup_date'], on(7))
+        self.assertEqual(journey['days_signup_to_booking'], 1)
+        self.assertEqual(journey['days_booking_to_appointment'], 4)
+        self.assertEqual(journey['total_bookings'], 2)
+        self.assertEqual(journey['total_appointments'], 2)
+        self.assertEqual(journey['lifetime_value'], Decimal('236.00'))
+        self.assertEqual(journey['sources'], {'google': 2, 'email': 1})
+
+    def test_weekly_funnel(self):
+        with self.assertNumQueries(1):
+            cohorts = journeys.funnel('week')
+        self.assertEqual([cohort['customers'] for cohort in cohorts], [3, 1])
+        first_week = cohorts[0]['steps']
+        self.assertEqual(first_week['signup'], {'users': 3, 'conversion': 100})
+        self.assertEqual(first_week['first_booking']['users'], 2)
+        self.assertEqual(first_week['first_appointment']['conversion'], 50)
+
+    def test_rollup_matches_live_queries(self):
+        journeys.rebuild_rollup()
+        self.assertTrue(CustomerJourneyRollup.objects.filter(step_type=CustomerJourneyRollup.COHORT).exists())
+        self.assertEqual(journeys.rollup_summary(), journeys.journey_summary())
+        for bucket in journeys.BUCKETS:
+            self.assertEqual(journeys.rollup_funnel(bucket), journeys.funnel(bucket))
+
+    def test_partial_rollup_rebuild(self):
+        journeys.rebuild_rollup()
+        self.step(self.customers[3], 'first_appointment', on(18))
+        journeys.rebuild_rollup(date(2030, 1, 15), date(2030, 1, 15))
+        self.assertEqual(journeys.rollup_summary(), journeys.journey_summary())
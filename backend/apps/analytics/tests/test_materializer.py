@@ -0,0 +1,143 @@
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+
+from django.contrib.contenttypes.models import ContentType
+from django.test import TestCase
+
+from apps.analytics.materializer import backfill, refresh_cells
+from apps.analytics.models import ServiceAnalytics
+from apps.booking.models import Appointment, Payment
+from apps.clinic.models import Branch, Service, TherapistProfile
+from apps.core.models import User
+from apps.engagement.models import FeedbackForm, FeedbackResponse
+
+
+def at(month, day, hour=10):
+    return datetime(2030, month, day, hour, tzinfo=dt_timezone.utc)
+
+
+class ServiceAnalyticsMaterializerTests(TestCase):
+    """Test grouped backfill and incremental refresh of ServiceAnalytics."""
+
+    def setUp(self):
+        self.branch = Branch.objects.create(
+            name="Main Branch", address="123 Main St", city="Pune", state="MH",
+            country="India", postal_code="411001", phone="555-123-4567"
+        )
+        self.services = [
+            Service.objects.create(
+                name=f"Service {index}", description="Service", duration=60,
+                price=100, category="massage"
+            )
+            for index in range(2)
+        ]
+        therapist_user = User.objects.create_user(email="therapist@example.com", role="therapist")
+        self.therapist = TherapistProfile.objects.create(user=therapist_user)
+        self.customers = [
+            User.objects.create_user(email=f"customer{index}@example.com", role="customer")
+            for index in range(3)
+        ]
+        self.form = FeedbackForm.objects.create(
+            name="Session", form_type='session', form_structure={}
+        )
+
+    def book(self, customer, service, start_time, status='completed', paid=None, score=None):
+        appointment = Appointment.objects.create(
+            customer=customer, therapist_profile=self.therapist, service=service,
+            branch=self.branch, start_time=start_time, end_time=start_time + timedelta(hours=1),
+            status=status
+        )
+        if paid is not None:
+            Payment.objects.create(
+                appointment=appointment, amount=paid, total_amount=paid,
+                status='completed', payment_method='card'
+            )
+        if score is not None:
+            FeedbackResponse.objects.create(
+                feedback_form=self.form, user=customer, response_data={},
+                content_type=ContentType.objects.get_for_model(Appointment),
+                object_id=appointment.id, satisfaction_score=score
+            )
+        return appointment
+
+    def row(self, service, month):
+        return ServiceAnalytics.objects.get(service=service, time_period=date(2030, month, 1))
+
+    def test_backfill_computes_all_cells_in_one_query(self):
+        first, second, third = self.customers
+        self.book(first, self.services[0], at(1, 5), paid=100, score=4)
+        self.book(first, self.services[0], at(1, 6), paid=50, score=5)
+        self.book(second, self.services[0], at(1, 7), status='cancelled')
+        self.book(third, self.services[0], at(1, 8), status='no_show')
+        self.book(first, self.services[1], at(2, 5), paid=80)
+        self.book(second, self.services[1], at(2, 6))
+
+        # One grouped select and one upsert, the content type is cached
+        ContentType.objects.get_for_model(Appointment)
+        with self.assertNumQueries(2):
+            self.assertEqual(backfill(), 2)
+
+        january = self.row(self.services[0], 1)
+        self.assertEqual(january.appointment_count, 4)
+        self.assertEqual(january.customer_count, 3)
+        self.assertEqual(january.new_customer_count, 3)
+        self.assertEqual(january.revenue, Decimal('150.00'))
+        self.assertEqual(january.average_rating, Decimal('4.50'))
+        self.assertEqual(january.cancellation_rate, Decimal('25.00'))
+        self.assertEqual(january.no_show_rate, Decimal('25.00'))
+
+        february = self.row(self.services[1], 2)
+        self.assertEqual(february.customer_count, 2)
+        self.assertEqual(february.new_customer_count, 0)
+        self.assertEqual(february.revenue, Decimal('80.00'))
+        self.assertIsNone(february.average_rating)
+
+    def test_backfill_range(self):
+        self.book(self.customers[0], self.services[0], at(1, 5))
+        self.book(self.customers[0], self.services[0], at(3, 5))
+        self.assertEqual(backfill(date(2030, 2, 1), date(2030, 3, 31)), 1)
+        self.assertFalse(ServiceAnalytics.objects.filter(time_period=date(2030, 1, 1)).exists())
+
+    def test_refresh_writes_empty_cells(self):
+        refresh_cells([(self.services[0].id, date(2030, 4, 15))])
+        self.assertEqual(self.row(self.services[0], 4).appointment_count, 0)
+
+    def test_refresh_skips_deleted_services(self):
+        # Cells can be marked dirty for a service that is gone by the refresh
+        service_id = self.services[1].id
+        self.services[1].delete()
+        cells = [(self.services[0].id, date(2030, 4, 1)), (service_id, date(2030, 4, 1))]
+        self.assertEqual(refresh_cells(cells), 1)
+        self.assertFalse(ServiceAnalytics.objects.filter(service_id=service_id).exists())
+
+    def test_change_events_refresh_cells_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment = self.book(self.customers[0], self.services[0], at(1, 5), paid=120)
+        self.assertEqual(self.row(self.services[0], 1).revenue, Decimal('120.00'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.status = 'cancelled'
+            appointment.save()
+        self.assertEqual(self.row(self.services[0], 1).cancellation_rate, Decimal('100.00'))
+
+        # Moving the appointment empties the month it leaves
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.start_time = at(2, 5)
+            appointment.save()
+        self.assertEqual(self.row(self.services[0], 1).appointment_count, 0)
+        self.assertEqual(self.row(self.services[0], 2).appointment_count, 1)
+
+    def test_earlier_visit_moves_new_customer_credit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book(self.customers[0], self.services[1], at(3, 5))
+        self.assertEqual(self.row(self.services[1], 3).new_customer_count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book(self.customers[0], self.services[0], at(1, 5))
+        self.assertEqual(self.row(self.services[0], 1).new_customer_count, 1)
+        self.assertEqual(self.row(self.services[1], 3).new_customer_count, 0)
+
+    def test_feedback_refreshes_rating(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book(self.customers[0], self.services[0], at(1, 5), score=3)
+        self.assertEqual(self.row(self.services[0], 1).average_rating, Decimal('3.00'))
@@ -0,0 +1,104 @@
+import json
+import shutil
+import tempfile
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from apps.analytics.models import AnalyticsReport
+from apps.analytics.tasks import advance, run_scheduled_reports
+from apps.core.models import User
+from apps.core.reports import submit_report
+from apps.core.testing import EagerCeleryMixin
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class AnalyticsReportGenerationTests(EagerCeleryMixin, TestCase):
+    """Test asynchronous analytics report generation and scheduling."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user(email="admin@example.com", role="admin")
+        for index, day in enumerate([3, 4, 20]):
+            user = User.objects.create_user(email=f"customer{index}@example.com", role="customer")
+            User.objects.filter(pk=user.pk).update(
+                date_joined=datetime(2030, 1, day, 12, tzinfo=dt_timezone.utc)
+            )
+
+    def create_report(self, **fields):
+        fields.setdefault('start_date', date(2030, 1, 1))
+        fields.setdefault('end_date', date(2030, 1, 10))
+        fields.setdefault('report_type', 'customer_trends')
+        return AnalyticsReport.objects.create(name="Trends", generated_by=self.admin, **fields)
+
+    def test_sections_are_computed_and_stored(self):
+        report = self.create_report()
+        with self.captureOnCommitCallbacks(execute=True):
+            submit_report(report)
+        self.assertEqual(report.sections_total, 3)
+
+        report.refresh_from_db()
+        self.assertEqual(report.status, 'completed')
+        self.assertEqual(report.progress, 100)
+        self.assertIsNotNone(report.task_id)
+        self.assertIsNotNone(report.last_run)
+        self.assertEqual(report.report_data['total_customers'], 2)
+        self.assertEqual(report.report_data['new_customers'], [
+            {'date': '2030-01-03', 'count': 1}, {'date': '2030-01-04', 'count': 1},
+        ])
+        with report.file.open() as stored:
+            self.assertEqual(json.load(stored), report.report_data)
+
+    def test_failing_section_marks_report_failed(self):
+        report = self.create_report()
+        with mock.patch.dict('apps.analytics.reports.SECTIONS', {
+            'customer_trends': {'total_customers': lambda report: 1 / 0},
+        }):
+            with self.assertRaises(ZeroDivisionError):
+                with self.captureOnCommitCallbacks(execute=True):
+                    submit_report(report)
+        report.refresh_from_db()
+        self.assertEqual(report.status, 'failed')
+        self.assertIn('total_customers', report.error)
+
+    def test_unknown_report_type_completes_empty(self):
+        report = self.create_report(report_type='custom')
+        with self.captureOnCommitCallbacks(execute=True):
+            submit_report(report)
+        report.refresh_from_db()
+        self.assertEqual(report.status, 'completed')
+        self.assertEqual(report.report_data, {})
+
+    def test_due_scheduled_reports_run_and_reschedule(self):
+        now = timezone.now()
+        due = self.create_report(
+            is_scheduled=True, schedule_frequency='weekly', next_run=now - timedelta(days=15)
+        )
+        later = self.create_report(
+            is_scheduled=True, schedule_frequency='daily', next_run=now + timedelta(hours=1)
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(run_scheduled_reports(), 1)
+
+        due.refresh_from_db()
+        self.assertEqual(due.status, 'completed')
+        self.assertEqual(due.end_date, timezone.localdate(now) - timedelta(days=1))
+        self.assertEqual(due.end_date - due.start_date, timedelta(days=9))
+        self.assertGreater(due.next_run, now)
+        self.assertLessEqual(due.next_run, now + timedelta(days=7))
+        later.refresh_from_db()
+        self.assertEqual(later.status, 'pending')
+
+    def test_monthly_schedule_clamps_short_months(self):
+        moment = datetime(2030, 1, 31, 6, tzinfo=dt_timezone.utc)
+        self.assertEqual(advance(moment, 'monthly'), datetime(2030, 2, 28, 6, tzinfo=dt_timezone.utc))
+        self.assertEqual(advance(moment, 'quarterly'), datetime(2030, 4, 30, 6, tzinfo=dt_timezone.utc))
@@ -0,0 +1,172 @@
+import shutil
+import tempfile
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.analytics import journeys
+from apps.analytics.models import AnalyticsReport, CustomerJourneyStep, ServiceAnalytics
+from apps.analytics.views import AnalyticsReportViewSet, CustomerJourneyViewSet, ServiceAnalyticsViewSet
+from apps.booking.models import Appointment
+from apps.clinic.models import Branch, Service, TherapistProfile
+from apps.core.models import User
+from apps.core.testing import EagerCeleryMixin
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def at(month, day, hour=10):
+    return datetime(2030, month, day, hour, tzinfo=dt_timezone.utc)
+
+
+class AnalyticsViewTestCase(EagerCeleryMixin, TestCase):
+    """Shared fixtures for the analytics view tests."""
+
+    viewset = None
+
+    def setUp(self):
+        super().setUp()
+        self.factory = APIRequestFactory()
+        self.admin = User.objects.create_user(email="admin@example.com", role="admin", is_staff=True)
+
+    def call(self, actions, method='post', data=None, **kwargs):
+        if method == 'get':
+            request = self.factory.get('/api/v1/analytics/', data)
+        else:
+            request = getattr(self.factory, method)('/api/v1/analytics/', data, format='json')
+        force_authenticate(request, user=self.admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.viewset.as_view(actions)(request, **kwargs)
+
+
+class ServiceAnalyticsViewTests(AnalyticsViewTestCase):
+    """Test recomputing and backfilling service analytics through the API."""
+
+    viewset = ServiceAnalyticsViewSet
+
+    def setUp(self):
+        super().setUp()
+        branch = Branch.objects.create(
+            name="Main Branch", address="123 Main St", city="Pune", state="MH",
+            country="India", postal_code="411001", phone="555-123-4567"
+        )
+        self.service = Service.objects.create(
+            name="Massage", description="Relaxing massage", duration=60, price=100, category="massage"
+        )
+        therapist = TherapistProfile.objects.create(
+            user=User.objects.create_user(email="therapist@example.com", role="therapist")
+        )
+        customer = User.objects.create_user(email="customer@example.com", role="customer")
+        for start_time in [at(1, 5), at(2, 5), at(3, 5)]:
+            Appointment.objects.create(
+                customer=customer, therapist_profile=therapist, service=self.service, branch=branch,
+                start_time=start_time, end_time=start_time + timedelta(hours=1), status='completed'
+            )
+
+    def test_generate_refreshes_one_month(self):
+        response = self.call({'post': 'generate'}, data={
+            'service_id': self.service.id, 'time_period': '2030-02-17',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['time_period'], '2030-02-01')
+        self.assertEqual(response.data['appointment_count'], 1)
+        self.assertEqual(ServiceAnalytics.objects.count(), 1)
+
+        response = self.call({'post': 'generate'}, data={
+            'service_id': self.service.id, 'time_period': 'February',
+        })
+        self.assertEqual(response.status_code, 400)
+        response = self.call({'post': 'generate'}, data={
+            'service_id': self.service.id + 1, 'time_period': '2030-02-17',
+        })
+        self.assertEqual(response.status_code, 404)
+
+    def test_backfill_is_queued(self):
+        response = self.call({'post': 'backfill'}, data={'start_date': '2030-02-01', 'end_date': '2030-03-31'})
+        self.assertEqual(response.status_code, 202)
+        self.assertTrue(response.data['task_id'])
+        self.assertEqual(
+            list(ServiceAnalytics.objects.order_by('time_period').values_list('time_period', flat=True)),
+            [date(2030, 2, 1), date(2030, 3, 1)]
+        )
+
+        response = self.call({'post': 'backfill'}, data={})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(ServiceAnalytics.objects.count(), 3)
+
+        response = self.call({'post': 'backfill'}, data={'start_date': '01-02-2030'})
+        self.assertEqual(response.status_code, 400)
+
+
+class CustomerJourneyViewTests(AnalyticsViewTestCase):
+    """Test the journey funnel and rollup endpoints."""
+
+    viewset = CustomerJourneyViewSet
+
+    def setUp(self):
+        super().setUp()
+        for index, day in enumerate([7, 8, 15]):
+            user = User.objects.create_user(email=f"customer{index}@example.com", role="customer")
+            User.objects.filter(pk=user.pk).update(date_joined=at(1, day))
+            CustomerJourneyStep.objects.create(user=user, step_type='signup', timestamp=at(1, day))
+            if index == 0:
+                CustomerJourneyStep.objects.create(user=user, step_type='first_booking', timestamp=at(1, 9))
+
+    def test_funnel(self):
+        response = self.call({'get': 'funnel'}, method='get', data={'bucket': 'week'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['steps'], journeys.FUNNEL_STEPS)
+        self.assertEqual(response.data['cohorts'], journeys.funnel('week'))
+        self.assertEqual([cohort['customers'] for cohort in response.data['cohorts']], [2, 1])
+
+        self.assertEqual(self.call({'get': 'funnel'}, method='get', data={'bucket': 'hour'}).status_code, 400)
+        self.assertEqual(self.call({'get': 'funnel'}, method='get', data={'steps': 'lunch'}).status_code, 400)
+        self.assertEqual(self.call({'get': 'funnel'}, method='get', data={'start_date': 'soon'}).status_code, 400)
+
+    def test_rebuild_rollup_feeds_rollup_funnel(self):
+        response = self.call({'post': 'rebuild_rollup'}, data={})
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(response.data['rows'], 0)
+
+        response = self.call({'get': 'funnel'}, method='get', data={'bucket': 'week', 'rollup': 'true'})
+        self.assertEqual(response.data['cohorts'], journeys.funnel('week'))
+
+        response = self.call({'post': 'rebuild_rollup'}, data={'end_date': '2030/01/31'})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class AnalyticsReportViewTests(AnalyticsViewTestCase):
+    """Test queueing reports and polling their progress."""
+
+    viewset = AnalyticsReportViewSet
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def test_generate_progress_and_regenerate(self):
+        response = self.call({'post': 'generate'}, data={
+            'name': "Trends", 'report_type': 'customer_trends',
+            'start_date': '2030-01-01', 'end_date': '2030-01-31',
+        })
+        self.assertEqual(response.status_code, 202)
+        report = AnalyticsReport.objects.get(pk=response.data['id'])
+
+        response = self.call({'get': 'progress'}, method='get', pk=report.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'completed')
+        self.assertEqual(response.data['progress'], 100)
+        self.assertIsNotNone(response.data['task_id'])
+
+        AnalyticsReport.objects.filter(pk=report.pk).update(status='failed', error="Worker lost")
+        response = self.call({'post': 'regenerate'}, pk=report.pk)
+        self.assertEqual(response.status_code, 202)
+        report.refresh_from_db()
+        self.assertEqual(report.status, 'completed')
+        self.assertIsNone(report.error)
+
+        response = self.call({'post': 'generate'}, data={'name': "Trends", 'report_type': 'customer_trends'})
+        self.assertEqual(response.status_code, 400)
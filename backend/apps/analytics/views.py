@@ -3,32 +3,34 @@ from rest_framework import viewsets, permissions, filters, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Count, Sum, Avg, F, Q, Case, When, Value, DecimalField
-from django.db.models.functions import TruncDay, TruncWeek, TruncMonth
+from django.db.models import F, Q, Case, When, Value, DecimalField
 from django.utils import timezone
-from datetime import timedelta, datetime
+from datetime import datetime
 
 from apps.analytics.models import (
     Dashboard, PerformanceMetric, MetricSnapshot, AnalyticsReport,
     ServiceAnalytics, CustomerJourneyStep
 )
+from apps.analytics import journeys, materializer
+from apps.analytics.tasks import backfill_service_analytics
 from apps.analytics.serializers import (
     DashboardSerializer, PerformanceMetricSerializer, MetricSnapshotSerializer,
     AnalyticsReportSerializer, ServiceAnalyticsSerializer, CustomerJourneyStepSerializer,
     CustomerJourneyAnalyticsSerializer
 )
-from apps.booking.models import Appointment, Payment
+from apps.clinic.models import Service
 from apps.ehr.models import TreatmentSession
-from apps.engagement.models import FeedbackResponse, Referral
+from apps.engagement.models import Referral
 from apps.core.models import User
-from apps.core.permissions import IsAdminUser, IsTherapistUser, IsOwnerOrReadOnly
+from apps.core.reports import submit_report
+from apps.core.permissions import IsAdminUser, IsOwner
 
 
 class DashboardViewSet(viewsets.ModelViewSet):
     """ViewSet for Dashboard model."""
     
     serializer_class = DashboardSerializer
-    permission_classes = [permissions.IsAuthenticated, IsOwnerOrReadOnly]
+    permission_classes = [permissions.IsAuthenticated, IsOwner]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
     filterset_fields = ['is_default']
     search_fields = ['name']
@@ -135,11 +137,15 @@ class AnalyticsReportViewSet(viewsets.ModelViewSet):
     
     def perform_create(self, serializer):
         """Set the generated_by field to the current user."""
-        serializer.save(generated_by=self.request.user)
+        report = serializer.save(generated_by=self.request.user)
+        if report.is_scheduled and not report.next_run:
+            # Let the next beat tick pick the report up
+            report.next_run = timezone.now()
+            report.save(update_fields=['next_run'])
     
     @action(detail=False, methods=['post'])
     def generate(self, request):
-        """Generate a new analytics report."""
+        """Queue a new analytics report; poll its progress action for the result."""
         # Get parameters from request
         report_type = request.data.get('report_type')
         start_date = request.data.get('start_date')
@@ -152,58 +158,15 @@ class AnalyticsReportViewSet(viewsets.ModelViewSet):
                 "detail": "Missing required parameters."
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Generate report data based on type
-        report_data = {}
-        
-        if report_type == 'customer_trends':
-            # New customers over time
-            users = User.objects.filter(
-                date_joined__range=(start_date, end_date),
-                role__in=['visitor', 'customer']
-            )
-            if branch_id:
-                # Filter by appointments at this branch
-                user_ids = Appointment.objects.filter(branch_id=branch_id).values_list('customer_id', flat=True).distinct()
-                users = users.filter(id__in=user_ids)
-              # Group by day/week/month based on date range
-            start_date_obj = datetime.strptime(start_date, '%Y-%m-%d')
-            end_date_obj = datetime.strptime(end_date, '%Y-%m-%d')
-            date_diff = (end_date_obj - start_date_obj).days
-            if date_diff <= 30:
-                # Group by day for ranges <= 30 days
-                users_by_date = users.annotate(
-                    date=TruncDay('date_joined')
-                ).values('date').annotate(count=Count('id')).order_by('date')
-                date_format = '%Y-%m-%d'
-            elif date_diff <= 90:
-                # Group by week for ranges <= 90 days
-                users_by_date = users.annotate(
-                    date=TruncWeek('date_joined')
-                ).values('date').annotate(count=Count('id')).order_by('date')
-                date_format = '%Y-%m-%d'
-            else:
-                # Group by month for ranges > 90 days
-                users_by_date = users.annotate(
-                    date=TruncMonth('date_joined')
-                ).values('date').annotate(count=Count('id')).order_by('date')
-                date_format = '%Y-%m'
-            
-            # Format the results
-            user_trend = [
-                {
-                    'date': item['date'].strftime(date_format),
-                    'count': item['count']
-                }
-                for item in users_by_date
-            ]
-            
-            report_data = {
-                'new_customers': user_trend,
-                'total_customers': users.count(),
-                'customer_roles': list(users.values('role').annotate(count=Count('id')))
-            }
+        try:
+            start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
+            end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
+        except ValueError:
+            return Response({
+                "detail": "Dates must be in YYYY-MM-DD format."
+            }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Create the report
+        # Create the report and compute its sections on the workers
         report = AnalyticsReport.objects.create(
             name=name,
             report_type=report_type,
@@ -211,12 +174,31 @@ class AnalyticsReportViewSet(viewsets.ModelViewSet):
             end_date=end_date,
             branch_id=branch_id if branch_id else None,
             parameters=request.data,
-            report_data=report_data,
             generated_by=request.user
         )
+        submit_report(report)
         
         serializer = self.get_serializer(report)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+    
+    @action(detail=True, methods=['get'])
+    def progress(self, request, pk=None):
+        """Get the generation status of a report."""
+        report = self.get_object()
+        return Response({
+            'id': report.id,
+            'status': report.status,
+            'progress': report.progress,
+            'task_id': report.task_id,
+            'error': report.error,
+        })
+    
+    @action(detail=True, methods=['post'])
+    def regenerate(self, request, pk=None):
+        """Queue an existing report for regeneration."""
+        report = submit_report(self.get_object())
+        serializer = self.get_serializer(report)
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
 
 
 class ServiceAnalyticsViewSet(viewsets.ModelViewSet):
@@ -229,9 +211,15 @@ class ServiceAnalyticsViewSet(viewsets.ModelViewSet):
     filterset_fields = ['service', 'time_period']
     ordering_fields = ['time_period', 'appointment_count', 'revenue']
     
+    def get_queryset(self):
+        # Rows are precomputed; only load what the serializer nests
+        return super().get_queryset().select_related('service').prefetch_related(
+            'service__available_branches'
+        )
+    
     @action(detail=False, methods=['post'])
     def generate(self, request):
-        """Generate service analytics for a specific time period."""
+        """Recompute service analytics for the month containing a date."""
         service_id = request.data.get('service_id')
         time_period = request.data.get('time_period')  # Date in YYYY-MM-DD format
         
@@ -239,65 +227,48 @@ class ServiceAnalyticsViewSet(viewsets.ModelViewSet):
             return Response({
                 "detail": "Service ID and time period are required."
             }, status=status.HTTP_400_BAD_REQUEST)
-          # Calculate start and end of the month for the given time period
-        date_obj = datetime.strptime(time_period, '%Y-%m-%d')
-        start_of_month = date_obj.replace(day=1).date()
-        if date_obj.month == 12:
-            end_of_month = date_obj.replace(year=date_obj.year+1, month=1, day=1) - timedelta(days=1)
-        else:
-            end_of_month = date_obj.replace(month=date_obj.month+1, day=1) - timedelta(days=1)
-        end_of_month = end_of_month.date()
         
-        # Get appointments for this service in the time period
-        appointments = Appointment.objects.filter(
-            service_id=service_id,
-            start_time__date__range=(start_of_month, end_of_month)
-        )
+        try:
+            service_id = int(service_id)
+            start_of_month = materializer.month_start(datetime.strptime(time_period, '%Y-%m-%d').date())
+        except ValueError:
+            return Response({
+                "detail": "Service ID must be a number and time period a date in YYYY-MM-DD format."
+            }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Calculate metrics
-        appointment_count = appointments.count()
+        if not Service.objects.filter(pk=service_id).exists():
+            return Response({
+                "detail": "Service not found."
+            }, status=status.HTTP_404_NOT_FOUND)
         
-        # Get unique customers
-        customer_count = appointments.values('customer').distinct().count()
+        materializer.refresh_cells([(service_id, start_of_month)])
+        analytics = self.get_queryset().get(service_id=service_id, time_period=start_of_month)
+        serializer = self.get_serializer(analytics)
+        return Response(serializer.data)
+    
+    @action(detail=False, methods=['post'])
+    def backfill(self, request):
+        """Queue materializing analytics for every service and month in a range."""
+        start_date = request.data.get('start_date')
+        end_date = request.data.get('end_date')
         
-        # Get payments for these appointments
-        payments = Payment.objects.filter(appointment__in=appointments)
-        revenue = payments.aggregate(total=Sum('total_amount'))['total'] or 0
+        try:
+            start_month = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else None
+            end_month = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else None
+        except ValueError:
+            return Response({
+                "detail": "Dates must be in YYYY-MM-DD format."
+            }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Calculate cancellation rate
-        cancelled = appointments.filter(status='cancelled').count()
-        cancellation_rate = 0
-        if appointment_count > 0:
-            cancellation_rate = (cancelled / appointment_count) * 100
-            
-        # Calculate no-show rate
-        no_shows = appointments.filter(status='no_show').count()
-        no_show_rate = 0
-        if appointment_count > 0:
-            no_show_rate = (no_shows / appointment_count) * 100
-            
-        # Get customer feedback for these appointments
-        feedback_responses = FeedbackResponse.objects.filter(
-            appointment__in=appointments
+        # A full backfill scans all appointment history, so it runs on the workers
+        result = backfill_service_analytics.delay(
+            start_month.isoformat() if start_month else None,
+            end_month.isoformat() if end_month else None,
         )
-        avg_rating = feedback_responses.aggregate(avg=Avg('rating'))['avg']
-        
-        # Check for existing analytics record
-        analytics, created = ServiceAnalytics.objects.update_or_create(
-            service_id=service_id,
-            time_period=start_of_month,
-            defaults={
-                'appointment_count': appointment_count,
-                'revenue': revenue,
-                'customer_count': customer_count,
-                'average_rating': avg_rating,
-                'cancellation_rate': cancellation_rate,
-                'no_show_rate': no_show_rate
-            }
-        )
-        
-        serializer = self.get_serializer(analytics)
-        return Response(serializer.data)
+        return Response({
+            "task_id": result.id,
+            "status": "queued"
+        }, status=status.HTTP_202_ACCEPTED)
 
 
 class CustomerJourneyViewSet(viewsets.ViewSet):
@@ -305,57 +276,27 @@ class CustomerJourneyViewSet(viewsets.ViewSet):
     
     permission_classes = [permissions.IsAuthenticated, IsAdminUser]
     
+    def get_dates(self, request):
+        """Parse optional start_date/end_date query parameters."""
+        dates = []
+        for name in ['start_date', 'end_date']:
+            value = request.query_params.get(name)
+            dates.append(datetime.strptime(value, '%Y-%m-%d').date() if value else None)
+        return dates
+    
     def list(self, request):
         """Get aggregate journey analytics."""
-        # Filter parameters
-        start_date = request.query_params.get('start_date')
-        end_date = request.query_params.get('end_date', timezone.now().date())
-        
-        # Base query - get customers
-        customers = User.objects.filter(role__in=['customer', 'visitor'])
-        
-        if start_date:
-            customers = customers.filter(date_joined__gte=start_date)
-            
-        # Get journey steps for these users
-        steps = CustomerJourneyStep.objects.filter(user__in=customers)
-        
-        # Aggregate stats
-        total_customers = customers.count()
-        
-        # Journey progression
-        signups = steps.filter(step_type='signup').count()
-        first_bookings = steps.filter(step_type='first_booking').count()
-        first_appointments = steps.filter(step_type='first_appointment').count()
-        repeat_bookings = steps.filter(step_type='repeat_booking').count()
-        
-        # Conversion rates
-        signup_to_booking = 0
-        booking_to_appointment = 0
-        
-        if signups > 0:
-            signup_to_booking = (first_bookings / signups) * 100
-        
-        if first_bookings > 0:
-            booking_to_appointment = (first_appointments / first_bookings) * 100
-        
-        # Top sources
-        sources = steps.values('source').annotate(count=Count('id')).order_by('-count')[:5]
+        try:
+            start_date, end_date = self.get_dates(request)
+        except ValueError:
+            return Response({
+                "detail": "Dates must be in YYYY-MM-DD format."
+            }, status=status.HTTP_400_BAD_REQUEST)
         
-        return Response({
-            'total_customers': total_customers,
-            'journey_progression': {
-                'signups': signups,
-                'first_bookings': first_bookings,
-                'first_appointments': first_appointments,
-                'repeat_bookings': repeat_bookings,
-            },
-            'conversion_rates': {
-                'signup_to_booking': signup_to_booking,
-                'booking_to_appointment': booking_to_appointment,
-            },
-            'top_sources': sources
-        })
+        # Precomputed cohort rollups avoid scanning the steps table
+        if request.query_params.get('rollup') == 'true':
+            return Response(journeys.rollup_summary(start_date, end_date))
+        return Response(journeys.journey_summary(start_date, end_date))
     
     @action(detail=False, methods=['get'])
     def user(self, request):
@@ -368,81 +309,65 @@ class CustomerJourneyViewSet(viewsets.ViewSet):
             }, status=status.HTTP_400_BAD_REQUEST)
         
         try:
-            user = User.objects.get(id=user_id)
+            user = journeys.journey_user_queryset().get(id=user_id)
         except User.DoesNotExist:
             return Response({
                 "detail": "User not found."
             }, status=status.HTTP_404_NOT_FOUND)
         
-        # Get journey steps for this user
-        steps = CustomerJourneyStep.objects.filter(user=user).order_by('timestamp')
+        response_data = journeys.user_journey(user)
+        steps = CustomerJourneyStep.objects.filter(user=user).order_by('timestamp').select_related(
+            'user__profile', 'user__settings'
+        ).prefetch_related('user__consents')
+        response_data['journey_steps'] = CustomerJourneyStepSerializer(steps, many=True).data
         
-        # Get key journey dates
-        first_visit = steps.filter(step_type='website_visit').first()
-        signup = steps.filter(step_type='signup').first()
-        first_booking = steps.filter(step_type='first_booking').first()
-        first_appointment = steps.filter(step_type='first_appointment').first()
+        serializer = CustomerJourneyAnalyticsSerializer(response_data)
+        return Response(serializer.data)
+    
+    @action(detail=False, methods=['get'])
+    def funnel(self, request):
+        """Get step conversion per signup cohort, bucketed by day, week or month."""
+        bucket = request.query_params.get('bucket', 'week')
+        steps = request.query_params.get('steps')
+        steps = steps.split(',') if steps else journeys.FUNNEL_STEPS
         
-        # Calculate time between steps
-        days_signup_to_booking = None
-        days_booking_to_appointment = None
+        if bucket not in journeys.BUCKETS:
+            return Response({
+                "detail": f"Bucket must be one of {', '.join(journeys.BUCKETS)}."
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if any(step not in journeys.STEP_TYPES for step in steps):
+            return Response({
+                "detail": "Unknown step type."
+            }, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            start_date, end_date = self.get_dates(request)
+        except ValueError:
+            return Response({
+                "detail": "Dates must be in YYYY-MM-DD format."
+            }, status=status.HTTP_400_BAD_REQUEST)
         
-        if signup and first_booking:
-            days_signup_to_booking = (first_booking.timestamp - signup.timestamp).days
-            
-        if first_booking and first_appointment:
-            days_booking_to_appointment = (first_appointment.timestamp - first_booking.timestamp).days
-            
-        # Get appointment counts
-        total_bookings = steps.filter(step_type__in=['first_booking', 'repeat_booking']).count()
-        total_appointments = steps.filter(step_type__in=['first_appointment']).count() + \
-                           Appointment.objects.filter(
-                               customer=user, 
-                               status__in=['completed', 'confirmed']
-                           ).count() - 1  # Subtract 1 to avoid double-counting first appointment
-        
-        # Other metrics
-        total_feedback = steps.filter(step_type='feedback_submission').count()
-        total_referrals = steps.filter(step_type='referral').count()
-        total_cancellations = steps.filter(step_type='cancellation').count()
-        
-        # Calculate lifetime value
-        lifetime_value = Payment.objects.filter(
-            appointment__customer=user,
-            status='completed'
-        ).aggregate(total=Sum('total_amount'))['total'] or 0
-        
-        # Get source breakdown
-        sources = {}
-        for step in steps:
-            if step.source:
-                if step.source in sources:
-                    sources[step.source] += 1
-                else:
-                    sources[step.source] = 1
-        
-        # Create response data
-        response_data = {
-            'user_id': user.id,
-            'user_email': user.email,
-            'first_visit_date': first_visit.timestamp if first_visit else None,
-            'signup_date': signup.timestamp if signup else None,
-            'first_booking_date': first_booking.timestamp if first_booking else None,
-            'first_appointment_date': first_appointment.timestamp if first_appointment else None,
-            'days_signup_to_booking': days_signup_to_booking,
-            'days_booking_to_appointment': days_booking_to_appointment,
-            'total_bookings': total_bookings,
-            'total_appointments': total_appointments,
-            'total_feedback': total_feedback,
-            'total_referrals': total_referrals,
-            'total_cancellations': total_cancellations,
-            'lifetime_value': lifetime_value,
-            'sources': sources,
-            'journey_steps': CustomerJourneyStepSerializer(steps, many=True).data
-        }
+        if request.query_params.get('rollup') == 'true':
+            cohorts = journeys.rollup_funnel(bucket, start_date, end_date, steps)
+        else:
+            cohorts = journeys.funnel(bucket, start_date, end_date, steps)
+        return Response({'bucket': bucket, 'steps': steps, 'cohorts': cohorts})
+    
+    @action(detail=False, methods=['post'])
+    def rebuild_rollup(self, request):
+        """Recompute the cohort rollup table for a range of signup dates."""
+        start_date = request.data.get('start_date')
+        end_date = request.data.get('end_date')
         
-        serializer = CustomerJourneyAnalyticsSerializer(response_data)
-        return Response(serializer.data)
+        try:
+            start_date = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else None
+            end_date = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else None
+        except ValueError:
+            return Response({
+                "detail": "Dates must be in YYYY-MM-DD format."
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        rows = journeys.rebuild_rollup(start_date, end_date)
+        return Response({"rows": rows})
     
     @action(detail=False, methods=['post'])
     def track(self, request):
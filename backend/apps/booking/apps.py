@@ -4,4 +4,7 @@ from django.apps import AppConfig
 class BookingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.booking'
-    verbose_name = 'Booking'
\ No newline at end of file
+    verbose_name = 'Booking'
+
+    def ready(self):
+        import apps.booking.signals
\ No newline at end of file
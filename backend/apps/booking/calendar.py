@@ -0,0 +1,205 @@
+"""
+iCalendar (RFC 5545) feeds of appointments.
+
+A feed covers one customer's, therapist's or branch's appointments from
+``CALENDAR_FEED_PAST_DAYS`` ago onwards. Calendar clients cannot send JWT
+headers, so feeds are addressed by a signed token naming the feed and the
+user it was issued to. The token embeds a digest of the user's password
+hash, so changing the password revokes every feed link the user shared.
+
+Events are streamed from a values() iterator in chunks and never loaded
+all at once, so a branch feed of thousands of events costs no more memory
+than a handful. The ETag and Last-Modified validators come from one
+aggregate over the feed's appointments, which lets polling clients get a
+304 without rendering the feed.
+"""
+import hashlib
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+from .models import Appointment
+
+FEED_KINDS = ['customer', 'therapist', 'branch']
+TOKEN_SALT = 'apps.booking.calendar'
+CHUNK_SIZE = 500
+
+
+def _password_digest(user):
+    return salted_hmac(TOKEN_SALT, user.password).hexdigest()[:16]
+
+
+def feed_token(user, kind, object_id):
+    """Signed token for a user's feed of one customer, therapist or branch."""
+    return signing.dumps(
+        {'u': user.pk, 'k': kind, 'i': object_id, 'p': _password_digest(user)},
+        salt=TOKEN_SALT, compress=True,
+    )
+
+
+def read_feed_token(token):
+    """
+    Return the (user, kind, object_id) a token was issued for.
+
+    Raises signing.BadSignature for tokens that are forged, malformed or
+    revoked by a password change.
+    """
+    from apps.core.models import User
+
+    data = signing.loads(token, salt=TOKEN_SALT)
+    if data.get('k') not in FEED_KINDS:
+        raise signing.BadSignature('Unknown feed')
+    user = User.objects.filter(pk=data.get('u'), is_active=True).first()
+    if user is None or not constant_time_compare(data.get('p', ''), _password_digest(user)):
+        raise signing.BadSignature('Revoked feed')
+    return user, data['k'], data['i']
+
+
+def can_read_feed(user, kind, object_id):
+    """Whether a user may see a feed; rechecked on every request."""
+    if user.is_staff or user.role == 'admin':
+        return True
+    if kind == 'customer':
+        return user.pk == object_id
+    profile = getattr(user, 'therapist_profile', None) if user.role == 'therapist' else None
+    if profile is None:
+        return False
+    if kind == 'therapist':
+        return profile.pk == object_id
+    return profile.branches.filter(pk=object_id).exists()
+
+
+def feed_links(user):
+    """The (kind, object_id, name) feeds a user is offered."""
+    from apps.clinic.models import Branch
+
+    feeds = []
+    if user.role == 'customer':
+        feeds.append(('customer', user.pk, user.get_full_name() or user.email))
+    profile = getattr(user, 'therapist_profile', None) if user.role == 'therapist' else None
+    if profile is not None:
+        feeds.append(('therapist', profile.pk, user.get_full_name() or user.email))
+        branches = profile.branches.all()
+    elif user.is_staff or user.role == 'admin':
+        branches = Branch.objects.filter(is_active=True)
+    else:
+        branches = Branch.objects.none()
+    feeds.extend(('branch', branch.pk, branch.name) for branch in branches.order_by('name'))
+    return feeds
+
+
+def feed_name(kind, object_id):
+    """Calendar name shown by clients for a feed."""
+    from apps.clinic.models import Branch
+    from apps.core.models import User
+
+    if kind == 'branch':
+        branch = Branch.objects.filter(pk=object_id).first()
+        return f'{branch.name} appointments' if branch else 'Appointments'
+    if kind == 'therapist':
+        user = User.objects.filter(therapist_profile__pk=object_id).first()
+    else:
+        user = User.objects.filter(pk=object_id).first()
+    return f'{user.get_full_name() or user.email} appointments' if user else 'Appointments'
+
+
+def feed_appointments(kind, object_id):
+    field = {'customer': 'customer_id', 'therapist': 'therapist_profile_id', 'branch': 'branch_id'}[kind]
+    since = timezone.now() - timedelta(days=settings.CALENDAR_FEED_PAST_DAYS)
+    return Appointment.objects.filter(**{field: object_id}, start_time__gte=since).order_by()
+
+
+def feed_version(appointments):
+    """
+    The latest change to a feed's appointments and a matching ETag.
+
+    The count is part of the ETag so that deleting an appointment, which
+    leaves no updated_at behind, still changes it.
+    """
+    state = appointments.aggregate(last_modified=Max('updated_at'), count=Count('id'))
+    last_modified = state['last_modified']
+    stamp = last_modified.isoformat() if last_modified else ''
+    etag = hashlib.sha256(f"{stamp}|{state['count']}".encode()).hexdigest()[:32]
+    return last_modified, f'"{etag}"'
+
+
+def escape_text(value):
+    return (str(value or '').replace('\\', '\\\\').replace(';', '\\;')
+            .replace(',', '\\,').replace('\r\n', '\\n').replace('\n', '\\n'))
+
+
+def fold(line):
+    """Fold a content line into 75-octet pieces, each ending in CRLF."""
+    encoded = line.encode()
+    if len(encoded) <= 75:
+        return line + '\r\n'
+    pieces = []
+    start, limit = 0, 75
+    while start < len(encoded):
+        end = min(start + limit, len(encoded))
+        # Never split a multi-byte character
+        while end < len(encoded) and (encoded[end] & 0xC0) == 0x80:
+            end -= 1
+        pieces.append(encoded[start:end].decode())
+        start, limit = end, 74
+    return '\r\n '.join(pieces) + '\r\n'
+
+
+def format_time(value):
+    return value.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+STATUSES = {'pending': 'TENTATIVE', 'confirmed': 'CONFIRMED', 'cancelled': 'CANCELLED'}
+
+
+def render_feed(kind, object_id, name, domain):
+    """Yield the feed's iCalendar text in chunks."""
+    yield ''.join(fold(line) for line in [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//Wellness Centre//Appointments//EN',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{escape_text(name)}',
+    ])
+    rows = feed_appointments(kind, object_id).values_list(
+        'id', 'start_time', 'end_time', 'updated_at', 'status', 'notes',
+        'service__name', 'customer__first_name', 'customer__last_name',
+        'therapist_profile__user__first_name', 'therapist_profile__user__last_name',
+        'branch__name', 'branch__address', 'branch__city',
+    ).order_by('start_time', 'id')
+
+    chunk = []
+    for (appointment_id, start_time, end_time, updated_at, status, notes, service,
+         customer_first, customer_last, therapist_first, therapist_last,
+         branch, address, city) in rows.iterator(chunk_size=CHUNK_SIZE):
+        if kind == 'customer':
+            therapist = f'{therapist_first or ""} {therapist_last or ""}'.strip()
+            summary = f'{service} with {therapist}' if therapist else service
+        else:
+            summary = f'{service}: {customer_first or ""} {customer_last or ""}'.strip()
+        lines = [
+            'BEGIN:VEVENT',
+            f'UID:appointment-{appointment_id}@{domain}',
+            f'DTSTAMP:{format_time(updated_at)}',
+            f'LAST-MODIFIED:{format_time(updated_at)}',
+            f'DTSTART:{format_time(start_time)}',
+            f'DTEND:{format_time(end_time)}',
+            f'SUMMARY:{escape_text(summary)}',
+            f'LOCATION:{escape_text(", ".join(part for part in [branch, address, city] if part))}',
+        ]
+        if notes and kind != 'customer':
+            lines.append(f'DESCRIPTION:{escape_text(notes)}')
+        if status in STATUSES:
+            lines.append(f'STATUS:{STATUSES[status]}')
+        lines.append('END:VEVENT')
+        chunk.append(''.join(fold(line) for line in lines))
+        if len(chunk) == CHUNK_SIZE:
+            yield ''.join(chunk)
+            chunk = []
+    chunk.append(fold('END:VCALENDAR'))
+    yield ''.join(chunk)
@@ -0,0 +1,64 @@
+"""
+Invoice PDFs and monthly invoice exports, rendered through apps.core.pdf.
+"""
+import shutil
+import tempfile
+import zipfile
+from datetime import date
+
+from django.core.files import File
+from django.core.files.storage import default_storage
+
+from apps.core.pdf import document_path, normalize, pdf_response, store_pdf
+
+from .models import Invoice
+from .serializers import InvoiceSerializer
+
+INVOICE_TEMPLATE = 'booking/invoice_pdf.html'
+EXPORT_ROOT = 'exports/invoices'
+# Archives larger than this are spooled to a temporary file instead of memory
+EXPORT_SPOOL_SIZE = 10 * 1024 * 1024
+
+
+def invoice_pdf_response(invoice):
+    """Serve an invoice PDF from the document cache, or queue its rendering."""
+    return pdf_response(
+        'invoices', INVOICE_TEMPLATE, InvoiceSerializer(invoice).data, f'{invoice.invoice_number}.pdf'
+    )
+
+
+def export_path(export_id):
+    return f'{EXPORT_ROOT}/{export_id}.zip'
+
+
+def month_invoices(year, month):
+    start = date(year, month, 1)
+    end = date(year + month // 12, month % 12 + 1, 1)
+    return InvoiceSerializer.setup_eager_loading(
+        Invoice.objects.filter(issue_date__gte=start, issue_date__lt=end)
+    ).order_by('invoice_number')
+
+
+def write_invoice_export(year, month, path):
+    """
+    Write a ZIP of every invoice issued in a month to storage.
+
+    PDFs are taken from the document cache, rendering only those that are
+    missing, and copied into the archive one at a time so that memory use
+    does not grow with the number of invoices. Returns the number of
+    invoices exported.
+    """
+    count = 0
+    with tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL_SIZE) as archive:
+        # PDFs are already compressed
+        with zipfile.ZipFile(archive, 'w', compression=zipfile.ZIP_STORED) as zip_file:
+            for invoice in month_invoices(year, month).iterator(chunk_size=100):
+                data = normalize(InvoiceSerializer(invoice).data)
+                pdf_path = store_pdf(INVOICE_TEMPLATE, data, document_path('invoices', INVOICE_TEMPLATE, data))
+                with default_storage.open(pdf_path, 'rb') as source, \
+                        zip_file.open(f'{invoice.invoice_number}.pdf', 'w') as target:
+                    shutil.copyfileobj(source, target)
+                count += 1
+        archive.seek(0)
+        default_storage.save(path, File(archive))
+    return count
@@ -0,0 +1,115 @@
+"""
+Invoice number allocation.
+
+Invoice numbers have the form ``INV-<branch>-<fiscal year>-<sequence>``,
+for example ``INV-003-2030-000142``. They sort by sequence within a branch
+and fiscal year.
+
+Each prefix has an InvoiceSequence row. A checkout never holds a lock on
+that row. Instead, an allocator reserves a block of numbers with one
+UPDATE and hands the numbers out from memory. The row is touched once per
+block rather than once per invoice. Inside a transaction, the reservation
+runs on a private autocommit connection so that it commits immediately.
+A checkout that rolls back therefore cannot release numbers that another
+worker would then reuse.
+
+SQLite allows a single writer, so inside a transaction there it takes one
+number at a time in the caller's transaction.
+
+Numbers are unique and increase within each worker, but two properties
+are traded away for contention-free checkout:
+
+* Numbers left over in a block when a worker exits are skipped, as are
+  numbers taken by checkouts that roll back.
+* Numbers from blocks held by different workers interleave in time.
+"""
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils import timezone
+
+from .models import InvoiceSequence
+from .scheduler import with_booking_retries
+
+
+def fiscal_year(day):
+    """The calendar year in which the fiscal year containing ``day`` starts."""
+    return day.year if day.month >= settings.FISCAL_YEAR_START_MONTH else day.year - 1
+
+
+def invoice_prefix(branch_id, day):
+    return f"INV-{branch_id or 0:03d}-{fiscal_year(day)}"
+
+
+class InvoiceNumberAllocator:
+    """Hand out invoice numbers from blocks reserved per worker thread."""
+
+    def __init__(self, block_size=None, using=DEFAULT_DB_ALIAS):
+        self.block_size = block_size or settings.INVOICE_NUMBER_BLOCK_SIZE
+        self.using = using
+        self._local = threading.local()
+
+    def _blocks(self):
+        if not hasattr(self._local, 'blocks'):
+            self._local.blocks = {}
+        return self._local.blocks
+
+    def reserve(self, connection, prefix, size):
+        """Reserve the next ``size`` numbers of a prefix and return them as a range."""
+        table = connection.ops.quote_name(InvoiceSequence._meta.db_table)
+        with connection.cursor() as cursor:
+            while True:
+                cursor.execute(
+                    f'UPDATE {table} SET next_value = next_value + %s '
+                    f'WHERE prefix = %s RETURNING next_value',
+                    [size, prefix]
+                )
+                row = cursor.fetchone()
+                if row:
+                    return range(row[0] - size, row[0])
+                cursor.execute(
+                    f'INSERT INTO {table} (prefix, next_value) VALUES (%s, 1) '
+                    f'ON CONFLICT (prefix) DO NOTHING',
+                    [prefix]
+                )
+
+    def reserve_block(self, prefix):
+        """Reserve a block in its own transaction, whatever transaction the caller is in."""
+        connection = connections[self.using]
+        if not connection.in_atomic_block:
+            # Autocommit releases the row as soon as the update is done
+            return self.reserve(connection, prefix, self.block_size)
+        private = connection.copy()
+        try:
+            return self.reserve(private, prefix, self.block_size)
+        finally:
+            private.close()
+
+    def next_value(self, prefix):
+        connection = connections[self.using]
+        if connection.vendor == 'sqlite' and connection.in_atomic_block:
+            # SQLite allows one writer at a time, so a private connection would
+            # wait for the caller's transaction. Take a single number in that
+            # transaction instead; a rollback releases it.
+            return with_booking_retries(self.reserve, connection, prefix, 1).start
+
+        blocks = self._blocks()
+        value = next(blocks[prefix], None) if prefix in blocks else None
+        if value is None:
+            blocks[prefix] = iter(with_booking_retries(self.reserve_block, prefix))
+            value = next(blocks[prefix])
+        return value
+
+    def next_number(self, branch_id=None, day=None):
+        """Allocate the next invoice number for a branch on an issue date."""
+        prefix = invoice_prefix(branch_id, day or timezone.localdate())
+        return f"{prefix}-{self.next_value(prefix):06d}"
+
+
+allocator = InvoiceNumberAllocator()
+
+
+def next_invoice_number(branch_id=None, day=None):
+    """Allocate an invoice number from the process-wide allocator."""
+    return allocator.next_number(branch_id, day)
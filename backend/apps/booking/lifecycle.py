@@ -0,0 +1,139 @@
+"""
+Batch job closing overdue appointments and recording their sessions.
+
+``close_overdue_appointments`` finds active appointments that ended more
+than ``APPOINTMENT_CLOSE_AFTER`` ago through a partial index and closes
+them in chunks of ``LIFECYCLE_BATCH_SIZE``, each chunk in its own short
+transaction with two set-based UPDATEs. An appointment is completed when
+it was confirmed, has a treatment session or has a completed payment;
+otherwise the customer never turned up and it becomes a no-show. Rows
+locked by a concurrent request are skipped and picked up by the next run.
+
+Appointments completed this way get their treatment session in the same
+transaction. ``create_missing_sessions`` catches the ones completed by hand:
+it walks completed appointments in ``(updated_at, id)`` order from a
+JobCheckpoint and bulk-creates the sessions they lack, saving the
+checkpoint with every chunk so an interrupted run resumes where it
+stopped. It stays ``CHECKPOINT_LAG`` behind the clock so rows committed
+late by slow transactions are not stepped over.
+
+Every chunk sends ``appointments_bulk_changed`` so analytics can refresh
+the cells the chunk touched, as saving each appointment would have.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from apps.clinic.availability import ACTIVE_APPOINTMENT_STATUSES
+from apps.core.models import JobCheckpoint
+from apps.ehr.models import TreatmentSession
+
+from .models import Appointment, Payment
+from .signals import appointments_bulk_changed
+
+SESSIONS_CHECKPOINT = 'booking.treatment_sessions'
+CHECKPOINT_LAG = timedelta(minutes=5)
+
+
+def _after(field, value, appointment_id):
+    return Q(**{f'{field}__gt': value}) | Q(**{field: value, 'id__gt': appointment_id})
+
+
+def _create_sessions(rows):
+    """Bulk-create completed sessions from (id, customer, therapist, service) rows."""
+    return len(TreatmentSession.objects.bulk_create([
+        TreatmentSession(
+            appointment_id=appointment_id, customer_id=customer_id,
+            therapist_id=therapist_id, service_id=service_id, status='completed',
+        )
+        for appointment_id, customer_id, therapist_id, service_id in rows
+    ], ignore_conflicts=True))
+
+
+def close_overdue_appointments(now=None, batch_size=None):
+    """
+    Complete or mark as no-show the active appointments that are overdue.
+
+    Returns a dict with the number of appointments completed, marked as
+    no-shows and given a treatment session.
+    """
+    now = now or timezone.now()
+    batch_size = batch_size or settings.LIFECYCLE_BATCH_SIZE
+    cutoff = now - settings.APPOINTMENT_CLOSE_AFTER
+    attended = (
+        Q(status='confirmed')
+        | Q(Exists(TreatmentSession.objects.filter(appointment=OuterRef('pk'))))
+        | Q(Exists(Payment.objects.filter(appointment=OuterRef('pk'), status='completed')))
+    )
+
+    totals = {'completed': 0, 'no_show': 0, 'sessions_created': 0}
+    position = None
+    while True:
+        with transaction.atomic():
+            overdue = Appointment.objects.filter(
+                status__in=ACTIVE_APPOINTMENT_STATUSES, end_time__lt=cutoff
+            )
+            if position:
+                overdue = overdue.filter(_after('end_time', *position))
+            rows = list(overdue.select_for_update(skip_locked=True).order_by('end_time', 'id').values_list(
+                'id', 'end_time', 'customer_id', 'therapist_profile_id', 'service_id', 'start_time'
+            )[:batch_size])
+            if not rows:
+                return totals
+            chunk = Appointment.objects.filter(pk__in=[row[0] for row in rows])
+            completed = set(chunk.filter(attended).order_by().values_list('id', flat=True))
+            without_session = completed - set(TreatmentSession.objects.filter(
+                appointment_id__in=completed
+            ).values_list('appointment_id', flat=True))
+
+            totals['completed'] += chunk.filter(pk__in=completed).update(status='completed', updated_at=now)
+            totals['no_show'] += chunk.exclude(pk__in=completed).update(status='no_show', updated_at=now)
+            totals['sessions_created'] += _create_sessions(
+                row[0:1] + row[2:5] for row in rows if row[0] in without_session
+            )
+            appointments_bulk_changed.send(sender=Appointment, appointments=[
+                (service_id, start_time, customer_id)
+                for _, _, customer_id, _, service_id, start_time in rows
+            ])
+        position = rows[-1][1], rows[-1][0]
+        if len(rows) < batch_size:
+            return totals
+
+
+def create_missing_sessions(now=None, batch_size=None):
+    """
+    Bulk-create treatment sessions for completed appointments without one.
+
+    Returns the number of sessions created.
+    """
+    now = now or timezone.now()
+    batch_size = batch_size or settings.LIFECYCLE_BATCH_SIZE
+    checkpoint, _ = JobCheckpoint.objects.get_or_create(name=SESSIONS_CHECKPOINT)
+    created = 0
+    while True:
+        completed = Appointment.objects.filter(status='completed', updated_at__lt=now - CHECKPOINT_LAG)
+        if checkpoint.position:
+            completed = completed.filter(
+                _after('updated_at', checkpoint.position['updated_at'], checkpoint.position['id'])
+            )
+        rows = list(completed.filter(treatment_session__isnull=True).order_by('updated_at', 'id').values_list(
+            'id', 'updated_at', 'customer_id', 'therapist_profile_id', 'service_id'
+        )[:batch_size])
+        if not rows:
+            return created
+        with transaction.atomic():
+            created += _create_sessions(row[0:1] + row[2:] for row in rows)
+            checkpoint.position = {'updated_at': rows[-1][1], 'id': rows[-1][0]}
+            checkpoint.save(update_fields=['position', 'updated_at'])
+        if len(rows) < batch_size:
+            return created
+
+
+def run_lifecycle(now=None, batch_size=None):
+    """Close overdue appointments, then record sessions for completed ones."""
+    totals = close_overdue_appointments(now, batch_size)
+    totals['sessions_created'] += create_missing_sessions(now, batch_size)
+    return totals
@@ -3,6 +3,10 @@ from django.utils.translation import gettext_lazy as _
 from django.conf import settings
 from django.core.validators import MinValueValidator, MaxValueValidator
 
+# Appointment statuses that occupy a therapist's time; the same list as
+# apps.clinic.availability.ACTIVE_APPOINTMENT_STATUSES
+ACTIVE_STATUSES = ['pending', 'confirmed']
+
 
 class Appointment(models.Model):
     """Model for appointments."""
@@ -35,6 +39,33 @@ class Appointment(models.Model):
         verbose_name = _('appointment')
         verbose_name_plural = _('appointments')
         ordering = ['-start_time']
+        indexes = [
+            # Conflict checks and the availability engine only look at active bookings
+            models.Index(
+                fields=['therapist_profile', 'start_time', 'end_time'],
+                condition=models.Q(status__in=ACTIVE_STATUSES),
+                name='appointment_therapist_active',
+            ),
+            # Therapist schedules, optionally filtered by status
+            models.Index(fields=['therapist_profile', 'status', 'start_time'],
+                         name='appointment_therapist_status'),
+            # Customer appointment lists and first visits
+            models.Index(fields=['customer', 'start_time'], name='appointment_customer_start'),
+            # Date range lists and monthly service analytics
+            models.Index(fields=['start_time'], name='appointment_start'),
+            models.Index(fields=['service', 'start_time'], name='appointment_service_start'),
+            # Branch calendar feeds
+            models.Index(fields=['branch', 'start_time'], name='appointment_branch_start'),
+            # The lifecycle job's overdue and completed appointment scans
+            models.Index(
+                fields=['end_time', 'id'], condition=models.Q(status__in=ACTIVE_STATUSES),
+                name='appointment_active_end',
+            ),
+            models.Index(
+                fields=['updated_at', 'id'], condition=models.Q(status='completed'),
+                name='appointment_completed_updated',
+            ),
+        ]
         
     def __str__(self):
         return f"{self.customer} - {self.service} - {self.start_time.strftime('%Y-%m-%d %H:%M')}"
@@ -81,6 +112,10 @@ class Payment(models.Model):
         verbose_name = _('payment')
         verbose_name_plural = _('payments')
         ordering = ['-created_at']
+        indexes = [
+            # "Already paid" checks and paid totals per appointment
+            models.Index(fields=['appointment', 'status'], name='payment_appointment_status'),
+        ]
         
     def __str__(self):
         return f"{self.appointment} - {self.total_amount} - {self.status}"
@@ -122,11 +157,30 @@ class Invoice(models.Model):
         verbose_name = _('invoice')
         verbose_name_plural = _('invoices')
         ordering = ['-issue_date']
+        indexes = [
+            models.Index(fields=['customer', 'issue_date'], name='invoice_customer_issue_date'),
+            # Monthly exports and date-ordered lists
+            models.Index(fields=['issue_date'], name='invoice_issue_date'),
+        ]
         
     def __str__(self):
         return f"Invoice #{self.invoice_number} - {self.customer} - {self.total}"
 
 
+class InvoiceSequence(models.Model):
+    """Next free invoice number for an invoice number prefix (branch and fiscal year)."""
+    
+    prefix = models.CharField(_('prefix'), max_length=30, unique=True)
+    next_value = models.PositiveBigIntegerField(_('next value'), default=1)
+    
+    class Meta:
+        verbose_name = _('invoice sequence')
+        verbose_name_plural = _('invoice sequences')
+        
+    def __str__(self):
+        return f"{self.prefix} - {self.next_value}"
+
+
 class WaitlistEntry(models.Model):
     """Model for waitlist entries."""
     
@@ -150,6 +204,7 @@ class WaitlistEntry(models.Model):
     preferred_time_slots = models.JSONField(_('preferred time slots'), default=list)
     status = models.CharField(_('status'), max_length=20, choices=STATUS_CHOICES, default='active')
     notes = models.TextField(_('notes'), blank=True, null=True)
+    # Gapped queue sort key, see apps.booking.waitlist
     position = models.PositiveIntegerField(_('position'), blank=True, null=True)
     created_at = models.DateTimeField(_('created at'), auto_now_add=True)
     updated_at = models.DateTimeField(_('updated at'), auto_now=True)
@@ -158,6 +213,16 @@ class WaitlistEntry(models.Model):
         verbose_name = _('waitlist entry')
         verbose_name_plural = _('waitlist entries')
         ordering = ['created_at']
+        indexes = [
+            # Matching freed slots to the front of the day's queue
+            models.Index(
+                fields=['branch', 'service', 'preferred_date', 'position'],
+                condition=models.Q(status='active'),
+                name='waitlist_active_day',
+            ),
+            # Queue tails and places in queue
+            models.Index(fields=['service', 'branch', 'position'], name='waitlist_queue_position'),
+        ]
         
     def __str__(self):
         return f"{self.customer} - {self.service} - {self.preferred_date}"
\ No newline at end of file
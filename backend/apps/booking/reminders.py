@@ -0,0 +1,198 @@
+"""
+Appointment reminders.
+
+Reminders are precomputed as pending ``reminder`` Notifications, one per
+entry in ``APPOINTMENT_REMINDER_OFFSETS`` (24 and 2 hours before the start
+by default). Their ``scheduled_at`` is floored to a ``REMINDER_BUCKET``
+boundary, so every reminder due in the same few minutes shares a bucket.
+
+Every bucket, ``dispatch_due_reminders`` claims the pending reminders that
+are due through a partial index over pending notifications, which never
+touches sent rows however large the table grows. The claimed reminders
+are grouped by channel and handed to Celery in batches, so one task sends
+a whole batch over a single connection.
+
+Saving an appointment marks it for a reminder refresh when it is created,
+moved or changes status. The marked appointments are refreshed together
+when the transaction commits: their pending reminders are replaced, and
+appointments that are no longer active simply lose theirs.
+"""
+from collections import defaultdict
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from apps.clinic.availability import ACTIVE_APPOINTMENT_STATUSES
+from apps.core.deferred import defer_until_commit
+from apps.core.models import UserSettings
+from apps.engagement.models import Notification
+
+from .models import Appointment
+
+
+def bucket_start(moment):
+    """Floor a datetime to the start of its reminder bucket."""
+    size = int(settings.REMINDER_BUCKET.total_seconds())
+    seconds = int(moment.timestamp())
+    return datetime.fromtimestamp(seconds - seconds % size, tz=dt_timezone.utc)
+
+
+def pending_reminders(appointment_ids):
+    return Notification.objects.filter(
+        content_type=ContentType.objects.get_for_model(Appointment),
+        object_id__in=appointment_ids,
+        notification_type='reminder',
+        status='pending',
+    )
+
+
+def reminder_channels(user_ids):
+    """Email for users who accept it, in-app notifications for the rest."""
+    no_email = set(UserSettings.objects.filter(
+        user_id__in=user_ids, notification_email=False
+    ).values_list('user_id', flat=True))
+    return {user_id: 'in_app' if user_id in no_email else 'email' for user_id in user_ids}
+
+
+def build_reminders(appointments, now=None):
+    """Unsaved reminders for the active appointments, skipping send times already past."""
+    now = now or timezone.now()
+    appointments = [
+        appointment for appointment in appointments
+        if appointment.status in ACTIVE_APPOINTMENT_STATUSES and appointment.start_time > now
+    ]
+    content_type = ContentType.objects.get_for_model(Appointment)
+    channels = reminder_channels({appointment.customer_id for appointment in appointments})
+
+    reminders = []
+    for appointment in appointments:
+        start = timezone.localtime(appointment.start_time)
+        for offset in settings.APPOINTMENT_REMINDER_OFFSETS:
+            # Only the exact send time decides whether a reminder is past;
+            # its floored bucket may start before now and still be dispatched
+            send_at = appointment.start_time - offset
+            if send_at < now:
+                continue
+            reminders.append(Notification(
+                user_id=appointment.customer_id,
+                title="Appointment reminder",
+                message=(
+                    f"Your {appointment.service.name} appointment at {appointment.branch.name} "
+                    f"starts on {start:%d %b %Y} at {start:%H:%M}."
+                ),
+                notification_type='reminder',
+                channel=channels[appointment.customer_id],
+                scheduled_at=bucket_start(send_at),
+                content_type=content_type,
+                object_id=appointment.pk,
+                metadata={'offset_minutes': int(offset.total_seconds() // 60)},
+            ))
+    return reminders
+
+
+@transaction.atomic
+def refresh_reminders(appointment_ids):
+    """
+    Replace the pending reminders of the given appointments.
+
+    Returns the number of reminders scheduled.
+    """
+    appointment_ids = list(appointment_ids)
+    pending_reminders(appointment_ids).delete()
+    appointments = Appointment.objects.filter(
+        pk__in=appointment_ids, status__in=ACTIVE_APPOINTMENT_STATUSES
+    ).select_related('service', 'branch')
+    return len(Notification.objects.bulk_create(build_reminders(appointments)))
+
+
+def mark_for_refresh(appointment_id):
+    """Refresh an appointment's reminders once the current transaction commits."""
+    defer_until_commit('booking.reminders', [appointment_id], refresh_reminders)
+
+
+def dispatch_due_reminders(now=None):
+    """
+    Claim every due reminder and queue it for sending in per-channel batches.
+
+    Returns the number of reminders queued.
+    """
+    from .tasks import send_reminders
+
+    now = now or timezone.now()
+    batch_size = settings.REMINDER_BATCH_SIZE
+    queued = 0
+    while True:
+        with transaction.atomic():
+            # Concurrent dispatchers skip each other's rows where the database can lock them
+            claimed = list(Notification.objects.select_for_update(skip_locked=True).filter(
+                status='pending', notification_type='reminder', scheduled_at__lte=now
+            ).order_by('scheduled_at').values_list('id', 'channel')[:batch_size])
+            if not claimed:
+                return queued
+            Notification.objects.filter(
+                pk__in=[notification_id for notification_id, _ in claimed]
+            ).update(status='queued', updated_at=now)
+
+            by_channel = defaultdict(list)
+            for notification_id, channel in claimed:
+                by_channel[channel].append(notification_id)
+            for channel, notification_ids in by_channel.items():
+                transaction.on_commit(
+                    lambda channel=channel, ids=notification_ids: send_reminders.delay(channel, ids)
+                )
+        queued += len(claimed)
+        if len(claimed) < batch_size:
+            return queued
+
+
+def send_email_reminders(reminders):
+    messages = [
+        EmailMessage(reminder.title, reminder.message, to=[reminder.user.email])
+        for reminder in reminders
+    ]
+    get_connection().send_messages(messages)
+
+
+# Channels without a sender are in-app only: being stored is their delivery
+CHANNEL_SENDERS = {
+    'email': send_email_reminders,
+}
+
+
+def send_queued_reminders(channel, notification_ids):
+    """
+    Send a batch of queued reminders over one channel.
+
+    Reminders whose appointment stopped being active after they were queued
+    are dropped. Returns the number of reminders sent.
+    """
+    reminders = list(Notification.objects.filter(
+        pk__in=notification_ids, status='queued'
+    ).select_related('user'))
+    active = set(Appointment.objects.filter(
+        pk__in={reminder.object_id for reminder in reminders},
+        status__in=ACTIVE_APPOINTMENT_STATUSES,
+    ).values_list('pk', flat=True))
+    stale = [reminder.pk for reminder in reminders if reminder.object_id not in active]
+    reminders = [reminder for reminder in reminders if reminder.object_id in active]
+    if stale:
+        Notification.objects.filter(pk__in=stale).delete()
+
+    sender = CHANNEL_SENDERS.get(channel)
+    try:
+        if sender and reminders:
+            sender(reminders)
+    except Exception:
+        Notification.objects.filter(pk__in=[reminder.pk for reminder in reminders]).update(
+            status='failed', updated_at=timezone.now()
+        )
+        raise
+    now = timezone.now()
+    Notification.objects.filter(pk__in=[reminder.pk for reminder in reminders]).update(
+        status='sent', sent_at=now, updated_at=now
+    )
+    return len(reminders)
@@ -0,0 +1,350 @@
+import random
+import time as clock
+from contextlib import contextmanager
+from datetime import datetime, time, timedelta
+
+from django.db import connection, transaction, OperationalError
+from django.utils import timezone
+
+from apps.clinic.availability import AvailabilityEngine, ACTIVE_APPOINTMENT_STATUSES, MAX_BUFFER
+from apps.clinic.models import TherapistProfile
+from .models import Appointment
+from .reminders import mark_for_refresh
+from .signals import appointments_bulk_changed
+
+
+def busy_window(service, start_time, end_time):
+    """Return the time a therapist is occupied by a slot, including buffers."""
+    return (
+        start_time - timedelta(minutes=service.preparation_time),
+        end_time + timedelta(minutes=service.cooldown_time),
+    )
+
+
+class TherapistAssigner:
+    """
+    Rank the therapists who can take a slot.
+
+    Candidates are therapists working at the branch and offering the
+    service. Their schedules for the whole day are loaded once through the
+    availability engine, so scoring any number of candidates costs no
+    further queries. Each free candidate is scored on:
+
+    * rating - the therapist's average rating,
+    * load - the share of their working day already booked,
+    * gaps - idle time the slot would strand next to other bookings that is
+      too short to fit another session of this service.
+    """
+
+    RATING_WEIGHT = 1.0
+    LOAD_WEIGHT = 2.0
+    GAP_WEIGHT = 1.5
+
+    def __init__(self, service, branch, start_time, end_time):
+        self.service = service
+        self.branch = branch
+        self.start_time = start_time
+        self.end_time = end_time
+        # The therapist is also occupied for preparation and cooldown
+        self.busy_start, self.busy_end = busy_window(service, start_time, end_time)
+
+    def candidates(self):
+        """Return (therapist id, average rating) for every qualified therapist."""
+        return list(TherapistProfile.objects.filter(
+            branches=self.branch, services=self.service, is_active=True
+        ).values_list('id', 'average_rating'))
+
+    def load_engine(self, therapist_ids):
+        day = timezone.localtime(self.start_time).date()
+        engine = AvailabilityEngine(
+            timezone.make_aware(datetime.combine(day, time.min)),
+            timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min)),
+            branch=self.branch, service=self.service
+        )
+        return engine.load(therapist_ids)
+
+    def score(self, schedule, rating):
+        """Score a therapist's schedule for this slot, or None if they cannot take it."""
+        gaps = schedule.free_gaps_around(self.busy_start, self.busy_end)
+        if gaps is None:
+            return None
+
+        working = schedule.working_time()
+        load = schedule.booked_time() / working if working else 1
+
+        # Gaps shorter than another session of this service are wasted time
+        span = self.busy_end - self.busy_start
+        wasted = sum((gap for gap in gaps if timedelta(0) < gap < span), timedelta(0))
+
+        return (
+            self.RATING_WEIGHT * float(rating or 0) / 5
+            - self.LOAD_WEIGHT * load
+            - self.GAP_WEIGHT * min(wasted / span, 1)
+        )
+
+    def rank(self):
+        """Return the ids of free therapists, best candidate first."""
+        candidates = self.candidates()
+        engine = self.load_engine([therapist_id for therapist_id, _ in candidates])
+
+        scored = []
+        for therapist_id, rating in candidates:
+            score = self.score(engine.schedule(therapist_id), rating)
+            if score is not None:
+                scored.append((score, therapist_id))
+
+        # Ties go to the lowest id so concurrent requests agree on the order
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [therapist_id for _, therapist_id in scored]
+
+
+def nearby_bookings(therapist_id, busy_start, busy_end):
+    """
+    Active bookings of a therapist that may clash with a busy window.
+
+    Unordered, so the lookup can be answered from the therapist's active
+    bookings index without sorting.
+    """
+    return Appointment.objects.filter(
+        therapist_profile_id=therapist_id,
+        status__in=ACTIVE_APPOINTMENT_STATUSES,
+        start_time__lt=busy_end + MAX_BUFFER,
+        end_time__gt=busy_start - MAX_BUFFER
+    ).order_by()
+
+
+def slot_is_taken(therapist_id, busy_start, busy_end, exclude_appointment=None):
+    """Re-check a therapist's slot against active bookings padded by their buffers."""
+    bookings = nearby_bookings(therapist_id, busy_start, busy_end)
+    if exclude_appointment:
+        bookings = bookings.exclude(id=exclude_appointment)
+    for start_time, end_time, preparation_time, cooldown_time in bookings.values_list(
+            'start_time', 'end_time', 'service__preparation_time', 'service__cooldown_time'):
+        if (start_time - timedelta(minutes=preparation_time) < busy_end
+                and end_time + timedelta(minutes=cooldown_time) > busy_start):
+            return True
+    return False
+
+
+# Attempts made when a booking transaction hits a deadlock or lock timeout
+BOOKING_RETRIES = 3
+BOOKING_RETRY_DELAY = 0.05
+
+
+def lock_therapist_days(therapist_id, busy_start, busy_end):
+    """
+    Serialize bookings for a therapist on the days a slot touches.
+
+    On PostgreSQL this takes transaction-scoped advisory locks keyed by
+    (therapist, day), so bookings on other days or for other therapists
+    never wait on each other and no row is held. Other backends fall back to
+    locking the therapist row. Must be called inside a transaction.
+    """
+    lock_therapist_series(therapist_id, [(busy_start, busy_end)])
+
+
+def lock_therapist_series(therapist_id, busy_windows):
+    """Take a therapist's booking locks for every day any of the windows touches."""
+    if connection.vendor != 'postgresql':
+        TherapistProfile.objects.select_for_update().filter(id=therapist_id).first()
+        return
+
+    days = set()
+    for busy_start, busy_end in busy_windows:
+        day = timezone.localtime(busy_start).date()
+        last_day = timezone.localtime(busy_end).date()
+        while day <= last_day:
+            days.add(day)
+            day += timedelta(days=1)
+    with connection.cursor() as cursor:
+        # Always lock days in ascending order so multi-day slots cannot deadlock
+        for day in sorted(days):
+            cursor.execute('SELECT pg_advisory_xact_lock(%s, %s)', [therapist_id, day.toordinal()])
+
+
+@contextmanager
+def booking_lock(therapist_id, busy_start, busy_end):
+    """Open a transaction holding the therapist's booking lock for the slot."""
+    with transaction.atomic():
+        lock_therapist_days(therapist_id, busy_start, busy_end)
+        yield
+
+
+def with_booking_retries(func, *args, **kwargs):
+    """
+    Run a locked booking operation, retrying deadlocks and lock timeouts
+    with jittered exponential backoff.
+    """
+    for attempt in range(BOOKING_RETRIES):
+        try:
+            return func(*args, **kwargs)
+        except OperationalError:
+            if attempt == BOOKING_RETRIES - 1:
+                raise
+            clock.sleep(BOOKING_RETRY_DELAY * (2 ** attempt) * (1 + random.random()))
+
+
+def _reserve_appointment(therapist_id, busy_start, busy_end, **fields):
+    with booking_lock(therapist_id, busy_start, busy_end):
+        if slot_is_taken(therapist_id, busy_start, busy_end):
+            return None
+        return Appointment.objects.create(therapist_profile_id=therapist_id, **fields)
+
+
+def reserve_appointment(therapist_id, busy_start, busy_end, **fields):
+    """
+    Create an appointment for a therapist if their slot is still free.
+
+    The conflict re-check and insert run under the therapist's booking
+    lock, so concurrent requests cannot both pass the check. Returns None
+    if the slot was taken.
+    """
+    return with_booking_retries(_reserve_appointment, therapist_id, busy_start, busy_end, **fields)
+
+
+def _move_appointment(appointment, therapist_id, busy_start, busy_end, **fields):
+    with booking_lock(therapist_id, busy_start, busy_end):
+        if slot_is_taken(therapist_id, busy_start, busy_end, exclude_appointment=appointment.id):
+            return False
+        appointment.therapist_profile_id = therapist_id
+        for name, value in fields.items():
+            setattr(appointment, name, value)
+        appointment.save()
+        return True
+
+
+def move_appointment(appointment, therapist_id, busy_start, busy_end, **fields):
+    """
+    Move an existing appointment to a new slot under the booking lock.
+
+    Returns False, leaving the appointment untouched, if the slot was taken.
+    """
+    return with_booking_retries(_move_appointment, appointment, therapist_id, busy_start, busy_end, **fields)
+
+
+def assign_and_book(service, branch, start_time, end_time, **fields):
+    """
+    Book the best available therapist for a slot.
+
+    Falls through the ranked candidates when a concurrent request claims a
+    therapist first. Returns None when nobody can take the slot.
+    """
+    assigner = TherapistAssigner(service, branch, start_time, end_time)
+    for therapist_id in assigner.rank():
+        appointment = reserve_appointment(
+            therapist_id, assigner.busy_start, assigner.busy_end,
+            service=service, branch=branch, start_time=start_time, end_time=end_time,
+            **fields
+        )
+        if appointment is not None:
+            return appointment
+    return None
+
+
+def series_window(busy_windows):
+    """The whole days spanned by a series' busy windows."""
+    first_day = timezone.localtime(min(start for start, _ in busy_windows)).date()
+    last_day = timezone.localtime(max(end for _, end in busy_windows)).date()
+    return (
+        timezone.make_aware(datetime.combine(first_day, time.min)),
+        timezone.make_aware(datetime.combine(last_day + timedelta(days=1), time.min)),
+    )
+
+
+def series_conflicts(schedule, busy_windows):
+    """
+    Check every item of a series against a therapist's schedule.
+
+    Returns {index: reason} for the items the therapist cannot take. Items
+    are also checked against the series' own earlier items, so of two
+    overlapping items the later one in the list is the conflict.
+    """
+    conflicts = {}
+    taken = []
+    for index, (busy_start, busy_end) in enumerate(busy_windows):
+        if schedule.has_conflict(busy_start, busy_end) or any(
+                start < busy_end and end > busy_start for start, end in taken):
+            conflicts[index] = "Selected therapist is not available at this time."
+        elif not schedule.is_working(busy_start, busy_end):
+            conflicts[index] = "Therapist is not available during this time."
+        else:
+            taken.append((busy_start, busy_end))
+    return conflicts
+
+
+def pick_series_therapist(service, branch, busy_windows):
+    """
+    The qualified therapist able to take the most items of a series.
+
+    Every candidate's schedule over the series comes from one engine load.
+    Ties go to the better rated therapist, then the lowest id. Returns None
+    when there are no candidates.
+    """
+    candidates = list(TherapistProfile.objects.filter(
+        branches=branch, services=service, is_active=True
+    ).values_list('id', 'average_rating'))
+    if not candidates:
+        return None
+    engine = AvailabilityEngine(*series_window(busy_windows), branch=branch, service=service)
+    engine.load([therapist_id for therapist_id, _ in candidates])
+    return min(candidates, key=lambda candidate: (
+        len(series_conflicts(engine.schedule(candidate[0]), busy_windows)),
+        -(candidate[1] or 0),
+        candidate[0],
+    ))[0]
+
+
+def announce_bulk_created(appointments):
+    """Do what post_save would have done for bulk-created appointments."""
+    for appointment in appointments:
+        mark_for_refresh(appointment.pk)
+    appointments_bulk_changed.send(sender=Appointment, appointments=[
+        (appointment.service_id, appointment.start_time, appointment.customer_id)
+        for appointment in appointments
+    ])
+
+
+def _book_series(therapist_id, service, branch, start_times, allow_partial, **fields):
+    duration = timedelta(minutes=service.duration)
+    busy_windows = [busy_window(service, start, start + duration) for start in start_times]
+    with transaction.atomic():
+        lock_therapist_series(therapist_id, busy_windows)
+        engine = AvailabilityEngine(*series_window(busy_windows), branch=branch, service=service)
+        conflicts = series_conflicts(engine.load([therapist_id]).schedule(therapist_id), busy_windows)
+        if conflicts and not allow_partial:
+            return [], conflicts
+        appointments = Appointment.objects.bulk_create([
+            Appointment(
+                therapist_profile_id=therapist_id, service=service, branch=branch,
+                start_time=start, end_time=start + duration, **fields
+            )
+            for index, start in enumerate(start_times) if index not in conflicts
+        ])
+        announce_bulk_created(appointments)
+        return appointments, conflicts
+
+
+def book_series(service, branch, start_times, therapist_id=None, allow_partial=False, **fields):
+    """
+    Book a series of appointments with one therapist in a single transaction.
+
+    The therapist's schedule over the whole series is loaded once under
+    their booking locks and every item is checked against it in memory,
+    then the free items are inserted with one bulk_create. Without
+    ``allow_partial`` any conflict books nothing. When no therapist is
+    given, the series goes to the one who can take most of it.
+
+    Returns (appointments, {index: reason}) for the booked and conflicting
+    items of ``start_times``.
+    """
+    if therapist_id is None:
+        duration = timedelta(minutes=service.duration)
+        therapist_id = pick_series_therapist(service, branch, [
+            busy_window(service, start, start + duration) for start in start_times
+        ])
+        if therapist_id is None:
+            return [], {index: "No therapist offers this service at this branch."
+                        for index in range(len(start_times))}
+    return with_booking_retries(
+        _book_series, therapist_id, service, branch, start_times, allow_partial, **fields
+    )
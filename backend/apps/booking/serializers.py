@@ -1,8 +1,10 @@
 from rest_framework import serializers
 from django.utils import timezone
 from .models import Appointment, Payment, Invoice, WaitlistEntry
+from .waitlist import parse_time_slot
 from apps.clinic.serializers import TherapistProfileSerializer, ServiceSerializer, BranchSerializer
-from apps.clinic.models import TherapistProfile, Service, Branch, TherapistAvailability
+from apps.clinic.models import TherapistProfile, Service, Branch
+from apps.clinic.availability import AvailabilityEngine, RECURRENCE_STEPS
 
 
 class AppointmentSerializer(serializers.ModelSerializer):
@@ -24,6 +26,18 @@ class AppointmentSerializer(serializers.ModelSerializer):
                  'service_details', 'therapist_details', 'branch_details']
         read_only_fields = ['id', 'created_at', 'updated_at']
     
+    @staticmethod
+    def setup_eager_loading(queryset, prefix=''):
+        """Load every relation this serializer renders in a fixed number of queries."""
+        return queryset.select_related(
+            f'{prefix}customer', f'{prefix}therapist_profile__user',
+            f'{prefix}service', f'{prefix}branch'
+        ).prefetch_related(
+            f'{prefix}service__available_branches',
+            f'{prefix}therapist_profile__branches',
+            f'{prefix}therapist_profile__services__available_branches'
+        )
+    
     def get_customer_name(self, obj):
         return obj.customer.get_full_name() if obj.customer else None
         
@@ -67,35 +81,58 @@ class AppointmentSerializer(serializers.ModelSerializer):
             
         # Check for therapist availability
         if therapist_profile and start_time and end_time:
-            # Check if there's a conflicting appointment
-            existing_appointments = Appointment.objects.filter(
-                therapist_profile=therapist_profile,
-                status__in=['pending', 'confirmed'],
-                start_time__lt=end_time,
-                end_time__gt=start_time
-            )
+            # The therapist is also occupied for the service's preparation and cooldown
+            busy_start, busy_end = start_time, end_time
+            if service:
+                busy_start -= timezone.timedelta(minutes=service.preparation_time)
+                busy_end += timezone.timedelta(minutes=service.cooldown_time)
+            schedule = AvailabilityEngine.for_slot(
+                therapist_profile, busy_start, busy_end, branch=branch, service=service
+            ).schedule(therapist_profile)
             
-            # Exclude current appointment if updating
-            if self.instance:
-                existing_appointments = existing_appointments.exclude(id=self.instance.id)
-                
-            if existing_appointments.exists():
+            # Check if there's a conflicting appointment, excluding the current one if updating
+            if schedule.has_conflict(busy_start, busy_end, self.instance.id if self.instance else None):
                 raise serializers.ValidationError("Selected time slot is not available for this therapist.")
                 
-            # Check if therapist has availability for this time slot
-            availability = TherapistAvailability.objects.filter(
-                therapist=therapist_profile,
-                start_time__lte=start_time,
-                end_time__gte=end_time,
-                is_available=True
-            )
-            
-            if not availability.exists():
+            # Check if therapist has (possibly recurring) availability for this time slot
+            if not schedule.is_working(busy_start, busy_end):
                 raise serializers.ValidationError("Therapist is not available during this time slot.")
                 
         return data
 
 
+class AppointmentListSerializer(serializers.ModelSerializer):
+    """Slim read-only serializer for appointment lists."""
+    
+    customer_name = serializers.SerializerMethodField()
+    therapist_name = serializers.SerializerMethodField()
+    service_name = serializers.CharField(source='service.name', read_only=True)
+    branch_name = serializers.CharField(source='branch.name', read_only=True)
+    
+    class Meta:
+        model = Appointment
+        fields = ['id', 'customer', 'customer_name', 'therapist_profile', 'therapist_name',
+                 'service', 'service_name', 'branch', 'branch_name', 'start_time',
+                 'end_time', 'status', 'created_at', 'updated_at']
+        read_only_fields = fields
+    
+    @staticmethod
+    def setup_eager_loading(queryset, prefix=''):
+        """Load every relation this serializer renders with a single join."""
+        return queryset.select_related(
+            f'{prefix}customer', f'{prefix}therapist_profile__user',
+            f'{prefix}service', f'{prefix}branch'
+        )
+    
+    def get_customer_name(self, obj):
+        return obj.customer.get_full_name() if obj.customer else None
+        
+    def get_therapist_name(self, obj):
+        if obj.therapist_profile and obj.therapist_profile.user:
+            return obj.therapist_profile.user.get_full_name()
+        return None
+
+
 class PaymentSerializer(serializers.ModelSerializer):
     """Serializer for Payment model."""
     
@@ -108,6 +145,11 @@ class PaymentSerializer(serializers.ModelSerializer):
                  'payment_date', 'payment_details', 'created_at', 'updated_at',
                  'appointment_details']
         read_only_fields = ['id', 'created_at', 'updated_at']
+    
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Load the nested appointment graph in a fixed number of queries."""
+        return AppointmentSerializer.setup_eager_loading(queryset, prefix='appointment__')
 
 
 class InvoiceSerializer(serializers.ModelSerializer):
@@ -123,6 +165,15 @@ class InvoiceSerializer(serializers.ModelSerializer):
                  'tax_rate', 'tax_amount', 'discount', 'total', 'paid_amount',
                  'status', 'notes', 'terms', 'created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at']
+        # Allocated from the invoice number sequence when omitted
+        extra_kwargs = {'invoice_number': {'required': False}}
+    
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Load the customer and nested appointment graph in a fixed number of queries."""
+        return AppointmentSerializer.setup_eager_loading(
+            queryset.select_related('customer'), prefix='appointment__'
+        )
         
     def get_customer_name(self, obj):
         return obj.customer.get_full_name() if obj.customer else None
@@ -135,6 +186,8 @@ class WaitlistEntrySerializer(serializers.ModelSerializer):
     service_name = serializers.SerializerMethodField()
     therapist_name = serializers.SerializerMethodField()
     branch_name = serializers.SerializerMethodField()
+    # Place in the queue; the stored position is only a sort key
+    position = serializers.SerializerMethodField()
     
     class Meta:
         model = WaitlistEntry
@@ -142,7 +195,13 @@ class WaitlistEntrySerializer(serializers.ModelSerializer):
                  'therapist_profile', 'therapist_name', 'branch', 'branch_name',
                  'preferred_date', 'preferred_time_slots', 'status', 'notes',
                  'position', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'position', 'created_at', 'updated_at']
+        # The customer is the requesting user, see WaitlistEntryViewSet.perform_create
+        read_only_fields = ['id', 'customer', 'position', 'created_at', 'updated_at']
+    
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Load every relation this serializer renders with a single join."""
+        return queryset.select_related('customer', 'service', 'therapist_profile__user', 'branch')
         
     def get_customer_name(self, obj):
         return obj.customer.get_full_name() if obj.customer else None
@@ -158,6 +217,19 @@ class WaitlistEntrySerializer(serializers.ModelSerializer):
     def get_branch_name(self, obj):
         return obj.branch.name if obj.branch else None
 
+    def get_position(self, obj):
+        return getattr(obj, 'queue_position', None)
+
+    def validate_preferred_time_slots(self, value):
+        if not isinstance(value, list):
+            raise serializers.ValidationError("Expected a list of time slots.")
+        for slot in value:
+            try:
+                parse_time_slot(slot)
+            except ValueError as exc:
+                raise serializers.ValidationError(str(exc))
+        return value
+
 
 class AppointmentBookingSerializer(serializers.Serializer):
     """Serializer for booking an appointment."""
@@ -168,76 +240,169 @@ class AppointmentBookingSerializer(serializers.Serializer):
     start_time = serializers.DateTimeField()
     notes = serializers.CharField(required=False, allow_blank=True)
     
-    def validate(self, data):
+    def resolve_booking(self, data):
         """
-        Validate the booking request.
+        Fetch the service, branch and therapist of a booking and check that
+        they go together, storing them in the validated data.
         """
-        # Get relevant data
         service_id = data.get('service_id')
         therapist_id = data.get('therapist_id')
         branch_id = data.get('branch_id')
-        start_time = data.get('start_time')
         
         try:
-            # Fetch related objects
             service = Service.objects.get(id=service_id, is_active=True)
+        except Service.DoesNotExist:
+            raise serializers.ValidationError("Selected service does not exist or is inactive.")
+        try:
             branch = Branch.objects.get(id=branch_id, is_active=True)
+        except Branch.DoesNotExist:
+            raise serializers.ValidationError("Selected branch does not exist or is inactive.")
             
-            # Validate branch offers service
-            if not service.available_branches.filter(id=branch_id).exists():
-                raise serializers.ValidationError("Selected service is not available at this branch.")
-                
-            # Set end time based on service duration
-            end_time = start_time + timezone.timedelta(minutes=service.duration)
+        # Validate branch offers service
+        if not service.available_branches.filter(id=branch_id).exists():
+            raise serializers.ValidationError("Selected service is not available at this branch.")
             
-            # If therapist is specified, validate availability
-            if therapist_id:
-                try:
-                    therapist = TherapistProfile.objects.get(id=therapist_id, is_active=True)
-                    
-                    # Check if therapist works at this branch
-                    if not therapist.branches.filter(id=branch_id).exists():
-                        raise serializers.ValidationError("Selected therapist does not work at this branch.")
-                        
-                    # Check if therapist offers this service
-                    if not therapist.services.filter(id=service_id).exists():
-                        raise serializers.ValidationError("Selected therapist does not offer this service.")
-                        
-                    # Check for conflicts
-                    conflicts = Appointment.objects.filter(
-                        therapist_profile=therapist,
-                        status__in=['pending', 'confirmed'],
-                        start_time__lt=end_time,
-                        end_time__gt=start_time
-                    ).exists()
-                    
-                    if conflicts:
-                        raise serializers.ValidationError("Selected therapist is not available at this time.")
-                        
-                    # Check if therapist has availability
-                    has_availability = TherapistAvailability.objects.filter(
-                        therapist=therapist,
-                        start_time__lte=start_time,
-                        end_time__gte=end_time,
-                        is_available=True
-                    ).exists()
-                    
-                    if not has_availability:
-                        raise serializers.ValidationError("Therapist is not available during this time.")
-                        
-                except TherapistProfile.DoesNotExist:
-                    raise serializers.ValidationError("Selected therapist does not exist or is inactive.")
+        data['service'] = service
+        data['branch'] = branch
+        if therapist_id:
+            try:
+                therapist = TherapistProfile.objects.get(id=therapist_id, is_active=True)
+            except TherapistProfile.DoesNotExist:
+                raise serializers.ValidationError("Selected therapist does not exist or is inactive.")
+                
+            # Check if therapist works at this branch
+            if not therapist.branches.filter(id=branch_id).exists():
+                raise serializers.ValidationError("Selected therapist does not work at this branch.")
+                
+            # Check if therapist offers this service
+            if not therapist.services.filter(id=service_id).exists():
+                raise serializers.ValidationError("Selected therapist does not offer this service.")
+                
+            data['therapist_profile'] = therapist
+        return data
+    
+    def validate(self, data):
+        """
+        Validate the booking request.
+        """
+        data = self.resolve_booking(data)
+        service = data['service']
+        start_time = data['start_time']
+        
+        # Set end time based on service duration
+        end_time = start_time + timezone.timedelta(minutes=service.duration)
+        data['end_time'] = end_time
+        
+        # If therapist is specified, validate availability
+        therapist = data.get('therapist_profile')
+        if therapist:
+            # The therapist is also occupied for preparation and cooldown
+            busy_start = start_time - timezone.timedelta(minutes=service.preparation_time)
+            busy_end = end_time + timezone.timedelta(minutes=service.cooldown_time)
+            schedule = AvailabilityEngine.for_slot(
+                therapist, busy_start, busy_end, branch=data['branch'], service=service
+            ).schedule(therapist)
             
-            # Store validated objects in data
-            data['service'] = service
-            data['branch'] = branch
-            data['end_time'] = end_time
-            if therapist_id:
-                data['therapist_profile'] = therapist
+            # Check for conflicts, ignoring the appointment being rescheduled
+            appointment = self.context.get('appointment')
+            if schedule.has_conflict(busy_start, busy_end, appointment.id if appointment else None):
+                raise serializers.ValidationError("Selected therapist is not available at this time.")
+                
+            # Check if therapist has availability, expanding recurring rows
+            if not schedule.is_working(busy_start, busy_end):
+                raise serializers.ValidationError("Therapist is not available during this time.")
                 
+        return data
+
+
+class SeriesBookingSerializer(AppointmentBookingSerializer):
+    """
+    Serializer for booking a package or recurring series of appointments.
+    
+    The series is either an explicit list of ``start_times`` or a first
+    ``start_time`` repeated ``count`` times at a ``repeat`` interval.
+    Availability is checked for the whole series at once when booking,
+    see ``apps.booking.scheduler.book_series``.
+    """
+    
+    # Most appointments booked by one request
+    MAX_ITEMS = 52
+    
+    start_time = serializers.DateTimeField(required=False)
+    start_times = serializers.ListField(child=serializers.DateTimeField(), required=False,
+                                        max_length=MAX_ITEMS)
+    repeat = serializers.ChoiceField(choices=list(RECURRENCE_STEPS), required=False)
+    count = serializers.IntegerField(required=False, min_value=1, max_value=MAX_ITEMS)
+    allow_partial = serializers.BooleanField(default=False,
+                                             help_text="Book the free items when others conflict")
+    
+    def validate(self, data):
+        """
+        Validate the series and expand it into start times.
+        """
+        data = self.resolve_booking(data)
+        
+        if data.get('start_times'):
+            start_times = data['start_times']
+        elif data.get('start_time') and data.get('repeat') and data.get('count'):
+            step = RECURRENCE_STEPS[data['repeat']]
+            start_times = [data['start_time'] + step * index for index in range(data['count'])]
+        else:
+            raise serializers.ValidationError(
+                "Provide start_times, or start_time with repeat and count."
+            )
+            
+        if len(set(start_times)) != len(start_times):
+            raise serializers.ValidationError("Start times must be distinct.")
+        if min(start_times) <= timezone.now():
+            raise serializers.ValidationError("Appointment start time must be in the future.")
+            
+        data['start_times'] = start_times
+        return data
+
+
+class OpenSlotsQuerySerializer(serializers.Serializer):
+    """Serializer for open slot search parameters."""
+    
+    # Widest date range returned in one response; longer ranges are paged
+    MAX_DAYS = 31
+    
+    service_id = serializers.IntegerField()
+    branch_id = serializers.IntegerField()
+    start_date = serializers.DateField()
+    end_date = serializers.DateField(required=False)
+    therapist_id = serializers.IntegerField(required=False)
+    interval = serializers.IntegerField(required=False, min_value=5,
+                                        help_text="Slot grid in minutes, defaults to the service duration")
+    
+    def validate(self, data):
+        """
+        Validate the search and clamp it to one page of dates.
+        """
+        try:
+            service = Service.objects.get(id=data['service_id'], is_active=True)
+            branch = Branch.objects.get(id=data['branch_id'], is_active=True)
         except Service.DoesNotExist:
             raise serializers.ValidationError("Selected service does not exist or is inactive.")
         except Branch.DoesNotExist:
             raise serializers.ValidationError("Selected branch does not exist or is inactive.")
             
-        return data
\ No newline at end of file
+        if not service.available_branches.filter(id=branch.id).exists():
+            raise serializers.ValidationError("Selected service is not available at this branch.")
+            
+        start_date = data['start_date']
+        end_date = data.get('end_date', start_date)
+        if end_date < start_date:
+            raise serializers.ValidationError("end_date must not be before start_date.")
+            
+        # Page wide ranges so a single request stays bounded
+        next_start_date = None
+        if (end_date - start_date).days >= self.MAX_DAYS:
+            next_start_date = start_date + timezone.timedelta(days=self.MAX_DAYS)
+            end_date = next_start_date - timezone.timedelta(days=1)
+            
+        data['service'] = service
+        data['branch'] = branch
+        data['end_date'] = end_date
+        data['next_start_date'] = next_start_date
+        return data
@@ -0,0 +1,43 @@
+from django.db.models.signals import pre_save, post_save
+from django.dispatch import Signal, receiver
+
+from .models import Appointment
+from .reminders import mark_for_refresh
+
+# Sent by batch jobs that change appointments with queryset updates, which
+# send no post_save. ``appointments`` lists the (service_id, start_time,
+# customer_id) of every appointment changed.
+appointments_bulk_changed = Signal()
+
+
+# Fields of an appointment that receivers compare against its stored state
+TRACKED_FIELDS = ['service_id', 'start_time', 'status', 'customer_id']
+
+
+@receiver(pre_save, sender=Appointment)
+def remember_previous_state(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    Fetch the stored state of an appointment that is about to be saved.
+
+    It is fetched once for every receiver, which find it in
+    ``instance._previous`` on post_save; it is None for new appointments
+    and for saves that cannot change a tracked field.
+    """
+    instance._previous = None
+    if raw or not instance.pk:
+        return
+    tracked = {'service', 'start_time', 'status', 'customer'}
+    if update_fields is not None and not tracked & {field.removesuffix('_id') for field in update_fields}:
+        return
+    instance._previous = Appointment.objects.filter(pk=instance.pk).values(*TRACKED_FIELDS).first()
+
+
+@receiver(post_save, sender=Appointment)
+def appointment_saved(sender, instance, created, raw=False, **kwargs):
+    """Refresh the reminders of an appointment that was created, moved or changed status."""
+    if raw:
+        return
+    previous = getattr(instance, '_previous', None)
+    if created or previous and (previous['start_time'], previous['status']) != (
+            instance.start_time, instance.status):
+        mark_for_refresh(instance.pk)
@@ -0,0 +1,59 @@
+from celery import shared_task
+from django.contrib.contenttypes.models import ContentType
+from django.utils import timezone
+
+from apps.engagement.models import Notification
+
+from .documents import export_path, write_invoice_export
+from .lifecycle import run_lifecycle
+from .models import Appointment, WaitlistEntry
+from .reminders import dispatch_due_reminders, send_queued_reminders
+
+
+@shared_task
+def export_invoices(export_id, year, month):
+    """Build the ZIP of a month's invoice PDFs for an export."""
+    return write_invoice_export(year, month, export_path(export_id))
+
+
+@shared_task
+def dispatch_reminders():
+    """Queue the reminders that have come due."""
+    return dispatch_due_reminders()
+
+
+@shared_task
+def run_appointment_lifecycle():
+    """Close overdue appointments and create their treatment sessions."""
+    return run_lifecycle()
+
+
+@shared_task
+def send_reminders(channel, notification_ids):
+    """Send a batch of queued reminders over one channel."""
+    return send_queued_reminders(channel, notification_ids)
+
+
+@shared_task
+def notify_waitlist(entry_ids, appointment_id):
+    """Tell promoted waitlisters that a slot they asked for has opened up."""
+    appointment = Appointment.objects.select_related('service', 'branch').get(pk=appointment_id)
+    start = timezone.localtime(appointment.start_time)
+    content_type = ContentType.objects.get_for_model(Appointment)
+    now = timezone.now()
+    entries = WaitlistEntry.objects.filter(pk__in=entry_ids, status='notified')
+    notifications = Notification.objects.bulk_create([
+        Notification(
+            user_id=entry.customer_id,
+            title="A slot has opened up",
+            message=(
+                f"{appointment.service.name} at {appointment.branch.name} is now free on "
+                f"{start:%d %b %Y} at {start:%H:%M}. Book it before someone else does."
+            ),
+            notification_type='appointment', channel='in_app', status='sent', sent_at=now,
+            content_type=content_type, object_id=appointment.pk,
+            metadata={'waitlist_entry': entry.pk},
+        )
+        for entry in entries
+    ])
+    return len(notifications)
@@ -0,0 +1,115 @@
+from datetime import timedelta
+
+from django.test import override_settings
+from django.urls import path
+from django.utils import timezone
+from rest_framework.test import force_authenticate
+
+from apps.booking import calendar
+from apps.booking.models import Appointment
+from apps.booking.views import CalendarFeedLinksView, CalendarFeedView
+from apps.core.models import User
+
+from .test_views import BookingViewTestCase
+
+
+urlpatterns = [
+    path('calendar/', CalendarFeedLinksView.as_view(), name='calendar-feeds'),
+    path('calendar/<str:token>.ics', CalendarFeedView.as_view(), name='calendar-feed'),
+]
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class CalendarFeedTests(BookingViewTestCase):
+    """Test streamed iCalendar feeds and their conditional GETs."""
+
+    def setUp(self):
+        super().setUp()
+        self.start = (timezone.now() + timedelta(days=2)).replace(hour=10, minute=0, second=0, microsecond=0)
+        self.appointments = [
+            Appointment.objects.create(
+                customer=self.customer, therapist_profile=self.therapists[index % 2],
+                service=self.service, branch=self.branch, status='confirmed',
+                start_time=self.start + timedelta(days=index),
+                end_time=self.start + timedelta(days=index, hours=1),
+                notes="Prefers a quiet room; no music" if index == 0 else None,
+            )
+            for index in range(3)
+        ]
+
+    def feed_url(self, user, kind, object_id):
+        return f'/calendar/{calendar.feed_token(user, kind, object_id)}.ics'
+
+    def fetch(self, url, **headers):
+        return self.client.get(url, **headers)
+
+    def body(self, response):
+        return b''.join(response.streaming_content).decode()
+
+    def test_therapist_feed_streams_events(self):
+        therapist = self.therapists[0]
+        with self.assertNumQueries(5):
+            response = self.fetch(self.feed_url(therapist.user, 'therapist', therapist.pk))
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.streaming)
+            body = self.body(response)
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        self.assertTrue(body.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertTrue(body.endswith('END:VCALENDAR\r\n'))
+        self.assertEqual(body.count('BEGIN:VEVENT'), 2)
+        self.assertIn(f'UID:appointment-{self.appointments[0].pk}@testserver', body)
+        self.assertIn('SUMMARY:Massage: Casey Customer', body)
+        self.assertIn('DESCRIPTION:Prefers a quiet room\\; no music', body)
+        self.assertIn('STATUS:CONFIRMED', body)
+        for line in body.split('\r\n'):
+            self.assertLessEqual(len(line.encode()), 75)
+
+    def test_customer_feed_hides_notes(self):
+        body = self.body(self.fetch(self.feed_url(self.customer, 'customer', self.customer.pk)))
+        self.assertEqual(body.count('BEGIN:VEVENT'), 3)
+        self.assertIn('SUMMARY:Massage with Therapist 0', body)
+        self.assertNotIn('DESCRIPTION', body)
+
+    def test_conditional_get_returns_not_modified(self):
+        url = self.feed_url(self.customer, 'customer', self.customer.pk)
+        response = self.fetch(url)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+
+        with self.assertNumQueries(2):
+            self.assertEqual(self.fetch(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.fetch(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+        self.appointments[1].status = 'cancelled'
+        self.appointments[1].save()
+        response = self.fetch(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('STATUS:CANCELLED', self.body(response))
+
+    def test_deleting_an_event_changes_the_etag(self):
+        url = self.feed_url(self.customer, 'customer', self.customer.pk)
+        etag = self.fetch(url)['ETag']
+        Appointment.objects.filter(pk=self.appointments[0].pk).delete()
+        self.assertEqual(self.fetch(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_tokens_are_checked(self):
+        other = User.objects.create_user(email="other@example.com", role="customer")
+        # Forged, foreign and revoked tokens all look like missing feeds
+        self.assertEqual(self.fetch('/calendar/not-a-token.ics').status_code, 404)
+        self.assertEqual(self.fetch(self.feed_url(other, 'customer', self.customer.pk)).status_code, 404)
+        self.assertEqual(
+            self.fetch(self.feed_url(other, 'branch', self.branch.pk)).status_code, 404
+        )
+        url = self.feed_url(self.customer, 'customer', self.customer.pk)
+        self.customer.set_password('changed')
+        self.customer.save()
+        self.assertEqual(self.fetch(url).status_code, 404)
+
+    def test_feed_links(self):
+        request = self.factory.get('/calendar/')
+        force_authenticate(request, user=self.therapists[0].user)
+        response = CalendarFeedLinksView.as_view()(request)
+        self.assertEqual([(link['kind'], link['id']) for link in response.data], [
+            ('therapist', self.therapists[0].pk), ('branch', self.branch.pk),
+        ])
+        body = self.body(self.fetch(response.data[1]['url']))
+        self.assertEqual(body.count('BEGIN:VEVENT'), 3)
@@ -0,0 +1,251 @@
+import logging
+import random
+import threading
+import time
+from datetime import date, timedelta
+
+from django.db import connection, OperationalError
+from django.test import TransactionTestCase
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.booking.invoicing import InvoiceNumberAllocator
+from apps.booking.models import Appointment, Invoice, Payment
+from apps.booking.scheduler import busy_window, reserve_appointment
+from apps.booking.views import PaymentViewSet
+from apps.clinic.models import Branch, Service, TherapistProfile, TherapistAvailability
+from apps.core.models import User
+
+from .test_views import at
+
+logger = logging.getLogger(__name__)
+
+
+class ConcurrentBookingLoadTest(TransactionTestCase):
+    """
+    Hammer the booking path from many threads and check that no two active
+    appointments of a therapist ever overlap, buffers included.
+    """
+
+    THREADS = 12
+    ATTEMPTS_PER_THREAD = 15
+    THERAPISTS = 3
+
+    def setUp(self):
+        self.branch = Branch.objects.create(
+            name="Main Branch", address="123 Main St", city="Pune", state="MH",
+            country="India", postal_code="411001", phone="555-123-4567"
+        )
+        self.service = Service.objects.create(
+            name="Massage", description="Relaxing massage", duration=60,
+            price=100, category="massage", preparation_time=10, cooldown_time=5
+        )
+        self.customer = User.objects.create_user(email="customer@example.com", role="customer")
+        self.therapist_ids = []
+        for index in range(self.THERAPISTS):
+            user = User.objects.create_user(email=f"therapist{index}@example.com", role="therapist")
+            therapist = TherapistProfile.objects.create(user=user)
+            TherapistAvailability.objects.create(
+                therapist=therapist, branch=self.branch, start_time=at(8, 9), end_time=at(8, 17)
+            )
+            self.therapist_ids.append(therapist.id)
+
+    def book_randomly(self, seed, results, errors):
+        generator = random.Random(seed)
+        try:
+            for _ in range(self.ATTEMPTS_PER_THREAD):
+                # Overlapping candidate slots every 15 minutes maximise contention
+                start_time = at(8, 9) + timedelta(minutes=15 * generator.randrange(28))
+                end_time = start_time + timedelta(minutes=self.service.duration)
+                busy_start, busy_end = busy_window(self.service, start_time, end_time)
+                try:
+                    appointment = reserve_appointment(
+                        generator.choice(self.therapist_ids), busy_start, busy_end,
+                        customer=self.customer, service=self.service, branch=self.branch,
+                        start_time=start_time, end_time=end_time, status='pending'
+                    )
+                except OperationalError:
+                    # SQLite locks whole tables and can exhaust the retries
+                    errors.append(seed)
+                    continue
+                results.append(appointment is not None)
+        finally:
+            connection.close()
+
+    def test_no_overlapping_bookings_under_load(self):
+        results = []
+        errors = []
+        threads = [
+            threading.Thread(target=self.book_randomly, args=(seed, results, errors))
+            for seed in range(self.THREADS)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        attempts = self.THREADS * self.ATTEMPTS_PER_THREAD
+        self.assertEqual(len(results) + len(errors), attempts)
+        self.assertTrue(any(results))
+        if connection.vendor == 'postgresql':
+            # Advisory locks queue bookings instead of failing them
+            self.assertEqual(errors, [])
+
+        padding_before = timedelta(minutes=self.service.preparation_time)
+        padding_after = timedelta(minutes=self.service.cooldown_time)
+        for therapist_id in self.therapist_ids:
+            bookings = list(Appointment.objects.filter(
+                therapist_profile_id=therapist_id
+            ).order_by('start_time').values_list('start_time', 'end_time'))
+            for previous, following in zip(bookings, bookings[1:]):
+                self.assertLessEqual(previous[1] + padding_after, following[0] - padding_before,
+                                     f"overlapping bookings {previous} and {following}")
+
+        logger.debug(
+            "%d booking attempts from %d threads in %.2fs (%.0f/s), %d booked, %d lock errors, %d rows",
+            attempts, self.THREADS, elapsed, attempts / elapsed, sum(results), len(errors),
+            Appointment.objects.count(),
+        )
+
+
+class ConcurrentPaymentRetryTest(TransactionTestCase):
+    """
+    Retry payments with the same idempotency key from many threads at once
+    and check that each key pays its appointment exactly once.
+    """
+
+    THREADS = 8
+    APPOINTMENTS = 5
+    RETRIES = 20
+
+    def setUp(self):
+        branch = Branch.objects.create(
+            name="Main Branch", address="123 Main St", city="Pune", state="MH",
+            country="India", postal_code="411001", phone="555-123-4567"
+        )
+        service = Service.objects.create(
+            name="Massage", description="Relaxing massage", duration=60, price=100, category="massage"
+        )
+        self.customer = User.objects.create_user(email="customer@example.com", role="customer")
+        therapist = TherapistProfile.objects.create(
+            user=User.objects.create_user(email="therapist@example.com", role="therapist")
+        )
+        self.appointment_ids = [
+            Appointment.objects.create(
+                customer=self.customer, therapist_profile=therapist, service=service, branch=branch,
+                start_time=at(8, 9 + index), end_time=at(8, 10 + index)
+            ).id
+            for index in range(self.APPOINTMENTS)
+        ]
+
+    def retry_payments(self, seed, responses, errors):
+        generator = random.Random(seed)
+        factory = APIRequestFactory()
+        view = PaymentViewSet.as_view({'post': 'process_payment'})
+        try:
+            for appointment_id in self.appointment_ids:
+                request = factory.post('/api/v1/booking/payments/process_payment/', {
+                    'appointment_id': appointment_id, 'payment_method': 'card',
+                }, format='json', HTTP_IDEMPOTENCY_KEY=f"pay-{appointment_id}")
+                force_authenticate(request, user=self.customer)
+                # Like a client on a flaky network, resend until a response arrives
+                for attempt in range(self.RETRIES):
+                    try:
+                        response = view(request)
+                    except OperationalError:
+                        # SQLite locks whole tables instead of queueing writers
+                        time.sleep(generator.uniform(0, 0.002 * 2 ** min(attempt, 6)))
+                        continue
+                    responses.append((appointment_id, response.status_code, response.data))
+                    break
+                else:
+                    errors.append(appointment_id)
+        finally:
+            connection.close()
+
+    def test_one_payment_per_key(self):
+        responses = []
+        errors = []
+        threads = [
+            threading.Thread(target=self.retry_payments, args=(seed, responses, errors))
+            for seed in range(self.THREADS)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        attempts = self.THREADS * self.APPOINTMENTS
+        self.assertEqual(len(responses) + len(errors), attempts)
+        if connection.vendor == 'postgresql':
+            self.assertEqual(errors, [])
+
+        # Every retry that got through saw the same successful payment
+        payments = {}
+        for appointment_id, status_code, data in responses:
+            self.assertEqual(status_code, 201)
+            payments.setdefault(appointment_id, set()).add(data['payment']['id'])
+        for appointment_id in self.appointment_ids:
+            self.assertLessEqual(Payment.objects.filter(appointment_id=appointment_id).count(), 1)
+            self.assertLessEqual(Invoice.objects.filter(appointment_id=appointment_id).count(), 1)
+        for appointment_id, payment_ids in payments.items():
+            self.assertEqual(payment_ids, {Payment.objects.get(appointment_id=appointment_id).id})
+
+        logger.debug(
+            "%d payment attempts from %d threads in %.2fs (%.0f/s), %d payments, %d gave up on lock errors",
+            attempts, self.THREADS, elapsed, attempts / elapsed, Payment.objects.count(), len(errors),
+        )
+
+
+class ParallelInvoiceNumberBenchmark(TransactionTestCase):
+    """
+    Allocate invoice numbers from many concurrent checkouts and compare
+    reserving one number at a time with reserving blocks.
+    """
+
+    THREADS = 8
+    CHECKOUTS_PER_THREAD = 50
+
+    def checkout(self, allocator, branch_id, numbers):
+        try:
+            allocated = []
+            for _ in range(self.CHECKOUTS_PER_THREAD):
+                # Outside a transaction, so that SQLite reserves blocks as well
+                allocated.append(allocator.next_number(branch_id, date(2030, 5, 1)))
+            numbers.append(allocated)
+        finally:
+            connection.close()
+
+    def run_checkouts(self, block_size, branch_id):
+        allocator = InvoiceNumberAllocator(block_size=block_size)
+        numbers = []
+        threads = [
+            threading.Thread(target=self.checkout, args=(allocator, branch_id, numbers))
+            for _ in range(self.THREADS)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(len(numbers), self.THREADS)
+        for allocated in numbers:
+            # Each worker hands out increasing numbers
+            self.assertEqual(allocated, sorted(allocated))
+        flat = [number for allocated in numbers for number in allocated]
+        self.assertEqual(len(set(flat)), self.THREADS * self.CHECKOUTS_PER_THREAD)
+        return elapsed
+
+    def test_unique_numbers_under_parallel_checkouts(self):
+        checkouts = self.THREADS * self.CHECKOUTS_PER_THREAD
+        for branch_id, block_size in enumerate([1, 50], start=1):
+            elapsed = self.run_checkouts(block_size, branch_id)
+            logger.debug(
+                "%d invoice numbers from %d threads with blocks of %d in %.2fs (%.0f/s)",
+                checkouts, self.THREADS, block_size, elapsed, checkouts / elapsed,
+            )
@@ -0,0 +1,103 @@
+import io
+import shutil
+import tempfile
+import zipfile
+from datetime import date
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import override_settings
+
+from apps.booking.models import Appointment, Invoice
+from apps.booking.views import InvoiceViewSet
+from apps.core.models import User
+from apps.core.testing import EagerCeleryMixin
+from rest_framework.test import force_authenticate
+
+from .test_views import BookingViewTestCase, at
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def fake_pdf(template_name, data):
+    return f"%PDF {data.get('invoice_number')} {data.get('total')}".encode()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+@mock.patch('apps.core.pdf.render_pdf', side_effect=fake_pdf)
+class InvoiceDocumentTests(EagerCeleryMixin, BookingViewTestCase):
+    """Test cached invoice PDFs and monthly ZIP exports."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.admin = User.objects.create_user(email="admin@example.com", role="admin", is_staff=True)
+        self.invoices = []
+        for index, issue_date in enumerate([date(2030, 1, 5), date(2030, 1, 31), date(2030, 2, 1)]):
+            appointment = Appointment.objects.create(
+                customer=self.customer, therapist_profile=self.therapists[0], service=self.service,
+                branch=self.branch, start_time=at(index + 1, 9), end_time=at(index + 1, 10)
+            )
+            self.invoices.append(Invoice.objects.create(
+                customer=self.customer, appointment=appointment, invoice_number=f"INV-TEST-{index}",
+                issue_date=issue_date, items=[], subtotal=100, total=118
+            ))
+
+    def request(self, actions, path, method='get', data=None, user=None, **kwargs):
+        request = getattr(self.factory, method)(path, data, format='json' if method == 'post' else None)
+        force_authenticate(request, user=user or self.customer)
+        return InvoiceViewSet.as_view(actions)(request, **kwargs)
+
+    def download(self, invoice):
+        return self.request({'get': 'download'}, f'/invoices/{invoice.pk}/download/', pk=invoice.pk)
+
+    def test_download_renders_once_and_serves_from_storage(self, render):
+        first = self.download(self.invoices[0])
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first['Content-Type'], 'application/pdf')
+        self.assertIn('INV-TEST-0.pdf', first['Content-Disposition'])
+        self.assertEqual(b''.join(first.streaming_content), b"%PDF INV-TEST-0 118.00")
+
+        self.assertEqual(self.download(self.invoices[0]).status_code, 200)
+        self.assertEqual(render.call_count, 1)
+
+    def test_changed_invoice_is_rendered_again(self, render):
+        self.download(self.invoices[0])
+        self.invoices[0].total = 200
+        self.invoices[0].save()
+        response = self.download(self.invoices[0])
+        self.assertEqual(b''.join(response.streaming_content), b"%PDF INV-TEST-0 200.00")
+        self.assertEqual(render.call_count, 2)
+
+    def test_pending_render_is_queued_once(self, render):
+        with mock.patch('apps.core.tasks.render_document.delay') as delay:
+            responses = [self.download(self.invoices[0]) for _ in range(3)]
+        self.assertEqual([response.status_code for response in responses], [202] * 3)
+        self.assertEqual(delay.call_count, 1)
+        render.assert_not_called()
+
+    def test_monthly_export(self, render):
+        self.download(self.invoices[0])
+        response = self.request({'post': 'export'}, '/invoices/export/', 'post', {'month': '2030-01'}, self.admin)
+        self.assertEqual(response.status_code, 202)
+        export_id = response.data['export_id']
+        self.assertTrue(export_id.startswith('invoices-2030-01-'))
+        # The first invoice was already cached
+        self.assertEqual(render.call_count, 2)
+
+        response = self.request(
+            {'get': 'export_download'}, f'/invoices/exports/{export_id}/', user=self.admin, export_id=export_id
+        )
+        self.assertEqual(response.status_code, 200)
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as archive:
+            self.assertEqual(archive.namelist(), ['INV-TEST-0.pdf', 'INV-TEST-1.pdf'])
+            self.assertEqual(archive.read('INV-TEST-1.pdf'), b"%PDF INV-TEST-1 118.00")
+
+    def test_export_requires_month(self, render):
+        response = self.request({'post': 'export'}, '/invoices/export/', 'post', {'month': 'January'}, self.admin)
+        self.assertEqual(response.status_code, 400)
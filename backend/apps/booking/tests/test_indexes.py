@@ -0,0 +1,91 @@
+from datetime import date, timedelta
+
+from django.db import connection
+
+from apps.booking.models import ACTIVE_STATUSES, Appointment
+from apps.booking.scheduler import nearby_bookings
+from apps.clinic.availability import ACTIVE_APPOINTMENT_STATUSES
+from apps.core.dates import date_range_q
+from apps.core.models import User
+
+from .test_views import BookingViewTestCase, at
+
+
+class AppointmentIndexTests(BookingViewTestCase):
+    """Test that the booking lookups are answered from indexes."""
+
+    def setUp(self):
+        super().setUp()
+        customers = [self.customer] + [
+            User.objects.create_user(email=f"regular{index}@example.com", role="customer")
+            for index in range(9)
+        ]
+        statuses = ['pending', 'confirmed', 'completed', 'cancelled', 'no_show']
+        start = at(1, 9)
+        Appointment.objects.bulk_create([
+            Appointment(
+                customer=customers[index % len(customers)],
+                therapist_profile=self.therapists[index % 2], service=self.service,
+                branch=self.branch, status=statuses[index % len(statuses)],
+                start_time=start + timedelta(hours=index),
+                end_time=start + timedelta(hours=index + 1),
+            )
+            for index in range(2000)
+        ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def assertUsesIndex(self, queryset, *index_names):
+        plan = queryset.explain()
+        self.assertTrue(any(name in plan for name in index_names), plan)
+        self.assertNotIn('Seq Scan', plan)
+        for line in plan.splitlines():
+            if 'SCAN booking_appointment' in line:
+                self.assertIn('USING', line, plan)
+
+    def test_active_statuses_match_availability(self):
+        self.assertEqual(ACTIVE_STATUSES, ACTIVE_APPOINTMENT_STATUSES)
+
+    def test_conflict_check_uses_therapist_index(self):
+        bookings = nearby_bookings(self.therapists[0].id, at(20, 10), at(20, 11))
+        self.assertUsesIndex(
+            bookings, 'appointment_therapist_active', 'appointment_therapist_status'
+        )
+        self.assertNotIn('ORDER BY', bookings.explain())
+
+    def test_customer_list_uses_customer_index(self):
+        bookings = Appointment.objects.filter(customer=self.customer).order_by('-start_time')
+        self.assertUsesIndex(bookings, 'appointment_customer_start')
+
+    def test_date_range_uses_start_index(self):
+        bookings = Appointment.objects.filter(
+            date_range_q('start_time', date(2030, 1, 20), date(2030, 1, 21))
+        )
+        self.assertUsesIndex(bookings, 'appointment_start')
+        self.assertEqual(bookings.count(), 48)
+
+    def test_date_cast_is_not_sargable(self):
+        bookings = Appointment.objects.filter(start_time__date__gte=date(2030, 1, 20))
+        plan = bookings.explain()
+        if connection.vendor == 'sqlite':
+            self.assertNotIn('SEARCH', plan)
+        elif connection.vendor == 'postgresql':
+            # The ::date cast hides start_time from its indexes, so it is only ever a Filter
+            self.assertFalse(
+                any('Index Cond' in line and 'start_time' in line for line in plan.splitlines()), plan
+            )
+
+    def test_list_filters_inclusive_days(self):
+        response = self.call({'get': 'list'}, data={
+            'start_date': '2030-01-20', 'end_date': '2030-01-20'
+        })
+        self.assertEqual(response.status_code, 200)
+        results = response.data['results'] if isinstance(response.data, dict) else response.data
+        self.assertTrue(results)
+        for appointment in results:
+            self.assertTrue(appointment['start_time'].startswith('2030-01-20'))
+
+    def test_list_rejects_malformed_dates(self):
+        response = self.call({'get': 'list'}, data={'start_date': '20-01-2030'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('start_date', response.data)
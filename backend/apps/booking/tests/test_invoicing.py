@@ -0,0 +1,55 @@
+from datetime import date
+
+from django.db import connection, transaction
+from django.test import TransactionTestCase, override_settings
+
+from apps.booking.invoicing import InvoiceNumberAllocator, fiscal_year, invoice_prefix
+
+
+@override_settings(FISCAL_YEAR_START_MONTH=4)
+class InvoiceNumberTests(TransactionTestCase):
+    """Test block-reserved invoice number allocation."""
+
+    def sequence(self, prefix):
+        return InvoiceNumberAllocator().reserve(connection, prefix, 1).start
+
+    def test_fiscal_year(self):
+        self.assertEqual(fiscal_year(date(2030, 3, 31)), 2029)
+        self.assertEqual(fiscal_year(date(2030, 4, 1)), 2030)
+        self.assertEqual(invoice_prefix(7, date(2030, 4, 1)), "INV-007-2030")
+        self.assertEqual(invoice_prefix(None, date(2030, 1, 1)), "INV-000-2029")
+
+    def test_numbers_are_sequential_within_prefix(self):
+        allocator = InvoiceNumberAllocator(block_size=3)
+        start = self.sequence("INV-001-2030") + 1
+        numbers = [allocator.next_number(1, date(2030, 5, 1)) for _ in range(7)]
+        self.assertEqual(numbers, [f"INV-001-2030-{start + index:06d}" for index in range(7)])
+        self.assertEqual(numbers, sorted(numbers))
+
+    def test_prefixes_have_separate_sequences(self):
+        allocator = InvoiceNumberAllocator(block_size=5)
+        first = allocator.next_number(2, date(2030, 5, 1))
+        self.assertTrue(allocator.next_number(3, date(2030, 5, 1)).startswith("INV-003-2030-"))
+        self.assertTrue(allocator.next_number(2, date(2031, 5, 1)).startswith("INV-002-2031-"))
+        self.assertEqual(allocator.next_number(2, date(2030, 6, 1)), first[:-6] + f"{int(first[-6:]) + 1:06d}")
+
+    def test_block_is_reserved_once(self):
+        allocator = InvoiceNumberAllocator(block_size=10)
+        before = self.sequence("INV-004-2030")
+        for _ in range(10):
+            allocator.next_number(4, date(2030, 5, 1))
+        # One block of ten plus the single number reserved below
+        self.assertEqual(self.sequence("INV-004-2030"), before + 11)
+
+    def test_rolled_back_checkouts_never_cause_duplicates(self):
+        first, second = InvoiceNumberAllocator(block_size=5), InvoiceNumberAllocator(block_size=5)
+        committed = []
+        for _ in range(4):
+            with transaction.atomic():
+                first.next_number(5, date(2030, 5, 1))
+                second.next_number(5, date(2030, 5, 1))
+                transaction.set_rollback(True)
+            with transaction.atomic():
+                committed.append(first.next_number(5, date(2030, 5, 1)))
+                committed.append(second.next_number(5, date(2030, 5, 1)))
+        self.assertEqual(len(set(committed)), len(committed))
@@ -0,0 +1,90 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.test import override_settings
+
+from apps.analytics.models import ServiceAnalytics
+from apps.booking import lifecycle
+from apps.booking.models import Appointment, Payment
+from apps.core.models import JobCheckpoint
+from apps.ehr.models import TreatmentSession
+
+from .test_views import BookingViewTestCase, at
+
+
+@override_settings(APPOINTMENT_CLOSE_AFTER=timedelta(hours=2))
+class AppointmentLifecycleTests(BookingViewTestCase):
+    """Test the batched appointment lifecycle job."""
+
+    def book(self, day, hour, status='pending', therapist=0):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Appointment.objects.create(
+                customer=self.customer, therapist_profile=self.therapists[therapist], service=self.service,
+                branch=self.branch, start_time=at(day, hour), end_time=at(day, hour + 1), status=status
+            )
+
+    def status(self, appointment):
+        appointment.refresh_from_db()
+        return appointment.status
+
+    def test_overdue_appointments_are_closed(self):
+        confirmed = self.book(5, 9, status='confirmed')
+        paid = self.book(5, 10)
+        Payment.objects.create(
+            appointment=paid, amount=Decimal('80'), total_amount=Decimal('80'), status='completed'
+        )
+        missed = self.book(5, 11)
+        recent = self.book(10, 9)
+        cancelled = self.book(5, 12, status='cancelled')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            totals = lifecycle.close_overdue_appointments(now=at(10, 11))
+        self.assertEqual(totals, {'completed': 2, 'no_show': 1, 'sessions_created': 2})
+        self.assertEqual(self.status(confirmed), 'completed')
+        self.assertEqual(self.status(paid), 'completed')
+        self.assertEqual(self.status(missed), 'no_show')
+        self.assertEqual(self.status(recent), 'pending')
+        self.assertEqual(self.status(cancelled), 'cancelled')
+        self.assertEqual(
+            set(TreatmentSession.objects.values_list('appointment_id', 'status')),
+            {(confirmed.pk, 'completed'), (paid.pk, 'completed')},
+        )
+
+        # Analytics cells see the queryset updates
+        cell = ServiceAnalytics.objects.get(service=self.service, time_period=date(2030, 1, 1))
+        self.assertEqual(cell.no_show_rate, Decimal('20.00'))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            totals = lifecycle.close_overdue_appointments(now=at(10, 11))
+        self.assertEqual(totals, {'completed': 0, 'no_show': 0, 'sessions_created': 0})
+
+    def test_closing_works_in_chunks(self):
+        appointments = [self.book(day, 9, therapist=day % 2) for day in range(1, 6)]
+        with self.assertNumQueries(15):
+            totals = lifecycle.close_overdue_appointments(now=at(10, 11), batch_size=2)
+        self.assertEqual(totals['no_show'], 5)
+        for appointment in appointments:
+            self.assertEqual(self.status(appointment), 'no_show')
+
+    def test_missing_sessions_are_created_from_the_checkpoint(self):
+        first = self.book(5, 9, status='completed')
+        second = self.book(6, 9, status='completed')
+        TreatmentSession.objects.create(
+            appointment=second, customer=self.customer, therapist=self.therapists[0], service=self.service
+        )
+        third = self.book(7, 9, status='completed')
+
+        self.assertEqual(lifecycle.create_missing_sessions(now=at(20, 12), batch_size=1), 2)
+        self.assertEqual(
+            set(TreatmentSession.objects.values_list('appointment_id', flat=True)),
+            {first.pk, second.pk, third.pk},
+        )
+        checkpoint = JobCheckpoint.objects.get(name=lifecycle.SESSIONS_CHECKPOINT)
+        self.assertEqual(checkpoint.position['id'], third.pk)
+
+        # A rerun resumes after the checkpoint and only scans new completions
+        TreatmentSession.objects.filter(appointment=first).delete()
+        fourth = self.book(8, 9, status='completed')
+        self.assertEqual(lifecycle.create_missing_sessions(now=at(20, 12)), 1)
+        self.assertFalse(TreatmentSession.objects.filter(appointment=first).exists())
+        self.assertTrue(TreatmentSession.objects.filter(appointment=fourth).exists())
@@ -0,0 +1,126 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core import mail
+from django.test import override_settings
+
+from apps.booking import tasks
+from apps.booking.models import Appointment
+from apps.booking.reminders import bucket_start, dispatch_due_reminders
+from apps.core.models import User, UserSettings
+from apps.core.testing import EagerCeleryMixin
+from apps.engagement.models import Notification
+
+from .test_views import BookingViewTestCase, at
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class AppointmentReminderTests(EagerCeleryMixin, BookingViewTestCase):
+    """Test precomputed, bucketed appointment reminders."""
+
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user(email="admin@example.com", role="admin", is_staff=True)
+
+    def book(self, start_time, status='confirmed'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Appointment.objects.create(
+                customer=self.customer, therapist_profile=self.therapists[0], service=self.service,
+                branch=self.branch, start_time=start_time, end_time=start_time + timedelta(hours=1),
+                status=status
+            )
+
+    def reminders(self, appointment):
+        return Notification.objects.filter(
+            object_id=appointment.pk, notification_type='reminder'
+        ).order_by('scheduled_at')
+
+    def test_booking_schedules_bucketed_reminders(self):
+        appointment = self.book(at(8, 10, 3))
+        reminders = self.reminders(appointment)
+        self.assertEqual(
+            [reminder.scheduled_at for reminder in reminders],
+            [at(7, 10), at(8, 8)],
+        )
+        self.assertEqual({reminder.status for reminder in reminders}, {'pending'})
+        self.assertEqual({reminder.channel for reminder in reminders}, {'email'})
+        self.assertEqual(bucket_start(at(8, 8, 4)), at(8, 8))
+
+    def test_reminders_due_later_in_the_current_bucket_are_kept(self):
+        # The 2h reminder is due at 10:03, inside the 10:00 bucket that started before the booking
+        with mock.patch('django.utils.timezone.now', return_value=at(8, 10, 1)):
+            appointment = self.book(at(8, 12, 3))
+        self.assertEqual([reminder.scheduled_at for reminder in self.reminders(appointment)], [at(8, 10)])
+
+    def test_reminders_follow_user_settings(self):
+        UserSettings.objects.filter(user=self.customer).update(notification_email=False)
+        appointment = self.book(at(8, 10))
+        self.assertEqual({reminder.channel for reminder in self.reminders(appointment)}, {'in_app'})
+
+    def test_inactive_appointments_get_no_reminders(self):
+        self.assertFalse(self.reminders(self.book(at(8, 10), status='completed')).exists())
+
+    def test_reschedule_replaces_pending_reminders(self):
+        appointment = self.book(at(8, 10))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.call({'post': 'reschedule'}, method='post', user=self.admin, pk=appointment.pk, data={
+                'service_id': self.service.id, 'branch_id': self.branch.id,
+                'therapist_id': self.therapists[0].id, 'start_time': at(9, 11).isoformat(),
+            })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [reminder.scheduled_at for reminder in self.reminders(appointment)],
+            [at(8, 11), at(9, 9)],
+        )
+
+    def test_unrelated_saves_keep_reminders(self):
+        appointment = self.book(at(8, 10))
+        ids = set(self.reminders(appointment).values_list('id', flat=True))
+        with self.captureOnCommitCallbacks(execute=True):
+            appointment.notes = "Bring a towel"
+            appointment.save()
+        self.assertEqual(set(self.reminders(appointment).values_list('id', flat=True)), ids)
+
+    def test_saves_fetch_the_previous_state_once(self):
+        appointment = self.book(at(8, 10))
+        appointment.start_time = at(8, 11)
+        # Reminders and analytics share one lookup of the stored row
+        with self.assertNumQueries(2):
+            appointment.save()
+
+    def test_cancel_drops_pending_reminders(self):
+        appointment = self.book(at(8, 10))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.call({'post': 'cancel'}, method='post', user=self.admin, pk=appointment.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(self.reminders(appointment).exists())
+
+    def test_dispatch_sends_due_reminders_in_channel_batches(self):
+        appointments = [self.book(at(8, hour)) for hour in (9, 10, 11)]
+        later = self.book(at(20, 10))
+
+        with mock.patch.object(tasks.send_reminders, 'delay', wraps=tasks.send_reminders.delay) as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                queued = dispatch_due_reminders(now=at(7, 12))
+        self.assertEqual(queued, 3)
+        delay.assert_called_once()
+        self.assertEqual(len(mail.outbox), 3)
+
+        for appointment in appointments:
+            statuses = list(self.reminders(appointment).values_list('status', flat=True))
+            self.assertEqual(statuses, ['sent', 'pending'])
+        self.assertEqual(set(self.reminders(later).values_list('status', flat=True)), {'pending'})
+
+        # Nothing is claimed twice
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(dispatch_due_reminders(now=at(7, 12)), 0)
+
+    def test_reminders_of_cancelled_appointments_are_dropped_before_sending(self):
+        appointment = self.book(at(8, 10))
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            dispatch_due_reminders(now=at(7, 12))
+        Appointment.objects.filter(pk=appointment.pk).update(status='cancelled')
+        for callback in callbacks:
+            callback()
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertFalse(self.reminders(appointment).filter(status='sent').exists())
@@ -0,0 +1,101 @@
+import time
+from datetime import timedelta
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from apps.booking.models import Appointment
+from apps.booking.scheduler import TherapistAssigner, assign_and_book
+from apps.clinic.models import TherapistProfile, TherapistAvailability
+from apps.core.models import User
+
+from .test_views import BookingViewTestCase, at
+
+
+class TherapistAssignerTests(BookingViewTestCase):
+    """Test therapist ranking for automatic assignment."""
+
+    def book(self, therapist, start, end):
+        return Appointment.objects.create(
+            customer=self.customer, therapist_profile=therapist, service=self.service,
+            branch=self.branch, start_time=start, end_time=end, status='confirmed'
+        )
+
+    def test_less_loaded_therapist_is_preferred(self):
+        self.book(self.therapists[0], at(8, 9, 15), at(8, 10, 15))
+        assigner = TherapistAssigner(self.service, self.branch, at(8, 11, 45), at(8, 12, 45))
+        self.assertEqual(assigner.rank(), [self.therapists[1].id, self.therapists[0].id])
+
+    def test_busy_therapists_are_excluded(self):
+        self.book(self.therapists[0], at(8, 10, 15), at(8, 11, 15))
+        assigner = TherapistAssigner(self.service, self.branch, at(8, 10, 45), at(8, 11, 45))
+        self.assertEqual(assigner.rank(), [self.therapists[1].id])
+
+    def test_rating_breaks_ties(self):
+        TherapistProfile.objects.filter(id=self.therapists[1].id).update(average_rating=4.5)
+        assigner = TherapistAssigner(self.service, self.branch, at(8, 9, 15), at(8, 10, 15))
+        self.assertEqual(assigner.rank()[0], self.therapists[1].id)
+
+    def test_slots_that_strand_short_gaps_are_penalised(self):
+        # Both therapists carry the same load; booking therapist 0 at 11:45
+        # would strand a 30 minute gap after their 10:15 session.
+        self.book(self.therapists[0], at(8, 9, 15), at(8, 10, 15))
+        self.book(self.therapists[1], at(8, 11, 45), at(8, 12, 45))
+        assigner = TherapistAssigner(self.service, self.branch, at(8, 10, 45), at(8, 11, 45))
+        self.assertEqual(assigner.rank()[0], self.therapists[0].id)
+
+    def test_assign_and_book_falls_through_taken_therapists(self):
+        first = assign_and_book(self.service, self.branch, at(8, 9, 15), at(8, 10, 15),
+                                customer=self.customer, status='pending')
+        second = assign_and_book(self.service, self.branch, at(8, 9, 15), at(8, 10, 15),
+                                 customer=self.customer, status='pending')
+        third = assign_and_book(self.service, self.branch, at(8, 9, 15), at(8, 10, 15),
+                                customer=self.customer, status='pending')
+        self.assertNotEqual(first.therapist_profile_id, second.therapist_profile_id)
+        self.assertIsNone(third)
+
+    def test_book_appointment_without_therapist(self):
+        response = self.call({'post': 'book_appointment'}, method='post', data={
+            'service_id': self.service.id,
+            'branch_id': self.branch.id,
+            'start_time': at(8, 9, 15).isoformat(),
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(response.data['therapist_profile'], [t.id for t in self.therapists])
+
+
+class TherapistAssignerBenchmark(BookingViewTestCase):
+    """Benchmark assignment latency for a branch with many therapists."""
+
+    THERAPISTS = 60
+
+    def setUp(self):
+        super().setUp()
+        for index in range(self.THERAPISTS - len(self.therapists)):
+            user = User.objects.create_user(email=f"bench{index}@example.com", role="therapist")
+            therapist = TherapistProfile.objects.create(user=user, average_rating=index % 5)
+            therapist.branches.add(self.branch)
+            therapist.services.add(self.service)
+            TherapistAvailability.objects.create(
+                therapist=therapist, branch=self.branch,
+                start_time=at(1, 9), end_time=at(1, 18), recurrence='daily'
+            )
+            # Give everyone a partly booked day
+            for hour in range(9 + index % 3, 17, 3):
+                Appointment.objects.create(
+                    customer=self.customer, therapist_profile=therapist, service=self.service,
+                    branch=self.branch, start_time=at(8, hour, 15),
+                    end_time=at(8, hour, 15) + timedelta(minutes=60), status='confirmed'
+                )
+
+    def test_assignment_latency(self):
+        assigner = TherapistAssigner(self.service, self.branch, at(8, 13, 45), at(8, 14, 45))
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            ranked = assigner.rank()
+            elapsed = time.perf_counter() - started
+
+        # Ranking cost is independent of the number of candidates
+        self.assertEqual(len(queries), 4)
+        self.assertTrue(ranked)
+        self.assertLess(elapsed, 0.5, f"ranking {self.THERAPISTS} therapists took {elapsed:.3f}s")
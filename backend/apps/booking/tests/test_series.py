@@ -0,0 +1,121 @@
+from datetime import timedelta
+
+from apps.booking.models import Appointment
+from apps.engagement.models import Notification
+
+from .test_views import BookingViewTestCase, at
+
+
+class SeriesBookingTests(BookingViewTestCase):
+    """Test booking packages and recurring series in one request."""
+
+    def book_series(self, **data):
+        data.setdefault('service_id', self.service.id)
+        data.setdefault('branch_id', self.branch.id)
+        for field in ('start_time', 'start_times'):
+            if field in data:
+                value = data[field]
+                data[field] = [item.isoformat() for item in value] if isinstance(value, list) else value.isoformat()
+        return self.call({'post': 'book_series'}, method='post', data=data)
+
+    def booked(self):
+        return list(Appointment.objects.order_by('start_time').values_list('start_time', 'therapist_profile_id'))
+
+    def test_weekly_series_is_booked(self):
+        response = self.book_series(
+            therapist_id=self.therapists[0].id, start_time=at(8, 10), repeat='weekly', count=4
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['conflicts'], [])
+        self.assertEqual(len(response.data['appointments']), 4)
+        self.assertEqual(self.booked(), [
+            (at(day, 10), self.therapists[0].id) for day in (8, 15, 22, 29)
+        ])
+        self.assertEqual(set(Appointment.objects.values_list('status', flat=True)), {'pending'})
+        self.assertEqual(Appointment.objects.first().end_time - Appointment.objects.first().start_time,
+                         timedelta(minutes=60))
+
+    def test_query_count_does_not_grow_with_series(self):
+        with self.assertNumQueries(14):
+            self.book_series(therapist_id=self.therapists[0].id, start_time=at(1, 9, 15), repeat='daily', count=2)
+        with self.assertNumQueries(14):
+            self.book_series(therapist_id=self.therapists[0].id, start_time=at(3, 9, 15), repeat='daily', count=20)
+        self.assertEqual(Appointment.objects.count(), 22)
+
+    def test_conflicts_book_nothing_by_default(self):
+        Appointment.objects.create(
+            customer=self.customer, therapist_profile=self.therapists[0], service=self.service,
+            branch=self.branch, start_time=at(15, 10, 30), end_time=at(15, 11, 30), status='confirmed'
+        )
+        response = self.book_series(
+            therapist_id=self.therapists[0].id, start_times=[at(22, 10), at(8, 10), at(15, 10), at(29, 12, 30)]
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(
+            [(item['index'], item['start_time'], item['reason']) for item in response.data['conflicts']],
+            [
+                (2, at(15, 10), "Selected therapist is not available at this time."),
+                (3, at(29, 12, 30), "Therapist is not available during this time."),
+            ]
+        )
+        self.assertEqual(Appointment.objects.count(), 1)
+
+    def test_partial_series_books_free_items(self):
+        Appointment.objects.create(
+            customer=self.customer, therapist_profile=self.therapists[0], service=self.service,
+            branch=self.branch, start_time=at(15, 10), end_time=at(15, 11), status='confirmed'
+        )
+        response = self.book_series(
+            therapist_id=self.therapists[0].id, start_time=at(8, 10), repeat='weekly', count=3,
+            allow_partial=True
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([item['index'] for item in response.data['conflicts']], [1])
+        self.assertEqual(
+            [item['start_time'] for item in response.data['appointments']],
+            ['2030-01-08T10:00:00Z', '2030-01-22T10:00:00Z']
+        )
+
+    def test_items_must_not_overlap_each_other(self):
+        response = self.book_series(
+            therapist_id=self.therapists[0].id, start_times=[at(8, 10), at(8, 10, 30)], allow_partial=True
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([item['index'] for item in response.data['conflicts']], [1])
+
+    def test_series_goes_to_the_therapist_free_for_most_of_it(self):
+        Appointment.objects.create(
+            customer=self.customer, therapist_profile=self.therapists[0], service=self.service,
+            branch=self.branch, start_time=at(15, 10), end_time=at(15, 11), status='confirmed'
+        )
+        response = self.book_series(start_time=at(8, 10), repeat='weekly', count=3)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual({item['therapist_profile'] for item in response.data['appointments']},
+                         {self.therapists[1].id})
+
+    def test_booked_series_gets_reminders(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.book_series(
+                therapist_id=self.therapists[0].id, start_time=at(8, 10), repeat='weekly', count=2
+            )
+        self.assertEqual(
+            Notification.objects.filter(
+                object_id__in=[item['id'] for item in response.data['appointments']],
+                notification_type='reminder'
+            ).count(),
+            4
+        )
+
+    def test_series_is_validated(self):
+        self.assertEqual(self.book_series(start_time=at(8, 10)).status_code, 400)
+        self.assertEqual(self.book_series(start_times=[at(8, 10), at(8, 10)]).status_code, 400)
+        self.assertEqual(
+            self.book_series(start_time=at(8, 10), repeat='weekly', count=100).status_code, 400
+        )
+        self.assertEqual(
+            self.book_series(start_time=at(8, 10) - timedelta(days=3650), repeat='weekly', count=2).status_code,
+            400
+        )
+        self.service.available_branches.clear()
+        self.assertEqual(self.book_series(start_times=[at(8, 10)]).status_code, 400)
+        self.assertEqual(Appointment.objects.count(), 0)
@@ -0,0 +1,277 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.booking.models import Appointment, Payment, Invoice, WaitlistEntry
+from apps.booking.views import AppointmentViewSet, PaymentViewSet, InvoiceViewSet, WaitlistEntryViewSet
+from apps.clinic.models import Branch, Service, TherapistProfile, TherapistAvailability
+from apps.core.models import User
+from apps.core.testing import QueryBudgetMixin
+
+
+def at(day, hour, minute=0):
+    return datetime(2030, 1, day, hour, minute, tzinfo=dt_timezone.utc)
+
+
+class BookingViewTestCase(TestCase):
+    """Shared fixtures for booking view tests."""
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.branch = Branch.objects.create(
+            name="Main Branch", address="123 Main St", city="Pune", state="MH",
+            country="India", postal_code="411001", phone="555-123-4567"
+        )
+        self.service = Service.objects.create(
+            name="Massage", description="Relaxing massage", duration=60,
+            price=100, category="massage", preparation_time=15, cooldown_time=15
+        )
+        self.service.available_branches.add(self.branch)
+        self.customer = User.objects.create_user(
+            email="customer@example.com", first_name="Casey", last_name="Customer", role="customer"
+        )
+        self.therapists = []
+        for index in range(2):
+            user = User.objects.create_user(
+                email=f"therapist{index}@example.com", first_name="Therapist", last_name=str(index),
+                role="therapist"
+            )
+            therapist = TherapistProfile.objects.create(user=user)
+            therapist.branches.add(self.branch)
+            therapist.services.add(self.service)
+            TherapistAvailability.objects.create(
+                therapist=therapist, branch=self.branch,
+                start_time=at(1, 9), end_time=at(1, 13), recurrence='daily'
+            )
+            self.therapists.append(therapist)
+
+    def call(self, actions, method='get', data=None, user=None, **kwargs):
+        view = AppointmentViewSet.as_view(actions)
+        if method == 'get':
+            request = self.factory.get('/api/v1/booking/appointments/', data)
+        else:
+            request = getattr(self.factory, method)('/api/v1/booking/appointments/', data, format='json')
+        force_authenticate(request, user=user or self.customer)
+        return view(request, **kwargs)
+
+
+class OpenSlotsTests(BookingViewTestCase):
+    """Test the open slot search endpoint."""
+
+    def open_slots(self, **params):
+        params.setdefault('service_id', self.service.id)
+        params.setdefault('branch_id', self.branch.id)
+        return self.call({'get': 'open_slots'}, data=params)
+
+    def test_slots_honour_buffers_and_bookings(self):
+        Appointment.objects.create(
+            customer=self.customer, therapist_profile=self.therapists[0], service=self.service,
+            branch=self.branch, start_time=at(8, 10, 15), end_time=at(8, 11, 15), status='confirmed'
+        )
+        response = self.open_slots(start_date='2030-01-08', interval=15)
+        self.assertEqual(response.status_code, 200)
+        slots = {
+            item['therapist_id']: [slot['start_time'].strftime('%H:%M') for slot in item['slots']]
+            for item in response.data['therapists']
+        }
+        # 15 minutes of preparation before and cooldown after every booking
+        self.assertEqual(slots[self.therapists[0].id], ['11:45'])
+        self.assertEqual(slots[self.therapists[1].id][0], '09:15')
+        self.assertEqual(slots[self.therapists[1].id][-1], '11:45')
+
+    def test_wide_ranges_are_paged(self):
+        response = self.open_slots(start_date='2030-01-01', end_date='2030-03-31')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(str(response.data['end_date']), '2030-01-31')
+        self.assertEqual(str(response.data['next_start_date']), '2030-02-01')
+
+    def test_query_count_does_not_grow_with_range(self):
+        with self.assertNumQueries(7):
+            self.open_slots(start_date='2030-01-08')
+        with self.assertNumQueries(7):
+            self.open_slots(start_date='2030-01-01', end_date='2030-01-31')
+
+    def test_service_must_be_offered_at_branch(self):
+        self.service.available_branches.clear()
+        response = self.open_slots(start_date='2030-01-08')
+        self.assertEqual(response.status_code, 400)
+
+
+class AppointmentUpdateTests(BookingViewTestCase):
+    """Test that moving an appointment re-checks its new slot."""
+
+    def book(self, start_time):
+        return Appointment.objects.create(
+            customer=self.customer, therapist_profile=self.therapists[0], service=self.service,
+            branch=self.branch, start_time=start_time, end_time=start_time + timedelta(hours=1),
+            status='confirmed'
+        )
+
+    def move(self, appointment, start_time):
+        return self.call({'patch': 'partial_update'}, method='patch', pk=appointment.pk, data={
+            'start_time': start_time.isoformat(),
+            'end_time': (start_time + timedelta(hours=1)).isoformat(),
+        })
+
+    def test_patch_cannot_move_onto_a_taken_slot(self):
+        self.book(at(8, 9))
+        appointment = self.book(at(8, 11))
+
+        response = self.move(appointment, at(8, 9, 30))
+        self.assertEqual(response.status_code, 400)
+        appointment.refresh_from_db()
+        self.assertEqual(appointment.start_time, at(8, 11))
+
+        # Overlapping its own old slot is fine
+        response = self.move(appointment, at(8, 11, 30))
+        self.assertEqual(response.status_code, 200)
+        appointment.refresh_from_db()
+        self.assertEqual(appointment.start_time, at(8, 11, 30))
+
+
+class QueryCountTests(QueryBudgetMixin, BookingViewTestCase):
+    """Guard list and detail endpoints against N+1 query regressions."""
+
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user(email="admin@example.com", role="admin", is_staff=True)
+        second_branch = Branch.objects.create(
+            name="Second Branch", address="9 Side St", city="Pune", state="MH",
+            country="India", postal_code="411002", phone="555-987-6543"
+        )
+        self.service.available_branches.add(second_branch)
+        for therapist in self.therapists:
+            therapist.branches.add(second_branch)
+
+    def create_bookings(self, count):
+        offset = Appointment.objects.count()
+        for index in range(offset, offset + count):
+            therapist = self.therapists[index % len(self.therapists)]
+            start_time = at(10 + index, 9, 15)
+            appointment = Appointment.objects.create(
+                customer=self.customer, therapist_profile=therapist, service=self.service,
+                branch=self.branch, start_time=start_time, end_time=start_time + timedelta(hours=1)
+            )
+            Payment.objects.create(
+                appointment=appointment, amount=100, total_amount=118,
+                status='completed', payment_method='card'
+            )
+            Invoice.objects.create(
+                customer=self.customer, appointment=appointment, invoice_number=f"INV-TEST-{index}",
+                issue_date=start_time.date(), items=[], subtotal=100, total=118
+            )
+            WaitlistEntry.objects.create(
+                customer=self.customer, service=self.service, therapist_profile=therapist,
+                branch=self.branch, preferred_date=start_time.date(), position=index + 1
+            )
+
+    def count_queries(self, viewset, actions, **kwargs):
+        response, profile = self.profile_view(viewset.as_view(actions), user=self.admin, **kwargs)
+        self.assertEqual(response.status_code, 200)
+        return profile.queries
+
+    def assertConstantListQueries(self, viewset, budget):
+        self.create_bookings(1)
+        few = self.count_queries(viewset, {'get': 'list'})
+        self.create_bookings(6)
+        many = self.count_queries(viewset, {'get': 'list'})
+        self.assertEqual(few, many, f"{viewset.__name__} list queries grow with rows")
+        self.assertLessEqual(many, budget)
+
+    def test_appointment_list(self):
+        self.assertConstantListQueries(AppointmentViewSet, budget=2)
+
+    def test_appointment_detail(self):
+        self.create_bookings(1)
+        appointment = Appointment.objects.get()
+        self.assertQueryBudget(
+            AppointmentViewSet.as_view({'get': 'retrieve'}), budget=5, user=self.admin, pk=appointment.pk
+        )
+
+    def test_payment_list(self):
+        self.assertConstantListQueries(PaymentViewSet, budget=6)
+
+    def test_invoice_list(self):
+        self.assertConstantListQueries(InvoiceViewSet, budget=6)
+
+    def test_waitlist_list(self):
+        self.assertConstantListQueries(WaitlistEntryViewSet, budget=2)
+
+
+class ProcessPaymentTests(BookingViewTestCase):
+    """Test atomic, idempotent payment processing."""
+
+    def setUp(self):
+        super().setUp()
+        self.appointment = Appointment.objects.create(
+            customer=self.customer, therapist_profile=self.therapists[0], service=self.service,
+            branch=self.branch, start_time=at(8, 9), end_time=at(8, 10)
+        )
+
+    def pay(self, key=None, appointment_id=None, payment_method='card'):
+        view = PaymentViewSet.as_view({'post': 'process_payment'})
+        headers = {'HTTP_IDEMPOTENCY_KEY': key} if key else {}
+        request = self.factory.post('/api/v1/booking/payments/process_payment/', {
+            'appointment_id': appointment_id or self.appointment.id,
+            'payment_method': payment_method,
+        }, format='json', **headers)
+        force_authenticate(request, user=self.customer)
+        return view(request)
+
+    def test_payment_confirms_appointment_and_issues_invoice(self):
+        response = self.pay()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['payment']['total_amount'], '118.00')
+        self.appointment.refresh_from_db()
+        self.assertEqual(self.appointment.status, 'confirmed')
+        invoice = Invoice.objects.get()
+        self.assertEqual(invoice.total, Payment.objects.get().total_amount)
+        self.assertRegex(invoice.invoice_number, rf"^INV-{self.branch.id:03d}-\d{{4}}-\d{{6}}$")
+
+    def test_retry_with_same_key_replays_response(self):
+        first = self.pay(key="retry-1")
+        second = self.pay(key="retry-1")
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(second.data['payment']['id'], first.data['payment']['id'])
+        self.assertEqual(Payment.objects.count(), 1)
+        self.assertEqual(Invoice.objects.count(), 1)
+
+    def test_retry_without_key_is_rejected_as_paid(self):
+        self.pay()
+        response = self.pay()
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Payment.objects.count(), 1)
+
+    def test_key_reused_for_different_request(self):
+        self.pay(key="reused")
+        response = self.pay(key="reused", payment_method='cash')
+        self.assertEqual(response.status_code, 422)
+
+    def test_failure_rolls_back_payment_and_key(self):
+        with mock.patch.object(Invoice.objects, 'create', side_effect=RuntimeError("invoice down")):
+            with self.assertRaises(RuntimeError):
+                self.pay(key="flaky")
+        self.assertFalse(Payment.objects.exists())
+        self.appointment.refresh_from_db()
+        self.assertEqual(self.appointment.status, 'pending')
+
+        response = self.pay(key="flaky")
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', response)
+
+    def test_key_adds_constant_query_overhead(self):
+        second = Appointment.objects.create(
+            customer=self.customer, therapist_profile=self.therapists[1], service=self.service,
+            branch=self.branch, start_time=at(8, 9), end_time=at(8, 10)
+        )
+        with CaptureQueriesContext(connection) as plain:
+            self.pay(appointment_id=second.id)
+        with CaptureQueriesContext(connection) as keyed:
+            self.pay(key="overhead")
+        # The key lookup and insert, plus the savepoint that wraps them in tests
+        self.assertLessEqual(len(keyed), len(plain) + 4)
@@ -0,0 +1,122 @@
+from django.test import override_settings
+from rest_framework.test import force_authenticate
+
+from apps.booking.models import Appointment, WaitlistEntry
+from apps.booking.views import WaitlistEntryViewSet
+from apps.core.models import User
+from apps.core.testing import EagerCeleryMixin
+from apps.engagement.models import Notification
+
+from .test_views import BookingViewTestCase, at
+
+
+class WaitlistTests(EagerCeleryMixin, BookingViewTestCase):
+    """Test waitlist queues and promotion into cancelled slots."""
+
+    def setUp(self):
+        super().setUp()
+        self.others = [
+            User.objects.create_user(email=f"waiting{index}@example.com", role="customer")
+            for index in range(3)
+        ]
+        self.admin = User.objects.create_user(email="admin@example.com", role="admin", is_staff=True)
+
+    def join(self, user, **data):
+        payload = {
+            'service': self.service.id, 'branch': self.branch.id, 'preferred_date': '2030-01-08',
+        }
+        payload.update(data)
+        request = self.factory.post('/api/v1/booking/waitlist/', payload, format='json')
+        force_authenticate(request, user=user)
+        return WaitlistEntryViewSet.as_view({'post': 'create'})(request)
+
+    def waitlist_action(self, actions, user, method='get', **kwargs):
+        request = getattr(self.factory, method)('/api/v1/booking/waitlist/')
+        force_authenticate(request, user=user)
+        return WaitlistEntryViewSet.as_view(actions)(request, **kwargs)
+
+    def test_positions_follow_join_order(self):
+        responses = [self.join(user) for user in self.others]
+        self.assertEqual([response.data['position'] for response in responses], [1, 2, 3])
+        keys = list(WaitlistEntry.objects.order_by('id').values_list('position', flat=True))
+        self.assertEqual(keys, sorted(set(keys)))
+
+    def test_cancel_does_not_rewrite_later_entries(self):
+        entries = [self.join(user).data['id'] for user in self.others]
+        before = dict(WaitlistEntry.objects.values_list('id', 'updated_at'))
+
+        with self.assertNumQueries(2):
+            response = self.waitlist_action({'post': 'cancel'}, self.others[0], method='post', pk=entries[0])
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.data['position'])
+        after = dict(WaitlistEntry.objects.values_list('id', 'updated_at'))
+        self.assertEqual(after[entries[2]], before[entries[2]])
+
+        response = self.waitlist_action({'get': 'retrieve'}, self.others[2], pk=entries[2])
+        self.assertEqual(response.data['position'], 2)
+
+    def test_only_the_customer_or_an_admin_can_cancel(self):
+        entries = [self.join(user).data['id'] for user in self.others]
+        therapist = self.therapists[0].user
+        WaitlistEntry.objects.filter(pk=entries[0]).update(therapist_profile=self.therapists[0])
+
+        # Other customers cannot see the entry, its therapist cannot cancel it
+        response = self.waitlist_action({'post': 'cancel'}, self.others[1], method='post', pk=entries[0])
+        self.assertEqual(response.status_code, 404)
+        response = self.waitlist_action({'post': 'cancel'}, therapist, method='post', pk=entries[0])
+        self.assertEqual(response.status_code, 403)
+
+        response = self.waitlist_action({'post': 'cancel'}, self.others[0], method='post', pk=entries[0])
+        self.assertEqual(response.status_code, 200)
+        response = self.waitlist_action({'post': 'cancel'}, self.admin, method='post', pk=entries[1])
+        self.assertEqual(response.status_code, 200)
+
+    def test_customers_gain_no_rights_over_their_appointments(self):
+        # Being an appointment's customer is not ownership for IsOwnerOrAdmin
+        appointment = Appointment.objects.create(
+            customer=self.customer, therapist_profile=self.therapists[0], service=self.service,
+            branch=self.branch, start_time=at(8, 10), end_time=at(8, 11), status='confirmed'
+        )
+        response = self.call({'post': 'cancel'}, method='post', user=self.customer, pk=appointment.pk)
+        self.assertEqual(response.status_code, 403)
+
+    def test_therapist_queue_counts_its_own_entries(self):
+        self.join(self.others[0])
+        response = self.join(self.others[1], therapist_profile=self.therapists[0].id)
+        self.assertEqual(response.data['position'], 1)
+        self.assertEqual(self.join(self.others[2]).data['position'], 3)
+
+    def test_rejects_malformed_time_slots(self):
+        response = self.join(self.others[0], preferred_time_slots=['morning'])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('preferred_time_slots', response.data)
+
+    @override_settings(WAITLIST_PROMOTION_BATCH=2)
+    def test_cancellation_promotes_matching_entries(self):
+        appointment = Appointment.objects.create(
+            customer=self.customer, therapist_profile=self.therapists[0], service=self.service,
+            branch=self.branch, start_time=at(8, 10), end_time=at(8, 11), status='confirmed'
+        )
+        evening = self.join(self.others[0], preferred_time_slots=['17:00-19:00']).data['id']
+        other_therapist = self.join(self.others[1], therapist_profile=self.therapists[1].id).data['id']
+        morning = self.join(self.others[2], preferred_time_slots=[{'start': '09:00', 'end': '12:00'}]).data['id']
+        anytime = self.join(self.others[0]).data['id']
+        last = self.join(self.others[1]).data['id']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.call({'post': 'cancel'}, method='post', user=self.admin, pk=appointment.pk)
+        self.assertEqual(response.status_code, 200)
+
+        statuses = dict(WaitlistEntry.objects.values_list('id', 'status'))
+        self.assertEqual(statuses[morning], 'notified')
+        self.assertEqual(statuses[anytime], 'notified')
+        self.assertEqual(statuses[evening], 'active')
+        self.assertEqual(statuses[other_therapist], 'active')
+        self.assertEqual(statuses[last], 'active')
+
+        notifications = Notification.objects.order_by('user__email')
+        self.assertEqual(
+            [notification.user for notification in notifications], [self.others[0], self.others[2]]
+        )
+        self.assertEqual(notifications[0].object_id, appointment.pk)
+        self.assertEqual(notifications[0].metadata, {'waitlist_entry': anytime})
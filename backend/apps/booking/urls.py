@@ -9,5 +9,7 @@ router.register('invoices', views.InvoiceViewSet, basename='invoice')
 router.register('waitlist', views.WaitlistEntryViewSet, basename='waitlist')
 
 urlpatterns = [
+    path('calendar/', views.CalendarFeedLinksView.as_view(), name='calendar-feeds'),
+    path('calendar/<str:token>.ics', views.CalendarFeedView.as_view(), name='calendar-feed'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -1,20 +1,57 @@
 from rest_framework import viewsets, permissions, filters, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
+from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q
+from celery.result import AsyncResult
+from django.core import signing
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.http import FileResponse, Http404, StreamingHttpResponse
+from django.urls import reverse
 from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django.views import View
+from datetime import datetime, time, timedelta
+from decimal import Decimal
 import uuid
 
 from .models import Appointment, Payment, Invoice, WaitlistEntry
 from .serializers import (
     AppointmentSerializer, 
+    AppointmentListSerializer,
     PaymentSerializer,
     InvoiceSerializer, 
     WaitlistEntrySerializer,
-    AppointmentBookingSerializer
+    AppointmentBookingSerializer,
+    OpenSlotsQuerySerializer,
+    SeriesBookingSerializer
 )
-from apps.core.permissions import IsAdminUser, IsTherapist, IsCustomer, IsOwnerOrAdmin
+from .calendar import (
+    can_read_feed, feed_appointments, feed_links, feed_name, feed_token, feed_version,
+    read_feed_token, render_feed
+)
+from .documents import export_path, invoice_pdf_response
+from .invoicing import next_invoice_number
+from .scheduler import (
+    assign_and_book,
+    book_series,
+    booking_lock,
+    busy_window,
+    move_appointment,
+    reserve_appointment,
+    slot_is_taken
+)
+from .tasks import export_invoices
+from .waitlist import next_position, promote_freed_slot, with_queue_position
+from apps.clinic.availability import AvailabilityEngine
+from apps.clinic.models import TherapistProfile
+from apps.core.dates import date_range_q
+from apps.core.idempotency import idempotent
+from apps.core.pagination import KeysetPagination
+from apps.core.permissions import IsAdminUser, IsTherapist, IsCustomer, IsCustomerOrAdmin, IsOwnerOrAdmin
 
 
 class AppointmentViewSet(viewsets.ModelViewSet):
@@ -25,6 +62,8 @@ class AppointmentViewSet(viewsets.ModelViewSet):
     filterset_fields = ['status', 'service', 'branch', 'therapist_profile']
     search_fields = ['customer__first_name', 'customer__last_name', 'customer__email', 'notes']
     ordering_fields = ['start_time', 'end_time', 'created_at']
+    ordering = ['-start_time']
+    pagination_class = KeysetPagination
     
     def get_queryset(self):
         queryset = Appointment.objects.all()
@@ -41,18 +80,22 @@ class AppointmentViewSet(viewsets.ModelViewSet):
                 return Appointment.objects.none()
         
         # Filter by date range
-        start_date = self.request.query_params.get('start_date')
-        end_date = self.request.query_params.get('end_date')
-        
-        if start_date:
-            queryset = queryset.filter(start_time__date__gte=start_date)
-        if end_date:
-            queryset = queryset.filter(start_time__date__lte=end_date)
+        queryset = queryset.filter(date_range_q(
+            'start_time',
+            self.request.query_params.get('start_date'),
+            self.request.query_params.get('end_date')
+        ))
             
+        queryset = self.get_serializer_class().setup_eager_loading(queryset)
         return queryset.order_by('-start_time')
     
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return AppointmentListSerializer
+        return AppointmentSerializer
+    
     def get_permissions(self):
-        if self.action == 'create' or self.action == 'book_appointment':
+        if self.action in ['create', 'book_appointment', 'book_series', 'open_slots']:
             permission_classes = [permissions.IsAuthenticated]
         elif self.action in ['cancel', 'reschedule']:
             permission_classes = [permissions.IsAuthenticated, IsOwnerOrAdmin]
@@ -63,7 +106,37 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         return [permission() for permission in permission_classes]
     
     def perform_create(self, serializer):
-        serializer.save(customer=self.request.user)
+        therapist_profile = serializer.validated_data['therapist_profile']
+        busy_start, busy_end = busy_window(
+            serializer.validated_data['service'],
+            serializer.validated_data['start_time'],
+            serializer.validated_data['end_time']
+        )
+        
+        # Re-check under the therapist's booking lock so concurrent requests cannot double book
+        with booking_lock(therapist_profile.id, busy_start, busy_end):
+            if slot_is_taken(therapist_profile.id, busy_start, busy_end):
+                raise ValidationError("Selected time slot is not available for this therapist.")
+            serializer.save(customer=self.request.user)
+    
+    def perform_update(self, serializer):
+        appointment = serializer.instance
+        data = serializer.validated_data
+        if not {'therapist_profile', 'service', 'start_time', 'end_time'} & set(data):
+            serializer.save()
+            return
+        therapist_profile = data.get('therapist_profile', appointment.therapist_profile)
+        busy_start, busy_end = busy_window(
+            data.get('service', appointment.service),
+            data.get('start_time', appointment.start_time),
+            data.get('end_time', appointment.end_time)
+        )
+        
+        # Moves are re-checked under the booking lock too, ignoring the appointment's own slot
+        with booking_lock(therapist_profile.id, busy_start, busy_end):
+            if slot_is_taken(therapist_profile.id, busy_start, busy_end, exclude_appointment=appointment.pk):
+                raise ValidationError("Selected time slot is not available for this therapist.")
+            serializer.save()
     
     @action(detail=False, methods=['post'])
     def book_appointment(self, request):
@@ -78,21 +151,31 @@ class AppointmentViewSet(viewsets.ModelViewSet):
         end_time = serializer.validated_data['end_time']
         notes = serializer.validated_data.get('notes', '')
         
-        # Get therapist if specified, otherwise find an available one
+        # Get therapist if specified, otherwise assign the best available one
         if 'therapist_profile' in serializer.validated_data:
             therapist_profile = serializer.validated_data['therapist_profile']
         else:
-            # Find available therapist logic would go here
-            # For now, return an error if no therapist specified
+            appointment = assign_and_book(
+                service, branch, start_time, end_time,
+                customer=request.user,
+                status='pending',
+                notes=notes
+            )
+            if appointment is None:
+                return Response(
+                    {"error": "No therapist is available at this time, please choose another slot"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
             return Response(
-                {"error": "Automatic therapist assignment not implemented, please select a therapist"},
-                status=status.HTTP_400_BAD_REQUEST
+                AppointmentSerializer(appointment).data,
+                status=status.HTTP_201_CREATED
             )
         
-        # Create the appointment
-        appointment = Appointment.objects.create(
+        # Create the appointment, re-checking the slot under the therapist's booking lock
+        busy_start, busy_end = busy_window(service, start_time, end_time)
+        appointment = reserve_appointment(
+            therapist_profile.id, busy_start, busy_end,
             customer=request.user,
-            therapist_profile=therapist_profile,
             service=service,
             branch=branch,
             start_time=start_time,
@@ -100,6 +183,11 @@ class AppointmentViewSet(viewsets.ModelViewSet):
             status='pending',
             notes=notes
         )
+        if appointment is None:
+            return Response(
+                {"error": "Selected therapist is no longer available at this time."},
+                status=status.HTTP_409_CONFLICT
+            )
         
         # Return the created appointment
         return Response(
@@ -107,6 +195,99 @@ class AppointmentViewSet(viewsets.ModelViewSet):
             status=status.HTTP_201_CREATED
         )
     
+    @action(detail=False, methods=['post'])
+    @idempotent
+    def book_series(self, request):
+        """Book a package or recurring series of appointments in one request."""
+        serializer = SeriesBookingSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        start_times = serializer.validated_data['start_times']
+        therapist_profile = serializer.validated_data.get('therapist_profile')
+        appointments, conflicts = book_series(
+            serializer.validated_data['service'],
+            serializer.validated_data['branch'],
+            start_times,
+            therapist_id=therapist_profile.id if therapist_profile else None,
+            allow_partial=serializer.validated_data['allow_partial'],
+            customer=request.user,
+            status='pending',
+            notes=serializer.validated_data.get('notes', '')
+        )
+        conflicts = [
+            {'index': index, 'start_time': start_times[index], 'reason': reason}
+            for index, reason in sorted(conflicts.items())
+        ]
+        if not appointments:
+            return Response(
+                {"error": "The series could not be booked.", "conflicts": conflicts},
+                status=status.HTTP_409_CONFLICT
+            )
+        
+        return Response({
+            'appointments': AppointmentListSerializer(
+                AppointmentListSerializer.setup_eager_loading(
+                    Appointment.objects.filter(pk__in=[appointment.pk for appointment in appointments])
+                ).order_by('start_time'),
+                many=True
+            ).data,
+            'conflicts': conflicts
+        }, status=status.HTTP_201_CREATED)
+    
+    @action(detail=False, methods=['get'])
+    def open_slots(self, request):
+        """List bookable start times for every qualified therapist."""
+        serializer = OpenSlotsQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        
+        service = serializer.validated_data['service']
+        branch = serializer.validated_data['branch']
+        start_date = serializer.validated_data['start_date']
+        end_date = serializer.validated_data['end_date']
+        therapist_id = serializer.validated_data.get('therapist_id')
+        
+        # Therapists who work at the branch and offer the service
+        therapists = TherapistProfile.objects.filter(
+            branches=branch, services=service, is_active=True
+        )
+        if therapist_id:
+            therapists = therapists.filter(id=therapist_id)
+        therapists = list(therapists.values('id', 'user__first_name', 'user__last_name'))
+        
+        # Never offer slots in the past
+        window_start = max(
+            timezone.make_aware(datetime.combine(start_date, time.min)), timezone.now()
+        )
+        window_end = timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min))
+        engine = AvailabilityEngine(window_start, window_end, branch=branch, service=service)
+        engine.load([therapist['id'] for therapist in therapists])
+        
+        duration = timedelta(minutes=service.duration)
+        step = timedelta(minutes=serializer.validated_data.get('interval') or service.duration)
+        before = timedelta(minutes=service.preparation_time)
+        after = timedelta(minutes=service.cooldown_time)
+        
+        results = []
+        for therapist in therapists:
+            slots = engine.free_slots(therapist['id'], duration, step, before, after)
+            results.append({
+                'therapist_id': therapist['id'],
+                'therapist_name': f"{therapist['user__first_name']} {therapist['user__last_name']}".strip(),
+                'slots': [
+                    {'start_time': slot, 'end_time': slot + duration}
+                    for slot in slots
+                ]
+            })
+        
+        return Response({
+            'service': service.id,
+            'branch': branch.id,
+            'start_date': start_date,
+            'end_date': end_date,
+            'next_start_date': serializer.validated_data['next_start_date'],
+            'therapists': results
+        })
+    
     @action(detail=True, methods=['post'])
     def cancel(self, request, pk=None):
         """Cancel an appointment."""
@@ -119,9 +300,11 @@ class AppointmentViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Update the status
-        appointment.status = 'cancelled'
-        appointment.save()
+        with transaction.atomic():
+            appointment.status = 'cancelled'
+            appointment.save()
+            # Offer the freed time to the waitlist
+            promote_freed_slot(appointment)
         
         # Return the updated appointment
         return Response(
@@ -142,19 +325,29 @@ class AppointmentViewSet(viewsets.ModelViewSet):
             )
         
         # Validate new time
-        serializer = AppointmentBookingSerializer(data=request.data)
+        serializer = AppointmentBookingSerializer(data=request.data, context={'appointment': appointment})
         serializer.is_valid(raise_exception=True)
         
-        # Update appointment fields
-        appointment.start_time = serializer.validated_data['start_time']
-        appointment.end_time = serializer.validated_data['end_time']
-        
         # Update therapist if changed
-        if 'therapist_profile' in serializer.validated_data:
-            appointment.therapist_profile = serializer.validated_data['therapist_profile']
+        therapist_profile = serializer.validated_data.get('therapist_profile', appointment.therapist_profile)
         
-        appointment.status = 'pending'  # Reset to pending for re-confirmation
-        appointment.save()
+        # Move the appointment under the therapist's booking lock
+        busy_start, busy_end = busy_window(
+            serializer.validated_data['service'],
+            serializer.validated_data['start_time'],
+            serializer.validated_data['end_time']
+        )
+        moved = move_appointment(
+            appointment, therapist_profile.id, busy_start, busy_end,
+            start_time=serializer.validated_data['start_time'],
+            end_time=serializer.validated_data['end_time'],
+            status='pending'  # Reset to pending for re-confirmation
+        )
+        if not moved:
+            return Response(
+                {"error": "Selected time slot is no longer available."},
+                status=status.HTTP_409_CONFLICT
+            )
         
         # Return the updated appointment
         return Response(
@@ -185,20 +378,29 @@ class PaymentViewSet(viewsets.ModelViewSet):
             except:
                 return Payment.objects.none()
                 
+        queryset = self.get_serializer_class().setup_eager_loading(queryset)
         return queryset.order_by('-created_at')
     
     def get_permissions(self):
         if self.action in ['list', 'retrieve']:
             permission_classes = [permissions.IsAuthenticated]
-        elif self.action in ['create', 'update', 'partial_update']:
+        elif self.action in ['create', 'update', 'partial_update', 'process_payment']:
             permission_classes = [permissions.IsAuthenticated & (IsAdminUser | IsCustomer)]
         else:
             permission_classes = [IsAdminUser]
         return [permission() for permission in permission_classes]
     
     @action(detail=False, methods=['post'])
+    @idempotent
     def process_payment(self, request):
-        """Process a payment for an appointment."""
+        """
+        Process a payment for an appointment.
+
+        The payment, the appointment confirmation and the invoice are written
+        in one transaction while the appointment row is locked, so concurrent
+        attempts cannot pay an appointment twice. Clients should send an
+        Idempotency-Key header so that retries replay the first response.
+        """
         # This would integrate with Stripe/Razorpay in production
         # For now, just simulate a payment
         
@@ -211,8 +413,17 @@ class PaymentViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        try:
-            appointment = Appointment.objects.get(id=appointment_id)
+        with transaction.atomic():
+            try:
+                # Concurrent payments for the appointment queue up on this lock
+                appointment = Appointment.objects.select_for_update(of=('self',)).select_related(
+                    'customer', 'service'
+                ).get(id=appointment_id)
+            except Appointment.DoesNotExist:
+                return Response(
+                    {"error": "Appointment not found"},
+                    status=status.HTTP_404_NOT_FOUND
+                )
             
             # Check if user is authorized to make payment
             if not request.user.is_staff and not request.user.role == 'admin' and appointment.customer != request.user:
@@ -230,8 +441,8 @@ class PaymentViewSet(viewsets.ModelViewSet):
                 
             # Calculate amounts
             amount = appointment.service.price
-            tax_rate = 0.18  # 18% tax
-            tax_amount = amount * tax_rate
+            tax_rate = Decimal('0.18')  # 18% tax
+            tax_amount = (amount * tax_rate).quantize(Decimal('0.01'))
             total_amount = amount + tax_amount
             
             # Create payment
@@ -249,15 +460,15 @@ class PaymentViewSet(viewsets.ModelViewSet):
             
             # Update appointment status
             appointment.status = 'confirmed'
-            appointment.save()
+            appointment.save(update_fields=['status', 'updated_at'])
             
             # Generate invoice
-            invoice_number = f"INV-{timezone.now().strftime('%Y%m%d')}-{uuid.uuid4().hex[:6]}"
+            issue_date = timezone.localdate()
             invoice = Invoice.objects.create(
                 customer=appointment.customer,
                 appointment=appointment,
-                invoice_number=invoice_number,
-                issue_date=timezone.now().date(),
+                invoice_number=next_invoice_number(appointment.branch_id, issue_date),
+                issue_date=issue_date,
                 items=[{
                     "service": appointment.service.name,
                     "description": appointment.service.description,
@@ -273,18 +484,12 @@ class PaymentViewSet(viewsets.ModelViewSet):
                 status='paid',
                 terms="Thank you for your business!"
             )
-            
-            return Response({
-                "payment": PaymentSerializer(payment).data,
-                "invoice": InvoiceSerializer(invoice).data,
-                "message": "Payment processed successfully"
-            }, status=status.HTTP_201_CREATED)
-            
-        except Appointment.DoesNotExist:
-            return Response(
-                {"error": "Appointment not found"},
-                status=status.HTTP_404_NOT_FOUND
-            )
+        
+        return Response({
+            "payment": PaymentSerializer(payment).data,
+            "invoice": InvoiceSerializer(invoice).data,
+            "message": "Payment processed successfully"
+        }, status=status.HTTP_201_CREATED)
 
 
 class InvoiceViewSet(viewsets.ModelViewSet):
@@ -310,6 +515,7 @@ class InvoiceViewSet(viewsets.ModelViewSet):
             except:
                 return Invoice.objects.none()
                 
+        queryset = self.get_serializer_class().setup_eager_loading(queryset)
         return queryset.order_by('-issue_date')
     
     def get_permissions(self):
@@ -319,17 +525,63 @@ class InvoiceViewSet(viewsets.ModelViewSet):
             permission_classes = [IsAdminUser]
         return [permission() for permission in permission_classes]
     
+    def perform_create(self, serializer):
+        """Number the invoice from its branch's sequence unless a number was given."""
+        if serializer.validated_data.get('invoice_number'):
+            serializer.save()
+            return
+        appointment = serializer.validated_data.get('appointment')
+        serializer.save(invoice_number=next_invoice_number(
+            appointment.branch_id if appointment else None, serializer.validated_data['issue_date']
+        ))
+    
     @action(detail=True, methods=['get'])
     def download(self, request, pk=None):
-        """Download invoice as PDF."""
-        invoice = self.get_object()
+        """
+        Download the invoice as PDF.
+
+        Answers 202 while the PDF is being rendered; retry until it is served.
+        """
+        return invoice_pdf_response(self.get_object())
+    
+    @action(detail=False, methods=['post'])
+    def export(self, request):
+        """Queue a ZIP of the PDFs of every invoice issued in a month (YYYY-MM)."""
+        try:
+            month = datetime.strptime(request.data.get('month', ''), '%Y-%m')
+        except ValueError:
+            return Response(
+                {"error": "month is required in YYYY-MM format"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        # In a real app, we would generate a PDF here using WeasyPrint
-        # For now, just return the invoice data
+        export_id = f"invoices-{month:%Y-%m}-{uuid.uuid4().hex[:12]}"
+        export_invoices.apply_async((export_id, month.year, month.month), task_id=export_id)
         return Response({
-            "message": "PDF generation would happen here",
-            "invoice": InvoiceSerializer(invoice).data
-        })
+            "export_id": export_id,
+            "status": "queued"
+        }, status=status.HTTP_202_ACCEPTED)
+    
+    @action(detail=False, methods=['get'], url_path=r'exports/(?P<export_id>[\w-]+)')
+    def export_download(self, request, export_id=None):
+        """Download a finished invoice export, or get its status while it is built."""
+        path = export_path(export_id)
+        if default_storage.exists(path):
+            return FileResponse(
+                default_storage.open(path, 'rb'), as_attachment=True,
+                filename=f"{export_id}.zip", content_type='application/zip'
+            )
+        
+        state = AsyncResult(export_id).state
+        if state == 'FAILURE':
+            return Response(
+                {"export_id": export_id, "status": "failed"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+        return Response({
+            "export_id": export_id,
+            "status": state.lower()
+        }, status=status.HTTP_202_ACCEPTED)
 
 
 class WaitlistEntryViewSet(viewsets.ModelViewSet):
@@ -354,37 +606,25 @@ class WaitlistEntryViewSet(viewsets.ModelViewSet):
             except:
                 return WaitlistEntry.objects.none()
                 
-        return queryset.order_by('position', 'created_at')
+        queryset = self.get_serializer_class().setup_eager_loading(queryset)
+        return with_queue_position(queryset).order_by('position', 'id')
     
     def get_permissions(self):
         if self.action in ['list', 'retrieve', 'create']:
             permission_classes = [permissions.IsAuthenticated]
         elif self.action in ['update', 'partial_update', 'cancel']:
-            permission_classes = [permissions.IsAuthenticated & (IsAdminUser | IsOwnerOrAdmin)]
+            permission_classes = [permissions.IsAuthenticated, IsCustomerOrAdmin]
         else:
             permission_classes = [IsAdminUser]
         return [permission() for permission in permission_classes]
     
     def perform_create(self, serializer):
         """Override create to set position and customer."""
-        
-        # Set the customer to the current user
-        customer = self.request.user
-        
-        # Get the position (count of active waitlist entries + 1)
         service = serializer.validated_data.get('service')
         branch = serializer.validated_data.get('branch')
-        therapist_profile = serializer.validated_data.get('therapist_profile')
-        
-        # Build filters for counting position
-        filters = Q(service=service, branch=branch, status='active')
-        if therapist_profile:
-            filters &= Q(therapist_profile=therapist_profile)
-            
-        position = WaitlistEntry.objects.filter(filters).count() + 1
-        
-        # Save the entry
-        serializer.save(customer=customer, position=position)
+        entry = serializer.save(customer=self.request.user, position=next_position(service, branch))
+        # Render the entry with its place in the queue
+        serializer.instance = with_queue_position(WaitlistEntry.objects.filter(pk=entry.pk)).get()
         
     @action(detail=True, methods=['post'])
     def cancel(self, request, pk=None):
@@ -398,31 +638,62 @@ class WaitlistEntryViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Update the status
+        # Later entries move up without being rewritten, see apps.booking.waitlist
         entry.status = 'cancelled'
-        entry.save()
-        
-        # Update positions for other entries
-        service = entry.service
-        branch = entry.branch
-        therapist_profile = entry.therapist_profile
-        
-        # Build filters for updating positions
-        filters = Q(service=service, branch=branch, status='active')
-        if therapist_profile:
-            filters &= Q(therapist_profile=therapist_profile)
-            
-        # Get entries with higher position and decrement them
-        entries_to_update = WaitlistEntry.objects.filter(
-            filters, position__gt=entry.position
-        )
-        
-        for e in entries_to_update:
-            e.position -= 1
-            e.save()
+        entry.save(update_fields=['status', 'updated_at'])
+        entry.queue_position = None
         
         # Return the updated entry
         return Response(
             WaitlistEntrySerializer(entry).data,
             status=status.HTTP_200_OK
-        )
\ No newline at end of file
+        )
+
+
+class CalendarFeedLinksView(APIView):
+    """List the calendar feed URLs the current user can subscribe to."""
+
+    def get(self, request):
+        return Response([
+            {
+                'kind': kind,
+                'id': object_id,
+                'name': name,
+                'url': request.build_absolute_uri(
+                    reverse('calendar-feed', kwargs={'token': feed_token(request.user, kind, object_id)})
+                ),
+            }
+            for kind, object_id, name in feed_links(request.user)
+        ])
+
+
+class CalendarFeedView(View):
+    """
+    Stream an iCalendar feed addressed by a signed token.
+
+    Answers 304 when the client's ETag or Last-Modified still matches the
+    feed's appointments.
+    """
+
+    def get(self, request, token):
+        try:
+            user, kind, object_id = read_feed_token(token)
+        except signing.BadSignature:
+            raise Http404("Unknown calendar feed")
+        if not can_read_feed(user, kind, object_id):
+            raise Http404("Unknown calendar feed")
+
+        last_modified, etag = feed_version(feed_appointments(kind, object_id))
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = StreamingHttpResponse(
+                render_feed(kind, object_id, feed_name(kind, object_id), request.get_host().split(':')[0]),
+                content_type='text/calendar; charset=utf-8',
+            )
+            response['Content-Disposition'] = f'inline; filename="{kind}-{object_id}.ics"'
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
@@ -0,0 +1,136 @@
+"""
+Waitlist queues and promotion of waitlisters into freed slots.
+
+A queue is the active entries for a service at a branch, narrowed to one
+therapist when the entry asks for one. Entries are ordered by ``position``,
+a sort key handed out per service and branch in steps of ``POSITION_GAP``
+and never renumbered, with the id breaking ties between entries created at
+the same moment.
+Leaving a queue therefore touches only the entry that leaves, and an
+entry's place in its queue is counted when it is read.
+
+When an appointment is cancelled, ``promote_freed_slot`` picks the first
+active entries waiting for that service, branch and day whose preferred
+time slots cover the freed start time, marks them notified and queues
+their notifications for after the commit.
+"""
+from datetime import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, Count, IntegerField, Max, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import WaitlistEntry
+
+POSITION_GAP = 1024
+
+
+def next_position(service, branch):
+    """
+    Sort key placing a new entry at the back of its queue.
+
+    Keys are shared by every therapist's queue for the service and branch,
+    so entries from different queues compare in the order they joined.
+    """
+    last = WaitlistEntry.objects.filter(
+        service=service, branch=branch
+    ).aggregate(last=Max('position'))['last']
+    return (last or 0) + POSITION_GAP
+
+
+def _entries_ahead(*conditions):
+    ahead = WaitlistEntry.objects.filter(
+        Q(position__lt=OuterRef('position')) | Q(position=OuterRef('position'), id__lt=OuterRef('id')),
+        *conditions,
+        service=OuterRef('service'), branch=OuterRef('branch'), status='active',
+    ).order_by().values('service').annotate(count=Count('id')).values('count')
+    return Coalesce(Subquery(ahead), Value(0))
+
+
+def with_queue_position(queryset):
+    """Annotate active entries with their 1-based place in their queue."""
+    return queryset.annotate(queue_position=Case(
+        When(status='active', position__isnull=False, therapist_profile__isnull=True,
+             then=_entries_ahead() + 1),
+        When(status='active', position__isnull=False,
+             then=_entries_ahead(Q(therapist_profile=OuterRef('therapist_profile'))) + 1),
+        default=None,
+        output_field=IntegerField(),
+    ))
+
+
+def parse_time_slot(slot):
+    """
+    Parse a preferred time slot into a (start, end) pair of times.
+
+    Slots are ``"HH:MM-HH:MM"`` strings or ``{"start": "HH:MM", "end": "HH:MM"}``.
+    Raises ValueError for anything else.
+    """
+    if isinstance(slot, dict):
+        start, end = slot.get('start'), slot.get('end')
+    elif isinstance(slot, str) and '-' in slot:
+        start, end = slot.split('-', 1)
+    else:
+        raise ValueError(f"Invalid time slot: {slot!r}")
+    try:
+        start, end = time.fromisoformat(start.strip()), time.fromisoformat(end.strip())
+    except (AttributeError, ValueError):
+        raise ValueError(f"Invalid time slot: {slot!r}")
+    if start >= end:
+        raise ValueError(f"Time slot ends before it starts: {slot!r}")
+    return start, end
+
+
+def wants_time(entry, start):
+    """Whether a slot starting at ``start`` (a local time) suits the entry."""
+    if not entry.preferred_time_slots:
+        return True
+    for slot in entry.preferred_time_slots:
+        try:
+            slot_start, slot_end = parse_time_slot(slot)
+        except ValueError:
+            continue
+        if slot_start <= start < slot_end:
+            return True
+    return False
+
+
+def matching_entries(appointment, limit):
+    """The first ``limit`` active entries that could take a freed appointment slot."""
+    start = timezone.localtime(appointment.start_time)
+    candidates = WaitlistEntry.objects.filter(
+        Q(therapist_profile__isnull=True) | Q(therapist_profile_id=appointment.therapist_profile_id),
+        service_id=appointment.service_id, branch_id=appointment.branch_id,
+        preferred_date=start.date(), status='active',
+    ).order_by('position', 'id')
+
+    matches = []
+    for entry in candidates.iterator():
+        if wants_time(entry, start.time()):
+            matches.append(entry)
+            if len(matches) == limit:
+                break
+    return matches
+
+
+def promote_freed_slot(appointment):
+    """
+    Notify waitlisters that a cancelled appointment freed their slot.
+
+    Returns the entries promoted from active to notified.
+    """
+    from .tasks import notify_waitlist
+
+    promoted = []
+    for entry in matching_entries(appointment, settings.WAITLIST_PROMOTION_BATCH):
+        # A concurrent cancellation may have promoted the entry already
+        if WaitlistEntry.objects.filter(pk=entry.pk, status='active').update(
+                status='notified', updated_at=timezone.now()):
+            entry.status = 'notified'
+            promoted.append(entry)
+    if promoted:
+        entry_ids = [entry.pk for entry in promoted]
+        transaction.on_commit(lambda: notify_waitlist.delay(entry_ids, appointment.pk))
+    return promoted
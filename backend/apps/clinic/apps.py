@@ -4,4 +4,7 @@ from django.apps import AppConfig
 class ClinicConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.clinic'
-    verbose_name = 'Clinic'
\ No newline at end of file
+    verbose_name = 'Clinic'
+    
+    def ready(self):
+        import apps.clinic.signals
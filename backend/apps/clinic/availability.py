@@ -0,0 +1,377 @@
+from bisect import bisect_left, bisect_right
+from calendar import monthrange
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import TherapistAvailability, Holiday
+
+
+# Appointment statuses that occupy a therapist's time
+ACTIVE_APPOINTMENT_STATUSES = ['pending', 'confirmed']
+
+# Widest preparation/cooldown buffer considered when loading neighbouring bookings
+MAX_BUFFER = timedelta(hours=4)
+
+RECURRENCE_STEPS = {
+    'daily': timedelta(days=1),
+    'weekly': timedelta(weeks=1),
+    'biweekly': timedelta(weeks=2),
+}
+
+
+def _add_months(value, months):
+    """Shift a datetime by whole months, or return None if the day does not exist."""
+    month_index = value.month - 1 + months
+    year = value.year + month_index // 12
+    month = month_index % 12 + 1
+    if value.day > monthrange(year, month)[1]:
+        return None
+    return value.replace(year=year, month=month)
+
+
+def expand_occurrences(start_time, end_time, recurrence, recurrence_end_date, window_start, window_end):
+    """
+    Yield (start, end) occurrences of a possibly recurring availability row
+    that intersect the [window_start, window_end) window.
+    """
+    duration = end_time - start_time
+
+    if recurrence == 'monthly':
+        # Skip straight to the month before the window opens
+        months = max((window_start.year - start_time.year) * 12
+                     + window_start.month - start_time.month - 1, 0)
+        anchor = start_time.replace(day=1)
+        while True:
+            month_start = _add_months(anchor, months)
+            if month_start >= window_end:
+                return
+            if recurrence_end_date and month_start.date() > recurrence_end_date:
+                return
+            occurrence_start = _add_months(start_time, months)
+            # Months without this day (e.g. the 31st) are skipped
+            if occurrence_start is not None:
+                if recurrence_end_date and occurrence_start.date() > recurrence_end_date:
+                    return
+                if occurrence_start < window_end and occurrence_start + duration > window_start:
+                    yield occurrence_start, occurrence_start + duration
+            months += 1
+
+    step = RECURRENCE_STEPS.get(recurrence)
+    if step is None:
+        if start_time < window_end and end_time > window_start:
+            yield start_time, end_time
+        return
+
+    # Jump straight to the first occurrence that can touch the window
+    occurrence_start = start_time
+    if end_time <= window_start:
+        occurrence_start += step * ((window_start - end_time) // step)
+    while occurrence_start < window_end:
+        if recurrence_end_date and occurrence_start.date() > recurrence_end_date:
+            return
+        if occurrence_start + duration > window_start:
+            yield occurrence_start, occurrence_start + duration
+        occurrence_start += step
+
+
+def merge_intervals(intervals):
+    """Merge overlapping or touching (start, end) intervals into a sorted list."""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def subtract_intervals(intervals, blocked):
+    """Remove the sorted, merged `blocked` intervals from the sorted, merged `intervals`."""
+    result = []
+    index = 0
+    for start, end in intervals:
+        cursor = start
+        while index < len(blocked) and blocked[index][1] <= cursor:
+            index += 1
+        probe = index
+        while probe < len(blocked) and blocked[probe][0] < end:
+            block_start, block_end = blocked[probe]
+            if block_start > cursor:
+                result.append((cursor, block_start))
+            cursor = max(cursor, block_end)
+            if cursor >= end:
+                break
+            probe += 1
+        if cursor < end:
+            result.append((cursor, end))
+    return result
+
+
+class IntervalIndex:
+    """
+    Static interval tree over (start, end, payload) tuples.
+
+    Intervals are sorted by start and augmented with a running maximum of
+    their end points, so overlap queries cost a binary search plus a short
+    backwards walk that stops as soon as no earlier interval can reach the
+    query window.
+    """
+
+    def __init__(self, intervals=()):
+        self.intervals = sorted(intervals, key=lambda item: (item[0], item[1]))
+        self.starts = [item[0] for item in self.intervals]
+        self.max_ends = []
+        running = None
+        for item in self.intervals:
+            running = item[1] if running is None or item[1] > running else running
+            self.max_ends.append(running)
+
+    def __len__(self):
+        return len(self.intervals)
+
+    def overlapping(self, start, end):
+        """Return the intervals that overlap the half-open range [start, end)."""
+        found = []
+        index = bisect_left(self.starts, end) - 1
+        while index >= 0 and self.max_ends[index] > start:
+            item = self.intervals[index]
+            if item[1] > start:
+                found.append(item)
+            index -= 1
+        found.reverse()
+        return found
+
+    def overlaps(self, start, end, exclude=None):
+        """Check whether any interval (other than payload `exclude`) overlaps [start, end)."""
+        index = bisect_left(self.starts, end) - 1
+        while index >= 0 and self.max_ends[index] > start:
+            item = self.intervals[index]
+            if item[1] > start and (exclude is None or item[2] != exclude):
+                return True
+            index -= 1
+        return False
+
+
+class TherapistSchedule:
+    """Indexed working hours and bookings for a single therapist."""
+
+    def __init__(self, therapist_id, working_intervals, bookings):
+        self.therapist_id = therapist_id
+        self.working = merge_intervals(working_intervals)
+        self.working_starts = [interval[0] for interval in self.working]
+        self.bookings = IntervalIndex(bookings)
+
+    def working_interval_at(self, start, end):
+        """Return the merged working interval containing [start, end), if any."""
+        index = bisect_right(self.working_starts, start) - 1
+        if index >= 0 and self.working[index][1] >= end:
+            return self.working[index]
+        return None
+
+    def is_working(self, start, end):
+        """Check that [start, end) lies inside the therapist's working hours."""
+        return self.working_interval_at(start, end) is not None
+
+    def has_conflict(self, start, end, exclude_appointment=None):
+        """Check whether [start, end) clashes with an active booking."""
+        return self.bookings.overlaps(start, end, exclude=exclude_appointment)
+
+    def is_free(self, start, end, exclude_appointment=None):
+        """Check that [start, end) is inside working hours and clashes with no booking."""
+        return self.is_working(start, end) and not self.has_conflict(start, end, exclude_appointment)
+
+    def working_time(self):
+        """Total working time indexed in this schedule."""
+        return sum((end - start for start, end in self.working), timedelta(0))
+
+    def booked_time(self):
+        """Total time taken by bookings, including their buffers."""
+        return sum((item[1] - item[0] for item in self.bookings.intervals), timedelta(0))
+
+    def free_gaps_around(self, start, end):
+        """
+        Return the idle time left (before, after) a free [start, end) slot
+        within its working interval, or None if the slot is not free.
+        """
+        interval = self.working_interval_at(start, end)
+        if interval is None or self.has_conflict(start, end):
+            return None
+        previous_end = interval[0]
+        index = bisect_left(self.bookings.starts, start)
+        if index > 0 and self.bookings.max_ends[index - 1] > previous_end:
+            previous_end = self.bookings.max_ends[index - 1]
+        next_start = interval[1]
+        index = bisect_left(self.bookings.starts, end)
+        if index < len(self.bookings) and self.bookings.starts[index] < next_start:
+            next_start = self.bookings.starts[index]
+        return start - previous_end, next_start - end
+
+    def free_slots(self, window_start, window_end, duration, step=None,
+                   before=timedelta(0), after=timedelta(0)):
+        """
+        List start times of free slots of `duration` within the window.
+
+        Each slot also reserves `before` and `after` buffers (preparation and
+        cooldown), and slot blocks are aligned to `step` from the start of
+        each working interval.
+        """
+        step = step or duration
+        span = before + duration + after
+        slots = []
+        index = max(bisect_right(self.working_starts, window_start - before) - 1, 0)
+        for interval_start, interval_end in self.working[index:]:
+            if interval_start >= window_end:
+                break
+            block = interval_start
+            if block + before < window_start:
+                block += step * -(-(window_start - before - block) // step)
+            while block + span <= interval_end and block + before < window_end:
+                clashes = self.bookings.overlapping(block, block + span)
+                if clashes:
+                    # Skip past the blocking booking instead of probing every step
+                    blocked_until = max(item[1] for item in clashes)
+                    block += step * -(-(blocked_until - block) // step)
+                    continue
+                slots.append(block + before)
+                block += step
+        return slots
+
+
+class AvailabilityEngine:
+    """
+    Availability of a set of therapists over a time window.
+
+    `load()` runs three set-based queries (availability rows, holidays and
+    active appointments) and builds one `TherapistSchedule` per therapist, so
+    any number of slot checks can be answered from memory afterwards.
+    """
+
+    def __init__(self, window_start, window_end, branch=None, service=None):
+        self.window_start = window_start
+        self.window_end = window_end
+        self.branch_id = getattr(branch, 'pk', branch)
+        self.service_id = getattr(service, 'pk', service)
+        self.schedules = {}
+
+    @classmethod
+    def for_slot(cls, therapist, start_time, end_time, branch=None, service=None):
+        """Build an engine covering the whole day(s) around a single slot."""
+        day_start = timezone.make_aware(
+            datetime.combine(timezone.localtime(start_time).date(), time.min)
+        )
+        day_end = timezone.make_aware(
+            datetime.combine(timezone.localtime(end_time).date() + timedelta(days=1), time.min)
+        )
+        engine = cls(day_start, day_end, branch=branch, service=service)
+        engine.load([getattr(therapist, 'pk', therapist)])
+        return engine
+
+    def _availability_rows(self, therapist_ids):
+        filters = Q(therapist_id__in=therapist_ids, start_time__lt=self.window_end)
+        filters &= (
+            Q(recurrence='none', end_time__gt=self.window_start)
+            | (~Q(recurrence='none') & (
+                Q(recurrence_end_date__isnull=True)
+                | Q(recurrence_end_date__gte=self.window_start.date())
+            ))
+        )
+        if self.branch_id:
+            filters &= Q(branch_id=self.branch_id) | Q(branch__isnull=True)
+        if self.service_id:
+            filters &= Q(service_id=self.service_id) | Q(service__isnull=True)
+        return TherapistAvailability.objects.filter(filters).values_list(
+            'therapist_id', 'branch_id', 'start_time', 'end_time',
+            'is_available', 'recurrence', 'recurrence_end_date'
+        )
+
+    def _holiday_intervals(self):
+        """Map branch id (None for all branches) to blocked datetime intervals."""
+        holidays = Holiday.objects.filter(
+            start_date__lte=timezone.localtime(self.window_end).date(),
+            end_date__gte=timezone.localtime(self.window_start).date(),
+        )
+        if self.branch_id:
+            holidays = holidays.filter(Q(branch_id=self.branch_id) | Q(branch__isnull=True))
+        blocked = defaultdict(list)
+        for branch_id, start_date, end_date in holidays.values_list('branch_id', 'start_date', 'end_date'):
+            blocked[branch_id].append((
+                timezone.make_aware(datetime.combine(start_date, time.min)),
+                timezone.make_aware(datetime.combine(end_date + timedelta(days=1), time.min)),
+            ))
+        return blocked
+
+    def _booking_rows(self, therapist_ids):
+        # Imported here to keep apps.clinic free of an import-time dependency on booking
+        from apps.booking.models import Appointment
+
+        return Appointment.objects.filter(
+            therapist_profile_id__in=therapist_ids,
+            status__in=ACTIVE_APPOINTMENT_STATUSES,
+            start_time__lt=self.window_end + MAX_BUFFER,
+            end_time__gt=self.window_start - MAX_BUFFER,
+        ).order_by().values_list(
+            'therapist_profile_id', 'start_time', 'end_time', 'id',
+            'service__preparation_time', 'service__cooldown_time'
+        )
+
+    def load(self, therapist_ids):
+        """Fetch and index the schedules of the given therapists."""
+        therapist_ids = list(therapist_ids)
+        working = defaultdict(list)
+        time_off = defaultdict(list)
+        holidays = self._holiday_intervals()
+
+        for (therapist_id, branch_id, start_time, end_time, is_available,
+                recurrence, recurrence_end_date) in self._availability_rows(therapist_ids):
+            occurrences = expand_occurrences(
+                start_time, end_time, recurrence, recurrence_end_date,
+                self.window_start, self.window_end
+            )
+            if not is_available:
+                time_off[therapist_id].extend(occurrences)
+                continue
+            occurrences = merge_intervals(occurrences)
+            closed = holidays.get(None, []) + holidays.get(branch_id or self.branch_id, [])
+            if closed:
+                occurrences = subtract_intervals(occurrences, merge_intervals(closed))
+            working[therapist_id].extend(occurrences)
+
+        bookings = defaultdict(list)
+        for (therapist_id, start_time, end_time, appointment_id,
+                preparation_time, cooldown_time) in self._booking_rows(therapist_ids):
+            # Bookings occupy the therapist for their service's buffers as well
+            bookings[therapist_id].append((
+                start_time - timedelta(minutes=preparation_time or 0),
+                end_time + timedelta(minutes=cooldown_time or 0),
+                appointment_id,
+            ))
+
+        for therapist_id in therapist_ids:
+            intervals = merge_intervals(working.get(therapist_id, []))
+            if therapist_id in time_off:
+                intervals = subtract_intervals(intervals, merge_intervals(time_off[therapist_id]))
+            self.schedules[therapist_id] = TherapistSchedule(
+                therapist_id, intervals, bookings.get(therapist_id, [])
+            )
+        return self
+
+    def schedule(self, therapist):
+        therapist_id = getattr(therapist, 'pk', therapist)
+        if therapist_id not in self.schedules:
+            self.load([therapist_id])
+        return self.schedules[therapist_id]
+
+    def is_slot_free(self, therapist, start_time, end_time, exclude_appointment=None):
+        """Check whether the therapist can take [start_time, end_time)."""
+        exclude_appointment = getattr(exclude_appointment, 'pk', exclude_appointment)
+        return self.schedule(therapist).is_free(start_time, end_time, exclude_appointment)
+
+    def free_slots(self, therapist, duration, step=None, before=timedelta(0), after=timedelta(0)):
+        """List free slot start times for the therapist inside the engine window."""
+        return self.schedule(therapist).free_slots(
+            self.window_start, self.window_end, duration, step, before, after
+        )
@@ -0,0 +1,173 @@
+"""
+Versioned cache for the public catalog (branches, services, therapists).
+
+Cache keys embed version counters instead of being deleted on writes: a
+global epoch, an epoch per resource and a version per branch scope.
+Invalidation bumps the relevant counters, so every stale entry becomes
+unreachable at once and simply ages out. Responses filtered by branch are
+keyed on that branch's version, so editing one branch's services leaves the
+other branches' cached pages untouched.
+
+Misses are recomputed by a single worker per key; concurrent requests wait
+briefly for its result instead of stampeding the database.
+"""
+import hashlib
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+GLOBAL_EPOCH = 'catalog:epoch'
+LOCK_TIMEOUT = 10
+LOCK_WAIT = 0.05
+LOCK_WAIT_ATTEMPTS = 40
+TIMEOUT_JITTER = 0.1
+
+# Query parameters that narrow a catalog response to a single branch
+BRANCH_PARAMS = ['branch_id', 'available_branches', 'branches']
+
+_MISSING = object()
+
+
+def _resource_epoch(resource):
+    return f'catalog:{resource}:epoch'
+
+
+def _scope_version(resource, scope):
+    return f'catalog:{resource}:{scope}:version'
+
+
+def _fresh_version():
+    # Never reuse a number an evicted counter may have had
+    return int(time.time() * 1000)
+
+
+def _versions(keys):
+    """Read version counters, creating any that are missing or were evicted."""
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, _fresh_version(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, _fresh_version(), timeout=None)
+
+
+def catalog_key(resource, scope, identity):
+    """Build the versioned cache key for a catalog entry."""
+    epoch_key = _resource_epoch(resource)
+    scope_key = _scope_version(resource, scope)
+    global_epoch, resource_epoch, scope_version = _versions([GLOBAL_EPOCH, epoch_key, scope_key])
+    digest = hashlib.md5(identity.encode()).hexdigest()
+    return f'catalog:{global_epoch}:{resource}:{resource_epoch}:{scope}:{scope_version}:{digest}'
+
+
+def get_or_compute(key, compute, timeout=None):
+    """
+    Return the cached value for ``key``, computing it on a miss.
+
+    Only the caller holding the key's lock computes; the others poll for its
+    result and fall back to computing themselves if the lock holder is slow.
+    """
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        return value
+
+    if timeout is None:
+        timeout = settings.CATALOG_CACHE_TIMEOUT
+    # Spread expiries so entries written together do not expire together
+    timeout = int(timeout * random.uniform(1 - TIMEOUT_JITTER, 1 + TIMEOUT_JITTER))
+
+    lock_key = f'{key}:lock'
+    for _ in range(LOCK_WAIT_ATTEMPTS):
+        if cache.add(lock_key, 1, timeout=LOCK_TIMEOUT):
+            try:
+                value = compute()
+                cache.set(key, value, timeout=timeout)
+                return value
+            finally:
+                cache.delete(lock_key)
+
+        time.sleep(LOCK_WAIT)
+        value = cache.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+    return compute()
+
+
+class _Uncacheable(Exception):
+    """Raised to return a response without caching it (e.g. a 404)."""
+
+    def __init__(self, response):
+        self.response = response
+
+
+def cached_response(resource):
+    """
+    Cache the data of a public, user-independent catalog action.
+
+    Requests filtered to one branch are scoped to that branch's version;
+    everything else is scoped to the resource as a whole.
+    """
+
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            if not settings.CATALOG_CACHE_ENABLED:
+                return view_method(self, request, *args, **kwargs)
+
+            scope = 'all'
+            for param in BRANCH_PARAMS:
+                branch_id = request.query_params.get(param)
+                if branch_id:
+                    scope = f'branch:{branch_id}'
+                    break
+
+            def compute():
+                response = view_method(self, request, *args, **kwargs)
+                if response.status_code != 200:
+                    raise _Uncacheable(response)
+                return response.data
+
+            key = catalog_key(resource, scope, request.build_absolute_uri())
+            try:
+                data = get_or_compute(key, compute)
+            except _Uncacheable as uncacheable:
+                return uncacheable.response
+            return Response(data)
+
+        return wrapper
+
+    return decorator
+
+
+def invalidate_catalog():
+    """Expire every cached catalog entry."""
+    transaction.on_commit(lambda: _bump(GLOBAL_EPOCH))
+
+
+def invalidate_resource(resource):
+    """Expire all cached entries of one resource, whatever their branch."""
+    transaction.on_commit(lambda: _bump(_resource_epoch(resource)))
+
+
+def invalidate_branches(resource, branch_ids):
+    """Expire unfiltered entries of a resource and those of the given branches."""
+    scopes = ['all'] + [f'branch:{branch_id}' for branch_id in set(branch_ids)]
+
+    def bump():
+        for scope in scopes:
+            _bump(_scope_version(resource, scope))
+
+    transaction.on_commit(bump)
@@ -22,6 +22,11 @@ class ServiceSerializer(serializers.ModelSerializer):
                  'category', 'is_active', 'image', 'max_capacity', 'preparation_time',
                  'cooldown_time', 'available_branches', 'created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at']
+    
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Prefetch the branch ids rendered for each service."""
+        return queryset.prefetch_related('available_branches')
 
 
 class TherapistProfileSerializer(serializers.ModelSerializer):
@@ -40,6 +45,13 @@ class TherapistProfileSerializer(serializers.ModelSerializer):
                  'created_at', 'updated_at']
         read_only_fields = ['id', 'average_rating', 'rating_count', 'created_at', 'updated_at']
     
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Load the user, branches and services rendered for each therapist."""
+        return queryset.select_related('user').prefetch_related(
+            'branches', 'services__available_branches'
+        )
+    
     def get_user_details(self, obj):
         """Get basic user details."""
         return {
@@ -113,6 +125,11 @@ class TherapistPublicSerializer(serializers.ModelSerializer):
                  'branches', 'services', 'profile_image', 'average_rating', 'rating_count']
         read_only_fields = fields
     
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Load the user, branches and services rendered for each therapist."""
+        return TherapistProfileSerializer.setup_eager_loading(queryset)
+    
     def get_user_details(self, obj):
         """Get limited user details for public view."""
         return {
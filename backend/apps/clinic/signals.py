@@ -0,0 +1,84 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .cache import invalidate_catalog, invalidate_resource, invalidate_branches
+from .models import Branch, Service, TherapistProfile
+
+User = get_user_model()
+
+M2M_ACTIONS = ['post_add', 'post_remove', 'pre_clear']
+
+
+def changed_branch_ids(instance, action, reverse, pk_set, accessor):
+    """Branch ids touched by an m2m change between a catalog model and Branch."""
+    if reverse:
+        return [instance.pk]
+    if action == 'pre_clear':
+        return list(getattr(instance, accessor).values_list('id', flat=True))
+    return list(pk_set or [])
+
+
+@receiver([post_save, post_delete], sender=Branch)
+def branch_changed(sender, instance, **kwargs):
+    """Branch details are nested across the catalog, so expire all of it."""
+    invalidate_catalog()
+
+
+@receiver(post_save, sender=Service)
+def service_saved(sender, instance, **kwargs):
+    invalidate_branches('service', instance.available_branches.values_list('id', flat=True))
+    # Therapist responses nest the services they offer
+    invalidate_resource('therapist')
+
+
+@receiver(post_delete, sender=Service)
+def service_deleted(sender, instance, **kwargs):
+    invalidate_resource('service')
+    invalidate_resource('therapist')
+
+
+@receiver(post_save, sender=TherapistProfile)
+def therapist_saved(sender, instance, **kwargs):
+    invalidate_branches('therapist', instance.branches.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=TherapistProfile)
+def therapist_deleted(sender, instance, **kwargs):
+    invalidate_resource('therapist')
+
+
+@receiver(post_save, sender=User)
+def therapist_user_saved(sender, instance, created, **kwargs):
+    """Therapist responses include the user's name and contact details."""
+    if created or instance.role != 'therapist':
+        return
+    branch_ids = TherapistProfile.branches.through.objects.filter(
+        therapistprofile__user=instance
+    ).values_list('branch_id', flat=True)
+    invalidate_branches('therapist', branch_ids)
+
+
+@receiver(m2m_changed, sender=Service.available_branches.through)
+def service_branches_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in M2M_ACTIONS:
+        invalidate_branches(
+            'service', changed_branch_ids(instance, action, reverse, pk_set, 'available_branches')
+        )
+        invalidate_resource('therapist')
+
+
+@receiver(m2m_changed, sender=TherapistProfile.branches.through)
+def therapist_branches_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in M2M_ACTIONS:
+        invalidate_branches(
+            'therapist', changed_branch_ids(instance, action, reverse, pk_set, 'branches')
+        )
+
+
+@receiver(m2m_changed, sender=TherapistProfile.services.through)
+def therapist_services_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # Services can be filtered by therapist and therapists nest their services
+    if action in M2M_ACTIONS:
+        invalidate_resource('service')
+        invalidate_resource('therapist')
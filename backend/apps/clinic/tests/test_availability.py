@@ -0,0 +1,128 @@
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+
+from django.test import TestCase, SimpleTestCase
+
+from apps.booking.models import Appointment
+from apps.clinic.availability import (
+    AvailabilityEngine, IntervalIndex, expand_occurrences, subtract_intervals
+)
+from apps.clinic.models import Branch, Service, TherapistProfile, TherapistAvailability, Holiday
+from apps.core.models import User
+
+
+def at(day, hour, minute=0):
+    return datetime(2030, 1, day, hour, minute, tzinfo=dt_timezone.utc)
+
+
+class ExpandOccurrencesTests(SimpleTestCase):
+    """Test recurrence expansion of availability rows."""
+
+    def test_non_recurring_row_outside_window(self):
+        occurrences = list(expand_occurrences(at(1, 9), at(1, 17), 'none', None, at(2, 0), at(3, 0)))
+        self.assertEqual(occurrences, [])
+
+    def test_weekly_row_jumps_to_window(self):
+        occurrences = list(expand_occurrences(at(1, 9), at(1, 17), 'weekly', None, at(15, 0), at(23, 0)))
+        self.assertEqual(occurrences, [(at(15, 9), at(15, 17)), (at(22, 9), at(22, 17))])
+
+    def test_recurrence_end_date_is_inclusive(self):
+        occurrences = list(expand_occurrences(
+            at(1, 9), at(1, 17), 'daily', date(2030, 1, 3), at(1, 0), at(10, 0)
+        ))
+        self.assertEqual([start.day for start, _ in occurrences], [1, 2, 3])
+
+    def test_monthly_row_skips_short_months(self):
+        start = datetime(2030, 1, 31, 9, tzinfo=dt_timezone.utc)
+        occurrences = list(expand_occurrences(
+            start, start + timedelta(hours=8), 'monthly', None,
+            start, datetime(2030, 5, 1, tzinfo=dt_timezone.utc)
+        ))
+        self.assertEqual([occurrence.month for occurrence, _ in occurrences], [1, 3])
+
+
+class IntervalIndexTests(SimpleTestCase):
+    """Test the static interval tree."""
+
+    def setUp(self):
+        self.index = IntervalIndex([(0, 100, 'long'), (10, 20, 'a'), (30, 40, 'b'), (50, 60, 'c')])
+
+    def test_overlapping_finds_nested_intervals(self):
+        self.assertEqual([item[2] for item in self.index.overlapping(35, 55)], ['long', 'b', 'c'])
+
+    def test_touching_intervals_do_not_overlap(self):
+        index = IntervalIndex([(10, 20, 'a')])
+        self.assertFalse(index.overlaps(20, 30))
+        self.assertFalse(index.overlaps(0, 10))
+
+    def test_overlaps_respects_exclude(self):
+        index = IntervalIndex([(10, 20, 'a')])
+        self.assertTrue(index.overlaps(15, 25))
+        self.assertFalse(index.overlaps(15, 25, exclude='a'))
+
+    def test_subtract_intervals(self):
+        self.assertEqual(
+            subtract_intervals([(0, 10), (20, 30)], [(5, 22), (25, 26)]),
+            [(0, 5), (22, 25), (26, 30)]
+        )
+
+
+class AvailabilityEngineTests(TestCase):
+    """Test the availability engine against the database."""
+
+    def setUp(self):
+        self.branch = Branch.objects.create(
+            name="Main Branch", address="123 Main St", city="Pune", state="MH",
+            country="India", postal_code="411001", phone="555-123-4567"
+        )
+        self.service = Service.objects.create(
+            name="Massage", description="Relaxing massage", duration=60,
+            price=100, category="massage"
+        )
+        therapist_user = User.objects.create_user(email="therapist@example.com", role="therapist")
+        self.customer = User.objects.create_user(email="customer@example.com", role="customer")
+        self.therapist = TherapistProfile.objects.create(user=therapist_user)
+        TherapistAvailability.objects.create(
+            therapist=self.therapist, branch=self.branch,
+            start_time=at(1, 9), end_time=at(1, 17), recurrence='weekly'
+        )
+
+    def engine(self, day):
+        return AvailabilityEngine(at(day, 0), at(day + 1, 0), branch=self.branch).load([self.therapist.id])
+
+    def test_recurring_availability_is_expanded(self):
+        self.assertTrue(self.engine(8).is_slot_free(self.therapist, at(8, 10), at(8, 11)))
+        self.assertFalse(self.engine(9).is_slot_free(self.therapist, at(9, 10), at(9, 11)))
+
+    def test_holiday_blocks_recurring_availability(self):
+        Holiday.objects.create(branch=self.branch, name="Festival",
+                               start_date=date(2030, 1, 8), end_date=date(2030, 1, 8))
+        self.assertFalse(self.engine(8).is_slot_free(self.therapist, at(8, 10), at(8, 11)))
+
+    def test_free_slots_skip_booked_time(self):
+        Appointment.objects.create(
+            customer=self.customer, therapist_profile=self.therapist, service=self.service,
+            branch=self.branch, start_time=at(8, 10), end_time=at(8, 12), status='confirmed'
+        )
+        slots = self.engine(8).free_slots(self.therapist, timedelta(hours=1))
+        self.assertEqual([slot.hour for slot in slots], [9, 12, 13, 14, 15, 16])
+
+    def test_cancelled_appointments_do_not_block(self):
+        appointment = Appointment.objects.create(
+            customer=self.customer, therapist_profile=self.therapist, service=self.service,
+            branch=self.branch, start_time=at(8, 10), end_time=at(8, 11), status='cancelled'
+        )
+        engine = self.engine(8)
+        self.assertTrue(engine.is_slot_free(self.therapist, at(8, 10), at(8, 11)))
+        appointment.status = 'pending'
+        appointment.save()
+        engine = self.engine(8)
+        self.assertFalse(engine.is_slot_free(self.therapist, at(8, 10), at(8, 11)))
+        self.assertTrue(engine.is_slot_free(self.therapist, at(8, 10), at(8, 11),
+                                            exclude_appointment=appointment))
+
+    def test_engine_loads_in_constant_queries(self):
+        with self.assertNumQueries(3):
+            engine = self.engine(8)
+        with self.assertNumQueries(0):
+            for hour in range(9, 17):
+                engine.is_slot_free(self.therapist, at(8, hour), at(8, hour + 1))
@@ -0,0 +1,135 @@
+import threading
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, SimpleTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory
+
+from apps.clinic.cache import get_or_compute
+from apps.clinic.models import Branch, Service, TherapistProfile
+from apps.clinic.views import ServiceViewSet, TherapistProfileViewSet
+from apps.core.models import User
+
+
+class GetOrComputeTests(SimpleTestCase):
+    """Test cache fills and stampede protection."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_computes_once(self):
+        calls = []
+        for _ in range(3):
+            value = get_or_compute('catalog:test', lambda: calls.append(1) or 'value', timeout=60)
+        self.assertEqual(value, 'value')
+        self.assertEqual(len(calls), 1)
+
+    def test_waits_for_lock_holder(self):
+        # Another worker holds the lock and publishes the value shortly after
+        cache.add('catalog:test:lock', 1)
+        timer = threading.Timer(0.1, lambda: cache.set('catalog:test', 'from worker'))
+        timer.start()
+        try:
+            value = get_or_compute('catalog:test', lambda: 'recomputed', timeout=60)
+        finally:
+            timer.join()
+        self.assertEqual(value, 'from worker')
+
+
+class CatalogCacheTests(TestCase):
+    """Test cached catalog responses and their signal driven invalidation."""
+
+    def setUp(self):
+        cache.clear()
+        self.factory = APIRequestFactory()
+        self.branches = [
+            Branch.objects.create(
+                name=f"Branch {index}", address="123 Main St", city="Pune", state="MH",
+                country="India", postal_code="411001", phone="555-123-4567"
+            )
+            for index in range(2)
+        ]
+        self.services = []
+        for index, branch in enumerate(self.branches):
+            service = Service.objects.create(
+                name=f"Service {index}", description="Service", duration=60,
+                price=100, category="massage"
+            )
+            service.available_branches.add(branch)
+            self.services.append(service)
+        self.user = User.objects.create_user(
+            email="therapist@example.com", first_name="Tara", role="therapist"
+        )
+        self.therapist = TherapistProfile.objects.create(user=self.user)
+        self.therapist.branches.add(self.branches[0])
+
+    def get(self, viewset, action, params=None, **kwargs):
+        request = self.factory.get('/api/v1/clinic/', params)
+        response = viewset.as_view({'get': action})(request, **kwargs)
+        response.render()
+        return response
+
+    def service_names(self, **params):
+        response = self.get(ServiceViewSet, 'list', params)
+        return [service['name'] for service in response.data['results']]
+
+    def test_repeat_reads_hit_the_cache(self):
+        self.service_names()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.service_names(), ['Service 0', 'Service 1'])
+
+    def test_saving_a_service_invalidates(self):
+        self.service_names()
+        with self.captureOnCommitCallbacks(execute=True):
+            Service.objects.filter(pk=self.services[0].pk).update(name="Renamed")
+            Service.objects.get(pk=self.services[0].pk).save()
+        self.assertIn("Renamed", self.service_names())
+
+    def test_other_branches_stay_cached(self):
+        first = self.branches[0].id
+        second = self.branches[1].id
+        self.service_names(branch_id=first)
+        self.service_names(branch_id=second)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.services[0].available_branches.remove(self.branches[0])
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.service_names(branch_id=second), ['Service 1'])
+        self.assertEqual(self.service_names(branch_id=first), [])
+
+    def test_therapist_name_change_invalidates_public_list(self):
+        self.get(TherapistProfileViewSet, 'public_list')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.first_name = "Tamsin"
+            self.user.save()
+        response = self.get(TherapistProfileViewSet, 'public_list')
+        self.assertEqual(response.data['results'][0]['user_details']['first_name'], "Tamsin")
+
+    def test_errors_are_not_cached(self):
+        self.assertEqual(self.get(ServiceViewSet, 'retrieve', pk=999).status_code, 404)
+        service = Service.objects.create(
+            name="Late", description="Service", duration=60, price=100, category="massage"
+        )
+        Service.objects.filter(pk=service.pk).update(id=999)
+        self.assertEqual(self.get(ServiceViewSet, 'retrieve', pk=999).status_code, 200)
+
+    def test_cached_lists_skip_the_database(self):
+        for index in range(30):
+            service = Service.objects.create(
+                name=f"Extra {index}", description="Service", duration=60,
+                price=100, category="massage"
+            )
+            service.available_branches.set(self.branches)
+
+        with self.settings(CATALOG_CACHE_ENABLED=False):
+            with CaptureQueriesContext(connection) as uncached:
+                for _ in range(5):
+                    self.get(ServiceViewSet, 'list')
+        # Every uncached request goes back to the database
+        self.assertGreater(len(uncached), 0)
+
+        self.get(ServiceViewSet, 'list')
+        with self.assertNumQueries(0):
+            for _ in range(5):
+                self.assertEqual(self.get(ServiceViewSet, 'list').data['count'], 32)
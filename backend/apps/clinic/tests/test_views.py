@@ -0,0 +1,58 @@
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory
+
+from apps.clinic.models import Branch, Service, TherapistProfile
+from apps.clinic.views import ServiceViewSet, TherapistProfileViewSet
+from apps.core.models import User
+
+
+@override_settings(CATALOG_CACHE_ENABLED=False)
+class CatalogQueryCountTests(TestCase):
+    """Guard public catalog endpoints against N+1 query regressions."""
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.branches = [
+            Branch.objects.create(
+                name=f"Branch {index}", address="123 Main St", city="Pune", state="MH",
+                country="India", postal_code="411001", phone="555-123-4567"
+            )
+            for index in range(2)
+        ]
+
+    def create_therapists(self, count):
+        offset = TherapistProfile.objects.count()
+        for index in range(offset, offset + count):
+            service = Service.objects.create(
+                name=f"Service {index}", description="Service", duration=60,
+                price=100, category="massage"
+            )
+            service.available_branches.set(self.branches)
+            user = User.objects.create_user(email=f"therapist{index}@example.com", role="therapist")
+            therapist = TherapistProfile.objects.create(user=user)
+            therapist.branches.set(self.branches)
+            therapist.services.add(service)
+
+    def count_queries(self, viewset, action):
+        with CaptureQueriesContext(connection) as queries:
+            response = viewset.as_view({'get': action})(self.factory.get('/'))
+            response.render()
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def assertConstantQueries(self, viewset, action):
+        self.create_therapists(1)
+        few = self.count_queries(viewset, action)
+        self.create_therapists(5)
+        self.assertEqual(few, self.count_queries(viewset, action))
+
+    def test_therapist_list(self):
+        self.assertConstantQueries(TherapistProfileViewSet, 'list')
+
+    def test_therapist_public_list(self):
+        self.assertConstantQueries(TherapistProfileViewSet, 'public_list')
+
+    def test_service_list(self):
+        self.assertConstantQueries(ServiceViewSet, 'list')
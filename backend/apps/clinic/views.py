@@ -4,6 +4,7 @@ from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
 from django.db.models import Q
 
+from .cache import cached_response
 from .models import Branch, Service, TherapistProfile, TherapistAvailability, Holiday
 from .serializers import (
     BranchSerializer,
@@ -13,6 +14,7 @@ from .serializers import (
     HolidaySerializer,
     TherapistPublicSerializer
 )
+from apps.core.dates import date_range_q
 from apps.core.permissions import IsAdminUser, IsTherapist, ReadOnly
 
 
@@ -32,6 +34,14 @@ class BranchViewSet(viewsets.ModelViewSet):
         else:
             permission_classes = [IsAdminUser]
         return [permission() for permission in permission_classes]
+    
+    @cached_response('branch')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+    
+    @cached_response('branch')
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
 
 
 class ServiceViewSet(viewsets.ModelViewSet):
@@ -64,13 +74,24 @@ class ServiceViewSet(viewsets.ModelViewSet):
         if therapist_id:
             queryset = queryset.filter(therapists__id=therapist_id)
             
-        return queryset
+        return ServiceSerializer.setup_eager_loading(queryset)
+    
+    @cached_response('service')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+    
+    @cached_response('service')
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
     
     @action(detail=True, methods=['get'])
+    @cached_response('therapist')
     def therapists(self, request, pk=None):
         """Get all therapists offering this service."""
         service = self.get_object()
-        therapists = service.therapists.filter(is_active=True)
+        therapists = TherapistPublicSerializer.setup_eager_loading(
+            service.therapists.filter(is_active=True)
+        )
         serializer = TherapistPublicSerializer(therapists, many=True)
         return Response(serializer.data)
 
@@ -117,7 +138,7 @@ class TherapistProfileViewSet(viewsets.ModelViewSet):
             # Using JSONField query to find specialization
             queryset = queryset.filter(specializations__contains=[specialization])
             
-        return queryset
+        return self.get_serializer_class().setup_eager_loading(queryset)
     
     def get_serializer_class(self):
         if self.action in ['public_list', 'public_detail']:
@@ -125,6 +146,7 @@ class TherapistProfileViewSet(viewsets.ModelViewSet):
         return TherapistProfileSerializer
     
     @action(detail=False, methods=['get'])
+    @cached_response('therapist')
     def public_list(self, request):
         """Get public list of therapists."""
         queryset = self.filter_queryset(self.get_queryset())
@@ -137,6 +159,7 @@ class TherapistProfileViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
     
     @action(detail=True, methods=['get'])
+    @cached_response('therapist')
     def public_detail(self, request, pk=None):
         """Get public details of a therapist."""
         therapist = self.get_object()
@@ -151,11 +174,7 @@ class TherapistProfileViewSet(viewsets.ModelViewSet):
         end_date = request.query_params.get('end_date')
         
         # Build the filter
-        filters = Q(therapist=therapist)
-        if start_date:
-            filters &= Q(start_time__date__gte=start_date)
-        if end_date:
-            filters &= Q(start_time__date__lte=end_date)
+        filters = Q(therapist=therapist) & date_range_q('start_time', start_date, end_date)
             
         availability = TherapistAvailability.objects.filter(filters)
         serializer = TherapistAvailabilitySerializer(availability, many=True)
@@ -179,7 +198,7 @@ class TherapistAvailabilityViewSet(viewsets.ModelViewSet):
         return [permission() for permission in permission_classes]
     
     def get_queryset(self):
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().select_related('therapist__user', 'branch', 'service')
         
         # If user is a therapist, only show their availability
         user = self.request.user
@@ -191,13 +210,11 @@ class TherapistAvailabilityViewSet(viewsets.ModelViewSet):
                 return TherapistAvailability.objects.none()
                 
         # Filter by date range
-        start_date = self.request.query_params.get('start_date')
-        end_date = self.request.query_params.get('end_date')
-        
-        if start_date:
-            queryset = queryset.filter(start_time__date__gte=start_date)
-        if end_date:
-            queryset = queryset.filter(start_time__date__lte=end_date)
+        queryset = queryset.filter(date_range_q(
+            'start_time',
+            self.request.query_params.get('start_date'),
+            self.request.query_params.get('end_date')
+        ))
             
         return queryset.order_by('start_time')
 
@@ -0,0 +1,48 @@
+"""
+Date range filters on datetime columns.
+
+``field__date__gte`` casts the column to a date before comparing, which
+keeps the database from using an index on it. ``date_range_q`` turns
+inclusive days into a half-open range of aware datetimes in the current
+time zone instead, so the raw column is compared and the filter stays
+sargable.
+"""
+from datetime import date, datetime, time, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework.exceptions import ValidationError
+
+
+def day_start(day):
+    """Midnight at the start of a day in the current time zone."""
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def parse_day(value, name):
+    """Parse a YYYY-MM-DD query parameter, raising a 400 error if it is malformed."""
+    if isinstance(value, date):
+        return value
+    try:
+        day = parse_date(value)
+    except ValueError:
+        day = None
+    if day is None:
+        raise ValidationError({name: "Enter a date in YYYY-MM-DD format."})
+    return day
+
+
+def date_range_q(field, start_date=None, end_date=None):
+    """
+    Filter a datetime field to the days from start_date to end_date, inclusive.
+
+    Either bound may be omitted. Bounds are dates or YYYY-MM-DD strings.
+    """
+    conditions = Q()
+    if start_date:
+        conditions &= Q(**{f'{field}__gte': day_start(parse_day(start_date, 'start_date'))})
+    if end_date:
+        end = parse_day(end_date, 'end_date') + timedelta(days=1)
+        conditions &= Q(**{f'{field}__lt': day_start(end)})
+    return conditions
@@ -0,0 +1,37 @@
+"""
+Work deferred until the current transaction commits.
+
+Signal receivers learn about changed rows one save at a time, but the work
+they trigger (refreshing reminders, analytics cells or stock alerts) is
+far cheaper done once for every row a transaction touched. Receivers hand
+ids to ``defer_until_commit`` under a key; the ids are collected per
+thread and passed to the key's flush function together when the
+transaction commits. Outside a transaction the flush runs at once.
+"""
+import threading
+
+from django.db import transaction
+
+_local = threading.local()
+
+
+def _pending():
+    if not hasattr(_local, 'keys'):
+        _local.keys = {}
+    return _local.keys
+
+
+def defer_until_commit(key, ids, flush):
+    """
+    Add ``ids`` to the set collected under ``key`` and call ``flush`` with
+    the whole set once the current transaction commits.
+    """
+    pending = _pending()
+    pending.setdefault(key, set()).update(ids)
+
+    def run():
+        collected = pending.pop(key, None)
+        if collected:
+            flush(collected)
+
+    transaction.on_commit(run)
@@ -0,0 +1,86 @@
+"""
+Idempotency keys for API actions that clients may retry.
+
+A request carrying an ``Idempotency-Key`` header runs in one transaction
+together with the IdempotencyKey row that stores its response, so either
+both commit or neither does. A retry with the same key gets the stored
+response back, marked with an ``Idempotent-Replayed`` header, instead of
+repeating the action. Concurrent requests with one key collide on the
+key's unique index; the loser rolls back and replays the winner's response.
+"""
+import hashlib
+import json
+from functools import wraps
+
+from django.db import IntegrityError, transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = IdempotencyKey._meta.get_field('key').max_length
+
+
+def request_hash(request):
+    """Fingerprint of a request, used to reject keys reused for another request."""
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f'{request.method} {request.path}\n{body}'.encode()).hexdigest()
+
+
+def replay(record, fingerprint):
+    """Response for a request whose key has already been used."""
+    if record.request_hash != fingerprint:
+        return Response(
+            {"detail": f"This {HEADER} was already used for a different request."},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+    response = Response(record.response_body, status=record.status_code)
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def idempotent(view_method):
+    """
+    Make a viewset action idempotent for requests with an Idempotency-Key.
+
+    Requests without the header, or from anonymous users, run unchanged.
+    Server errors are rolled back and not stored, so they can be retried.
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key or not request.user.is_authenticated:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {"detail": f"{HEADER} must be at most {MAX_KEY_LENGTH} characters."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        fingerprint = request_hash(request)
+        keys = IdempotencyKey.objects.filter(user=request.user, key=key)
+        try:
+            with transaction.atomic():
+                record = keys.select_for_update().first()
+                if record is None:
+                    response = view_method(self, request, *args, **kwargs)
+                    if response.status_code >= 500:
+                        transaction.set_rollback(True)
+                        return response
+                    IdempotencyKey.objects.create(
+                        user=request.user, key=key, method=request.method, path=request.path,
+                        request_hash=fingerprint, status_code=response.status_code,
+                        response_body=response.data
+                    )
+                    return response
+        except IntegrityError:
+            # Either a concurrent request with this key committed first, or
+            # the action itself failed
+            record = keys.first()
+            if record is None:
+                raise
+        return replay(record, fingerprint)
+
+    return wrapper
@@ -1,3 +1,4 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.utils.translation import gettext_lazy as _
@@ -94,6 +95,9 @@ class AuditLog(models.Model):
     class Meta:
         verbose_name = _('audit log')
         verbose_name_plural = _('audit logs')
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='auditlog_created'),
+        ]
         
     def __str__(self):
         return f"{self.user} - {self.action} - {self.created_at}"
@@ -134,4 +138,47 @@ class UserSettings(models.Model):
         verbose_name_plural = _('user settings')
         
     def __str__(self):
-        return f"Settings for {self.user.email}"
\ No newline at end of file
+        return f"Settings for {self.user.email}"
+
+class IdempotencyKey(models.Model):
+    """
+    Response of a request made with an Idempotency-Key header.
+
+    A row is only ever committed together with the effects of the request
+    it records, so a stored key always has a response to replay.
+    """
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(_('key'), max_length=255)
+    method = models.CharField(_('method'), max_length=10)
+    path = models.CharField(_('path'), max_length=255)
+    request_hash = models.CharField(_('request hash'), max_length=64)
+    status_code = models.PositiveSmallIntegerField(_('status code'))
+    response_body = models.JSONField(_('response body'), encoder=DjangoJSONEncoder, null=True, blank=True)
+    created_at = models.DateTimeField(_('created at'), auto_now_add=True)
+    
+    class Meta:
+        verbose_name = _('idempotency key')
+        verbose_name_plural = _('idempotency keys')
+        unique_together = ('user', 'key')
+        indexes = [
+            models.Index(fields=['created_at']),
+        ]
+        
+    def __str__(self):
+        return f"{self.user} - {self.key} - {self.status_code}"
+
+
+class JobCheckpoint(models.Model):
+    """Where a resumable batch job left off, so that the next run continues from there."""
+    
+    name = models.CharField(_('name'), max_length=100, unique=True)
+    position = models.JSONField(_('position'), encoder=DjangoJSONEncoder, default=dict, blank=True)
+    updated_at = models.DateTimeField(_('updated at'), auto_now=True)
+    
+    class Meta:
+        verbose_name = _('job checkpoint')
+        verbose_name_plural = _('job checkpoints')
+        
+    def __str__(self):
+        return f"{self.name} - {self.position}"
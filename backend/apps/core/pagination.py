@@ -0,0 +1,260 @@
+"""
+Keyset (cursor) pagination for high-volume list endpoints.
+
+Page number pagination skips rows with OFFSET and counts the whole result
+on every request, so deep pages get slower as a table grows. Keyset
+pagination instead orders by a stable key ending in the primary key, and
+the cursor carries the key values of the last row served; the next page is
+the rows strictly after that position, which an index on the ordering
+fields answers directly however deep the page.
+
+The ordering comes from the view's OrderingFilter (``?ordering=``) or its
+``ordering`` attribute, with ``id`` appended as a tie-breaker. Nullable
+ordering fields sort their nulls last whichever way they are ordered.
+
+Responses carry ``next`` and ``previous`` links and ``results``, plus the
+total ``count`` unless the client passes ``count=false`` or the paginator
+has ``include_count`` disabled. Clients pick a page size with
+``page_size`` up to ``MAX_PAGE_SIZE``.
+"""
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from datetime import date, datetime, time
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+from uuid import UUID
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import F, Q
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+TRUE_VALUES = {'1', 'true', 'yes'}
+FALSE_VALUES = {'0', 'false', 'no'}
+
+
+def encode_value(value):
+    """Make an ordering value JSON-safe without losing precision."""
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, (Decimal, UUID)):
+        return str(value)
+    return value
+
+
+def is_nullable(model, path):
+    """Whether any field along an ordering lookup path allows NULL."""
+    opts = model._meta
+    for name in path.split('__'):
+        field = opts.get_field(name)
+        if field.null:
+            return True
+        if not field.is_relation:
+            break
+        opts = field.related_model._meta
+    return False
+
+
+def ordering_field(model, path):
+    """The field an ordering lookup path ends at, or the key of the relation it ends at."""
+    opts = model._meta
+    for name in path.split('__'):
+        field = opts.get_field(name)
+        if field.is_relation:
+            opts = field.related_model._meta
+    return field.target_field if field.is_relation else field
+
+
+class KeysetPagination(BasePagination):
+    """Paginate by the position of the last row served instead of an offset."""
+
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    count_query_param = 'count'
+    include_count = True
+    invalid_cursor_message = _('Invalid cursor')
+
+    def __init__(self):
+        self.page_size = api_settings.PAGE_SIZE
+        self.max_page_size = settings.MAX_PAGE_SIZE
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.keys = self.get_ordering(request, queryset, view)
+        position, self.reverse = self.decode_cursor(request, queryset.model)
+
+        if self.get_include_count(request):
+            self.count = queryset.order_by().count()
+        else:
+            self.count = None
+
+        keys = [(name, not descending if self.reverse else descending, nullable)
+                for name, descending, nullable in self.keys]
+        if position is not None:
+            queryset = queryset.filter(self.after(keys, position, nulls_last=not self.reverse))
+        ordering = self.order_by(keys, nulls_last=not self.reverse)
+        rows = list(queryset.order_by(*ordering)[:self.page_size + 1])
+
+        more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.reverse:
+            rows.reverse()
+        self.rows = rows
+        # Going back from a page means there is a page after it, and vice versa
+        self.has_next = bool(rows) and (more if not self.reverse else True)
+        self.has_previous = bool(rows) and (position is not None if not self.reverse else more)
+        return rows
+
+    def get_paginated_response(self, data):
+        fields = [
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]
+        if self.count is not None:
+            fields.insert(0, ('count', self.count))
+        return Response(OrderedDict(fields))
+
+    def get_paginated_response_schema(self, schema):
+        properties = {
+            'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+            'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+            'results': schema,
+        }
+        if self.include_count:
+            properties = {'count': {'type': 'integer'}, **properties}
+        return {'type': 'object', 'required': ['results'], 'properties': properties}
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def get_include_count(self, request):
+        value = request.query_params.get(self.count_query_param, '').lower()
+        if value in TRUE_VALUES:
+            return True
+        if value in FALSE_VALUES:
+            return False
+        return self.include_count
+
+    def get_ordering(self, request, queryset, view):
+        """Return (field, descending, nullable) keys ending in the primary key."""
+        ordering = None
+        for backend in getattr(view, 'filter_backends', None) or []:
+            if hasattr(backend, 'get_ordering'):
+                ordering = backend().get_ordering(request, queryset, view)
+                break
+        if not ordering:
+            ordering = getattr(view, 'ordering', None) or ['-id']
+        if isinstance(ordering, str):
+            ordering = [ordering]
+
+        keys = []
+        for field in ordering:
+            name = field.lstrip('-')
+            if name == 'pk':
+                name = 'id'
+            keys.append((name, field.startswith('-'), is_nullable(queryset.model, name)))
+            if name == 'id':
+                break
+        else:
+            keys.append(('id', keys[0][1], False))
+        return keys
+
+    def order_by(self, keys, nulls_last=True):
+        # Walking backwards reverses the null placement as well
+        nulls = {'nulls_last': True} if nulls_last else {'nulls_first': True}
+        ordering = []
+        for name, descending, nullable in keys:
+            if nullable:
+                expression = F(name)
+                ordering.append(expression.desc(**nulls) if descending else expression.asc(**nulls))
+            else:
+                ordering.append(f'-{name}' if descending else name)
+        return ordering
+
+    def after(self, keys, position, nulls_last=True):
+        """Rows strictly after ``position`` in the order given by ``keys``."""
+        branches = []
+        equal = Q()
+        for (name, descending, nullable), value in zip(keys, position):
+            if value is None:
+                if not nulls_last:
+                    branches.append(equal & Q(**{f'{name}__isnull': False}))
+                equal &= Q(**{f'{name}__isnull': True})
+                continue
+            later = Q(**{f'{name}__lt' if descending else f'{name}__gt': value})
+            if nullable and nulls_last:
+                later |= Q(**{f'{name}__isnull': True})
+            branches.append(equal & later)
+            equal &= Q(**{name: value})
+        if not branches:
+            return Q(pk__in=[])
+        return reduce(or_, branches)
+
+    def position(self, row):
+        values = []
+        for name, _, _ in self.keys:
+            value = row
+            for attr in name.split('__'):
+                value = getattr(value, attr, None) if value is not None else None
+            if hasattr(value, 'pk'):
+                value = value.pk
+            values.append(encode_value(value))
+        return values
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None, False
+        try:
+            cursor = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+            position, reverse = cursor['p'], bool(cursor.get('r'))
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.keys):
+            raise NotFound(self.invalid_cursor_message)
+        # Cursors come from the client, so every value must parse as its field
+        try:
+            position = [
+                None if value is None else ordering_field(model, name).to_python(value)
+                for (name, _, _), value in zip(self.keys, position)
+            ]
+        except (ValidationError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def encode_cursor(self, position, reverse):
+        cursor = {'p': position}
+        if reverse:
+            cursor['r'] = 1
+        encoded = urlsafe_b64encode(json.dumps(cursor, separators=(',', ':')).encode()).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.position(self.rows[-1]), reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.encode_cursor(self.position(self.rows[0]), reverse=True)
+
+
+class UncountedKeysetPagination(KeysetPagination):
+    """Keyset pagination that skips the total count unless asked for it."""
+
+    include_count = False
@@ -0,0 +1,101 @@
+"""
+PDF rendering with a content-addressed cache in default storage.
+
+Documents are rendered from a template and the serialized data of the
+object they describe. The storage key is a hash of the template source and
+that data, so an unchanged object is never rendered twice and any change
+to either gives a new key. Stale files are simply never read again.
+
+WeasyPrint is CPU-heavy, so web workers never render. They serve a cached
+file straight from storage, or queue ``apps.core.tasks.render_document``,
+which is routed to the ``pdf`` queue served by a prefork worker pool (see
+CELERY_TASK_ROUTES), and answer 202 until the file exists.
+"""
+import hashlib
+import json
+from functools import lru_cache
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import FileResponse
+from django.template.loader import get_template, render_to_string
+from rest_framework import status
+from rest_framework.response import Response
+
+# Storage prefix for rendered documents
+PDF_ROOT = 'pdf'
+# How long a queued render suppresses further renders of the same document
+RENDER_LOCK_TIMEOUT = 300
+
+
+@lru_cache(maxsize=None)
+def template_digest(template_name):
+    source = get_template(template_name).template.source
+    return hashlib.sha256(source.encode()).hexdigest()
+
+
+def normalize(data):
+    """Round-trip serializer output through JSON, as Celery will."""
+    return json.loads(json.dumps(data, cls=DjangoJSONEncoder))
+
+
+def document_path(kind, template_name, data):
+    """Content-addressed storage path of a document."""
+    payload = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True)
+    digest = hashlib.sha256(f'{template_digest(template_name)}\n{payload}'.encode()).hexdigest()
+    return f'{PDF_ROOT}/{kind}/{digest}.pdf'
+
+
+def render_pdf(template_name, data):
+    """Render a document to PDF bytes."""
+    # Imported here so that web workers never load the native libraries
+    from weasyprint import HTML
+
+    html = render_to_string(template_name, {'document': data})
+    return HTML(string=html).write_pdf()
+
+
+def store_pdf(template_name, data, path):
+    """Render a document into storage unless it is already there."""
+    if not default_storage.exists(path):
+        default_storage.save(path, ContentFile(render_pdf(template_name, data)))
+    return path
+
+
+def render_lock_key(path):
+    return f'pdf-render:{path}'
+
+
+def _file_response(path, filename):
+    return FileResponse(
+        default_storage.open(path, 'rb'), as_attachment=True,
+        filename=filename, content_type='application/pdf'
+    )
+
+
+def pdf_response(kind, template_name, data, filename):
+    """
+    Serve a document from storage, or queue its rendering.
+
+    Returns the PDF as an attachment when it is cached, otherwise 202; the
+    client retries the same URL until the document is ready.
+    """
+    from apps.core.tasks import render_document
+
+    data = normalize(data)
+    path = document_path(kind, template_name, data)
+    if default_storage.exists(path):
+        return _file_response(path, filename)
+
+    # Queue one render per document, however many clients are waiting
+    if cache.add(render_lock_key(path), True, RENDER_LOCK_TIMEOUT):
+        render_document.delay(template_name, data, path)
+        if default_storage.exists(path):
+            # Rendered eagerly
+            return _file_response(path, filename)
+    return Response({
+        "status": "rendering",
+        "detail": "The document is being generated. Retry this request shortly."
+    }, status=status.HTTP_202_ACCEPTED, headers={'Retry-After': '2'})
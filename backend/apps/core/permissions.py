@@ -17,6 +17,16 @@ class IsOwnerOrAdmin(permissions.BasePermission):
         # If the object is a user, check if it's the same user
         return obj == request.user
 
+class IsCustomerOrAdmin(permissions.BasePermission):
+    """
+    Allow access only to admins and the customer an object belongs to.
+    """
+    
+    def has_object_permission(self, request, view, obj):
+        if request.user.is_staff or request.user.role == 'admin':
+            return True
+        return obj.customer_id == request.user.id
+
 class IsAdminUser(permissions.BasePermission):
     """
     Allow access only to admin users.
@@ -0,0 +1,219 @@
+"""
+Per-request profiling of DRF views.
+
+ProfilingMiddleware records, for every request, the number of SQL queries,
+time spent in the database, time spent serializing and time spent rendering
+the response. The figures are exposed in a Server-Timing header and
+aggregated per view/action for the metrics endpoint.
+"""
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from rest_framework import serializers
+
+_local = threading.local()
+
+
+def current_profile():
+    """Return the profile of the request running on this thread, if any."""
+    return getattr(_local, 'profile', None)
+
+
+class RequestProfile:
+    """Timings and query count collected while handling one request."""
+
+    def __init__(self, label=''):
+        self.label = label
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.render_time = 0.0
+        self.total_time = 0.0
+        self.serializer_depth = 0
+        self.started = time.perf_counter()
+
+    def record_query(self, execute, sql, params, many, context):
+        """Database execute wrapper counting queries and their duration."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - started
+
+    def finish(self):
+        self.total_time = time.perf_counter() - self.started
+
+    def as_dict(self):
+        return {
+            'queries': self.queries,
+            'db_ms': round(self.db_time * 1000, 3),
+            'serializer_ms': round(self.serializer_time * 1000, 3),
+            'render_ms': round(self.render_time * 1000, 3),
+            'total_ms': round(self.total_time * 1000, 3),
+        }
+
+    def server_timing(self):
+        """Format the profile as a Server-Timing header value."""
+        return ', '.join([
+            f'db;dur={self.db_time * 1000:.2f};desc="{self.queries} queries"',
+            f'serializer;dur={self.serializer_time * 1000:.2f}',
+            f'render;dur={self.render_time * 1000:.2f}',
+            f'total;dur={self.total_time * 1000:.2f}',
+        ])
+
+
+@contextmanager
+def profiling(label=''):
+    """Profile every query run on this thread while the block executes."""
+    profile = RequestProfile(label)
+    previous = current_profile()
+    _local.profile = profile
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(profile.record_query))
+            yield profile
+    finally:
+        profile.finish()
+        _local.profile = previous
+
+
+class MetricsRegistry:
+    """Thread-safe running totals of request profiles per view/action."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def record(self, profile):
+        with self._lock:
+            route = self._routes.setdefault(profile.label, {
+                'requests': 0,
+                'queries': 0,
+                'max_queries': 0,
+                'db_time': 0.0,
+                'serializer_time': 0.0,
+                'render_time': 0.0,
+                'total_time': 0.0,
+                'max_time': 0.0,
+            })
+            route['requests'] += 1
+            route['queries'] += profile.queries
+            route['max_queries'] = max(route['max_queries'], profile.queries)
+            route['db_time'] += profile.db_time
+            route['serializer_time'] += profile.serializer_time
+            route['render_time'] += profile.render_time
+            route['total_time'] += profile.total_time
+            route['max_time'] = max(route['max_time'], profile.total_time)
+
+    def snapshot(self):
+        """Return per-route averages in milliseconds, slowest routes first."""
+        with self._lock:
+            routes = {label: dict(values) for label, values in self._routes.items()}
+
+        results = []
+        for label, route in routes.items():
+            count = route['requests']
+            results.append({
+                'route': label,
+                'requests': count,
+                'avg_queries': round(route['queries'] / count, 2),
+                'max_queries': route['max_queries'],
+                'avg_db_ms': round(route['db_time'] * 1000 / count, 3),
+                'avg_serializer_ms': round(route['serializer_time'] * 1000 / count, 3),
+                'avg_render_ms': round(route['render_time'] * 1000 / count, 3),
+                'avg_total_ms': round(route['total_time'] * 1000 / count, 3),
+                'max_total_ms': round(route['max_time'] * 1000, 3),
+            })
+        return sorted(results, key=lambda result: result['avg_total_ms'], reverse=True)
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+
+metrics = MetricsRegistry()
+
+
+def route_label(request):
+    """
+    Name a request after its method and URL name, e.g. 'GET appointment-list'.
+
+    Requests that resolve to no named URL share one label, so probing
+    arbitrary paths cannot grow the registry without bound.
+    """
+    match = getattr(request, 'resolver_match', None)
+    name = match.view_name if match and match.view_name else '<unresolved>'
+    return f'{request.method} {name}'
+
+
+def _timed_data(data_property):
+    """Wrap a serializer ``data`` property so the outermost access is timed."""
+
+    def data(self):
+        profile = current_profile()
+        if profile is None:
+            return data_property.fget(self)
+        profile.serializer_depth += 1
+        started = time.perf_counter()
+        try:
+            return data_property.fget(self)
+        finally:
+            profile.serializer_depth -= 1
+            if not profile.serializer_depth:
+                profile.serializer_time += time.perf_counter() - started
+
+    return property(data)
+
+
+def install_serializer_timing():
+    """Time serializer output for profiled requests. Safe to call repeatedly."""
+    for serializer_class in (serializers.Serializer, serializers.ListSerializer):
+        if not getattr(serializer_class, '_profiling_installed', False):
+            serializer_class.data = _timed_data(serializer_class.data)
+            serializer_class._profiling_installed = True
+
+
+class ProfilingMiddleware:
+    """
+    Record query count, DB, serializer and render time for every request.
+
+    Enabled by PROFILING_ENABLED; the Server-Timing header is only sent when
+    PROFILING_SERVER_TIMING is set, as it reveals backend internals.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'PROFILING_ENABLED', False)
+        self.server_timing = getattr(settings, 'PROFILING_SERVER_TIMING', False)
+        if self.enabled:
+            install_serializer_timing()
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        with profiling(request.path) as profile:
+            response = self.get_response(request)
+        profile.label = route_label(request)
+
+        metrics.record(profile)
+        if self.server_timing:
+            response['Server-Timing'] = profile.server_timing()
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view returns; time that step
+        profile = current_profile()
+        if profile is not None:
+            started = time.perf_counter()
+
+            def finished_rendering(rendered):
+                profile.render_time += time.perf_counter() - started
+
+            response.add_post_render_callback(finished_rendering)
+        return response
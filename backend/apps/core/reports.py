@@ -0,0 +1,85 @@
+"""
+Asynchronous report generation shared by AnalyticsReport and FinancialReport.
+
+A report model's app provides a ``reports`` module with a ``SECTIONS`` dict
+mapping each report type to ``{section name: function(report)}`` and,
+optionally, ``finalize(report, data)`` to derive figures from the computed
+sections. Submitting a report fans its sections out to Celery workers as a
+chord; each finished section advances ``sections_done`` so that progress
+can be polled, and the chord callback stores the merged ``report_data`` and
+a JSON copy in ``file``.
+"""
+import json
+from importlib import import_module
+
+from django.apps import apps
+from django.core.files.base import ContentFile
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+
+def report_label(report):
+    return report._meta.label
+
+
+def get_report(label, report_id):
+    return apps.get_model(label).objects.get(pk=report_id)
+
+
+def report_module(report):
+    return import_module(f'{report._meta.app_config.name}.reports')
+
+
+def report_sections(report):
+    """Section functions for the report's type, in computation order."""
+    return report_module(report).SECTIONS.get(report.report_type, {})
+
+
+def compute_section(report, name):
+    """Compute one section and return it as JSON-compatible data."""
+    data = report_sections(report)[name](report)
+    return json.loads(json.dumps(data, cls=DjangoJSONEncoder))
+
+
+def complete_report(report, sections):
+    """Merge computed sections, store the result and mark the report completed."""
+    data = {}
+    for section in sections:
+        data.update(section)
+    finalize = getattr(report_module(report), 'finalize', None)
+    if finalize:
+        data = finalize(report, data)
+
+    report.report_data = data
+    report.status = 'completed'
+    report.error = None
+    report.sections_done = report.sections_total
+    update_fields = ['report_data', 'status', 'error', 'sections_done', 'file', 'updated_at']
+    if hasattr(report, 'last_run'):
+        report.last_run = timezone.now()
+        update_fields.append('last_run')
+
+    content = json.dumps(data, cls=DjangoJSONEncoder, indent=2)
+    report.file.save(f'{report.report_type}-{report.pk}.json', ContentFile(content.encode()), save=False)
+    report.save(update_fields=update_fields)
+    return report
+
+
+def submit_report(report):
+    """
+    Queue a saved report for generation once the current transaction commits.
+
+    Returns the report with its status reset to pending.
+    """
+    from apps.core.tasks import dispatch_report
+
+    report.status = 'pending'
+    report.error = None
+    report.sections_total = len(report_sections(report))
+    report.sections_done = 0
+    report.save(update_fields=['status', 'error', 'sections_total', 'sections_done', 'updated_at'])
+
+    label = report_label(report)
+    transaction.on_commit(lambda: dispatch_report(label, report.pk))
+    return report
@@ -0,0 +1,68 @@
+from celery import chord, shared_task
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+
+from apps.core.models import IdempotencyKey
+from apps.core.pdf import render_lock_key, store_pdf
+from apps.core.reports import complete_report, compute_section, get_report, report_sections
+
+
+def dispatch_report(label, report_id):
+    """Fan the report's sections out to workers and join them in finalize_report."""
+    report = get_report(label, report_id)
+    names = list(report_sections(report))
+    callback = finalize_report.s(label, report_id)
+    if names:
+        result = chord(
+            compute_report_section.s(label, report_id, name) for name in names
+        )(callback)
+    else:
+        result = callback.delay([])
+    type(report).objects.filter(pk=report_id).update(task_id=result.id)
+    return result
+
+
+@shared_task
+def compute_report_section(label, report_id, name):
+    """Compute one report section and record the progress."""
+    report = get_report(label, report_id)
+    model = type(report)
+    model.objects.filter(pk=report_id, status='pending').update(status='running')
+    try:
+        data = compute_section(report, name)
+    except Exception as exc:
+        model.objects.filter(pk=report_id).update(status='failed', error=f'{name}: {exc}')
+        raise
+    model.objects.filter(pk=report_id).update(sections_done=F('sections_done') + 1)
+    return {name: data}
+
+
+@shared_task
+def finalize_report(sections, label, report_id):
+    """Store the merged sections of a report."""
+    report = get_report(label, report_id)
+    try:
+        complete_report(report, sections)
+    except Exception as exc:
+        type(report).objects.filter(pk=report_id).update(status='failed', error=str(exc))
+        raise
+    return report_id
+
+
+@shared_task
+def purge_idempotency_keys():
+    """Delete idempotency keys older than IDEMPOTENCY_KEY_TTL."""
+    cutoff = timezone.now() - settings.IDEMPOTENCY_KEY_TTL
+    deleted, _ = IdempotencyKey.objects.filter(created_at__lt=cutoff).delete()
+    return deleted
+
+
+@shared_task
+def render_document(template_name, data, path):
+    """Render a document into its content-addressed storage path."""
+    try:
+        return store_pdf(template_name, data, path)
+    finally:
+        cache.delete(render_lock_key(path))
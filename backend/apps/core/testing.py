@@ -0,0 +1,94 @@
+"""
+Test helpers for asserting per-endpoint query and latency budgets.
+
+Mix QueryBudgetMixin into a TestCase and call assertQueryBudget with a view
+(e.g. ``AppointmentViewSet.as_view({'get': 'list'})``) or a URL name from
+``api_patterns``; the assertion fails when the endpoint runs more queries
+than budgeted, which catches N+1 regressions before they ship.
+"""
+import time
+from unittest import mock
+
+from django.test import override_settings
+from django.urls import resolve, reverse
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from .profiling import install_serializer_timing, profiling
+
+
+class QueryBudgetMixin:
+    """Profile views the way ProfilingMiddleware does and assert budgets."""
+
+    def profile_view(self, view, method='get', path='/', data=None, user=None, **kwargs):
+        """Call a view and return the rendered response and its RequestProfile."""
+        install_serializer_timing()
+        factory = APIRequestFactory()
+        if method == 'get':
+            request = factory.get(path, data)
+        else:
+            request = getattr(factory, method)(path, data, format='json')
+        if user is not None:
+            force_authenticate(request, user=user)
+
+        with profiling(f'{method.upper()} {path}') as profile:
+            response = view(request, **kwargs)
+            if hasattr(response, 'render'):
+                started = time.perf_counter()
+                response.render()
+                profile.render_time += time.perf_counter() - started
+        return response, profile
+
+    def profile_route(self, name, method='get', data=None, user=None, args=None, kwargs=None):
+        """Profile the view behind a named URL, e.g. 'appointment-list'."""
+        path = reverse(name, args=args, kwargs=kwargs)
+        match = resolve(path)
+        return self.profile_view(
+            match.func, method=method, path=path, data=data, user=user, **match.kwargs
+        )
+
+    def assertQueryBudget(self, view, budget, max_ms=None, status_code=200, **options):
+        """
+        Assert that a view or URL name stays within ``budget`` queries and,
+        optionally, ``max_ms`` milliseconds. Returns the profile.
+        """
+        if isinstance(view, str):
+            response, profile = self.profile_route(view, **options)
+        else:
+            response, profile = self.profile_view(view, **options)
+
+        self.assertEqual(response.status_code, status_code)
+        self.assertLessEqual(
+            profile.queries, budget,
+            f"{profile.label} ran {profile.queries} queries, budget is {budget}"
+        )
+        if max_ms is not None:
+            self.assertLessEqual(
+                profile.total_time * 1000, max_ms,
+                f"{profile.label} took {profile.total_time * 1000:.1f}ms, budget is {max_ms}ms"
+            )
+        return profile
+
+
+class EagerCeleryMixin:
+    """
+    Run Celery tasks synchronously, in the test's own process and transaction.
+
+    Results go to an in-memory backend so that eager chords can be joined
+    without a Redis server.
+    """
+
+    def setUp(self):
+        from celery.backends.cache import CacheBackend
+        from config.celery import app
+
+        super().setUp()
+        eager = override_settings(CELERY_TASK_ALWAYS_EAGER=True, CELERY_TASK_EAGER_PROPAGATES=True)
+        eager.enable()
+        self.addCleanup(eager.disable)
+
+        backend = mock.patch.object(
+            type(app), 'backend', new_callable=mock.PropertyMock,
+            return_value=CacheBackend(app=app, backend='memory'),
+        )
+        backend.start()
+        self.addCleanup(backend.stop)
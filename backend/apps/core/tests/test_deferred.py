@@ -0,0 +1,30 @@
+from django.db import transaction
+from django.test import TestCase
+
+from apps.core.deferred import defer_until_commit
+
+
+class DeferUntilCommitTests(TestCase):
+    """Test collecting ids and flushing them once per commit."""
+
+    def test_ids_are_flushed_together_on_commit(self):
+        flushed = []
+        with self.captureOnCommitCallbacks(execute=True):
+            defer_until_commit('test', [1, 2], flushed.append)
+            defer_until_commit('test', [2, 3], flushed.append)
+            defer_until_commit('other', ['a'], flushed.append)
+            self.assertEqual(flushed, [])
+        self.assertEqual(flushed, [{1, 2, 3}, {'a'}])
+
+        # The next transaction starts from an empty set
+        with self.captureOnCommitCallbacks(execute=True):
+            defer_until_commit('test', [4], flushed.append)
+        self.assertEqual(flushed[2:], [{4}])
+
+    def test_nested_blocks_flush_on_the_outer_commit(self):
+        flushed = []
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                defer_until_commit('test', [1], flushed.append)
+            defer_until_commit('test', [2], flushed.append)
+        self.assertEqual(flushed, [{1, 2}])
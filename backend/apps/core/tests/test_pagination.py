@@ -0,0 +1,143 @@
+import json
+from base64 import urlsafe_b64encode
+from datetime import datetime, timedelta, timezone as dt_timezone
+from urllib.parse import parse_qs, urlparse
+
+from django.test import TestCase, override_settings
+from rest_framework import filters, generics, serializers
+from rest_framework.permissions import AllowAny
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.core.models import AuditLog, User
+from apps.core.pagination import KeysetPagination
+from apps.core.views import AuditLogViewSet
+from apps.engagement.models import Notification
+
+
+class NotificationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Notification
+        fields = ['id', 'scheduled_at']
+
+
+class NotificationListView(generics.ListAPIView):
+    queryset = Notification.objects.all()
+    serializer_class = NotificationSerializer
+    permission_classes = [AllowAny]
+    pagination_class = KeysetPagination
+    filter_backends = [filters.OrderingFilter]
+    ordering_fields = ['created_at', 'scheduled_at']
+    ordering = ['-created_at']
+
+
+def query(link):
+    return {name: values[0] for name, values in parse_qs(urlparse(link).query).items()}
+
+
+class KeysetPaginationTests(TestCase):
+    """Test cursor pagination of the audit log and notification lists."""
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.admin = User.objects.create_user(email="admin@example.com", role="admin")
+        # Pairs of entries share a timestamp so that the id breaks ties
+        start = datetime(2030, 1, 1, tzinfo=dt_timezone.utc)
+        AuditLog.objects.bulk_create([AuditLog(action=f"action {index}") for index in range(25)])
+        for index, log in enumerate(AuditLog.objects.order_by('id')):
+            AuditLog.objects.filter(pk=log.pk).update(created_at=start + timedelta(minutes=index // 2))
+        self.expected = list(AuditLog.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+
+    def audit_logs(self, **params):
+        request = self.factory.get('/api/v1/core/audit-logs/', params)
+        force_authenticate(request, user=self.admin)
+        response = AuditLogViewSet.as_view({'get': 'list'})(request)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def ids(self, response):
+        return [entry['id'] for entry in response.data['results']]
+
+    def test_walks_forwards_and_backwards_without_gaps(self):
+        seen = []
+        pages = []
+        params = {'page_size': 7}
+        while True:
+            response = self.audit_logs(**params)
+            pages.append(self.ids(response))
+            seen.extend(pages[-1])
+            if not response.data['next']:
+                break
+            params = query(response.data['next'])
+        self.assertEqual(seen, self.expected)
+        self.assertEqual(len(pages), 4)
+
+        response = self.audit_logs(**query(self.audit_logs(**params).data['previous']))
+        self.assertEqual(self.ids(response), pages[-2])
+
+    def test_audit_log_count_is_opt_in(self):
+        self.assertNotIn('count', self.audit_logs().data)
+        self.assertEqual(self.audit_logs(count='true').data['count'], 25)
+
+    def test_page_size_is_capped(self):
+        with override_settings(MAX_PAGE_SIZE=5):
+            response = self.audit_logs(page_size=1000)
+        self.assertEqual(len(response.data['results']), 5)
+
+    def test_deep_page_does_not_offset(self):
+        response = self.audit_logs(page_size=20)
+        params = query(response.data['next'])
+        with self.assertNumQueries(1) as queries:
+            response = self.audit_logs(**params)
+        self.assertEqual(self.ids(response), self.expected[20:])
+        self.assertNotIn('OFFSET', queries.captured_queries[0]['sql'].upper())
+
+    def test_invalid_cursor(self):
+        created_at = AuditLog.objects.latest('id').created_at.isoformat()
+        tampered = [
+            {'p': ["not-a-date", 1]},
+            {'p': [created_at, "abc"]},
+            {'p': [created_at, [1]]},
+        ]
+        cursors = ['not-a-cursor'] + [
+            urlsafe_b64encode(json.dumps(cursor).encode()).decode('ascii') for cursor in tampered
+        ]
+        for cursor in cursors:
+            request = self.factory.get('/api/v1/core/audit-logs/', {'cursor': cursor})
+            force_authenticate(request, user=self.admin)
+            response = AuditLogViewSet.as_view({'get': 'list'})(request)
+            self.assertEqual(response.status_code, 404, cursor)
+
+    def test_nullable_ordering_field(self):
+        scheduled = datetime(2030, 2, 1, tzinfo=dt_timezone.utc)
+        Notification.objects.bulk_create([
+            Notification(
+                user=self.admin, title=f"Notice {index}", message="Hello",
+                notification_type='system', channel='in_app',
+                scheduled_at=scheduled + timedelta(hours=index % 3) if index % 2 else None,
+            )
+            for index in range(9)
+        ])
+        expected = sorted(
+            Notification.objects.values_list('scheduled_at', 'id'),
+            key=lambda row: (row[0] is None, row[0] or scheduled, row[1])
+        )
+
+        def notifications(**params):
+            request = self.factory.get('/api/v1/engagement/notifications/', params)
+            return NotificationListView.as_view()(request)
+
+        seen = []
+        pages = []
+        params = {'ordering': 'scheduled_at', 'page_size': 2}
+        while True:
+            response = notifications(**params)
+            pages.append(self.ids(response))
+            seen.extend(pages[-1])
+            if not response.data['next']:
+                break
+            params = query(response.data['next'])
+        self.assertEqual(seen, [row[1] for row in expected])
+
+        # Step back from the last page, which ends among the nulls
+        previous = notifications(**query(response.data['previous']))
+        self.assertEqual(self.ids(previous), pages[-2])
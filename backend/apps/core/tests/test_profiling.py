@@ -0,0 +1,106 @@
+from django.test import TestCase, override_settings
+from django.urls import path
+from rest_framework import serializers
+from rest_framework.permissions import AllowAny
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.core.models import User
+from apps.core.profiling import metrics
+from apps.core.testing import QueryBudgetMixin
+from apps.core.views import MetricsView
+
+
+class EmailSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ['email']
+
+
+class UserEmailsView(APIView):
+    permission_classes = [AllowAny]
+
+    def get(self, request):
+        return Response(EmailSerializer(User.objects.order_by('email'), many=True).data)
+
+
+user_emails = UserEmailsView.as_view()
+
+
+urlpatterns = [
+    path('emails/', user_emails, name='user-emails'),
+]
+
+
+@override_settings(ROOT_URLCONF=__name__, PROFILING_ENABLED=True, PROFILING_SERVER_TIMING=True)
+class ProfilingMiddlewareTests(TestCase):
+    """Test request profiling and the Server-Timing header."""
+
+    def setUp(self):
+        metrics.reset()
+        User.objects.create_user(email="first@example.com")
+        User.objects.create_user(email="second@example.com")
+
+    def test_server_timing_header(self):
+        response = self.client.get('/emails/')
+        self.assertEqual(response.status_code, 200)
+        timing = response['Server-Timing']
+        for metric in ('db;', 'serializer;', 'render;', 'total;'):
+            self.assertIn(metric, timing)
+        self.assertIn('desc="1 queries"', timing)
+
+    def test_metrics_aggregate_per_route(self):
+        self.client.get('/emails/')
+        self.client.get('/emails/')
+        routes = {route['route']: route for route in metrics.snapshot()}
+        self.assertEqual(routes['GET user-emails']['requests'], 2)
+        self.assertEqual(routes['GET user-emails']['max_queries'], 1)
+
+    def test_unresolved_paths_share_a_route(self):
+        self.client.get('/missing/1/')
+        self.client.get('/missing/2/')
+        routes = {route['route']: route for route in metrics.snapshot()}
+        self.assertEqual(set(routes), {'GET <unresolved>'})
+        self.assertEqual(routes['GET <unresolved>']['requests'], 2)
+
+    @override_settings(PROFILING_SERVER_TIMING=False)
+    def test_header_can_be_disabled(self):
+        response = self.client.get('/emails/')
+        self.assertNotIn('Server-Timing', response)
+        self.assertTrue(metrics.snapshot())
+
+
+class MetricsViewTests(TestCase):
+    """Test the metrics endpoint."""
+
+    def test_admin_only(self):
+        user = User.objects.create_user(email="customer@example.com", role="customer")
+        request = APIRequestFactory().get('/health/metrics/')
+        force_authenticate(request, user=user)
+        self.assertEqual(MetricsView.as_view()(request).status_code, 403)
+
+    def test_lists_routes(self):
+        admin = User.objects.create_user(email="admin@example.com", role="admin")
+        request = APIRequestFactory().get('/health/metrics/')
+        force_authenticate(request, user=admin)
+        response = MetricsView.as_view()(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('routes', response.data)
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class QueryBudgetMixinTests(QueryBudgetMixin, TestCase):
+    """Test the query budget assertion."""
+
+    def test_within_budget(self):
+        profile = self.assertQueryBudget(user_emails, budget=1)
+        self.assertEqual(profile.queries, 1)
+        self.assertGreater(profile.serializer_time, 0)
+
+    def test_named_route(self):
+        self.assertQueryBudget('user-emails', budget=1)
+
+    def test_over_budget_fails(self):
+        with self.assertRaises(AssertionError):
+            self.assertQueryBudget(user_emails, budget=0)
@@ -0,0 +1,134 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.test import TestCase, override_settings
+
+from apps.booking.models import Appointment, Invoice, Payment, WaitlistEntry
+from apps.booking.views import AppointmentViewSet, InvoiceViewSet, PaymentViewSet, WaitlistEntryViewSet
+from apps.clinic.models import Branch, Service, TherapistAvailability, TherapistProfile
+from apps.clinic.views import (
+    BranchViewSet, HolidayViewSet, ServiceViewSet, TherapistAvailabilityViewSet, TherapistProfileViewSet
+)
+from apps.core.models import User
+from apps.core.testing import QueryBudgetMixin
+from apps.core.views import AuditLogViewSet, UserConsentViewSet, UserProfileViewSet, UserViewSet
+from apps.ehr.views import (
+    FileAttachmentViewSet, MedicalHistoryViewSet, SymptomTrackerViewSet, TreatmentSessionViewSet
+)
+from apps.inventory import ledger
+from apps.inventory.models import Product, ProductCategory, PurchaseOrder, PurchaseOrderItem, Vendor, VendorProduct
+from apps.inventory.views import (
+    InventoryTransactionViewSet, InventoryViewSet, ProductCategoryViewSet, ProductViewSet,
+    PurchaseOrderItemViewSet, PurchaseOrderViewSet, VendorProductViewSet, VendorViewSet
+)
+
+
+def at(day, hour):
+    return datetime(2030, 1, day, hour, tzinfo=dt_timezone.utc)
+
+
+# Measure the database work, not the catalog cache
+@override_settings(CATALOG_CACHE_ENABLED=False)
+class ListQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Guard the API's list endpoints against N+1 query regressions."""
+
+    def setUp(self):
+        self.admin = User.objects.create_user(email="admin@example.com", role="admin", is_staff=True)
+        self.branch = Branch.objects.create(
+            name="Main Branch", address="123 Main St", city="Pune", state="MH",
+            country="India", postal_code="411001", phone="555-123-4567"
+        )
+        self.service = Service.objects.create(
+            name="Massage", description="Relaxing massage", duration=60, price=100, category="massage"
+        )
+        self.service.available_branches.add(self.branch)
+        self.category = ProductCategory.objects.create(name="Oils")
+        self.vendor = Vendor.objects.create(name="Supplier")
+        self.order = PurchaseOrder.objects.create(
+            vendor=self.vendor, branch=self.branch, order_number="PO-1", order_date=at(1, 9).date()
+        )
+        self.rows = 0
+        self.add_rows(1)
+
+    def add_rows(self, count):
+        """Add ``count`` rows to every listed table."""
+        for index in range(self.rows, self.rows + count):
+            customer = User.objects.create_user(email=f"customer{index}@example.com", role="customer")
+            therapist = TherapistProfile.objects.create(user=User.objects.create_user(
+                email=f"therapist{index}@example.com", role="therapist"
+            ))
+            therapist.branches.add(self.branch)
+            therapist.services.add(self.service)
+            TherapistAvailability.objects.create(
+                therapist=therapist, branch=self.branch, start_time=at(1, 9), end_time=at(1, 17),
+                recurrence='daily'
+            )
+            start_time = at(10 + index, 10)
+            appointment = Appointment.objects.create(
+                customer=customer, therapist_profile=therapist, service=self.service, branch=self.branch,
+                start_time=start_time, end_time=start_time + timedelta(hours=1)
+            )
+            Payment.objects.create(
+                appointment=appointment, amount=100, total_amount=118, status='completed', payment_method='card'
+            )
+            Invoice.objects.create(
+                customer=customer, appointment=appointment, invoice_number=f"INV-{index}",
+                issue_date=start_time.date(), items=[], subtotal=100, total=118
+            )
+            WaitlistEntry.objects.create(
+                customer=customer, service=self.service, therapist_profile=therapist, branch=self.branch,
+                preferred_date=start_time.date(), position=index + 1
+            )
+            product = Product.objects.create(
+                name=f"Oil {index}", sku=f"OIL-{index}", cost_price=5, retail_price=12, category=self.category
+            )
+            VendorProduct.objects.create(vendor=self.vendor, product=product, vendor_price=4)
+            PurchaseOrderItem.objects.create(
+                purchase_order=self.order, product=product, quantity_ordered=5, unit_price=4
+            )
+            ledger.post(ledger.stock_for(product.id, self.branch.id), 'purchase', 10)
+        self.rows += count
+
+    def list_queries(self, viewset):
+        response, profile = self.profile_view(viewset.as_view({'get': 'list'}), user=self.admin)
+        self.assertEqual(response.status_code, 200)
+        return profile.queries
+
+    def assertListBudgets(self, budgets):
+        """
+        Assert that each viewset's list stays within its budget and runs
+        the same number of queries with one row per table as with four.
+        """
+        few = {viewset: self.list_queries(viewset) for viewset in budgets}
+        self.add_rows(3)
+        for viewset, budget in budgets.items():
+            many = self.list_queries(viewset)
+            self.assertEqual(few[viewset], many, f"{viewset.__name__} list queries grow with rows")
+            self.assertLessEqual(many, budget, f"{viewset.__name__} ran {many} queries, budget is {budget}")
+
+    def test_core(self):
+        self.assertListBudgets({
+            UserViewSet: 3, UserProfileViewSet: 2, UserConsentViewSet: 1, AuditLogViewSet: 1,
+        })
+
+    def test_clinic(self):
+        self.assertListBudgets({
+            BranchViewSet: 2, ServiceViewSet: 3, TherapistProfileViewSet: 5,
+            TherapistAvailabilityViewSet: 2, HolidayViewSet: 1,
+        })
+
+    def test_booking(self):
+        self.assertListBudgets({
+            AppointmentViewSet: 2, PaymentViewSet: 6, InvoiceViewSet: 6, WaitlistEntryViewSet: 2,
+        })
+
+    def test_ehr(self):
+        self.assertListBudgets({
+            MedicalHistoryViewSet: 1, TreatmentSessionViewSet: 1, SymptomTrackerViewSet: 1,
+            FileAttachmentViewSet: 1,
+        })
+
+    def test_inventory(self):
+        self.assertListBudgets({
+            ProductCategoryViewSet: 2, ProductViewSet: 2, InventoryViewSet: 2, InventoryTransactionViewSet: 2,
+            VendorViewSet: 2, VendorProductViewSet: 2, PurchaseOrderViewSet: 4, PurchaseOrderItemViewSet: 2,
+        })
@@ -25,7 +25,9 @@ from .serializers import (
     PasswordResetRequestSerializer,
     PasswordResetConfirmSerializer
 )
+from .pagination import UncountedKeysetPagination
 from .permissions import IsAdminUser, IsOwnerOrAdmin
+from .profiling import metrics
 
 User = get_user_model()
 
@@ -266,9 +268,10 @@ class UserViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         # Regular users can only see themselves, admins can see all users
+        queryset = User.objects.select_related('profile', 'settings').prefetch_related('consents')
         if self.request.user.is_staff or self.request.user.role == 'admin':
-            return User.objects.all()
-        return User.objects.filter(id=self.request.user.id)
+            return queryset
+        return queryset.filter(id=self.request.user.id)
     
     @action(detail=False, methods=['get'])
     def me(self, request):
@@ -354,6 +357,23 @@ class AuditLogViewSet(viewsets.ReadOnlyModelViewSet):
     """ViewSet for AuditLog model (read-only)."""
     serializer_class = AuditLogSerializer
     permission_classes = [IsAdminUser]
+    # Millions of rows: scroll by cursor and only count when asked to
+    pagination_class = UncountedKeysetPagination
+    ordering = ['-created_at']
     
     def get_queryset(self):
-        return AuditLog.objects.all().order_by('-created_at')
\ No newline at end of file
+        return AuditLog.objects.all()
+
+class MetricsView(APIView):
+    """Expose per-route query counts and timings collected by ProfilingMiddleware."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({
+            'enabled': settings.PROFILING_ENABLED,
+            'routes': metrics.snapshot(),
+        })
+
+    def delete(self, request):
+        metrics.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,64 @@
+import shutil
+import tempfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.booking.models import Appointment
+from apps.clinic.models import Branch, Service, TherapistProfile
+from apps.core.models import User
+from apps.core.testing import EagerCeleryMixin
+from apps.ehr.models import TreatmentSession
+from apps.ehr.views import TreatmentSessionViewSet
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class TreatmentSummaryPdfTests(EagerCeleryMixin, TestCase):
+    """Test the cached treatment session PDF summary."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        branch = Branch.objects.create(
+            name="Main Branch", address="123 Main St", city="Pune", state="MH",
+            country="India", postal_code="411001", phone="555-123-4567"
+        )
+        service = Service.objects.create(
+            name="Massage", description="Relaxing massage", duration=60, price=100, category="massage"
+        )
+        self.customer = User.objects.create_user(email="customer@example.com", role="customer")
+        self.therapist_user = User.objects.create_user(email="therapist@example.com", role="therapist")
+        therapist = TherapistProfile.objects.create(user=self.therapist_user)
+        start_time = datetime(2030, 1, 8, 9, tzinfo=dt_timezone.utc)
+        appointment = Appointment.objects.create(
+            customer=self.customer, therapist_profile=therapist, service=service, branch=branch,
+            start_time=start_time, end_time=start_time + timedelta(hours=1), status='completed'
+        )
+        self.session = TreatmentSession.objects.create(
+            appointment=appointment, customer=self.customer, therapist=therapist, service=service,
+            status='completed', notes="Lower back tension"
+        )
+
+    def pdf_summary(self):
+        request = APIRequestFactory().get(f'/ehr/sessions/{self.session.pk}/pdf_summary/')
+        force_authenticate(request, user=self.therapist_user)
+        return TreatmentSessionViewSet.as_view({'get': 'pdf_summary'})(request, pk=self.session.pk)
+
+    def test_summary_is_rendered_once(self):
+        with mock.patch('apps.core.pdf.render_pdf', return_value=b"%PDF summary") as render:
+            first = self.pdf_summary()
+            second = self.pdf_summary()
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(b''.join(second.streaming_content), b"%PDF summary")
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(render.call_args[0][1]['notes'], "Lower back tension")
@@ -13,9 +13,13 @@ from .serializers import (
     WellnessJournalSerializer,
     FileAttachmentSerializer
 )
+from apps.core.dates import date_range_q
+from apps.core.pdf import pdf_response
 from apps.core.permissions import IsAdminUser, IsTherapist, IsOwnerOrAdmin
 from apps.booking.models import Appointment
 
+TREATMENT_SUMMARY_TEMPLATE = 'ehr/treatment_summary_pdf.html'
+
 
 class MedicalHistoryViewSet(viewsets.ModelViewSet):
     """ViewSet for MedicalHistory model."""
@@ -81,18 +85,16 @@ class TreatmentSessionViewSet(viewsets.ModelViewSet):
                 return TreatmentSession.objects.none()
         
         # Filter by date range
-        start_date = self.request.query_params.get('start_date')
-        end_date = self.request.query_params.get('end_date')
-        
-        if start_date:
-            queryset = queryset.filter(created_at__date__gte=start_date)
-        if end_date:
-            queryset = queryset.filter(created_at__date__lte=end_date)
+        queryset = queryset.filter(date_range_q(
+            'created_at',
+            self.request.query_params.get('start_date'),
+            self.request.query_params.get('end_date')
+        ))
             
         return queryset.order_by('-created_at')
     
     def get_permissions(self):
-        if self.action in ['retrieve']:
+        if self.action in ['retrieve', 'pdf_summary']:
             permission_classes = [permissions.IsAuthenticated & (IsOwnerOrAdmin | IsTherapist)]
         elif self.action in ['create', 'update', 'partial_update']:
             permission_classes = [permissions.IsAuthenticated & (IsAdminUser | IsTherapist)]
@@ -123,15 +125,17 @@ class TreatmentSessionViewSet(viewsets.ModelViewSet):
     
     @action(detail=True, methods=['get'])
     def pdf_summary(self, request, pk=None):
-        """Generate a PDF summary of the treatment session."""
-        treatment_session = self.get_object()
+        """
+        Download a PDF summary of the treatment session.
         
-        # In a real implementation, we would generate a PDF here
-        # For now, just return the session data
-        return Response({
-            'message': 'PDF generation would happen here',
-            'session': TreatmentSessionSerializer(treatment_session).data
-        })
+        Answers 202 while the PDF is being rendered; retry until it is served.
+        """
+        treatment_session = self.get_object()
+        return pdf_response(
+            'treatment-sessions', TREATMENT_SUMMARY_TEMPLATE,
+            TreatmentSessionSerializer(treatment_session).data,
+            f'treatment-summary-{treatment_session.id}.pdf'
+        )
 
 
 class SymptomTrackerViewSet(viewsets.ModelViewSet):
@@ -124,6 +124,7 @@ class Notification(models.Model):
     
     STATUS_CHOICES = [
         ('pending', 'Pending'),
+        ('queued', 'Queued'),
         ('sent', 'Sent'),
         ('delivered', 'Delivered'),
         ('read', 'Read'),
@@ -160,6 +161,18 @@ class Notification(models.Model):
         verbose_name = _('notification')
         verbose_name_plural = _('notifications')
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pages of a user's notifications, newest first
+            models.Index(fields=['user', 'created_at', 'id'], name='notification_user_created'),
+            models.Index(fields=['created_at', 'id'], name='notification_created'),
+            # Due scheduled notifications; sent ones drop out of the index
+            models.Index(
+                fields=['scheduled_at'], condition=models.Q(status='pending'),
+                name='notification_pending_due',
+            ),
+            # Reminders of an appointment
+            models.Index(fields=['content_type', 'object_id'], name='notification_object'),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.user.email}"
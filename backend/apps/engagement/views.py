@@ -6,6 +6,7 @@ from django.utils import timezone
 from django.contrib.auth import get_user_model
 from django.contrib.contenttypes.models import ContentType
 
+from apps.core.pagination import KeysetPagination
 from apps.core.permissions import IsAdminUser, IsTherapist, IsOwnerOrAdmin
 from apps.engagement.models import (
     Campaign, CampaignRecipient, Notification, FeedbackForm, 
@@ -138,6 +139,7 @@ class NotificationViewSet(viewsets.ModelViewSet):
     search_fields = ['title', 'message']
     ordering_fields = ['created_at', 'scheduled_at', 'notification_type', 'status']
     ordering = ['-created_at']
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         """
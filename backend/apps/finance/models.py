@@ -145,6 +145,9 @@ class Transaction(models.Model):
         verbose_name = _('transaction')
         verbose_name_plural = _('transactions')
         ordering = ['-date', '-created_at']
+        indexes = [
+            models.Index(fields=['date', 'created_at', 'id'], name='transaction_date_created'),
+        ]
         
     def __str__(self):
         return f"{self.get_type_display()}: {self.amount} - {self.date}"
@@ -212,6 +215,13 @@ class FinancialReport(models.Model):
         ('custom', 'Custom Report'),
     ]
     
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    
     name = models.CharField(_('name'), max_length=255)
     report_type = models.CharField(_('report type'), max_length=50, choices=REPORT_TYPES)
     start_date = models.DateField(_('start date'))
@@ -221,6 +231,11 @@ class FinancialReport(models.Model):
     parameters = models.JSONField(_('parameters'), blank=True, null=True)
     report_data = models.JSONField(_('report data'), blank=True, null=True)
     file = models.FileField(_('file'), upload_to='financial_reports/', blank=True, null=True)
+    status = models.CharField(_('status'), max_length=20, choices=STATUS_CHOICES, default='pending')
+    task_id = models.CharField(_('task ID'), max_length=255, blank=True, null=True)
+    sections_total = models.PositiveSmallIntegerField(_('sections total'), default=0)
+    sections_done = models.PositiveSmallIntegerField(_('sections done'), default=0)
+    error = models.TextField(_('error'), blank=True, null=True)
     generated_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
                                    related_name='generated_reports')
     created_at = models.DateTimeField(_('created at'), auto_now_add=True)
@@ -232,4 +247,13 @@ class FinancialReport(models.Model):
         ordering = ['-created_at']
         
     def __str__(self):
-        return f"{self.name} - {self.get_report_type_display()} ({self.start_date} to {self.end_date})"
\ No newline at end of file
+        return f"{self.name} - {self.get_report_type_display()} ({self.start_date} to {self.end_date})"
+    
+    @property
+    def progress(self):
+        """Percentage of report sections computed so far."""
+        if self.status == 'completed':
+            return 100
+        if not self.sections_total:
+            return 0
+        return int(self.sections_done * 100 / self.sections_total)
@@ -0,0 +1,69 @@
+"""
+Report sections for FinancialReport, computed by apps.core.reports.
+
+Each section receives the report and returns JSON-compatible data stored
+under the section's name in ``report_data``.
+"""
+from django.db.models import Q, Sum
+
+from apps.finance.models import Transaction
+
+
+def _transactions(report, transaction_type):
+    transactions = Transaction.objects.filter(
+        date__gte=report.start_date,
+        date__lte=report.end_date,
+        type=transaction_type
+    )
+    if report.branch_id:
+        related_branch = 'invoice__appointment__branch_id' if transaction_type == 'income' else 'expense__branch_id'
+        transactions = transactions.filter(
+            Q(account__branch_id=report.branch_id) | Q(**{related_branch: report.branch_id})
+        )
+    return transactions
+
+
+def _total(report, transaction_type):
+    return float(_transactions(report, transaction_type).aggregate(total=Sum('amount'))['total'] or 0)
+
+
+def _by_category(report, transaction_type):
+    return [
+        {'category__name': row['category__name'], 'total': float(row['total'])}
+        for row in _transactions(report, transaction_type).values('category__name').annotate(
+            total=Sum('amount')
+        ).order_by('category__name')
+    ]
+
+
+def total_income(report):
+    return _total(report, 'income')
+
+
+def total_expenses(report):
+    return _total(report, 'expense')
+
+
+def income_by_category(report):
+    return _by_category(report, 'income')
+
+
+def expenses_by_category(report):
+    return _by_category(report, 'expense')
+
+
+SECTIONS = {
+    'income_statement': {
+        'total_income': total_income,
+        'total_expenses': total_expenses,
+        'income_by_category': income_by_category,
+        'expenses_by_category': expenses_by_category,
+    },
+}
+
+
+def finalize(report, data):
+    """Derive figures that need more than one section."""
+    if report.report_type == 'income_statement':
+        data['net_income'] = data['total_income'] - data['total_expenses']
+    return data
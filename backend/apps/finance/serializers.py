@@ -114,8 +114,10 @@ class FinancialReportSerializer(serializers.ModelSerializer):
     
     branch_detail = BranchSerializer(source='branch', read_only=True)
     generated_by_detail = UserSerializer(source='generated_by', read_only=True)
+    progress = serializers.IntegerField(read_only=True)
     
     class Meta:
         model = FinancialReport
         fields = '__all__'
-        read_only_fields = ('created_at', 'updated_at', 'file', 'report_data')
\ No newline at end of file
+        read_only_fields = ('created_at', 'updated_at', 'file', 'report_data', 'status',
+                           'task_id', 'sections_total', 'sections_done', 'error')
\ No newline at end of file
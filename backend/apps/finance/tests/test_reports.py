@@ -0,0 +1,54 @@
+import shutil
+import tempfile
+from datetime import date
+
+from django.test import TestCase, override_settings
+
+from apps.core.models import User
+from apps.core.reports import submit_report
+from apps.core.testing import EagerCeleryMixin
+from apps.finance.models import BudgetCategory, FinancialAccount, FinancialReport, Transaction
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class FinancialReportGenerationTests(EagerCeleryMixin, TestCase):
+    """Test asynchronous income statement generation."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user(email="admin@example.com", role="admin")
+        account = FinancialAccount.objects.create(name="Bank", account_type='bank', current_balance=0)
+        services = BudgetCategory.objects.create(name="Services", category_type='income')
+        rent = BudgetCategory.objects.create(name="Rent", category_type='expense')
+        for kind, category, amount, day in [
+            ('income', services, 500, 5), ('income', services, 250, 6),
+            ('expense', rent, 300, 7), ('income', services, 999, 28),
+        ]:
+            Transaction.objects.create(
+                account=account, type=kind, category=category, amount=amount,
+                date=date(2030, 1, day), description="Test"
+            )
+
+    def test_income_statement(self):
+        report = FinancialReport.objects.create(
+            name="January", report_type='income_statement', start_date=date(2030, 1, 1),
+            end_date=date(2030, 1, 15), generated_by=self.admin
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            submit_report(report)
+
+        report.refresh_from_db()
+        self.assertEqual(report.status, 'completed')
+        self.assertEqual(report.report_data['total_income'], 750.0)
+        self.assertEqual(report.report_data['total_expenses'], 300.0)
+        self.assertEqual(report.report_data['net_income'], 450.0)
+        self.assertEqual(report.report_data['income_by_category'], [
+            {'category__name': 'Services', 'total': 750.0},
+        ])
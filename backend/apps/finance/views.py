@@ -3,9 +3,9 @@ from rest_framework import viewsets, permissions, filters, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Sum, Q
+from django.db.models import Sum
 from django.utils import timezone
-from datetime import timedelta
+from datetime import datetime, timedelta
 
 from apps.finance.models import (
     BudgetCategory, Expense, FinancialAccount, 
@@ -15,6 +15,8 @@ from apps.finance.serializers import (
     BudgetCategorySerializer, ExpenseSerializer, FinancialAccountSerializer,
     TransactionSerializer, BudgetSerializer, TaxRateSerializer, FinancialReportSerializer
 )
+from apps.core.pagination import KeysetPagination
+from apps.core.reports import submit_report
 from apps.core.permissions import IsAdminUser, IsTherapistUser, IsOwnerOrReadOnly
 
 
@@ -135,6 +137,8 @@ class TransactionViewSet(viewsets.ModelViewSet):
     filterset_fields = ['account', 'type', 'category', 'date']
     search_fields = ['description', 'reference_number']
     ordering_fields = ['date', 'amount', 'created_at']
+    ordering = ['-date', '-created_at']
+    pagination_class = KeysetPagination
     
     def perform_create(self, serializer):
         """Set the created_by field to the current user."""
@@ -251,7 +255,7 @@ class FinancialReportViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['post'])
     def generate(self, request):
-        """Generate a new financial report."""
+        """Queue a new financial report; poll its progress action for the result."""
         # Get parameters from request
         report_type = request.data.get('report_type')
         start_date = request.data.get('start_date')
@@ -264,51 +268,15 @@ class FinancialReportViewSet(viewsets.ModelViewSet):
                 "detail": "Missing required parameters."
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Generate report data based on type
-        report_data = {}
-        
-        if report_type == 'income_statement':
-            # Calculate income
-            income_transactions = Transaction.objects.filter(
-                date__range=(start_date, end_date),
-                type='income'
-            )
-            if branch_id:
-                income_transactions = income_transactions.filter(
-                    Q(account__branch_id=branch_id) | Q(invoice__appointment__branch_id=branch_id)
-                )
-            
-            total_income = income_transactions.aggregate(total=Sum('amount'))['total'] or 0
-            
-            # Calculate expenses
-            expense_transactions = Transaction.objects.filter(
-                date__range=(start_date, end_date),
-                type='expense'
-            )
-            if branch_id:
-                expense_transactions = expense_transactions.filter(
-                    Q(account__branch_id=branch_id) | Q(expense__branch_id=branch_id)
-                )
-            
-            total_expenses = expense_transactions.aggregate(total=Sum('amount'))['total'] or 0
-            
-            # Calculate net income
-            net_income = total_income - total_expenses
-            
-            # Build report data
-            report_data = {
-                'total_income': float(total_income),
-                'total_expenses': float(total_expenses),
-                'net_income': float(net_income),
-                'income_by_category': list(income_transactions.values(
-                    'category__name'
-                ).annotate(total=Sum('amount'))),
-                'expenses_by_category': list(expense_transactions.values(
-                    'category__name'
-                ).annotate(total=Sum('amount')))
-            }
+        try:
+            start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
+            end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
+        except ValueError:
+            return Response({
+                "detail": "Dates must be in YYYY-MM-DD format."
+            }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Create the report
+        # Create the report and compute its sections on the workers
         report = FinancialReport.objects.create(
             name=name,
             report_type=report_type,
@@ -316,9 +284,21 @@ class FinancialReportViewSet(viewsets.ModelViewSet):
             end_date=end_date,
             branch_id=branch_id if branch_id else None,
             parameters=request.data,
-            report_data=report_data,
             generated_by=request.user
         )
+        submit_report(report)
         
         serializer = self.get_serializer(report)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
\ No newline at end of file
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+    
+    @action(detail=True, methods=['get'])
+    def progress(self, request, pk=None):
+        """Get the generation status of a report."""
+        report = self.get_object()
+        return Response({
+            'id': report.id,
+            'status': report.status,
+            'progress': report.progress,
+            'task_id': report.task_id,
+            'error': report.error,
+        })
@@ -9,11 +9,11 @@ from apps.inventory.models import (
 
 class ProductCategoryAdmin(admin.ModelAdmin):
     """Admin interface for product categories."""
-    list_display = ['name', 'parent', 'is_active', 'created_at']
+    list_display = ['name', 'parent', 'path', 'is_active', 'created_at']
     list_filter = ['is_active', 'created_at']
     search_fields = ['name', 'description']
     prepopulated_fields = {'name': ('name',)}
-    readonly_fields = ['created_at', 'updated_at']
+    readonly_fields = ['path', 'depth', 'created_at', 'updated_at']
 
 
 class InventoryInline(admin.TabularInline):
@@ -0,0 +1,195 @@
+"""
+Demand forecasting and reorder suggestions.
+
+Consumption is the stock that left each inventory through ``sale`` and
+``write_off`` transactions. One grouped query fetches its daily totals
+over the last ``FORECAST_HISTORY_DAYS``. The totals are laid out as an
+inventories x days NumPy matrix, so smoothing every inventory at once
+takes one vector operation per day, however many SKUs and branches there
+are.
+
+The daily rate is an exponentially weighted average of that history
+(``FORECAST_SMOOTHING`` is the weight of each new day). The reorder point
+covers the rate over the preferred vendor's lead time, plus safety stock
+for the day-to-day spread, and is never below ``Product.minimum_stock``.
+When stock, less reservations, plus what is already on order falls to the
+reorder point, enough is ordered to cover ``FORECAST_REVIEW_DAYS`` more,
+rounded up to the vendor's minimum order quantity. Suggested orders are
+bulk-created as draft PurchaseOrders, one per vendor and branch.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Inventory, InventoryTransaction, PurchaseOrder, PurchaseOrderItem, VendorProduct
+from .stock_levels import refresh_levels
+
+CONSUMPTION_TYPES = ['sale', 'write_off']
+# Orders that already cover future demand, including earlier suggestions
+OPEN_ORDER_STATUSES = ['draft', 'submitted', 'confirmed', 'partial']
+
+
+def consumption_matrix(inventory_ids, start_day, days):
+    """Daily consumption of each inventory as an (inventories x days) array."""
+    index = {inventory_id: row for row, inventory_id in enumerate(inventory_ids)}
+    matrix = np.zeros((len(inventory_ids), days))
+    totals = InventoryTransaction.objects.filter(
+        transaction_type__in=CONSUMPTION_TYPES,
+        created_at__gte=timezone.make_aware(datetime.combine(start_day, time.min)),
+    ).annotate(day=TruncDate('created_at')).order_by().values_list(
+        'inventory_id', 'day'
+    ).annotate(total=Sum('quantity'))
+    rows, columns, values = [], [], []
+    for inventory_id, day, total in totals:
+        column = (day - start_day).days
+        if inventory_id in index and 0 <= column < days:
+            rows.append(index[inventory_id])
+            columns.append(column)
+            # Consumption is posted as negative quantities
+            values.append(-total)
+    if rows:
+        np.add.at(matrix, (np.array(rows), np.array(columns)), np.array(values, dtype=float))
+    return matrix
+
+
+def smoothed_rates(matrix, alpha):
+    """Exponentially smoothed daily rate of every row, seeded with its mean."""
+    level = matrix.mean(axis=1)
+    for column in range(matrix.shape[1]):
+        level = alpha * matrix[:, column] + (1 - alpha) * level
+    return level
+
+
+def preferred_vendors(product_ids):
+    """
+    Map product id to the (vendor id, lead days, minimum order, price) it is
+    ordered with: the cheapest preferred vendor, else the cheapest vendor.
+    """
+    choices = {}
+    for product_id, vendor_id, lead_time, minimum, price in VendorProduct.objects.filter(
+            product_id__in=product_ids, vendor__is_active=True
+    ).order_by('-is_preferred_vendor', 'vendor_price', 'vendor_id').values_list(
+        'product_id', 'vendor_id', 'lead_time_days', 'minimum_order_quantity', 'vendor_price'
+    ):
+        choices.setdefault(product_id, (vendor_id, lead_time, minimum, price))
+    return choices
+
+
+def quantities_on_order(product_ids):
+    """Map (product id, branch id) to the quantity still outstanding on open orders."""
+    return {
+        (product_id, branch_id): outstanding
+        for product_id, branch_id, outstanding in PurchaseOrderItem.objects.filter(
+            product_id__in=product_ids, purchase_order__status__in=OPEN_ORDER_STATUSES
+        ).order_by().values_list('product_id', 'purchase_order__branch_id').annotate(
+            outstanding=Sum(F('quantity_ordered') - F('quantity_received'))
+        )
+    }
+
+
+def forecast(today=None):
+    """
+    Forecast every tracked inventory.
+
+    Returns a dict of parallel arrays keyed by column: ``inventory``,
+    ``product``, ``branch``, ``rate``, ``reorder_point`` and ``order``
+    (the quantity to order, 0 when none is needed), plus ``vendors``, the
+    vendor choice of each product.
+    """
+    today = today or timezone.localdate()
+    days = settings.FORECAST_HISTORY_DAYS
+    rows = list(Inventory.objects.filter(
+        product__track_inventory=True, product__is_active=True
+    ).order_by('pk').values_list(
+        'pk', 'product_id', 'branch_id', 'quantity_in_stock', 'quantity_reserved', 'product__minimum_stock'
+    ))
+    if not rows:
+        return None
+    inventory_ids, product_ids, branch_ids, stock, reserved, minimum_stock = (np.array(column) for column in zip(*rows))
+    vendors = preferred_vendors(set(product_ids.tolist()))
+    on_order = quantities_on_order(set(product_ids.tolist()))
+
+    matrix = consumption_matrix(inventory_ids.tolist(), today - timedelta(days=days), days)
+    rate = smoothed_rates(matrix, settings.FORECAST_SMOOTHING)
+    spread = matrix.std(axis=1)
+
+    default = (None, settings.FORECAST_DEFAULT_LEAD_DAYS, 1, None)
+    lead_days = np.array([vendors.get(product, default)[1] for product in product_ids.tolist()], dtype=float)
+    minimum_order = np.array(
+        [max(vendors.get(product, default)[2], 1) for product in product_ids.tolist()], dtype=float
+    )
+    outstanding = np.array([
+        on_order.get((product, branch), 0) for product, branch in zip(product_ids.tolist(), branch_ids.tolist())
+    ], dtype=float)
+
+    safety_stock = settings.FORECAST_SERVICE_LEVEL_Z * spread * np.sqrt(lead_days)
+    reorder_point = np.maximum(np.ceil(rate * lead_days + safety_stock), minimum_stock)
+    position = stock - reserved + outstanding
+    target = reorder_point + rate * settings.FORECAST_REVIEW_DAYS
+    shortfall = np.where(position <= reorder_point, np.ceil(target - position), 0)
+    order = np.where(shortfall > 0, np.ceil(shortfall / minimum_order) * minimum_order, 0)
+
+    return {
+        'inventory': inventory_ids, 'product': product_ids, 'branch': branch_ids,
+        'rate': rate, 'reorder_point': reorder_point.astype(int), 'order': order.astype(int),
+        'vendors': vendors,
+    }
+
+
+@transaction.atomic
+def suggest_reorders(today=None, user=None):
+    """
+    Store every inventory's reorder point and draft the orders that are due.
+
+    Products without an active vendor cannot be ordered and are skipped.
+    A vendor and branch already suggested an order today are skipped too.
+    Returns a summary of the run.
+    """
+    today = today or timezone.localdate()
+    result = forecast(today)
+    if result is None:
+        return {'inventories': 0, 'orders': 0, 'lines': 0}
+
+    Inventory.objects.bulk_update([
+        Inventory(pk=inventory_id, reorder_point=reorder_point)
+        for inventory_id, reorder_point in zip(result['inventory'].tolist(), result['reorder_point'].tolist())
+    ], ['reorder_point'], batch_size=1000)
+    # The new reorder points decide which inventories are low
+    refresh_levels()
+
+    lines = defaultdict(list)
+    for product_id, branch_id, quantity in zip(
+            result['product'].tolist(), result['branch'].tolist(), result['order'].tolist()):
+        vendor = result['vendors'].get(product_id)
+        if quantity > 0 and vendor:
+            lines[(vendor[0], branch_id)].append((product_id, quantity, vendor[3]))
+
+    numbers = {
+        (vendor_id, branch_id): f"RO-{today:%Y%m%d}-{vendor_id}-{branch_id}"
+        for vendor_id, branch_id in lines
+    }
+    taken = set(PurchaseOrder.objects.filter(order_number__in=numbers.values()).values_list('order_number', flat=True))
+    groups = [key for key in sorted(lines) if numbers[key] not in taken]
+    orders = []
+    for vendor_id, branch_id in groups:
+        # Totals are worked out here as bulk_create skips PurchaseOrder.save
+        subtotal = sum((price * quantity for _, quantity, price in lines[(vendor_id, branch_id)]), Decimal('0'))
+        orders.append(PurchaseOrder(
+            vendor_id=vendor_id, branch_id=branch_id, order_number=numbers[(vendor_id, branch_id)],
+            status='draft', order_date=today, created_by=user, subtotal=subtotal, total=subtotal,
+            notes="Suggested from forecast demand",
+        ))
+    orders = PurchaseOrder.objects.bulk_create(orders)
+    items = PurchaseOrderItem.objects.bulk_create([
+        PurchaseOrderItem(purchase_order=order, product_id=product_id, quantity_ordered=quantity, unit_price=price)
+        for order, key in zip(orders, groups)
+        for product_id, quantity, price in lines[key]
+    ], batch_size=1000)
+    return {'inventories': len(result['inventory']), 'orders': len(orders), 'lines': len(items)}
@@ -0,0 +1,189 @@
+"""
+Inventory ledger.
+
+InventoryTransaction rows are an append-only ledger and the source of
+truth for stock. ``Inventory.quantity_in_stock`` is a running balance kept
+in step with it: every posting inserts its transactions and moves the
+balance with an ``F()`` expression in the same database transaction, so
+concurrent sales and receipts add up instead of overwriting each other.
+The same transaction keeps the low-stock flags and product totals of
+apps.inventory.stock_levels in step.
+Physical counts, which set an absolute quantity, lock the row to turn the
+count into a difference. Purchases must add stock and sales and write-offs
+must take it away; the other types may move it either way.
+
+``checkpoint_balances`` periodically folds each inventory's new
+transactions into ``checkpoint_quantity``, so ``reconcile`` can recompute
+every balance in one grouped query from the checkpoint plus the
+transactions after it, without summing the whole ledger.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Case, F, Max, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import stock_levels
+from .models import Inventory, InventoryTransaction
+
+logger = logging.getLogger(__name__)
+
+# Transactions younger than this are left out of checkpoints, so a slow
+# transaction committing a lower id late is not stepped over
+CHECKPOINT_LAG = timedelta(minutes=5)
+
+# The sign a transaction type's quantity must have; types not listed here
+# (adjustments, transfers and returns) may move stock either way
+SIGNS = {
+    'purchase': 1,
+    'sale': -1,
+    'write_off': -1,
+}
+
+
+class LedgerError(Exception):
+    """A transaction that cannot be posted."""
+
+
+def check_sign(transaction_type, quantity):
+    """Raise LedgerError if ``quantity`` moves stock the wrong way for its type."""
+    sign = SIGNS.get(transaction_type)
+    if sign and quantity * sign <= 0:
+        raise LedgerError(
+            f"A {transaction_type} must have a {'positive' if sign > 0 else 'negative'} quantity"
+        )
+
+
+def stock_for(product_id, branch_id):
+    """The inventory row of a product at a branch, created empty if missing."""
+    inventory, _ = Inventory.objects.get_or_create(
+        product_id=product_id, branch_id=branch_id, defaults={'quantity_in_stock': 0}
+    )
+    return inventory
+
+
+@transaction.atomic
+def post_many(entries):
+    """
+    Append unsaved InventoryTransactions to the ledger and move the balances.
+
+    However many inventories the entries touch, their balances move in one
+    UPDATE, with their low-stock flags and product totals (see
+    apps.inventory.stock_levels). The rows are locked in id order first, so
+    concurrent postings touching the same rows cannot deadlock. Returns the
+    saved transactions. Raises LedgerError, posting nothing, if any entry's
+    quantity has the wrong sign for its type.
+    """
+    for entry in entries:
+        check_sign(entry.transaction_type, entry.quantity)
+    entries = InventoryTransaction.objects.bulk_create(entries)
+    movements = defaultdict(int)
+    for entry in entries:
+        movements[entry.inventory_id] += entry.quantity
+    if not movements:
+        return entries
+    levels = stock_levels.lock(Inventory.objects.filter(pk__in=movements))
+    Inventory.objects.filter(pk__in=movements).update(
+        quantity_in_stock=F('quantity_in_stock') + Case(
+            *[When(pk=inventory_id, then=Value(quantity)) for inventory_id, quantity in movements.items()],
+            default=Value(0),
+        ),
+        is_low=stock_levels.low_flags(levels, movements),
+        last_updated_at=timezone.now(),
+    )
+    stock_levels.move_products(levels, movements)
+    return entries
+
+
+@transaction.atomic
+def post(inventory, transaction_type, quantity, counted_at=None, **fields):
+    """
+    Append one transaction to the ledger and move the inventory's balance.
+
+    ``counted_at`` also records a stock check. The inventory instance is
+    refreshed with the new balance. Returns the transaction.
+    """
+    entry, = post_many([InventoryTransaction(
+        inventory=inventory, transaction_type=transaction_type, quantity=quantity, **fields
+    )])
+    if counted_at:
+        Inventory.objects.filter(pk=inventory.pk).update(last_counted_at=counted_at)
+    inventory.refresh_from_db(fields=['quantity_in_stock', 'is_low', 'last_counted_at', 'last_updated_at'])
+    return entry
+
+
+@transaction.atomic
+def record_count(inventory, counted, **fields):
+    """
+    Record a physical count as an adjustment by the difference it reveals.
+
+    The row is locked while the difference is worked out, so postings that
+    land during the count are not lost. Returns the transaction.
+    """
+    current = Inventory.objects.select_for_update().values_list(
+        'quantity_in_stock', flat=True
+    ).get(pk=inventory.pk)
+    return post(
+        inventory, 'adjustment', counted - current, counted_at=timezone.now(), **fields
+    )
+
+
+def checkpoint_balances(now=None):
+    """
+    Fold the transactions posted since each inventory's checkpoint into it.
+
+    One UPDATE covers every inventory. Returns the number of inventories
+    whose checkpoint moved.
+    """
+    now = now or timezone.now()
+    through = InventoryTransaction.objects.filter(
+        created_at__lt=now - CHECKPOINT_LAG
+    ).aggregate(last=Max('id'))['last']
+    if through is None:
+        return 0
+    movement = InventoryTransaction.objects.filter(
+        inventory=OuterRef('pk'), id__gt=OuterRef('checkpoint_transaction_id'), id__lte=through
+    ).order_by().values('inventory').annotate(total=Sum('quantity')).values('total')
+    return Inventory.objects.filter(checkpoint_transaction_id__lt=through).update(
+        checkpoint_quantity=F('checkpoint_quantity') + Coalesce(Subquery(movement), 0),
+        checkpoint_transaction_id=through,
+        checkpointed_at=now,
+    )
+
+
+def ledger_balances(queryset=None):
+    """Annotate inventories with ``ledger_quantity``, the stock the ledger adds up to."""
+    queryset = Inventory.objects.all() if queryset is None else queryset
+    return queryset.annotate(ledger_quantity=F('checkpoint_quantity') + Coalesce(
+        Sum('transactions__quantity', filter=Q(transactions__id__gt=F('checkpoint_transaction_id'))), 0
+    ))
+
+
+def reconcile(fix=False):
+    """
+    Compare every stock balance with the ledger in one grouped query.
+
+    Returns (inventory id, stock, ledger quantity) for each inventory that
+    drifted. With ``fix`` their balances are moved by the drift, which is
+    safe against postings made in the meantime.
+    """
+    drifted = list(ledger_balances().exclude(
+        quantity_in_stock=F('ledger_quantity')
+    ).order_by('pk').values_list('pk', 'quantity_in_stock', 'ledger_quantity'))
+    for inventory_id, stock, ledger_quantity in drifted:
+        logger.warning(
+            "Inventory %s holds %s in stock but its ledger adds up to %s",
+            inventory_id, stock, ledger_quantity
+        )
+        if fix:
+            Inventory.objects.filter(pk=inventory_id).update(
+                quantity_in_stock=F('quantity_in_stock') + (ledger_quantity - stock)
+            )
+    if fix and drifted:
+        stock_levels.refresh_levels(Inventory.objects.filter(
+            pk__in=[inventory_id for inventory_id, _, _ in drifted]
+        ).values('product_id'))
+    return drifted
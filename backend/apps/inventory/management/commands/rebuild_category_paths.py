@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from apps.inventory.models import ProductCategory
+
+
+class Command(BaseCommand):
+    help = "Recompute the materialized paths of every product category from their parents."
+
+    def handle(self, *args, **options):
+        ProductCategory.rebuild_paths()
+        unindexed = ProductCategory.objects.filter(path='').count()
+        self.stdout.write(f"Rebuilt the paths of {ProductCategory.objects.count()} categories.")
+        if unindexed:
+            # Only a cycle in the parents keeps a category out of the tree
+            self.stderr.write(f"{unindexed} categories are in a parent cycle and have no path.")
@@ -1,11 +1,26 @@
-from django.db import models
+from collections import defaultdict
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import F, Subquery, Sum, Value
+from django.db.models.functions import Concat, Substr
 from django.utils.translation import gettext_lazy as _
 from django.conf import settings
 from apps.clinic.models import Branch
 
 
 class ProductCategory(models.Model):
-    """Model for organizing products into categories."""
+    """
+    Model for organizing products into categories.
+    
+    Besides its parent, every category stores its materialized ``path``, the
+    ids from the root down to itself (``/3/8/21/``), and its ``depth``. A
+    subtree is then the categories whose path starts with its root's path,
+    and the ancestors are the categories whose path its own starts with, so
+    neither needs a recursive query. ``save`` keeps the paths of a moved
+    subtree current with one UPDATE.
+    """
     
     name = models.CharField(_('name'), max_length=100)
     description = models.TextField(_('description'), blank=True)
@@ -14,6 +29,8 @@ class ProductCategory(models.Model):
     # For category hierarchy
     parent = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True,
                               related_name='subcategories')
+    path = models.CharField(_('path'), max_length=255, blank=True, editable=False)
+    depth = models.PositiveSmallIntegerField(_('depth'), default=0, editable=False)
     
     created_at = models.DateTimeField(_('created at'), auto_now_add=True)
     updated_at = models.DateTimeField(_('updated at'), auto_now=True)
@@ -22,9 +39,94 @@ class ProductCategory(models.Model):
         verbose_name = _('product category')
         verbose_name_plural = _('product categories')
         ordering = ['name']
+        indexes = [
+            # Prefix matches on the path; the operator class lets PostgreSQL use the index for LIKE
+            models.Index(fields=['path'], name='product_category_path', opclasses=['varchar_pattern_ops']),
+        ]
     
     def __str__(self):
         return self.name
+    
+    def save(self, *args, **kwargs):
+        """Save the category and move the paths of its subtree with it."""
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            paths = self._stored_paths()
+            if self.parent_id and not paths[self.parent_id][0]:
+                # The parent predates the paths, so index the whole tree first
+                ProductCategory.rebuild_paths()
+                paths = self._stored_paths()
+            old_path, old_depth = paths[self.pk]
+            parent_path, parent_depth = paths.get(self.parent_id, ('/', -1))
+            path, depth = f"{parent_path}{self.pk}/", parent_depth + 1
+            if old_path and parent_path.startswith(old_path):
+                raise ValidationError(_('A category cannot be moved under its own subcategory.'))
+            if not old_path:
+                ProductCategory.objects.filter(pk=self.pk).update(path=path, depth=depth)
+            elif path != old_path:
+                ProductCategory.objects.filter(path__startswith=old_path).update(
+                    path=Concat(Value(path), Substr('path', len(old_path) + 1)),
+                    depth=F('depth') + (depth - old_depth),
+                )
+            self.path, self.depth = path, depth
+    
+    def _stored_paths(self):
+        """The stored paths of this category and its parent, locked."""
+        # Read back, as this instance may predate a move of its ancestors
+        return {
+            pk: (path, depth) for pk, path, depth in ProductCategory.objects.select_for_update().filter(
+                pk__in=[self.pk, self.parent_id]
+            ).values_list('pk', 'path', 'depth')
+        }
+    
+    def get_descendants(self, include_self=True):
+        """The categories in this category's subtree, none until it has a path."""
+        if not self.path:
+            return ProductCategory.objects.none()
+        descendants = ProductCategory.objects.filter(path__startswith=self.path)
+        return descendants if include_self else descendants.exclude(pk=self.pk)
+    
+    @staticmethod
+    def _path_of(category_id):
+        # Categories without a path yield NULL, which no prefix match accepts
+        return Subquery(ProductCategory.objects.filter(pk=category_id).exclude(path='').values('path')[:1])
+    
+    @staticmethod
+    def subtree_of(category_id):
+        """Categories under the given category, including itself, in one query."""
+        return ProductCategory.objects.filter(path__startswith=ProductCategory._path_of(category_id))
+    
+    @staticmethod
+    def ancestors_of(category_id):
+        """The breadcrumb from the root down to the given category, in one query."""
+        return ProductCategory.objects.exclude(path='').annotate(
+            descendant_path=ProductCategory._path_of(category_id)
+        ).filter(descendant_path__startswith=F('path')).order_by('depth')
+    
+    @classmethod
+    def rebuild_paths(cls):
+        """
+        Recompute every path from the parents, for rows saved around ``save``.
+        
+        Run by ``manage.py rebuild_category_paths``.
+        """
+        categories = {category.pk: category for category in cls.objects.only('pk', 'parent')}
+        # Categories caught in a parent cycle are left without a path
+        for category in categories.values():
+            category.path, category.depth = '', 0
+        pending = [category for category in categories.values() if category.parent_id is None]
+        for category in pending:
+            category.path, category.depth = f"/{category.pk}/", 0
+        children = defaultdict(list)
+        for category in categories.values():
+            if category.parent_id is not None:
+                children[category.parent_id].append(category)
+        while pending:
+            parent = pending.pop()
+            for child in children[parent.pk]:
+                child.path, child.depth = f"{parent.path}{child.pk}/", parent.depth + 1
+                pending.append(child)
+        cls.objects.bulk_update(categories.values(), ['path', 'depth'], batch_size=500)
 
 
 class Product(models.Model):
@@ -104,10 +206,24 @@ class Inventory(models.Model):
     last_counted_at = models.DateTimeField(_('last counted at'), null=True, blank=True)
     last_updated_at = models.DateTimeField(_('last updated at'), auto_now=True)
     
+    # Balance checkpoint: the stock after every transaction up to and including
+    # checkpoint_transaction_id (see apps.inventory.ledger)
+    checkpoint_quantity = models.IntegerField(_('checkpoint quantity'), default=0)
+    checkpoint_transaction_id = models.BigIntegerField(_('checkpoint transaction'), default=0)
+    checkpointed_at = models.DateTimeField(_('checkpointed at'), null=True, blank=True)
+    
+    # Forecast reorder point, null until forecast (see apps.inventory.forecasting)
+    reorder_point = models.IntegerField(_('reorder point'), null=True, blank=True)
+    # Below the reorder point, kept by apps.inventory.stock_levels
+    is_low = models.BooleanField(_('is low'), default=False)
+    
     class Meta:
         verbose_name = _('inventory')
         verbose_name_plural = _('inventories')
         unique_together = ('product', 'branch')
+        indexes = [
+            models.Index(fields=['branch'], condition=models.Q(is_low=True), name='inventory_low_stock'),
+        ]
     
     def __str__(self):
         return f"{self.product.name} at {self.branch.name}"
@@ -118,8 +234,40 @@ class Inventory(models.Model):
         return self.quantity_in_stock - self.quantity_reserved
 
 
+class ProductStock(models.Model):
+    """
+    Stock of a product summed over every branch.
+    
+    A rollup of Inventory maintained by apps.inventory.stock_levels, so that
+    product stock and low-stock lists need no aggregate.
+    """
+    
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True,
+                                   related_name='stock')
+    quantity_in_stock = models.IntegerField(_('quantity in stock'), default=0)
+    is_low = models.BooleanField(_('is low'), default=False)
+    low_since = models.DateTimeField(_('low since'), null=True, blank=True)
+    updated_at = models.DateTimeField(_('updated at'), auto_now=True)
+    
+    class Meta:
+        verbose_name = _('product stock')
+        verbose_name_plural = _('product stock')
+        indexes = [
+            models.Index(fields=['low_since'], condition=models.Q(is_low=True), name='product_stock_low'),
+        ]
+    
+    def __str__(self):
+        return f"{self.product.name}: {self.quantity_in_stock}"
+
+
 class InventoryTransaction(models.Model):
-    """Model for tracking inventory movements."""
+    """
+    Model for tracking inventory movements.
+    
+    Transactions form an append-only ledger that is the source of truth for
+    stock levels; post them through apps.inventory.ledger, which keeps
+    Inventory.quantity_in_stock in step.
+    """
     
     TRANSACTION_TYPES = [
         ('purchase', 'Purchase'),
@@ -156,6 +304,11 @@ class InventoryTransaction(models.Model):
         verbose_name = _('inventory transaction')
         verbose_name_plural = _('inventory transactions')
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='inventory_txn_created'),
+            # Summing an inventory's transactions since its checkpoint
+            models.Index(fields=['inventory', 'id'], name='inventory_txn_ledger'),
+        ]
     
     def __str__(self):
         return f"{self.transaction_type}: {self.quantity} x {self.inventory.product.name}"
@@ -285,7 +438,9 @@ class PurchaseOrder(models.Model):
         """Calculate totals before saving."""
         # Calculate only if items have been added (for new POs, items are added after initial save)
         if self.id:
-            self.subtotal = sum(item.total for item in self.items.all())
+            self.subtotal = self.items.aggregate(
+                subtotal=Sum(F('quantity_ordered') * F('unit_price'), default=Decimal('0'))
+            )['subtotal']
             self.total = self.subtotal + self.tax + self.shipping_cost
         super().save(*args, **kwargs)
 
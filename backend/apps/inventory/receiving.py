@@ -0,0 +1,125 @@
+"""
+Receiving purchase order deliveries.
+
+A delivery is received in one transaction with a fixed number of queries
+however many lines it has. The order is locked once, its items and the
+branch's inventories for their products are fetched in one query each,
+missing inventories are bulk-created, received quantities are written
+with one bulk_update and the stock moves through one ledger posting.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from . import ledger
+from .models import Inventory, InventoryTransaction, PurchaseOrder, PurchaseOrderItem
+
+RECEIVABLE_STATUSES = ['submitted', 'confirmed', 'partial']
+
+
+class ReceivingError(Exception):
+    """A delivery that cannot be received."""
+
+
+def parse_receipt(lines):
+    """
+    Sum the quantities received per purchase order item.
+
+    Lines without an item id or with nothing received are skipped. Item ids
+    sent as strings are read as numbers. Raises ReceivingError for ids or
+    quantities that are not whole numbers.
+    """
+    quantities = {}
+    for line in lines:
+        try:
+            item_id = int(line['id']) if line.get('id') else None
+            quantity = int(line.get('quantity_received', 0))
+        except (AttributeError, TypeError, ValueError):
+            raise ReceivingError('Each item needs a whole-number id and quantity_received')
+        if item_id and quantity > 0:
+            quantities[item_id] = quantities.get(item_id, 0) + quantity
+    return quantities
+
+
+def inventories_for(branch_id, product_ids):
+    """Map product id to the branch's inventory row, creating missing rows in bulk."""
+    inventories = {
+        inventory.product_id: inventory
+        for inventory in Inventory.objects.filter(branch_id=branch_id, product_id__in=product_ids)
+    }
+    missing = set(product_ids) - set(inventories)
+    if missing:
+        # Rows created concurrently are skipped and fetched below
+        Inventory.objects.bulk_create([
+            Inventory(product_id=product_id, branch_id=branch_id) for product_id in missing
+        ], ignore_conflicts=True)
+        inventories.update(
+            (inventory.product_id, inventory)
+            for inventory in Inventory.objects.filter(branch_id=branch_id, product_id__in=missing)
+        )
+    return inventories
+
+
+@transaction.atomic
+def receive_delivery(purchase_order_id, lines, user=None):
+    """
+    Receive a delivery against a purchase order.
+
+    Quantities beyond what is still outstanding on a line are ignored.
+    Returns the updated order and a summary of every line received.
+    Raises ReceivingError when the order cannot take deliveries.
+    """
+    purchase_order = PurchaseOrder.objects.select_for_update().get(pk=purchase_order_id)
+    if purchase_order.status not in RECEIVABLE_STATUSES:
+        raise ReceivingError(
+            'Only submitted, confirmed, or partially received purchase orders can be received.'
+        )
+    quantities = parse_receipt(lines)
+    if not quantities:
+        raise ReceivingError('No items provided for receipt')
+
+    items = list(PurchaseOrderItem.objects.filter(
+        purchase_order=purchase_order
+    ).select_related('product').order_by('pk'))
+    received = []
+    for item in items:
+        quantity = min(quantities.get(item.id, 0), item.quantity_ordered - item.quantity_received)
+        if quantity > 0:
+            item.quantity_received += quantity
+            received.append((item, quantity))
+
+    if received:
+        inventories = inventories_for(purchase_order.branch_id, {item.product_id for item, _ in received})
+        PurchaseOrderItem.objects.bulk_update([item for item, _ in received], ['quantity_received'])
+        ledger.post_many([
+            InventoryTransaction(
+                inventory=inventories[item.product_id],
+                transaction_type='purchase',
+                quantity=quantity,
+                reference_number=purchase_order.order_number,
+                notes=f"Received from PO #{purchase_order.order_number}",
+                created_by=user,
+            )
+            for item, quantity in received
+        ])
+
+    now = timezone.now()
+    if all(item.quantity_received >= item.quantity_ordered for item in items):
+        purchase_order.status = 'received'
+        purchase_order.delivery_date = now.date()
+    elif received:
+        purchase_order.status = 'partial'
+    # The totals depend on ordered quantities only, so they are not recomputed
+    purchase_order.updated_at = now
+    PurchaseOrder.objects.filter(pk=purchase_order.pk).update(
+        status=purchase_order.status, delivery_date=purchase_order.delivery_date, updated_at=now
+    )
+
+    return purchase_order, [
+        {
+            'item_id': item.id,
+            'product_name': item.product.name,
+            'quantity_received': quantity,
+            'total_received': item.quantity_received
+        }
+        for item, quantity in received
+    ]
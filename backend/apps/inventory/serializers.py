@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from apps.inventory import ledger
 from apps.inventory.models import (
     ProductCategory, Product, Inventory, InventoryTransaction,
     Vendor, VendorProduct, PurchaseOrder, PurchaseOrderItem
@@ -11,21 +12,24 @@ class ProductCategorySerializer(serializers.ModelSerializer):
 
     subcategory_count = serializers.IntegerField(read_only=True, required=False)
     product_count = serializers.IntegerField(read_only=True, required=False)
-    parent_name = serializers.SerializerMethodField()
+    subtree_product_count = serializers.IntegerField(read_only=True, required=False)
+    subtree_stock = serializers.IntegerField(read_only=True, required=False)
+    parent_name = serializers.CharField(source='parent.name', read_only=True, default=None)
     
     class Meta:
         model = ProductCategory
         fields = [
-            'id', 'name', 'description', 'parent', 'parent_name', 'is_active',
-            'subcategory_count', 'product_count', 'created_at', 'updated_at'
+            'id', 'name', 'description', 'parent', 'parent_name', 'path', 'depth', 'is_active',
+            'subcategory_count', 'product_count', 'subtree_product_count', 'subtree_stock',
+            'created_at', 'updated_at'
         ]
-        read_only_fields = ['created_at', 'updated_at']
+        read_only_fields = ['path', 'depth', 'created_at', 'updated_at']
     
-    def get_parent_name(self, obj):
-        """Get the parent category name if it exists."""
-        if obj.parent:
-            return obj.parent.name
-        return None
+    def validate_parent(self, value):
+        """A category cannot be moved into its own subtree."""
+        if value and self.instance and self.instance.path and value.path.startswith(self.instance.path):
+            raise serializers.ValidationError("A category cannot be moved under its own subcategory.")
+        return value
 
 
 class ProductSerializer(serializers.ModelSerializer):
@@ -82,9 +86,10 @@ class InventorySerializer(serializers.ModelSerializer):
         fields = [
             'id', 'product', 'product_name', 'product_sku', 
             'branch', 'branch_name', 'quantity_in_stock', 'quantity_reserved',
-            'available_quantity', 'shelf_location', 'last_counted_at', 'last_updated_at'
+            'available_quantity', 'reorder_point', 'is_low', 'shelf_location', 'last_counted_at',
+            'last_updated_at'
         ]
-        read_only_fields = ['last_updated_at']
+        read_only_fields = ['reorder_point', 'is_low', 'last_updated_at']
 
 
 class InventoryTransactionSerializer(serializers.ModelSerializer):
@@ -106,6 +111,14 @@ class InventoryTransactionSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['created_at', 'created_by']
     
+    def validate(self, attrs):
+        """The quantity's sign must match the transaction type (see apps.inventory.ledger)."""
+        try:
+            ledger.check_sign(attrs['transaction_type'], attrs['quantity'])
+        except ledger.LedgerError as e:
+            raise serializers.ValidationError({'quantity': str(e)})
+        return attrs
+    
     def get_product_name(self, obj):
         """Get the product name associated with this transaction."""
         return obj.inventory.product.name
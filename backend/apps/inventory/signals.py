@@ -0,0 +1,40 @@
+from django.db.models import F
+from django.db.models.functions import Substr
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from apps.core.deferred import defer_until_commit
+
+from .models import Inventory, Product, ProductCategory
+from .stock_levels import refresh_levels
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, raw=False, **kwargs):
+    """The product's thresholds may have moved, so recompute its stock levels."""
+    if not raw:
+        refresh_levels([instance.pk])
+
+
+@receiver(post_save, sender=Inventory)
+def inventory_created(sender, instance, created, raw=False, **kwargs):
+    """Flag new inventories that start out low."""
+    if created and not raw:
+        refresh_levels([instance.product_id])
+
+
+@receiver(post_delete, sender=Inventory)
+def inventory_deleted(sender, instance, **kwargs):
+    """Take the stock of a deleted inventory out of its product's summary."""
+    # After commit, as deleting a product cascades here before the product is gone
+    defer_until_commit('inventory.levels', [instance.product_id], refresh_levels)
+
+
+@receiver(pre_delete, sender=ProductCategory)
+def category_deleted(sender, instance, **kwargs):
+    """Its subcategories become roots, so cut its path off their subtrees."""
+    path, depth = ProductCategory.objects.values_list('path', 'depth').get(pk=instance.pk)
+    if path:
+        ProductCategory.objects.filter(path__startswith=path).exclude(pk=instance.pk).update(
+            path=Substr('path', len(path)), depth=F('depth') - (depth + 1)
+        )
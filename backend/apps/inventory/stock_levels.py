@@ -0,0 +1,203 @@
+"""
+Materialized stock levels.
+
+``ProductStock`` rolls every product's inventories up into one row with its
+total stock, and both it and ``Inventory`` carry an ``is_low`` flag behind a
+partial index, so low-stock lists are index lookups rather than aggregates
+and joins. The ledger keeps them current: every posting locks the rows it
+moves, works out their new levels from what it locked and writes the flags
+and totals in the same transaction as the balances.
+
+An inventory is low when its stock is below its forecast reorder point, or
+below the product's minimum stock until it has one. A product is low when
+its total is below its minimum stock. Only products that track inventory
+with a threshold above zero are ever low. Thresholds change outside the
+ledger, so ``refresh_levels`` recomputes the levels of the products whose
+thresholds or inventories changed, and of every product after the nightly
+forecast.
+
+Products that run low are collected per transaction and pushed to
+administrators as in-app notifications once it commits, so nobody has to
+poll for them.
+"""
+from collections import defaultdict, namedtuple
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Case, DateTimeField, Exists, F, IntegerField, OuterRef, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from apps.core.deferred import defer_until_commit
+from apps.core.models import User
+from apps.engagement.models import Notification
+
+from .models import Inventory, Product, ProductStock
+
+Level = namedtuple('Level', 'product_id quantity reorder_point minimum_stock track_inventory')
+
+
+def inventory_is_low(level, quantity):
+    threshold = level.minimum_stock if level.reorder_point is None else level.reorder_point
+    return level.track_inventory and 0 < threshold and quantity < threshold
+
+
+def product_is_low(minimum_stock, track_inventory, quantity):
+    return track_inventory and 0 < minimum_stock and quantity < minimum_stock
+
+
+def lock(inventories):
+    """
+    Lock inventory rows in id order, so concurrent postings cannot deadlock.
+
+    Returns a Level, the stock and thresholds, for each inventory id.
+    """
+    return {
+        row[0]: Level(*row[1:])
+        for row in inventories.select_for_update(of=('self',)).order_by('pk').values_list(
+            'pk', 'product_id', 'quantity_in_stock', 'reorder_point',
+            'product__minimum_stock', 'product__track_inventory'
+        )
+    }
+
+
+def low_flags(levels, movements):
+    """The ``is_low`` value of locked inventories once their movements are applied."""
+    low = [
+        inventory_id for inventory_id, quantity in movements.items()
+        if inventory_is_low(levels[inventory_id], levels[inventory_id].quantity + quantity)
+    ]
+    return Case(When(pk__in=low, then=Value(True)), default=Value(False))
+
+
+def move_products(levels, movements):
+    """
+    Move the product totals by the movements of their locked inventories.
+
+    Products without a summary yet have it built from their inventories.
+    """
+    totals = defaultdict(int)
+    for inventory_id, quantity in movements.items():
+        totals[levels[inventory_id].product_id] += quantity
+    rows = list(ProductStock.objects.select_for_update(of=('self',)).filter(
+        pk__in=totals
+    ).order_by('pk').values_list(
+        'pk', 'quantity_in_stock', 'is_low', 'product__minimum_stock', 'product__track_inventory'
+    ))
+    missing = set(totals) - {row[0] for row in rows}
+    if rows:
+        now = timezone.now()
+        low, went_low, recovered = [], [], []
+        for product_id, quantity, was_low, minimum_stock, track_inventory in rows:
+            is_low = product_is_low(minimum_stock, track_inventory, quantity + totals[product_id])
+            if is_low:
+                low.append(product_id)
+            if is_low and not was_low:
+                went_low.append(product_id)
+            elif was_low and not is_low:
+                recovered.append(product_id)
+        ProductStock.objects.filter(pk__in=[row[0] for row in rows]).update(
+            quantity_in_stock=F('quantity_in_stock') + Case(
+                *[When(pk=product_id, then=Value(totals[product_id])) for product_id, *_ in rows],
+                default=Value(0),
+            ),
+            is_low=Case(When(pk__in=low, then=Value(True)), default=Value(False)),
+            low_since=Case(
+                When(pk__in=went_low, then=Value(now)),
+                When(pk__in=recovered, then=Value(None, output_field=DateTimeField())),
+                default=F('low_since'),
+            ),
+            updated_at=now,
+        )
+        alert(went_low)
+    if missing:
+        refresh_levels(missing)
+
+
+@transaction.atomic
+def refresh_levels(product_ids=None):
+    """
+    Recompute the stock levels of the given products, or of every product.
+
+    The inventory flags are set by one UPDATE and the product summaries are
+    rebuilt from one grouped query. Returns the number of products that
+    went low.
+    """
+    inventories = Inventory.objects.all()
+    products = Product.objects.all()
+    if product_ids is not None:
+        inventories = inventories.filter(product_id__in=product_ids)
+        products = products.filter(pk__in=product_ids)
+    list(inventories.select_for_update().order_by('pk').values_list('pk'))
+    below_threshold = Product.objects.filter(pk=OuterRef('product_id'), track_inventory=True).annotate(
+        threshold=Coalesce(OuterRef('reorder_point'), 'minimum_stock', output_field=IntegerField())
+    ).filter(threshold__gt=0).filter(threshold__gt=OuterRef('quantity_in_stock'))
+    inventories.update(is_low=Exists(below_threshold))
+
+    previous = {
+        product_id: low_since if is_low else None
+        for product_id, is_low, low_since in ProductStock.objects.select_for_update().filter(
+            product__in=products
+        ).order_by('pk').values_list('pk', 'is_low', 'low_since')
+    }
+    now = timezone.now()
+    summaries, went_low = [], []
+    for product_id, minimum_stock, track_inventory, quantity in products.order_by().values_list(
+            'pk', 'minimum_stock', 'track_inventory'
+    ).annotate(total=Sum('inventories__quantity_in_stock', default=0)):
+        is_low = product_is_low(minimum_stock, track_inventory, quantity)
+        if is_low and not previous.get(product_id):
+            went_low.append(product_id)
+        summaries.append(ProductStock(
+            product_id=product_id, quantity_in_stock=quantity, is_low=is_low, updated_at=now,
+            low_since=(previous.get(product_id) or now) if is_low else None,
+        ))
+    ProductStock.objects.bulk_create(
+        summaries, batch_size=500, update_conflicts=True, unique_fields=['product'],
+        update_fields=['quantity_in_stock', 'is_low', 'low_since', 'updated_at'],
+    )
+    alert(went_low)
+    return len(went_low)
+
+
+def _notify(product_ids):
+    from .tasks import notify_low_stock
+
+    notify_low_stock.delay(sorted(product_ids))
+
+
+def alert(product_ids):
+    """Notify administrators about products that ran low once the transaction commits."""
+    if product_ids:
+        defer_until_commit('inventory.low_stock', product_ids, _notify)
+
+
+def notify_administrators(product_ids):
+    """
+    Send every active administrator an in-app notification per product that
+    is still low. Returns the number of notifications sent.
+    """
+    summaries = list(ProductStock.objects.filter(
+        pk__in=product_ids, is_low=True
+    ).select_related('product').order_by('pk'))
+    if not summaries:
+        return 0
+    content_type = ContentType.objects.get_for_model(Product)
+    now = timezone.now()
+    notifications = Notification.objects.bulk_create([
+        Notification(
+            user_id=user_id,
+            title=f"Low stock: {summary.product.name}",
+            message=(
+                f"{summary.product.name} ({summary.product.sku}) is down to "
+                f"{summary.quantity_in_stock} across all branches, below its minimum of "
+                f"{summary.product.minimum_stock}."
+            ),
+            notification_type='system', channel='in_app', status='sent', sent_at=now,
+            content_type=content_type, object_id=summary.product_id,
+            metadata={'quantity_in_stock': summary.quantity_in_stock},
+        )
+        for user_id in User.objects.filter(role='admin', is_active=True).values_list('pk', flat=True)
+        for summary in summaries
+    ])
+    return len(notifications)
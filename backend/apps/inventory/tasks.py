@@ -0,0 +1,29 @@
+from celery import shared_task
+
+from .forecasting import suggest_reorders
+from .ledger import checkpoint_balances, reconcile
+from .stock_levels import notify_administrators
+
+
+@shared_task
+def checkpoint_inventory():
+    """Fold new ledger transactions into the balance checkpoints."""
+    return checkpoint_balances()
+
+
+@shared_task
+def reconcile_inventory():
+    """Report stock balances that disagree with the ledger."""
+    return len(reconcile())
+
+
+@shared_task
+def forecast_reorders():
+    """Refresh reorder points and draft the purchase orders that are due."""
+    return suggest_reorders()
+
+
+@shared_task
+def notify_low_stock(product_ids):
+    """Tell administrators which products have run low."""
+    return notify_administrators(product_ids)
@@ -0,0 +1,121 @@
+from io import StringIO
+
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.test import TestCase
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.core.models import User
+from apps.inventory import ledger
+from apps.inventory.models import Product, ProductCategory
+from apps.inventory.views import ProductCategoryViewSet, ProductViewSet
+
+from .test_ledger import create_stock
+
+
+class CategoryTreeTests(TestCase):
+    """Test materialized category paths and the subtree queries built on them."""
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.admin = User.objects.create_user(email="admin@example.com", role="admin", is_staff=True)
+        self.branch, self.oil = create_stock()
+        self.body = ProductCategory.objects.create(name="Body")
+        self.oils = ProductCategory.objects.create(name="Oils", parent=self.body)
+        self.aroma = ProductCategory.objects.create(name="Aromatherapy", parent=self.oils)
+        self.linen = ProductCategory.objects.create(name="Linen")
+        Product.objects.filter(pk=self.oil.pk).update(category=self.aroma)
+        self.lotion = Product.objects.create(
+            name="Lotion", sku="LOT-1", cost_price=3, retail_price=8, category=self.body
+        )
+        self.towel = Product.objects.create(
+            name="Towel", sku="TWL-1", cost_price=2, retail_price=4, category=self.linen
+        )
+        ledger.post(ledger.stock_for(self.oil.id, self.branch.id), 'purchase', 5)
+        ledger.post(ledger.stock_for(self.lotion.id, self.branch.id), 'purchase', 2)
+        ledger.post(ledger.stock_for(self.towel.id, self.branch.id), 'purchase', 9)
+
+    def call(self, viewset, actions, params=None, **kwargs):
+        request = self.factory.get('/api/v1/inventory/', params)
+        force_authenticate(request, user=self.admin)
+        return viewset.as_view(actions)(request, **kwargs)
+
+    def paths(self):
+        return dict(ProductCategory.objects.values_list('name', 'path'))
+
+    def test_paths_follow_the_tree(self):
+        self.assertEqual(self.aroma.path, f"/{self.body.pk}/{self.oils.pk}/{self.aroma.pk}/")
+        self.assertEqual(self.aroma.depth, 2)
+
+        # Moving a category moves its whole subtree
+        self.oils.parent = self.linen
+        self.oils.save()
+        self.assertEqual(self.paths()['Aromatherapy'], f"/{self.linen.pk}/{self.oils.pk}/{self.aroma.pk}/")
+        self.assertEqual(ProductCategory.objects.get(pk=self.aroma.pk).depth, 2)
+
+        self.linen.parent = self.aroma
+        with self.assertRaises(ValidationError):
+            self.linen.save()
+
+        # Deleting a category turns its subcategories into roots
+        self.linen.refresh_from_db()
+        self.linen.delete()
+        self.assertEqual(self.paths()['Aromatherapy'], f"/{self.oils.pk}/{self.aroma.pk}/")
+        self.assertEqual(ProductCategory.objects.get(pk=self.oils.pk).depth, 0)
+
+    def test_rebuild_paths(self):
+        ProductCategory.objects.update(path='', depth=0)
+        call_command('rebuild_category_paths', stdout=StringIO())
+        self.assertEqual(self.paths()['Aromatherapy'], self.aroma.path)
+        self.assertEqual(ProductCategory.objects.get(pk=self.aroma.pk).depth, 2)
+
+    def test_categories_without_paths(self):
+        # Rows from before the paths, or from bulk_create, have none
+        legacy, = ProductCategory.objects.bulk_create([ProductCategory(name="Legacy", parent=self.body)])
+        ProductCategory.objects.filter(pk=self.body.pk).update(path='')
+        self.assertEqual(list(ProductCategory.subtree_of(legacy.pk)), [])
+        self.assertEqual(list(ProductCategory.ancestors_of(legacy.pk)), [])
+        response = self.call(ProductViewSet, {'get': 'list'}, {'category_tree': legacy.pk})
+        self.assertEqual(response.data['results'], [])
+
+        # A child saved under an unindexed parent indexes the tree first
+        child = ProductCategory.objects.create(name="Scrubs", parent=legacy)
+        self.assertEqual(child.path, f"/{self.body.pk}/{legacy.pk}/{child.pk}/")
+        self.assertEqual(
+            list(ProductCategory.ancestors_of(child.pk).values_list('name', flat=True)),
+            ["Body", "Legacy", "Scrubs"]
+        )
+
+    def test_subtree_products(self):
+        with self.assertNumQueries(1):
+            products = set(Product.objects.filter(
+                category__in=ProductCategory.subtree_of(self.body.pk)
+            ).values_list('pk', flat=True))
+        self.assertEqual(products, {self.oil.pk, self.lotion.pk})
+
+        response = self.call(ProductViewSet, {'get': 'list'}, {'category_tree': self.oils.pk})
+        self.assertEqual([row['id'] for row in response.data['results']], [self.oil.pk])
+
+    def test_breadcrumbs(self):
+        with self.assertNumQueries(1):
+            response = self.call(ProductCategoryViewSet, {'get': 'breadcrumbs'}, pk=self.aroma.pk)
+        self.assertEqual([crumb['name'] for crumb in response.data], ["Body", "Oils", "Aromatherapy"])
+        response = self.call(ProductCategoryViewSet, {'get': 'breadcrumbs'}, pk=0)
+        self.assertEqual(response.status_code, 404)
+
+    def test_rolled_up_stock(self):
+        with self.assertNumQueries(2):
+            response = self.call(ProductCategoryViewSet, {'get': 'list'})
+        rollups = {
+            row['name']: (row['parent_name'], row['subtree_product_count'], row['subtree_stock'])
+            for row in response.data['results']
+        }
+        self.assertEqual(rollups, {
+            "Body": (None, 2, 7),
+            "Oils": ("Body", 1, 5),
+            "Aromatherapy": ("Oils", 1, 5),
+            "Linen": (None, 1, 9),
+        })
+
+        response = self.call(ProductCategoryViewSet, {'get': 'list'}, {'ancestor': self.oils.pk})
+        self.assertEqual({row['name'] for row in response.data['results']}, {"Oils", "Aromatherapy"})
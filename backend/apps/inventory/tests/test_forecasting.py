@@ -0,0 +1,134 @@
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from apps.clinic.models import Branch
+from apps.inventory import ledger
+from apps.inventory.forecasting import forecast, smoothed_rates, suggest_reorders
+from apps.inventory.models import (
+    Inventory, InventoryTransaction, Product, PurchaseOrder, PurchaseOrderItem, Vendor, VendorProduct
+)
+
+from .test_ledger import create_stock
+
+TODAY = date(2030, 1, 31)
+
+
+@override_settings(
+    FORECAST_HISTORY_DAYS=30, FORECAST_SMOOTHING=0.3, FORECAST_SERVICE_LEVEL_Z=1.65,
+    FORECAST_DEFAULT_LEAD_DAYS=7, FORECAST_REVIEW_DAYS=14,
+)
+class ReorderForecastTests(TestCase):
+    """Test consumption forecasts, reorder points and suggested orders."""
+
+    def setUp(self):
+        self.branch, self.product = create_stock()
+        self.inventory = ledger.stock_for(self.product.id, self.branch.id)
+        self.vendor = Vendor.objects.create(name="Supplier")
+        VendorProduct.objects.create(
+            vendor=self.vendor, product=self.product, vendor_price=Decimal('4.00'),
+            minimum_order_quantity=12, lead_time_days=4, is_preferred_vendor=True,
+        )
+        # A cheaper vendor that is not preferred
+        VendorProduct.objects.create(
+            vendor=Vendor.objects.create(name="Discounter"), product=self.product,
+            vendor_price=Decimal('3.00'), minimum_order_quantity=1, lead_time_days=10,
+        )
+
+    def consume(self, inventory, daily, days=30, start=1):
+        """Post ``daily`` sales on each of the ``days`` days before TODAY."""
+        ledger.post_many([
+            InventoryTransaction(inventory=inventory, transaction_type='sale', quantity=-daily)
+            for _ in range(days)
+        ])
+        entries = list(inventory.transactions.filter(transaction_type='sale').order_by('-id')[:days])
+        for offset, entry in enumerate(entries, start=start):
+            InventoryTransaction.objects.filter(pk=entry.pk).update(
+                created_at=timezone.make_aware(datetime.combine(TODAY - timedelta(days=offset), time(12)))
+            )
+
+    def test_smoothing_weights_recent_days(self):
+        matrix = np.array([[2.0, 2.0, 2.0, 2.0], [0.0, 0.0, 0.0, 8.0]])
+        rates = smoothed_rates(matrix, 0.5)
+        self.assertAlmostEqual(rates[0], 2.0)
+        self.assertAlmostEqual(rates[1], 0.5 * 8 + 0.0625 * 2)
+
+    def test_reorder_point_covers_lead_time(self):
+        ledger.post(self.inventory, 'purchase', 100)
+        self.consume(self.inventory, 3)
+        result = forecast(TODAY)
+        self.assertAlmostEqual(result['rate'][0], 3.0)
+        # Steady demand needs no safety stock: 3 a day over a 4 day lead time
+        self.assertEqual(result['reorder_point'][0], 12)
+        # 10 left is below the reorder point: order up to 12 + 14 * 3 = 54,
+        # rounded up to the vendor's cases of 12
+        self.assertEqual(result['order'][0], 48)
+
+    def test_minimum_stock_is_the_floor(self):
+        Product.objects.filter(pk=self.product.pk).update(minimum_stock=20)
+        ledger.post(self.inventory, 'purchase', 50)
+        self.assertEqual(forecast(TODAY)['reorder_point'][0], 20)
+        self.assertEqual(forecast(TODAY)['order'][0], 0)
+
+    def test_orders_are_drafted_per_vendor_and_branch(self):
+        ledger.post(self.inventory, 'purchase', 100)
+        self.consume(self.inventory, 3)
+        other = Branch.objects.create(
+            name="Second Branch", address="1 Side St", city="Pune", state="MH",
+            country="India", postal_code="411002", phone="555-765-4321"
+        )
+        ledger.post(ledger.stock_for(self.product.id, other.id), 'purchase', 1000)
+        towel = Product.objects.create(name="Towel", sku="TWL-1", cost_price=2, retail_price=4)
+        VendorProduct.objects.create(
+            vendor=self.vendor, product=towel, vendor_price=Decimal('1.50'), lead_time_days=2,
+        )
+        towels = ledger.stock_for(towel.id, self.branch.id)
+        ledger.post(towels, 'purchase', 150)
+        self.consume(towels, 5)
+        # No vendor sells these, so they cannot be ordered
+        ledger.stock_for(Product.objects.create(
+            name="Candle", sku="CND-1", cost_price=1, retail_price=3, minimum_stock=5
+        ).id, self.branch.id)
+
+        self.assertEqual(suggest_reorders(TODAY), {'inventories': 4, 'orders': 1, 'lines': 2})
+        order = PurchaseOrder.objects.get()
+        self.assertEqual((order.vendor, order.branch, order.status), (self.vendor, self.branch, 'draft'))
+        self.assertEqual(order.order_number, f"RO-20300131-{self.vendor.id}-{self.branch.id}")
+        self.assertEqual(
+            list(order.items.order_by('product_id').values_list('product_id', 'quantity_ordered')),
+            [(self.product.id, 48), (towel.id, 80)]
+        )
+        self.assertEqual(order.total, Decimal('312.00'))
+        self.assertEqual(Inventory.objects.get(pk=towels.pk).reorder_point, 10)
+
+        # The drafts now count as stock on order
+        self.assertEqual(suggest_reorders(TODAY), {'inventories': 4, 'orders': 0, 'lines': 0})
+        self.assertEqual(PurchaseOrderItem.objects.count(), 2)
+
+    def test_query_count_does_not_grow_with_inventories(self):
+        def add_products(count, prefix):
+            products = Product.objects.bulk_create([
+                Product(name=f"{prefix} {index}", sku=f"{prefix}-{index}", cost_price=1, retail_price=2,
+                        minimum_stock=5)
+                for index in range(count)
+            ])
+            VendorProduct.objects.bulk_create([
+                VendorProduct(vendor=self.vendor, product=product, vendor_price=Decimal('1.00'))
+                for product in products
+            ])
+            Inventory.objects.bulk_create([
+                Inventory(product=product, branch=self.branch) for product in products
+            ])
+
+        # Small enough for SQLite to write the rows without splitting the batch
+        add_products(2, "SMALL")
+        with self.assertNumQueries(17):
+            suggest_reorders(TODAY)
+        PurchaseOrder.objects.all().delete()
+        add_products(60, "LARGE")
+        with self.assertNumQueries(17):
+            summary = suggest_reorders(TODAY)
+        self.assertEqual(summary, {'inventories': 63, 'orders': 1, 'lines': 62})
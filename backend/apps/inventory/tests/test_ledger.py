@@ -0,0 +1,233 @@
+import random
+import threading
+from datetime import date, timedelta
+
+from django.db import connection, OperationalError
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.clinic.models import Branch
+from apps.core.models import User
+from apps.inventory import ledger
+from apps.inventory.models import (
+    Inventory, InventoryTransaction, Product, PurchaseOrder, PurchaseOrderItem, Vendor
+)
+from apps.inventory.views import (
+    InventoryTransactionViewSet, InventoryViewSet, ProductViewSet, PurchaseOrderViewSet
+)
+
+
+def create_stock(sku="OIL-1"):
+    branch = Branch.objects.create(
+        name="Main Branch", address="123 Main St", city="Pune", state="MH",
+        country="India", postal_code="411001", phone="555-123-4567"
+    )
+    product = Product.objects.create(name="Massage oil", sku=sku, cost_price=5, retail_price=12)
+    return branch, product
+
+
+class InventoryLedgerTests(TestCase):
+    """Test ledger postings, checkpoints and reconciliation."""
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.admin = User.objects.create_user(email="admin@example.com", role="admin", is_staff=True)
+        self.branch, self.product = create_stock()
+        self.inventory = ledger.stock_for(self.product.id, self.branch.id)
+
+    def call(self, viewset, actions, method='post', data=None, **kwargs):
+        request = getattr(self.factory, method)('/api/v1/inventory/', data, format='json')
+        force_authenticate(request, user=self.admin)
+        return viewset.as_view(actions)(request, **kwargs)
+
+    def stock(self):
+        return Inventory.objects.get(pk=self.inventory.pk).quantity_in_stock
+
+    def ledger_quantity(self):
+        return ledger.ledger_balances().get(pk=self.inventory.pk).ledger_quantity
+
+    def test_postings_move_the_balance(self):
+        ledger.post(self.inventory, 'purchase', 10)
+        ledger.post_many([
+            InventoryTransaction(inventory=self.inventory, transaction_type='sale', quantity=-3),
+            InventoryTransaction(inventory=self.inventory, transaction_type='sale', quantity=-2),
+        ])
+        self.assertEqual(self.stock(), 5)
+        self.assertEqual(self.ledger_quantity(), 5)
+
+    def test_quantity_sign_must_match_the_type(self):
+        for transaction_type, quantity in [('purchase', -5), ('purchase', 0), ('sale', 2), ('write_off', 1)]:
+            with self.assertRaises(ledger.LedgerError):
+                ledger.post(self.inventory, transaction_type, quantity)
+        with self.assertRaises(ledger.LedgerError):
+            ledger.post_many([
+                InventoryTransaction(inventory=self.inventory, transaction_type='purchase', quantity=4),
+                InventoryTransaction(inventory=self.inventory, transaction_type='sale', quantity=3),
+            ])
+        self.assertEqual(self.stock(), 0)
+        self.assertFalse(InventoryTransaction.objects.exists())
+
+        ledger.post(self.inventory, 'adjustment', 4)
+        ledger.post(self.inventory, 'adjustment', -1)
+        self.assertEqual(self.stock(), 3)
+
+        response = self.call(InventoryTransactionViewSet, {'post': 'create'}, data={
+            'inventory': self.inventory.pk, 'transaction_type': 'sale', 'quantity': 1,
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('quantity', response.data)
+        self.assertEqual(self.stock(), 3)
+
+    def test_stale_instances_do_not_overwrite_the_balance(self):
+        stale = Inventory.objects.get(pk=self.inventory.pk)
+        ledger.post(self.inventory, 'purchase', 10)
+        ledger.post(stale, 'sale', -4)
+        self.assertEqual(self.stock(), 6)
+        self.assertEqual(stale.quantity_in_stock, 6)
+
+    def test_count_posts_the_difference(self):
+        ledger.post(self.inventory, 'purchase', 10)
+        entry = ledger.record_count(Inventory.objects.get(pk=self.inventory.pk), 7)
+        self.assertEqual(entry.quantity, -3)
+        self.assertEqual(self.stock(), 7)
+        self.assertIsNotNone(Inventory.objects.get(pk=self.inventory.pk).last_counted_at)
+
+    def test_checkpoints_fold_older_transactions(self):
+        for quantity in (10, -4, 6):
+            ledger.post(self.inventory, 'adjustment', quantity)
+        later = timezone.now() + timedelta(hours=1)
+        self.assertEqual(ledger.checkpoint_balances(now=later), 1)
+        inventory = Inventory.objects.get(pk=self.inventory.pk)
+        self.assertEqual(inventory.checkpoint_quantity, 12)
+        self.assertEqual(inventory.checkpoint_transaction_id, InventoryTransaction.objects.latest('id').id)
+
+        # Recent transactions wait for the next checkpoint
+        ledger.post(self.inventory, 'sale', -2)
+        self.assertEqual(ledger.checkpoint_balances(now=timezone.now()), 0)
+        self.assertEqual(self.ledger_quantity(), 10)
+        self.assertEqual(ledger.checkpoint_balances(now=later), 1)
+        self.assertEqual(Inventory.objects.get(pk=self.inventory.pk).checkpoint_quantity, 10)
+
+    def test_reconcile_finds_and_fixes_drift(self):
+        other = ledger.stock_for(Product.objects.create(
+            name="Towel", sku="TWL-1", cost_price=2, retail_price=4
+        ).id, self.branch.id)
+        ledger.post(self.inventory, 'purchase', 10)
+        ledger.post(other, 'purchase', 3)
+        ledger.checkpoint_balances(now=timezone.now() + timedelta(hours=1))
+        ledger.post(self.inventory, 'sale', -1)
+        Inventory.objects.filter(pk=self.inventory.pk).update(quantity_in_stock=20)
+
+        with self.assertNumQueries(1):
+            drifted = ledger.reconcile()
+        self.assertEqual(drifted, [(self.inventory.pk, 20, 9)])
+        ledger.reconcile(fix=True)
+        self.assertEqual(self.stock(), 9)
+        self.assertEqual(ledger.reconcile(), [])
+
+    def test_stock_endpoints_post_to_the_ledger(self):
+        response = self.call(ProductViewSet, {'post': 'update_stock'}, pk=self.product.pk, data={
+            'branch_id': self.branch.id, 'quantity': 8,
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['inventory']['quantity_in_stock'], 8)
+
+        response = self.call(InventoryViewSet, {'post': 'count'}, pk=self.inventory.pk, data={'quantity': 5})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['transaction']['quantity'], -3)
+
+        response = self.call(InventoryTransactionViewSet, {'post': 'create'}, data={
+            'inventory': self.inventory.pk, 'transaction_type': 'sale', 'quantity': -1,
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.stock(), 4)
+        self.assertEqual(self.ledger_quantity(), 4)
+
+        response = self.call(ProductViewSet, {'post': 'update_stock'}, pk=self.product.pk, data={
+            'branch_id': self.branch.id, 'quantity': 'lots',
+        })
+        self.assertEqual(response.status_code, 400)
+
+    def test_new_inventory_gets_an_opening_balance(self):
+        product = Product.objects.create(name="Towel", sku="TWL-1", cost_price=2, retail_price=4)
+        response = self.call(InventoryViewSet, {'post': 'create'}, data={
+            'product': product.id, 'branch': self.branch.id, 'quantity_in_stock': 12,
+        })
+        self.assertEqual(response.status_code, 201)
+        inventory = Inventory.objects.get(pk=response.data['id'])
+        self.assertEqual(inventory.quantity_in_stock, 12)
+        self.assertEqual(list(inventory.transactions.values_list('quantity', flat=True)), [12])
+
+        response = self.call(InventoryViewSet, {'patch': 'partial_update'}, method='patch',
+                             pk=inventory.pk, data={'quantity_in_stock': 10})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(ledger.reconcile(), [])
+
+    def test_receiving_posts_purchases(self):
+        vendor = Vendor.objects.create(name="Supplier")
+        order = PurchaseOrder.objects.create(
+            vendor=vendor, branch=self.branch, order_number="PO-1", status='submitted', order_date=date.today()
+        )
+        item = PurchaseOrderItem.objects.create(
+            purchase_order=order, product=self.product, quantity_ordered=6, unit_price=5
+        )
+        response = self.call(PurchaseOrderViewSet, {'post': 'receive'}, pk=order.pk, data={
+            'items': [{'id': item.id, 'quantity_received': 4}],
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.stock(), 4)
+        self.assertEqual(self.ledger_quantity(), 4)
+
+
+class ConcurrentLedgerTest(TransactionTestCase):
+    """
+    Post sales and receipts for one inventory from many threads at once and
+    check that the balance ends up where the ledger says, with no update lost.
+    """
+
+    THREADS = 8
+    POSTINGS_PER_THREAD = 25
+
+    def setUp(self):
+        branch, product = create_stock()
+        self.inventory = ledger.stock_for(product.id, branch.id)
+
+    def post_randomly(self, seed, posted, errors):
+        generator = random.Random(seed)
+        try:
+            for _ in range(self.POSTINGS_PER_THREAD):
+                quantity = generator.choice([-2, -1, 1, 3])
+                for attempt in range(20):
+                    try:
+                        # Every thread works from its own, soon stale, copy of the row
+                        inventory = Inventory.objects.get(pk=self.inventory.pk)
+                        ledger.post(inventory, 'sale' if quantity < 0 else 'purchase', quantity)
+                    except OperationalError:
+                        # SQLite locks the whole database instead of queueing writers
+                        continue
+                    posted.append(quantity)
+                    break
+                else:
+                    errors.append(seed)
+        finally:
+            connection.close()
+
+    def test_no_lost_updates(self):
+        posted = []
+        errors = []
+        threads = [
+            threading.Thread(target=self.post_randomly, args=(seed, posted, errors))
+            for seed in range(self.THREADS)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        if connection.vendor == 'postgresql':
+            self.assertEqual(errors, [])
+        self.assertEqual(len(posted) + len(errors), self.THREADS * self.POSTINGS_PER_THREAD)
+        self.assertEqual(InventoryTransaction.objects.count(), len(posted))
+        self.assertEqual(Inventory.objects.get(pk=self.inventory.pk).quantity_in_stock, sum(posted))
+        self.assertEqual(ledger.reconcile(), [])
@@ -0,0 +1,148 @@
+from datetime import date
+from decimal import Decimal
+
+from django.test import TestCase
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.core.models import User
+from apps.inventory import ledger, stock_levels
+from apps.inventory.models import Inventory, Product, PurchaseOrder, PurchaseOrderItem, Vendor
+from apps.inventory.views import PurchaseOrderViewSet
+
+from .test_ledger import create_stock
+
+
+class PurchaseOrderReceivingTests(TestCase):
+    """Test receiving whole deliveries in one transaction."""
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.admin = User.objects.create_user(email="admin@example.com", role="admin", is_staff=True)
+        self.branch, product = create_stock()
+        self.products = [product] + [
+            Product.objects.create(name=f"Product {index}", sku=f"SKU-{index}", cost_price=1, retail_price=2)
+            for index in range(2)
+        ]
+        self.order = self.create_order(self.products, quantity=5)
+        # Only the first product is stocked at the branch so far
+        ledger.post(ledger.stock_for(self.products[0].id, self.branch.id), 'purchase', 2)
+
+    def create_order(self, products, quantity, number="PO-1"):
+        order = PurchaseOrder.objects.create(
+            vendor=Vendor.objects.create(name=f"Supplier {number}"), branch=self.branch,
+            order_number=number, status='submitted', order_date=date(2030, 1, 1), tax=Decimal('3.00'),
+        )
+        PurchaseOrderItem.objects.bulk_create([
+            PurchaseOrderItem(purchase_order=order, product=product, quantity_ordered=quantity,
+                              unit_price=Decimal('2.50'))
+            for product in products
+        ])
+        return order
+
+    def receive(self, order, lines):
+        request = self.factory.post('/api/v1/inventory/purchase-orders/', {'items': lines}, format='json')
+        force_authenticate(request, user=self.admin)
+        return PurchaseOrderViewSet.as_view({'post': 'receive'})(request, pk=order.pk)
+
+    def items(self, order=None):
+        return list((order or self.order).items.order_by('pk'))
+
+    def stock(self):
+        return dict(Inventory.objects.filter(branch=self.branch).values_list('product_id', 'quantity_in_stock'))
+
+    def test_partial_then_full_delivery(self):
+        first, second, third = self.items()
+        response = self.receive(self.order, [
+            {'id': first.id, 'quantity_received': 3},
+            {'id': second.id, 'quantity_received': 5},
+            {'id': first.id, 'quantity_received': 1},
+            {'id': third.id, 'quantity_received': 0},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['purchase_order_status'], 'partial')
+        self.assertEqual(
+            [(line['item_id'], line['quantity_received'], line['total_received'])
+             for line in response.data['processed_items']],
+            [(first.id, 4, 4), (second.id, 5, 5)]
+        )
+        self.assertEqual(self.stock(), {self.products[0].id: 6, self.products[1].id: 5})
+
+        # Quantities beyond what is outstanding are ignored
+        response = self.receive(self.order, [
+            {'id': first.id, 'quantity_received': 9},
+            {'id': third.id, 'quantity_received': 5},
+        ])
+        self.assertEqual(response.data['purchase_order_status'], 'received')
+        self.assertEqual([line['quantity_received'] for line in response.data['processed_items']], [1, 5])
+        self.assertEqual([item.quantity_received for item in self.items()], [5, 5, 5])
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.delivery_date, date.today())
+        self.assertEqual(ledger.reconcile(), [])
+
+        response = self.receive(self.order, [{'id': first.id, 'quantity_received': 1}])
+        self.assertEqual(response.status_code, 400)
+
+    def test_query_count_does_not_grow_with_delivery(self):
+        # Small enough for SQLite to insert the rows without splitting the batch
+        products = Product.objects.bulk_create([
+            Product(name=f"Bulk {index}", sku=f"BULK-{index}", cost_price=1, retail_price=2)
+            for index in range(80)
+        ])
+        # bulk_create skips the signal that builds their stock summaries
+        stock_levels.refresh_levels()
+        small = self.create_order(self.products, quantity=4, number="PO-2")
+        large = self.create_order(products, quantity=4, number="PO-3")
+
+        small_lines = [{'id': item.id, 'quantity_received': 4} for item in self.items(small)]
+        large_lines = [{'id': item.id, 'quantity_received': 4} for item in self.items(large)]
+
+        with self.assertNumQueries(17):
+            self.receive(small, small_lines)
+        with self.assertNumQueries(17):
+            response = self.receive(large, large_lines)
+        self.assertEqual(response.data['purchase_order_status'], 'received')
+        self.assertEqual(len(response.data['processed_items']), 80)
+        self.assertEqual(set(Inventory.objects.filter(product__in=products).values_list(
+            'quantity_in_stock', flat=True
+        )), {4})
+
+    def test_large_delivery(self):
+        products = Product.objects.bulk_create([
+            Product(name=f"Bulk {index}", sku=f"BULK-{index}", cost_price=1, retail_price=2)
+            for index in range(300)
+        ])
+        order = self.create_order(products, quantity=4, number="PO-2")
+        response = self.receive(order, [
+            {'id': item.id, 'quantity_received': 3} for item in self.items(order)
+        ])
+        self.assertEqual(response.data['purchase_order_status'], 'partial')
+        self.assertEqual(ledger.reconcile(), [])
+        self.assertEqual(
+            sum(Inventory.objects.filter(product__in=products).values_list('quantity_in_stock', flat=True)), 900
+        )
+
+    def test_string_item_ids_are_received(self):
+        first, second, _ = self.items()
+        response = self.receive(self.order, [
+            {'id': str(first.id), 'quantity_received': '2'},
+            {'id': first.id, 'quantity_received': 1},
+            {'id': str(second.id), 'quantity_received': 5},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item.quantity_received for item in self.items()], [3, 5, 0])
+        self.assertEqual(self.stock(), {self.products[0].id: 5, self.products[1].id: 5})
+
+    def test_invalid_deliveries_are_rejected(self):
+        first = self.items()[0]
+        self.assertEqual(self.receive(self.order, []).status_code, 400)
+        self.assertEqual(self.receive(self.order, [{'id': first.id, 'quantity_received': 'six'}]).status_code, 400)
+        self.assertEqual(self.receive(self.order, [{'id': 'first', 'quantity_received': 1}]).status_code, 400)
+        self.order.status = 'draft'
+        self.order.save()
+        self.assertEqual(self.receive(self.order, [{'id': first.id, 'quantity_received': 1}]).status_code, 400)
+        self.assertEqual(self.items()[0].quantity_received, 0)
+
+    def test_totals_are_summed_in_the_database(self):
+        self.order.save()
+        self.assertEqual(self.order.subtotal, Decimal('37.50'))
+        self.assertEqual(self.order.total, Decimal('40.50'))
@@ -0,0 +1,144 @@
+from django.test import TestCase
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.clinic.models import Branch
+from apps.core.models import User
+from apps.core.testing import EagerCeleryMixin
+from apps.engagement.models import Notification
+from apps.inventory import ledger, stock_levels
+from apps.inventory.models import Inventory, InventoryTransaction, Product, ProductStock
+from apps.inventory.views import InventoryViewSet, ProductViewSet
+
+from .test_ledger import create_stock
+
+
+class StockLevelTests(EagerCeleryMixin, TestCase):
+    """Test the product stock summaries, low-stock flags and alerts."""
+
+    def setUp(self):
+        super().setUp()
+        self.factory = APIRequestFactory()
+        self.admin = User.objects.create_user(email="admin@example.com", role="admin", is_staff=True)
+        self.branch, self.product = create_stock()
+        self.product.minimum_stock = 10
+        self.product.save()
+        self.other = Branch.objects.create(
+            name="Second Branch", address="1 Side St", city="Pune", state="MH",
+            country="India", postal_code="411002", phone="555-765-4321"
+        )
+        self.inventory = ledger.stock_for(self.product.id, self.branch.id)
+        self.other_inventory = ledger.stock_for(self.product.id, self.other.id)
+
+    def summary(self):
+        return ProductStock.objects.get(pk=self.product.pk)
+
+    def low_inventories(self):
+        return set(Inventory.objects.filter(is_low=True).values_list('pk', flat=True))
+
+    def list_low(self, viewset):
+        request = self.factory.get('/api/v1/inventory/', {'low_stock': 'true'})
+        force_authenticate(request, user=self.admin)
+        response = viewset.as_view({'get': 'list'})(request)
+        return [row['id'] for row in response.data['results']]
+
+    def alerts(self):
+        return Notification.objects.filter(user=self.admin, notification_type='system').count()
+
+    def test_postings_move_the_summary(self):
+        self.assertTrue(self.summary().is_low)
+        self.assertEqual(self.low_inventories(), {self.inventory.pk, self.other_inventory.pk})
+
+        ledger.post(self.inventory, 'purchase', 12)
+        ledger.post_many([
+            InventoryTransaction(inventory=self.inventory, transaction_type='sale', quantity=-3),
+            InventoryTransaction(inventory=self.other_inventory, transaction_type='purchase', quantity=4),
+        ])
+        summary = self.summary()
+        self.assertEqual(summary.quantity_in_stock, 13)
+        self.assertFalse(summary.is_low)
+        self.assertIsNone(summary.low_since)
+        self.assertEqual(self.low_inventories(), {self.inventory.pk, self.other_inventory.pk})
+
+        ledger.post(self.other_inventory, 'purchase', 6)
+        self.assertEqual(self.low_inventories(), {self.inventory.pk})
+        self.assertEqual(self.list_low(InventoryViewSet), [self.inventory.pk])
+        self.assertEqual(self.list_low(ProductViewSet), [])
+
+    def test_threshold_changes_refresh_the_flags(self):
+        ledger.post(self.inventory, 'purchase', 8)
+        self.assertEqual(self.list_low(ProductViewSet), [self.product.pk])
+
+        self.product.minimum_stock = 5
+        self.product.save()
+        self.assertFalse(self.summary().is_low)
+        self.assertEqual(self.low_inventories(), {self.other_inventory.pk})
+
+        # Reorder points take over from the product's minimum
+        Inventory.objects.filter(pk=self.inventory.pk).update(reorder_point=9)
+        stock_levels.refresh_levels([self.product.pk])
+        self.assertEqual(self.low_inventories(), {self.inventory.pk, self.other_inventory.pk})
+
+        self.product.track_inventory = False
+        self.product.save()
+        self.assertEqual(self.low_inventories(), set())
+
+    def test_running_low_alerts_administrators_once(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ledger.post(self.inventory, 'purchase', 20)
+        self.assertEqual(self.alerts(), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ledger.post(self.inventory, 'sale', -15)
+        self.assertEqual(self.alerts(), 1)
+        notification = Notification.objects.get(user=self.admin)
+        self.assertEqual(notification.object_id, self.product.pk)
+        self.assertEqual(notification.metadata, {'quantity_in_stock': 5})
+
+        # Staying low is not news
+        with self.captureOnCommitCallbacks(execute=True):
+            ledger.post(self.inventory, 'sale', -1)
+        self.assertEqual(self.alerts(), 1)
+
+    def test_deleting_an_inventory_takes_its_stock_out(self):
+        ledger.post(self.inventory, 'purchase', 10)
+        ledger.post(self.other_inventory, 'purchase', 10)
+        self.assertFalse(self.summary().is_low)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other_inventory.delete()
+        summary = self.summary()
+        self.assertEqual(summary.quantity_in_stock, 10)
+        self.assertEqual(self.list_low(ProductViewSet), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.inventory.delete()
+        self.assertEqual(self.summary().quantity_in_stock, 0)
+        self.assertEqual(self.list_low(ProductViewSet), [self.product.pk])
+
+        # Deleting the product cascades to its summary
+        ledger.stock_for(self.product.id, self.branch.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.delete()
+        self.assertFalse(ProductStock.objects.exists())
+
+    def test_refresh_rebuilds_missing_and_drifted_summaries(self):
+        ledger.post(self.inventory, 'purchase', 7)
+        bulk = Product.objects.bulk_create([
+            Product(name="Towel", sku="TWL-1", cost_price=2, retail_price=4, minimum_stock=3)
+        ])[0]
+        towels = Inventory.objects.bulk_create([Inventory(product=bulk, branch=self.branch)])[0]
+        ledger.post(towels, 'purchase', 2)
+        self.assertEqual(ProductStock.objects.get(pk=bulk.pk).quantity_in_stock, 2)
+        self.assertTrue(Inventory.objects.get(pk=towels.pk).is_low)
+
+        Inventory.objects.filter(pk=self.inventory.pk).update(quantity_in_stock=30)
+        ledger.reconcile(fix=True)
+        self.assertEqual(self.summary().quantity_in_stock, 7)
+
+        ProductStock.objects.all().delete()
+        with self.assertNumQueries(7):
+            self.assertEqual(stock_levels.refresh_levels(), 2)
+        self.assertEqual(
+            dict(ProductStock.objects.values_list('product_id', 'quantity_in_stock')),
+            {self.product.pk: 7, bulk.pk: 2}
+        )
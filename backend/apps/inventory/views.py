@@ -1,14 +1,20 @@
-from django.db.models import Count, Sum, Q, F
+from django.db import transaction as db_transaction
+from django.db.models import Count, Func, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.http import Http404
 from django.utils import timezone
 from rest_framework import viewsets, permissions, status, filters
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
+from apps.core.pagination import KeysetPagination
 from apps.core.permissions import IsAdminOrTherapist
+from apps.inventory import ledger
 from apps.inventory.models import (
     ProductCategory, Product, Inventory, InventoryTransaction,
     Vendor, VendorProduct, PurchaseOrder, PurchaseOrderItem
 )
+from apps.inventory.receiving import ReceivingError, receive_delivery
 from apps.inventory.serializers import (
     ProductCategorySerializer, ProductSerializer, ProductDetailSerializer,
     InventorySerializer, InventoryTransactionSerializer,
@@ -32,11 +38,21 @@ class ProductCategoryViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         """
-        Get categories with counts of subcategories and products.
+        Get categories with counts of subcategories and products, and the
+        products and stock rolled up over each category's subtree.
         """
-        queryset = ProductCategory.objects.annotate(
+        # Aggregating functions that Django does not group by, so each
+        # subquery totals the whole subtree
+        subtree = Product.objects.filter(category__path__startswith=OuterRef('path')).order_by()
+        queryset = ProductCategory.objects.select_related('parent').annotate(
             subcategory_count=Count('subcategories', distinct=True),
-            product_count=Count('products', distinct=True)
+            product_count=Count('products', distinct=True),
+            subtree_product_count=Subquery(
+                subtree.annotate(total=Func('pk', function='COUNT')).values('total')[:1]
+            ),
+            subtree_stock=Coalesce(Subquery(
+                subtree.annotate(total=Func('stock__quantity_in_stock', function='SUM')).values('total')[:1]
+            ), 0),
         )
         
         # Filter by active status if specified
@@ -52,8 +68,26 @@ class ProductCategoryViewSet(viewsets.ModelViewSet):
                 queryset = queryset.filter(parent__isnull=True)
             else:
                 queryset = queryset.filter(parent_id=parent)
+        
+        # Filter to the subtree under a category
+        ancestor = self.request.query_params.get('ancestor')
+        if ancestor:
+            queryset = queryset.filter(pk__in=ProductCategory.subtree_of(ancestor).values('pk'))
                 
         return queryset
+    
+    @action(detail=True, methods=['get'])
+    def breadcrumbs(self, request, pk=None):
+        """
+        Get the categories from the root down to this one.
+        """
+        breadcrumbs = [
+            {'id': category_id, 'name': name}
+            for category_id, name in ProductCategory.ancestors_of(pk).values_list('pk', 'name')
+        ]
+        if not breadcrumbs:
+            raise Http404
+        return Response(breadcrumbs)
 
 
 class ProductViewSet(viewsets.ModelViewSet):
@@ -77,23 +111,26 @@ class ProductViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         """
-        Get products with total quantity aggregated from inventory.
+        Get products with their total quantity from the stock summary.
         """
-        queryset = Product.objects.annotate(
-            total_quantity=Sum('inventories__quantity_in_stock', default=0)
+        queryset = Product.objects.select_related('category').annotate(
+            total_quantity=Coalesce('stock__quantity_in_stock', 0)
         )
         
         # Filter by minimum stock if specified
         low_stock = self.request.query_params.get('low_stock')
         if low_stock is not None and low_stock.lower() == 'true':
-            queryset = queryset.filter(
-                Q(total_quantity__lt=F('minimum_stock')) & Q(track_inventory=True)
-            )
+            queryset = queryset.filter(stock__is_low=True)
             
         # Filter by category name
         category_name = self.request.query_params.get('category_name')
         if category_name:
             queryset = queryset.filter(category__name__icontains=category_name)
+        
+        # Filter by a category and everything under it
+        category_tree = self.request.query_params.get('category_tree')
+        if category_tree:
+            queryset = queryset.filter(category__in=ProductCategory.subtree_of(category_tree))
             
         # Filter by product type if specified
         product_type = self.request.query_params.get('product_type')
@@ -133,28 +170,25 @@ class ProductViewSet(viewsets.ModelViewSet):
                 'error': 'branch_id and quantity are required'
             }, status=status.HTTP_400_BAD_REQUEST)
         
+        try:
+            quantity = int(quantity)
+        except (TypeError, ValueError):
+            return Response({
+                'error': 'quantity must be a whole number'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
         try:
             # Get or create inventory record for this product/branch
-            inventory, created = Inventory.objects.get_or_create(
-                product=product,
-                branch_id=branch_id,
-                defaults={'quantity_in_stock': 0}
-            )
+            inventory = ledger.stock_for(product.id, branch_id)
             
-            # Create a transaction for this adjustment
-            transaction = InventoryTransaction.objects.create(
-                inventory=inventory,
-                transaction_type='adjustment',
-                quantity=quantity,
+            # Post the adjustment, moving the stock atomically
+            transaction = ledger.post(
+                inventory, 'adjustment', quantity,
+                counted_at=timezone.now(),
                 notes=notes,
                 created_by=request.user
             )
             
-            # Update inventory quantity
-            inventory.quantity_in_stock += int(quantity)
-            inventory.last_counted_at = timezone.now()
-            inventory.save()
-            
             return Response({
                 'success': True,
                 'inventory': InventorySerializer(inventory).data,
@@ -187,10 +221,7 @@ class InventoryViewSet(viewsets.ModelViewSet):
         # Filter by low stock status
         low_stock = self.request.query_params.get('low_stock')
         if low_stock is not None and low_stock.lower() == 'true':
-            queryset = queryset.filter(
-                Q(quantity_in_stock__lt=F('product__minimum_stock')) & 
-                Q(product__track_inventory=True)
-            )
+            queryset = queryset.filter(is_low=True)
             
         # Filter by product name
         product_name = self.request.query_params.get('product_name')
@@ -209,6 +240,25 @@ class InventoryViewSet(viewsets.ModelViewSet):
             
         return queryset
     
+    def perform_create(self, serializer):
+        """Post the initial stock to the ledger as an opening balance."""
+        quantity = serializer.validated_data.pop('quantity_in_stock', 0)
+        with db_transaction.atomic():
+            inventory = serializer.save(quantity_in_stock=0)
+            if quantity:
+                ledger.post(
+                    inventory, 'adjustment', quantity,
+                    notes='Opening balance', created_by=self.request.user
+                )
+    
+    def perform_update(self, serializer):
+        """Record a changed stock level as a count rather than overwriting it."""
+        quantity = serializer.validated_data.pop('quantity_in_stock', None)
+        with db_transaction.atomic():
+            inventory = serializer.save()
+            if quantity is not None:
+                ledger.record_count(inventory, quantity, created_by=self.request.user)
+    
     @action(detail=True, methods=['post'])
     def count(self, request, pk=None):
         """
@@ -225,22 +275,19 @@ class InventoryViewSet(viewsets.ModelViewSet):
         
         try:
             quantity = int(quantity)
-            difference = quantity - inventory.quantity_in_stock
-            
-            # Create a transaction for this count
-            transaction = InventoryTransaction.objects.create(
-                inventory=inventory,
-                transaction_type='adjustment',
-                quantity=difference,
+        except (TypeError, ValueError):
+            return Response({
+                'error': 'quantity must be a whole number'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            # Adjust by the difference the count reveals
+            transaction = ledger.record_count(
+                inventory, quantity,
                 notes=notes,
                 created_by=request.user
             )
             
-            # Update inventory quantity
-            inventory.quantity_in_stock = quantity
-            inventory.last_counted_at = timezone.now()
-            inventory.save()
-            
             return Response({
                 'success': True,
                 'inventory': InventorySerializer(inventory).data,
@@ -263,12 +310,17 @@ class InventoryTransactionViewSet(viewsets.ModelViewSet):
     search_fields = ['inventory__product__name', 'reference_number', 'notes']
     ordering_fields = ['created_at']
     ordering = ['-created_at']
+    pagination_class = KeysetPagination
+    # The ledger is append-only: mistakes are corrected by new transactions
+    http_method_names = ['get', 'post', 'head', 'options']
     
     def get_queryset(self):
         """
         Filter inventory transactions.
         """
-        queryset = InventoryTransaction.objects.all()
+        queryset = InventoryTransaction.objects.all().select_related(
+            'inventory__product', 'inventory__branch', 'created_by'
+        )
         
         # Filter by transaction type if specified
         transaction_type = self.request.query_params.get('transaction_type')
@@ -288,8 +340,12 @@ class InventoryTransactionViewSet(viewsets.ModelViewSet):
         return queryset
     
     def perform_create(self, serializer):
-        """Set the created_by field to current user."""
-        serializer.save(created_by=self.request.user)
+        """Post the transaction to the ledger, moving the stock with it."""
+        data = dict(serializer.validated_data)
+        serializer.instance = ledger.post(
+            data.pop('inventory'), data.pop('transaction_type'), data.pop('quantity'),
+            created_by=self.request.user, **data
+        )
 
 
 class VendorViewSet(viewsets.ModelViewSet):
@@ -344,7 +400,7 @@ class VendorProductViewSet(viewsets.ModelViewSet):
         """
         Filter vendor products.
         """
-        queryset = VendorProduct.objects.all()
+        queryset = VendorProduct.objects.all().select_related('product', 'vendor')
         
         # Filter by vendor if specified
         vendor = self.request.query_params.get('vendor')
@@ -420,99 +476,20 @@ class PurchaseOrderViewSet(viewsets.ModelViewSet):
         """
         purchase_order = self.get_object()
         
-        # Check if PO can be received
-        if purchase_order.status not in ['submitted', 'confirmed', 'partial']:
-            return Response({
-                'error': 'Only submitted, confirmed, or partially received purchase orders can be received.'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
-        # Process receipt data
-        receipt_data = request.data.get('items', [])
-        if not receipt_data:
-            return Response({
-                'error': 'No items provided for receipt'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
         try:
-            processed_items = []
-            fully_received = True
-            
-            for item_data in receipt_data:
-                item_id = item_data.get('id')
-                quantity_received = int(item_data.get('quantity_received', 0))
-                
-                # Skip if invalid data
-                if not item_id or quantity_received <= 0:
-                    continue
-                
-                try:
-                    # Get the PO item
-                    item = PurchaseOrderItem.objects.get(id=item_id, purchase_order=purchase_order)
-                    
-                    # Calculate the quantity to add (don't exceed ordered quantity)
-                    quantity_to_add = min(quantity_received, item.quantity_ordered - item.quantity_received)
-                    
-                    if quantity_to_add <= 0:
-                        continue
-                    
-                    # Update the item's received quantity
-                    item.quantity_received += quantity_to_add
-                    item.save()
-                    
-                    # Get or create inventory for this product at the PO's branch
-                    inventory, created = Inventory.objects.get_or_create(
-                        product=item.product,
-                        branch=purchase_order.branch,
-                        defaults={'quantity_in_stock': 0}
-                    )
-                    
-                    # Create inventory transaction
-                    transaction = InventoryTransaction.objects.create(
-                        inventory=inventory,
-                        transaction_type='purchase',
-                        quantity=quantity_to_add,
-                        reference_number=purchase_order.order_number,
-                        notes=f"Received from PO #{purchase_order.order_number}",
-                        created_by=request.user
-                    )
-                    
-                    # Update inventory quantity
-                    inventory.quantity_in_stock += quantity_to_add
-                    inventory.save()
-                    
-                    processed_items.append({
-                        'item_id': item.id,
-                        'product_name': item.product.name,
-                        'quantity_received': quantity_to_add,
-                        'total_received': item.quantity_received
-                    })
-                    
-                    # Check if all items are fully received
-                    if item.quantity_received < item.quantity_ordered:
-                        fully_received = False
-                        
-                except PurchaseOrderItem.DoesNotExist:
-                    continue
-            
-            # Update purchase order status
-            if fully_received:
-                purchase_order.status = 'received'
-                purchase_order.delivery_date = timezone.now().date()
-            elif processed_items:
-                purchase_order.status = 'partial'
-            
-            purchase_order.save()
-            
-            return Response({
-                'success': True,
-                'purchase_order_status': purchase_order.status,
-                'processed_items': processed_items
-            })
-            
-        except Exception as e:
+            purchase_order, processed_items = receive_delivery(
+                purchase_order.pk, request.data.get('items') or [], user=request.user
+            )
+        except ReceivingError as e:
             return Response({
                 'error': str(e)
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            'success': True,
+            'purchase_order_status': purchase_order.status,
+            'processed_items': processed_items
+        })
 
 
 class PurchaseOrderItemViewSet(viewsets.ModelViewSet):
@@ -529,7 +506,7 @@ class PurchaseOrderItemViewSet(viewsets.ModelViewSet):
         """
         Filter purchase order items.
         """
-        queryset = PurchaseOrderItem.objects.all()
+        queryset = PurchaseOrderItem.objects.all().select_related('product')
         
         # Filter by purchase order if specified
         purchase_order = self.request.query_params.get('purchase_order')
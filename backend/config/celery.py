@@ -0,0 +1,19 @@
+"""
+Celery application for the config project.
+
+Workers are started with ``celery -A config worker`` and the scheduler with
+``celery -A config beat`` (see docker-compose.yml).
+"""
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+app = Celery('config')
+
+# Read CELERY_* settings from Django settings
+app.config_from_object('django.conf:settings', namespace='CELERY')
+
+# Load tasks.py modules from all installed apps
+app.autodiscover_tasks()
@@ -84,6 +84,7 @@ LOCAL_APPS = [
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
+    'apps.core.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -248,6 +249,30 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
 }
 
+# Largest page a client can request with ?page_size= (see apps.core.pagination)
+MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', 100))
+
+# Cache: Redis when REDIS_URL is set (see docker-compose.yml), local memory otherwise
+REDIS_URL = os.environ.get('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'wellness',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Public catalog response cache (see apps.clinic.cache)
+CATALOG_CACHE_ENABLED = os.environ.get('CATALOG_CACHE_ENABLED', 'True') == 'True'
+CATALOG_CACHE_TIMEOUT = int(os.environ.get('CATALOG_CACHE_TIMEOUT', 300))
+
 # Celery Configuration
 CELERY_BROKER_URL = os.environ.get('CELERY_BROKER', 'redis://redis:6379/0')
 CELERY_RESULT_BACKEND = os.environ.get('CELERY_BACKEND', 'redis://redis:6379/0')
@@ -255,6 +280,82 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+CELERY_TASK_ALWAYS_EAGER = os.environ.get('CELERY_TASK_ALWAYS_EAGER', 'False') == 'True'
+CELERY_TASK_TRACK_STARTED = True
+CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
+# PDF rendering is CPU-bound and runs on its own prefork worker (see docker-compose.yml)
+CELERY_TASK_ROUTES = {
+    'apps.core.tasks.render_document': {'queue': 'pdf'},
+    'apps.booking.tasks.export_invoices': {'queue': 'pdf'},
+}
+CELERY_BEAT_SCHEDULE = {
+    'run-scheduled-analytics-reports': {
+        'task': 'apps.analytics.tasks.run_scheduled_reports',
+        'schedule': timedelta(minutes=5),
+    },
+    'dispatch-appointment-reminders': {
+        'task': 'apps.booking.tasks.dispatch_reminders',
+        'schedule': timedelta(minutes=5),
+    },
+    'run-appointment-lifecycle': {
+        'task': 'apps.booking.tasks.run_appointment_lifecycle',
+        'schedule': timedelta(minutes=15),
+    },
+    'checkpoint-inventory-ledger': {
+        'task': 'apps.inventory.tasks.checkpoint_inventory',
+        'schedule': timedelta(hours=1),
+    },
+    'reconcile-inventory-ledger': {
+        'task': 'apps.inventory.tasks.reconcile_inventory',
+        'schedule': timedelta(days=1),
+    },
+    'forecast-inventory-reorders': {
+        'task': 'apps.inventory.tasks.forecast_reorders',
+        'schedule': timedelta(days=1),
+    },
+    'purge-idempotency-keys': {
+        'task': 'apps.core.tasks.purge_idempotency_keys',
+        'schedule': timedelta(hours=1),
+    },
+}
+
+# Invoice numbering (see apps.booking.invoicing)
+FISCAL_YEAR_START_MONTH = int(os.environ.get('FISCAL_YEAR_START_MONTH', 4))
+INVOICE_NUMBER_BLOCK_SIZE = int(os.environ.get('INVOICE_NUMBER_BLOCK_SIZE', 50))
+
+# Appointment reminders (see apps.booking.reminders); REMINDER_BUCKET should
+# match the dispatch-appointment-reminders schedule
+APPOINTMENT_REMINDER_OFFSETS = [timedelta(hours=24), timedelta(hours=2)]
+REMINDER_BUCKET = timedelta(minutes=5)
+REMINDER_BATCH_SIZE = int(os.environ.get('REMINDER_BATCH_SIZE', 500))
+
+# Appointment lifecycle job (see apps.booking.lifecycle): how long after its
+# end an active appointment is closed, and how many rows each batch handles
+APPOINTMENT_CLOSE_AFTER = timedelta(hours=2)
+LIFECYCLE_BATCH_SIZE = int(os.environ.get('LIFECYCLE_BATCH_SIZE', 1000))
+
+# How far back calendar feeds reach (see apps.booking.calendar)
+CALENDAR_FEED_PAST_DAYS = int(os.environ.get('CALENDAR_FEED_PAST_DAYS', 30))
+
+# Waitlisters notified when a cancellation frees a slot (see apps.booking.waitlist)
+WAITLIST_PROMOTION_BATCH = int(os.environ.get('WAITLIST_PROMOTION_BATCH', 3))
+
+# Demand forecasting (see apps.inventory.forecasting): days of sales history,
+# weight of each new day in the smoothed rate, safety stock in standard
+# deviations, lead time for products without a vendor and days of demand
+# each reorder covers beyond the reorder point
+FORECAST_HISTORY_DAYS = int(os.environ.get('FORECAST_HISTORY_DAYS', 90))
+FORECAST_SMOOTHING = float(os.environ.get('FORECAST_SMOOTHING', 0.3))
+FORECAST_SERVICE_LEVEL_Z = float(os.environ.get('FORECAST_SERVICE_LEVEL_Z', 1.65))
+FORECAST_DEFAULT_LEAD_DAYS = int(os.environ.get('FORECAST_DEFAULT_LEAD_DAYS', 7))
+FORECAST_REVIEW_DAYS = int(os.environ.get('FORECAST_REVIEW_DAYS', 14))
+
+# How long responses to requests with an Idempotency-Key are kept for replay
+IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+
+# Request profiling (query counts and timings per view, see apps.core.profiling)
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', str(DEBUG)) == 'True'
+PROFILING_SERVER_TIMING = os.environ.get('PROFILING_SERVER_TIMING', str(DEBUG)) == 'True'
 
 # Email settings
 EMAIL_BACKEND = os.environ.get(
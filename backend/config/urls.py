@@ -12,6 +12,8 @@ from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 
+from apps.core.views import MetricsView
+
 schema_view = get_schema_view(
    openapi.Info(
       title="Wellness Centre API",
@@ -49,7 +51,8 @@ urlpatterns = [
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('swagger<format>/', schema_view.without_ui(cache_timeout=0), name='schema-json'),
     
-    # Health check
+    # Health check and request metrics
+    path('health/metrics/', MetricsView.as_view(), name='health-metrics'),
     path('health/', include('health_check.urls')),
 ]
 